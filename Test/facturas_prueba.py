@@ -0,0 +1,44 @@
+"""
+Facturas sintéticas compartidas por las pruebas.
+
+Las facturas se reparten en ciclo por día (1-28), mes, año y tipo, así que
+cada prueba obtiene datos variados y reproducibles sin escribir su propio
+generador.
+"""
+
+# Tipos de gasto usados cuando la prueba no indica otros
+TIPOS = ("Mercado", "Transporte", "Servicios")
+
+
+def tipos_numerados(cantidad):
+    """Devuelve los tipos "Tipo 0" ... "Tipo <cantidad - 1>"."""
+    return [f"Tipo {i}" for i in range(cantidad)]
+
+
+def generar_facturas(cantidad, anios=(2025,), tipos=TIPOS, descripcion=None, valor=None, primer_id=None):
+    """
+    Genera facturas de prueba con fechas, tipos y valores variados.
+
+    Args:
+        cantidad: Número de facturas
+        anios: Años en los que se reparten las facturas, en ciclo
+        tipos: Tipos de gasto, en ciclo
+        descripcion: Función i -> descripción (por defecto "Factura {i}")
+        valor: Función i -> valor (por defecto 1000.0 + i)
+        primer_id: Si se indica, las facturas llevan 'id' consecutivos desde este valor
+
+    Returns:
+        List[Dict]: Facturas con fecha DD/MM/YYYY, tipo, descripción y valor
+    """
+    facturas = []
+    for i in range(cantidad):
+        factura = {
+            'fecha': f"{i % 28 + 1:02d}/{i % 12 + 1:02d}/{anios[i % len(anios)]}",
+            'tipo': tipos[i % len(tipos)],
+            'descripcion': descripcion(i) if descripcion else f"Factura {i}",
+            'valor': valor(i) if valor else 1000.0 + i
+        }
+        if primer_id is not None:
+            factura['id'] = primer_id + i
+        facturas.append(factura)
+    return facturas
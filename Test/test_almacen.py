@@ -0,0 +1,93 @@
+import sys
+import logging
+import tracemalloc
+from database import Database, UnitOfWork
+from almacen import Factura, crear_facturas
+from facturas_prueba import generar_facturas, tipos_numerados
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def test_factura_como_diccionario():
+    """Verifica que el registro se comporte como el diccionario que reemplaza."""
+    datos = {'fecha': '01/02/2025', 'tipo': 'Mercado', 'descripcion': 'Pan', 'valor': 1500.0}
+    factura = Factura(datos)
+    assert factura == datos and datos == factura
+    assert factura['valor'] == 1500.0 and factura.get('id') is None
+    assert 'id' not in factura and 'fecha' in factura
+    assert list(factura) == ['fecha', 'tipo', 'descripcion', 'valor']
+    try:
+        factura['id']
+        assert False, "Se esperaba KeyError"
+    except KeyError:
+        pass
+
+    # Las claves que no son campos se guardan aparte
+    factura['id'] = 7
+    factura['timestamp'] = '2025-02-01T10:00:00'
+    assert dict(factura) == dict(datos, id=7, timestamp='2025-02-01T10:00:00')
+    assert len(factura) == 6 and factura.get('color', 'gris') == 'gris'
+    del factura['timestamp']
+    assert factura.pop('id') == 7 and len(factura) == 4
+
+    copia = factura.copy()
+    copia['valor'] = 1.0
+    assert factura['valor'] == 1500.0
+    assert Factura.desde(factura) is factura
+    assert crear_facturas([datos, [('tipo', 'Otro')]])[1] == {'tipo': 'Otro'}
+
+    # Los textos repetidos se comparten entre facturas
+    otra = Factura(fecha=''.join(['01/02/', '2025']), tipo='Mercado')
+    assert otra['fecha'] is factura['fecha']
+
+
+def test_facturas_de_la_base_de_datos():
+    """Verifica que la base de datos entregue registros compactos y editables."""
+    db = Database(":memory:")
+    cantidad = 20000
+
+    def datos():
+        return generar_facturas(cantidad, tipos=tipos_numerados(5), descripcion=lambda i: f"Compra {i % 300}")
+
+    db.agregar_facturas_lote(datos())
+
+    # Referencia: los diccionarios que se cargaban antes, con sus textos propios
+    tracemalloc.start()
+    diccionarios = [dict(factura, id=i + 1, color=f"#{i % 5:06d}") for i, factura in enumerate(datos())]
+    memoria_diccionarios = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del diccionarios
+
+    tracemalloc.start()
+    facturas = db.obtener_facturas()
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    logger.info(f"Memoria por factura: {memoria / cantidad:.0f} B (diccionarios: "
+                f"{memoria_diccionarios / cantidad:.0f} B)")
+
+    assert len(facturas) == cantidad
+    assert all(isinstance(f, Factura) for f in facturas)
+    assert set(facturas[0]) == {'id', 'fecha', 'tipo', 'descripcion', 'valor', 'color'}
+    assert memoria * 2 < memoria_diccionarios
+
+    # Las ediciones se guardan igual que con un diccionario
+    factura = facturas[0]
+    factura['valor'] = 5.0
+    cambios = UnitOfWork(db)
+    cambios.registrar_modificada(factura)
+    cambios.confirmar()
+    assert next(f for f in db.obtener_facturas() if f['id'] == factura['id'])['valor'] == 5.0
+
+
+if __name__ == "__main__":
+    test_factura_como_diccionario()
+    test_facturas_de_la_base_de_datos()
+    logger.info("¡Pruebas del almacén de facturas completadas!")
@@ -0,0 +1,127 @@
+import sys
+import time
+import random
+import logging
+from datetime import date
+from analitica import ColumnasFacturas, np
+from indices import IndiceCalendario
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def crear_facturas(cantidad, semilla=7):
+    """Crea facturas de varios años con tipos y valores aleatorios."""
+    aleatorio = random.Random(semilla)
+    return [
+        {'id': i, 'fecha': f"{aleatorio.randint(1, 28):02d}/{aleatorio.randint(1, 12):02d}/"
+                           f"{aleatorio.randint(2020, 2025)}",
+         'tipo': f"Tipo {aleatorio.randint(0, 6)}", 'descripcion': f"Factura {i}",
+         'valor': aleatorio.randint(100, 500000) / 100}
+        for i in range(cantidad)
+    ]
+
+
+def implementaciones(facturas):
+    """Columnas en Python puro y, si NumPy está instalado, también con NumPy."""
+    columnas = [ColumnasFacturas(facturas, usar_numpy=False)]
+    if np is None:
+        logger.warning("NumPy no está instalado, solo se prueba la implementación en Python")
+    else:
+        columnas.append(ColumnasFacturas(facturas, usar_numpy=True))
+    return columnas
+
+
+def test_filtros():
+    """Verifica los filtros contra un recorrido directo de las facturas."""
+    facturas = crear_facturas(3000)
+    facturas.append({'id': -1, 'fecha': 'sin fecha', 'tipo': 'Tipo 0', 'valor': 1.0})
+
+    def fecha(f):
+        dia, mes, anio = (int(p) for p in f['fecha'].split('/'))
+        return date(anio, mes, dia)
+
+    validas = facturas[:-1]
+    casos = [
+        ({'desde': date(2022, 3, 10), 'hasta': date(2023, 1, 5)},
+         lambda f: date(2022, 3, 10) <= fecha(f) <= date(2023, 1, 5)),
+        ({'desde': date(2021, 1, 1), 'hasta': date(2021, 12, 31), 'tipo': 'Tipo 3'},
+         lambda f: fecha(f).year == 2021 and f['tipo'] == 'Tipo 3'),
+        ({'anio': 2024, 'mes': 2}, lambda f: fecha(f).year == 2024 and fecha(f).month == 2),
+        ({'mes': 7, 'tipo': 'Tipo 1'}, lambda f: fecha(f).month == 7 and f['tipo'] == 'Tipo 1'),
+        ({'anio': 2020, 'dia': 15}, lambda f: fecha(f).year == 2020 and fecha(f).day == 15),
+        ({'dia': 3}, lambda f: fecha(f).day == 3),
+        ({'anio': 2023, 'mes': 2, 'dia': 30}, lambda f: False),
+        ({'tipo': 'No existe'}, lambda f: False),
+    ]
+    for columnas in implementaciones(facturas):
+        assert len(columnas) == len(validas)
+        assert columnas.rango_anios() == (2020, 2025)
+        for filtros, cumple in casos:
+            esperadas = [f for f in validas if cumple(f)]
+            encontradas = columnas.filtrar(**filtros)
+            assert sorted(f['id'] for f in encontradas) == sorted(f['id'] for f in esperadas), filtros
+            assert [fecha(f) for f in encontradas] == sorted((fecha(f) for f in esperadas), reverse=True)
+            cantidad, suma = columnas.totales(**filtros)
+            assert cantidad == len(esperadas)
+            assert abs(suma - sum(f['valor'] for f in esperadas)) < 1e-6
+
+
+def test_totales_como_el_calendario():
+    """Verifica que los totales coincidan con los agregados de IndiceCalendario."""
+    facturas = crear_facturas(5000)
+    indice = IndiceCalendario()
+    indice.reconstruir(facturas)
+
+    for columnas in implementaciones(facturas):
+        assert columnas.totales_por_tipo(anio=2023) == indice.totales_por_tipo(2023)
+        assert columnas.totales_por_tipo(anio=2022, mes=6) == indice.totales_por_tipo(2022, 6)
+        assert columnas.totales_por_tipo(anio=2019) == {}
+        assert ColumnasFacturas([], usar_numpy=columnas.usa_numpy).rango_anios() is None
+
+        mensuales = columnas.totales_mensuales(2019, 2025)
+        assert mensuales[2019] == [0.0] * 12
+        for anio in range(2020, 2026):
+            assert mensuales[anio] == indice.totales_mensuales(anio)
+
+        por_tipo = columnas.totales_mensuales(2020, 2025, tipo='Tipo 2')
+        for anio in range(2020, 2026):
+            for mes in range(1, 13):
+                _, suma = indice.totales(anio, mes, tipo='Tipo 2')
+                assert por_tipo[anio][mes - 1] == suma
+
+
+def test_rendimiento_informe_varios_anios():
+    """Mide un informe de varios años sobre muchas facturas con NumPy."""
+    if np is None:
+        logger.warning("NumPy no está instalado, se omite la medición")
+        return
+    facturas = crear_facturas(200000)
+    columnas = ColumnasFacturas(facturas)
+
+    inicio = time.perf_counter()
+    mensuales = columnas.totales_mensuales(2020, 2025)
+    por_tipo = columnas.totales_por_tipo(desde=date(2020, 1, 1), hasta=date(2025, 12, 31))
+    filtradas = columnas.totales(mes=12, tipo='Tipo 4')
+    duracion = time.perf_counter() - inicio
+    logger.info(f"Informe de 6 años sobre {len(columnas)} facturas: {duracion * 1000:.1f} ms")
+
+    total = sum(f['valor'] for f in facturas)
+    assert abs(sum(sum(meses) for meses in mensuales.values()) - total) < 1e-3
+    assert sum(cantidad for cantidad, _ in por_tipo.values()) == len(facturas)
+    assert filtradas[0] == sum(1 for f in facturas if f['fecha'][3:5] == '12' and f['tipo'] == 'Tipo 4')
+    assert duracion < 1.0
+
+
+if __name__ == "__main__":
+    test_filtros()
+    test_totales_como_el_calendario()
+    test_rendimiento_informe_varios_anios()
+    logger.info("¡Pruebas de la analítica de facturas completadas!")
@@ -0,0 +1,74 @@
+import os
+import sys
+import logging
+import tempfile
+import threading
+from database import Database, PERFILES_PRAGMA
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def test_reutilizacion_conexiones():
+    """Verifica que una base de datos de archivo reutilice su conexión."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = Database(os.path.join(tmp_dir, 'facturas.db'))
+
+        for i in range(10):
+            db.agregar_factura(f"0{i % 9 + 1}/08/2025", "Mercado", f"Compra {i}", 1000.0 * (i + 1))
+        facturas = db.obtener_facturas()
+        assert len(facturas) == 10
+
+        stats = db.estadisticas_conexiones()
+        logger.info(f"Estadísticas de conexiones: {stats}")
+        assert stats['abiertas'] == 1
+        assert stats['reutilizadas'] >= 10
+
+        # Cada hilo obtiene su propia conexión
+        resultado = {}
+        hilo = threading.Thread(target=lambda: resultado.update(n=len(db.obtener_facturas())))
+        hilo.start()
+        hilo.join()
+        assert resultado['n'] == 10
+        assert db.estadisticas_conexiones()['abiertas'] == 2
+
+        db.cerrar()
+        stats = db.estadisticas_conexiones()
+        assert stats['cerradas'] == 2
+        assert stats['activas'] == 0
+
+
+def test_perfiles_pragma():
+    """Verifica que el perfil de PRAGMA se aplique al abrir la conexión."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = Database(os.path.join(tmp_dir, 'facturas.db'))
+        assert db.perfil_pragma == 'balanced'
+
+        with db._get_connection() as conn:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+
+        efectivos = db.cambiar_perfil_pragma('bulk-load')
+        logger.info(f"Perfil bulk-load: {efectivos}")
+        assert efectivos['synchronous'] == 0  # OFF
+        assert efectivos['cache_size'] == PERFILES_PRAGMA['bulk-load']['cache_size']
+
+        try:
+            db.cambiar_perfil_pragma('inexistente')
+            assert False, "Se esperaba ValueError"
+        except ValueError:
+            pass
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    test_reutilizacion_conexiones()
+    test_perfiles_pragma()
+    logger.info("¡Pruebas de conexiones completadas!")
@@ -0,0 +1,87 @@
+import sys
+import logging
+from datetime import date
+from database import Database
+from facturas_prueba import generar_facturas
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def crear_db_con_facturas(cantidad):
+    """Crea una base en memoria con facturas repartidas en 2024 y 2025."""
+    db = Database(":memory:")
+    db.agregar_facturas_lote(generar_facturas(
+        cantidad, anios=(2024, 2025),
+        descripcion=lambda i: f"Factura {i}" + (" 100% especial" if i % 50 == 0 else "")
+    ))
+    return db
+
+
+def test_paginacion_por_claves():
+    """Verifica que las páginas cubran todas las facturas sin repetir ni saltar."""
+    db = crear_db_con_facturas(1000)
+
+    vistos = []
+    cursor = None
+    paginas = 0
+    while True:
+        pagina = db.consultar_facturas(limite=64, despues_de=cursor)
+        vistos.extend(pagina['facturas'])
+        paginas += 1
+        cursor = pagina['siguiente']
+        if cursor is None:
+            break
+
+    assert paginas == 16
+    assert len(vistos) == 1000
+    assert len({f['id'] for f in vistos}) == 1000
+
+    # Orden descendente por (fecha, id) y fecha en formato DD/MM/YYYY
+    claves = [(f['fecha'][6:] + f['fecha'][3:5] + f['fecha'][:2], f['id']) for f in vistos]
+    assert claves == sorted(claves, reverse=True)
+    assert [f['id'] for f in db.iterar_facturas(tamano_pagina=100)] == [f['id'] for f in vistos]
+
+
+def test_filtros_consulta():
+    """Verifica cada filtro contra el resultado completo filtrado en Python."""
+    db = crear_db_con_facturas(600)
+    todas = list(db.iterar_facturas())
+    tipos = {t['nombre']: t['id'] for t in db.obtener_tipos_gasto()}
+
+    def partes(f):
+        dia, mes, anio = f['fecha'].split('/')
+        return int(anio), int(mes), int(dia)
+
+    casos = [
+        (dict(anio=2024), lambda f: partes(f)[0] == 2024),
+        (dict(anio=2025, mes=3), lambda f: partes(f)[:2] == (2025, 3)),
+        (dict(anio=2024, mes=5, dia=5), lambda f: partes(f) == (2024, 5, 5)),
+        (dict(mes=2), lambda f: partes(f)[1] == 2),
+        (dict(dia=15), lambda f: partes(f)[2] == 15),
+        (dict(fecha_desde=date(2024, 3, 1), fecha_hasta='30/06/2024'),
+         lambda f: (2024, 3, 1) <= partes(f) <= (2024, 6, 30)),
+        (dict(tipo_ids=[tipos['Mercado']]), lambda f: f['tipo'] == 'Mercado'),
+        (dict(valor_min=1100, valor_max=1200), lambda f: 1100 <= f['valor'] <= 1200),
+        (dict(texto='100%'), lambda f: '100%' in f['descripcion']),
+    ]
+    for filtros, condicion in casos:
+        esperado = [f['id'] for f in todas if condicion(f)]
+        obtenido = [f['id'] for f in db.iterar_facturas(tamano_pagina=37, **filtros)]
+        assert obtenido == esperado, filtros
+        resumen = db.contar_facturas(**filtros)
+        assert resumen['cantidad'] == len(esperado)
+        assert resumen['total'] == sum(f['valor'] for f in todas if condicion(f))
+
+
+if __name__ == "__main__":
+    test_paginacion_por_claves()
+    test_filtros_consulta()
+    logger.info("¡Pruebas de consultas completadas!")
@@ -0,0 +1,93 @@
+import os
+import sys
+import sqlite3
+import logging
+import tempfile
+import threading
+from database import Database, UnitOfWork
+from facturas_prueba import generar_facturas
+
+try:
+    from PyQt6.QtCore import QCoreApplication
+    from ejecutor_db import EjecutorDB
+except ImportError:  # PyQt6 solo es necesario para el ejecutor en segundo plano
+    QCoreApplication = EjecutorDB = None
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def guardar(ejecutor, cambios, confirmar_lote=None):
+    """Envía los cambios pendientes en segundo plano, como guardar_datos() de la ventana."""
+    lote = cambios.tomar_pendientes()
+    ejecutor.escribir(
+        confirmar_lote or cambios.confirmar_lote, lote,
+        al_terminar=lambda resultado: cambios.finalizar_lote(lote, resultado),
+        al_fallar=lambda error: cambios.finalizar_lote(lote, None)
+    )
+
+
+def cerrar(ejecutor, cambios):
+    """Termina las operaciones y guarda lo pendiente, como closeEvent() de la ventana."""
+    assert ejecutor.esperar()
+    assert ejecutor.escrituras_pendientes == 0 and not ejecutor.ocupado
+    if cambios.hay_cambios:
+        cambios.confirmar()
+
+
+def test_cerrar_durante_un_guardado():
+    """Verifica que cerrar mientras se guarda no pierda las ediciones ni un guardado fallido."""
+    if EjecutorDB is None:
+        logger.warning("PyQt6 no está instalado; se omite la prueba del ejecutor")
+        return
+    # Las señales en cola del ejecutor necesitan una aplicación de Qt durante toda la prueba
+    app = QCoreApplication.instance() or QCoreApplication([])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = Database(os.path.join(tmp_dir, 'facturas.db'))
+        cambios = UnitOfWork(db)
+        ejecutor = EjecutorDB(db)
+        facturas = generar_facturas(3)
+        cambios.registrar_nuevas(facturas)
+
+        # La inserción sigue en curso mientras una factura nueva se edita y otra se elimina
+        liberar = threading.Event()
+
+        def confirmar_lento(lote):
+            assert liberar.wait(5)
+            return cambios.confirmar_lote(lote)
+
+        guardar(ejecutor, cambios, confirmar_lento)
+        facturas[0]['descripcion'] = "Editada"
+        cambios.registrar_modificada(facturas[0])
+        cambios.registrar_eliminada(facturas[1])
+        assert not cambios.hay_cambios  # Esperan a que las facturas reciban su 'id'
+        liberar.set()
+        cerrar(ejecutor, cambios)
+        assert all('id' in factura for factura in facturas)
+        assert sorted(f['descripcion'] for f in db.obtener_facturas()) == ["Editada", "Factura 2"]
+
+        # Un último guardado que falla vuelve a pendientes y se guarda al cerrar
+        nueva = generar_facturas(1, descripcion=lambda i: "Tras un error")[0]
+        cambios.registrar_nueva(nueva)
+
+        def fallar(lote):
+            raise sqlite3.OperationalError("database is locked")
+
+        guardar(ejecutor, cambios, fallar)
+        cerrar(ejecutor, cambios)
+        assert 'id' in nueva
+        assert "Tras un error" in {f['descripcion'] for f in db.obtener_facturas()}
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    test_cerrar_durante_un_guardado()
+    logger.info("¡Pruebas del ejecutor completadas!")
@@ -0,0 +1,212 @@
+import os
+import sys
+import logging
+import tempfile
+import warnings
+from indices import IndiceCalendario
+from facturas_prueba import generar_facturas, tipos_numerados
+from exportacion import (exportar_excel, exportar_filtro_excel, exportar_comparativo_anios,
+                         instantanea_facturas, AgrupacionFacturas, AnchosColumnas, AvanceExportacion,
+                         ExportacionCancelada, ANCHO_MAXIMO, MESES)
+
+try:
+    import openpyxl
+except ImportError:  # openpyxl solo es necesario para la prueba del libro
+    openpyxl = None
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def crear_facturas(cantidad):
+    """Facturas de prueba repartidas en dos años, doce meses y cinco tipos."""
+    return generar_facturas(cantidad, anios=(2024, 2025), tipos=tipos_numerados(5),
+                            descripcion=lambda i: "Factura " + "x" * (i % 30), valor=lambda i: 0.1 + i)
+
+
+def test_agrupacion_facturas():
+    """Verifica los grupos, los totales en centavos y los anchos de una sola pasada."""
+    facturas = crear_facturas(1200) + [{'fecha': 'sin fecha', 'tipo': 'Tipo 0', 'descripcion': 'A', 'valor': 1}]
+    grupos = AgrupacionFacturas(iter(facturas))
+
+    assert len(grupos.facturas) == 1201
+    assert len(grupos.meses) == 12
+    assert sum(len(g.facturas) for g in grupos.meses.values()) == 1200
+    assert grupos.centavos_total == sum(round(f['valor'] * 100) for f in facturas)
+    assert [anio for anio, _, _ in grupos.totales_mensuales()] == [2024] * 6 + [2025] * 6
+    totales = [total for _, total in grupos.totales_por_tipo()]
+    assert totales == sorted(totales, reverse=True)
+
+    # El ancho de la descripción sigue la más larga y respeta el máximo
+    assert grupos.anchos_detalle.maximos[2] == len("Factura " + "x" * 29)
+    anchos = AnchosColumnas(["A", "B"])
+    anchos.medir(3, 200)
+    assert anchos.anchos([10, 0]) == [(10 + 4) * 1.1, ANCHO_MAXIMO]
+
+
+def test_exportar_excel():
+    """Verifica las hojas, tablas y anchos del libro exportado."""
+    if openpyxl is None:
+        logger.warning("openpyxl no está instalado; se omite la prueba de exportación")
+        return
+    facturas = crear_facturas(3000)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ruta = os.path.join(tmp_dir, 'facturas.xlsx')
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            resultado = exportar_excel(facturas, ruta)
+        assert resultado['facturas'] == 3000 and resultado['meses'] == 12
+        assert resultado['bytes'] == os.path.getsize(ruta)
+
+        wb = openpyxl.load_workbook(ruta)
+        assert wb.sheetnames[0] == "Todas las Facturas"
+        assert wb.sheetnames[-2:] == ["Resumen por Tipo", "Resumen Mensual"]
+        assert "2025-02 Febrero" in wb.sheetnames
+
+        ws = wb["Todas las Facturas"]
+        assert ws.max_row == 3001
+        assert ws['D2'].value == 0.1 and ws['D2'].number_format == '#,##0.00" COP"'
+        assert list(ws.tables) == ["TablaDetalle"]
+        assert ws.column_dimensions['C'].width == (len("Factura " + "x" * 29) + 4) * 1.1
+
+        ws = wb["2025-02 Febrero"]
+        assert ws['A1'].value == "Facturas de Febrero 2025"
+        assert {str(r) for r in ws.merged_cells.ranges} == {"A1:D1", "A2:D2"}
+        assert ws.tables["Tabla_2025_02"].ref == "A4:D254"
+
+        ws = wb["Resumen por Tipo"]
+        assert ws.cell(row=ws.max_row, column=1).value == "TOTAL"
+        assert abs(ws.cell(row=ws.max_row, column=2).value - sum(f['valor'] for f in facturas)) < 0.01
+
+        # Con los totales del índice de calendario las hojas de resumen usan esas cifras
+        totales = IndiceCalendario(facturas[:100]).instantanea_totales()
+        exportar_excel(facturas, ruta, totales=totales)
+        wb = openpyxl.load_workbook(ruta)
+        ws = wb["Resumen por Tipo"]
+        assert abs(ws.cell(row=ws.max_row, column=2).value - sum(f['valor'] for f in facturas[:100])) < 0.01
+        assert wb["Resumen Mensual"].max_row == len(totales.totales_mensuales()) + 1
+
+        # Un libro sin facturas no lleva tablas de solo encabezado
+        resultado = exportar_excel([], ruta)
+        assert resultado['facturas'] == 0 and resultado['meses'] == 0
+        wb = openpyxl.load_workbook(ruta)
+        assert wb.sheetnames == ["Todas las Facturas", "Resumen por Tipo", "Resumen Mensual"]
+        assert all(not ws.tables for ws in wb.worksheets)
+
+
+def test_exportar_progreso_y_cancelacion():
+    """Verifica el avance, la cancelación y que el destino solo se reemplace al terminar."""
+    if openpyxl is None:
+        logger.warning("openpyxl no está instalado; se omite la prueba de exportación")
+        return
+    facturas = instantanea_facturas(crear_facturas(5000) + [{'fecha': '01/01/2025', 'valor': 'abc'}])
+    assert facturas[-1] == {'fecha': '01/01/2025', 'tipo': '', 'descripcion': '', 'valor': 0.0}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ruta = os.path.join(tmp_dir, 'facturas.xlsx')
+        with open(ruta, 'wb') as f:
+            f.write(b'libro anterior')
+
+        # Cancelar a mitad de las filas deja el archivo anterior y ningún temporal
+        avance = AvanceExportacion()
+        try:
+            exportar_excel(facturas, ruta, cancelado=lambda: avance.filas >= 3000, avance=avance)
+            assert False, "Se esperaba ExportacionCancelada"
+        except ExportacionCancelada:
+            pass
+        assert avance.filas == 3000 and avance.bytes == 0
+        with open(ruta, 'rb') as f:
+            assert f.read() == b'libro anterior'
+        assert os.listdir(tmp_dir) == ['facturas.xlsx']
+
+        # Cancelar mientras se guarda el archivo tampoco lo modifica
+        avance = AvanceExportacion()
+        try:
+            exportar_excel(facturas, ruta, cancelado=lambda: avance.bytes > 0, avance=avance)
+            assert False, "Se esperaba ExportacionCancelada"
+        except ExportacionCancelada:
+            pass
+        assert os.listdir(tmp_dir) == ['facturas.xlsx']
+
+        # La factura sin tipo agrega el mes de enero de 2025
+        avances = []
+        avance = AvanceExportacion()
+        exportar_excel(facturas, ruta, progreso=lambda hechas, total: avances.append((hechas, total)),
+                       avance=avance)
+        assert avances[-1] == (10002, 10002)
+        assert [hechas for hechas, _ in avances] == sorted(hechas for hechas, _ in avances)
+        assert avance.hojas == avance.total_hojas == 16
+        assert avance.bytes == os.path.getsize(ruta)
+        assert "Hojas: 16 de 16" in avance.texto()
+        assert openpyxl.load_workbook(ruta, read_only=True).sheetnames[0] == "Todas las Facturas"
+
+
+def test_exportar_filtro_excel():
+    """Verifica la hoja de un filtro con título, filtros, tabla y total."""
+    if openpyxl is None:
+        logger.warning("openpyxl no está instalado; se omite la prueba de exportación")
+        return
+    facturas = instantanea_facturas(crear_facturas(100))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ruta = os.path.join(tmp_dir, 'filtro.xlsx')
+        resultado = exportar_filtro_excel(facturas, ruta, "Rango_de_Fechas",
+                                          ["Filtro: Desde 01/01/2025 hasta 31/12/2025", "Tipo de gasto: Tipo 1"],
+                                          "TablaFiltroRango")
+        assert resultado['facturas'] == 100
+
+        ws = openpyxl.load_workbook(ruta)["Rango_de_Fechas"]
+        assert ws['A1'].value == "Reporte de Facturas - Rango_de_Fechas"
+        assert ws['A3'].value == "Tipo de gasto: Tipo 1"
+        assert ws['A4'].value == "Fecha"
+        assert ws.tables["TablaFiltroRango"].ref == "A4:D104"
+        assert ws['C105'].value == "Total:"
+        assert abs(ws['D105'].value - sum(f['valor'] for f in facturas)) < 0.01
+
+
+def test_exportar_comparativo_anios():
+    """Verifica el comparativo de varios años contra los agregados del índice de calendario."""
+    if openpyxl is None:
+        logger.warning("openpyxl no está instalado; se omite la prueba de exportación")
+        return
+    facturas = crear_facturas(3000)
+    indice = IndiceCalendario(facturas)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ruta = os.path.join(tmp_dir, 'comparativo.xlsx')
+        resultado = exportar_comparativo_anios(instantanea_facturas(facturas), ruta, anio_fin=2026)
+        assert resultado['facturas'] == 3000 and resultado['anios'] == 3
+
+        wb = openpyxl.load_workbook(ruta)
+        assert wb.sheetnames == ["Comparativo Mensual", "Comparativo por Tipo"]
+
+        ws = wb["Comparativo Mensual"]
+        assert [c.value for c in ws[1]] == ["Mes", "2024", "2025", "2026"]
+        assert ws.tables["TablaComparativoMensual"].ref == "A1:D13"
+        for mes in range(1, 13):
+            fila = [c.value for c in ws[mes + 1]]
+            assert fila[0] == MESES[mes - 1]
+            assert fila[1:3] == [indice.totales_mensuales(2024)[mes - 1], indice.totales_mensuales(2025)[mes - 1]]
+            assert fila[3] == 0
+        assert ws['A14'].value == "TOTAL"
+        assert abs(ws['B14'].value + ws['C14'].value - sum(f['valor'] for f in facturas)) < 0.01
+
+        ws = wb["Comparativo por Tipo"]
+        assert ws.max_row == 5 + 2
+        for fila in ws.iter_rows(min_row=2, max_row=6, values_only=True):
+            tipo = fila[0]
+            assert fila[1] == indice.totales_por_tipo(2024)[tipo][1]
+            assert fila[2] == indice.totales_por_tipo(2025)[tipo][1]
+
+
+if __name__ == "__main__":
+    test_agrupacion_facturas()
+    test_exportar_excel()
+    test_exportar_progreso_y_cancelacion()
+    test_exportar_filtro_excel()
+    test_exportar_comparativo_anios()
+    logger.info("¡Pruebas de exportación completadas!")
@@ -0,0 +1,225 @@
+import io
+import os
+import sys
+import csv
+import json
+import logging
+import tempfile
+import tracemalloc
+from datetime import datetime, date
+from database import Database
+from facturas_prueba import generar_facturas, tipos_numerados
+from importacion import (importar_csv, importar_excel, importar_json, iterar_json, validar_fila,
+                         ImportacionCancelada, ESCALA_PROGRESO, _LectorJSON, _iterar_lector_json)
+
+try:
+    import openpyxl
+except ImportError:  # openpyxl solo es necesario para la prueba de Excel
+    openpyxl = None
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def escribir_csv(ruta, cantidad, invalidas_cada=0):
+    """Escribe un CSV de prueba; una de cada `invalidas_cada` filas tiene un valor inválido."""
+    with open(ruta, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['fecha', 'tipo', 'descripcion', 'valor'])
+        for i in range(cantidad):
+            valor = 'abc' if invalidas_cada and i % invalidas_cada == 0 else f"$1,{i % 1000:03d}"
+            writer.writerow([f"{i % 28 + 1}/{i % 12 + 1}/2025", "Mercado", f"Factura, {i}", valor])
+
+
+def test_importar_csv():
+    """Verifica la importación por bloques, el tope de errores y el progreso."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ruta = os.path.join(tmp_dir, 'facturas.csv')
+        escribir_csv(ruta, 20000, invalidas_cada=10)
+
+        db = Database(":memory:")
+        avances = []
+        resultado = importar_csv(db, ruta, progreso=lambda hechas, total: avances.append(hechas),
+                                 tamano_bloque=1000, max_errores=50)
+
+        assert resultado['importadas'] == 18000
+        errores = resultado['errores']
+        assert len(errores) == 2000
+        assert len(errores.mensajes) == 50
+        assert errores.mensajes[0].startswith("Fila 2:")
+        assert "1950 error(es) más" in errores.texto()
+        assert avances[-1] == ESCALA_PROGRESO
+        assert avances == sorted(avances)
+
+        facturas = db.obtener_facturas()
+        assert len(facturas) == 18000
+        assert facturas[0]['fecha'] == '28/12/2025'
+        assert {f['valor'] for f in facturas} <= {1000.0 + i for i in range(1000)}
+        assert any(f['descripcion'] == "Factura, 1" for f in facturas)
+
+        # Reemplazar elimina las facturas anteriores
+        escribir_csv(ruta, 10)
+        assert importar_csv(db, ruta, reemplazar=True)['importadas'] == 10
+        assert len(db.obtener_facturas()) == 10
+
+
+def test_importar_csv_memoria_acotada():
+    """Verifica que la memoria usada no crezca con el tamaño del archivo."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        picos = []
+        for cantidad in (20000, 80000):
+            ruta = os.path.join(tmp_dir, f'facturas_{cantidad}.csv')
+            escribir_csv(ruta, cantidad, invalidas_cada=3)
+            db = Database(os.path.join(tmp_dir, f'facturas_{cantidad}.db'))
+            tracemalloc.start()
+            importar_csv(db, ruta, tamano_bloque=2000)
+            picos.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            db.cerrar()
+        logger.info(f"Memoria máxima: {picos}")
+        assert picos[1] < picos[0] * 2
+
+
+def test_importar_csv_cancelado_y_formato():
+    """Verifica que cancelar no deje facturas y que falten columnas sea un error."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ruta = os.path.join(tmp_dir, 'facturas.csv')
+        escribir_csv(ruta, 5000)
+        db = Database(":memory:")
+        db.agregar_factura("01/01/2025", "Mercado", "Existente", 10.0)
+
+        try:
+            importar_csv(db, ruta, reemplazar=True, cancelado=lambda: True, tamano_bloque=500)
+            assert False, "Se esperaba ImportacionCancelada"
+        except ImportacionCancelada:
+            pass
+        assert [f['descripcion'] for f in db.obtener_facturas()] == ["Existente"]
+
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write("fecha,tipo,valor\n01/01/2025,Mercado,10\n")
+        try:
+            importar_csv(db, ruta)
+            assert False, "Se esperaba ValueError"
+        except ValueError as e:
+            assert 'descripcion' in str(e)
+
+
+def test_validar_valores_nativos():
+    """Verifica que las fechas y números de Excel se usen sin pasar por texto."""
+    factura, error = validar_fila({'fecha': datetime(2025, 3, 7, 0, 0), 'tipo': 'Mercado',
+                                   'descripcion': 123, 'valor': 1500})
+    assert error is None
+    assert factura == {'fecha': '07/03/2025', 'tipo': 'Mercado', 'descripcion': '123', 'valor': 1500.0}
+    assert validar_fila({'fecha': date(2025, 1, 2), 'tipo': 'A', 'descripcion': 'B', 'valor': 2.5})[0]['fecha'] == '02/01/2025'
+    assert validar_fila({'fecha': '07/03/2025', 'tipo': 'A', 'descripcion': 'B', 'valor': 0})[1]
+    assert validar_fila({'fecha': 45000, 'tipo': 'A', 'descripcion': 'B', 'valor': 1})[1]
+
+
+def test_importar_excel():
+    """Verifica la importación por flujo de una hoja de Excel."""
+    if openpyxl is None:
+        logger.warning("openpyxl no está instalado; se omite la prueba de Excel")
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ruta = os.path.join(tmp_dir, 'facturas.xlsx')
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Datos")
+        ws.append(['Fecha', 'Tipo', 'Descripcion', 'Valor'])
+        for i in range(3000):
+            ws.append([datetime(2025, i % 12 + 1, i % 28 + 1), "Mercado", f"Factura {i}", 0 if i % 100 == 0 else 1000 + i])
+        wb.save(ruta)
+
+        db = Database(":memory:")
+        resultado = importar_excel(db, ruta, hoja="Datos", tamano_bloque=500)
+        assert resultado['importadas'] == 2970
+        assert len(resultado['errores']) == 30
+        assert len(db.obtener_facturas()) == 2970
+
+
+def test_iterar_json():
+    """Verifica el lector incremental con arreglos, JSON Lines y elementos partidos entre lecturas."""
+    elementos = [{'fecha': '01/01/2025', 'descripcion': 'ñandú "x" ' * (i % 5), 'valor': i * 1.5}
+                 for i in range(300)] + [12345, [1, 2], "texto", None]
+    arreglo = json.dumps(elementos, ensure_ascii=False, indent=2).encode('utf-8')
+    lineas = "\n".join(json.dumps(e, ensure_ascii=False) for e in elementos).encode('utf-8')
+
+    for contenido in (arreglo, b'\xef\xbb\xbf' + arreglo, lineas, lineas + b'\n\n'):
+        lector = _LectorJSON(io.BytesIO(contenido), tamano_lectura=7)
+        assert list(_iterar_lector_json(lector)) == elementos
+        assert list(iterar_json(io.BytesIO(contenido))) == elementos
+
+    assert list(iterar_json(io.BytesIO(b' [ ] '))) == []
+    assert list(iterar_json(io.BytesIO(b''))) == []
+    for invalido in (b'[{"a": 1} {"b": 2}]', b'[{"a": 1},', b'{"a": 1'):
+        try:
+            list(iterar_json(io.BytesIO(invalido)))
+            assert False, invalido
+        except json.JSONDecodeError:
+            pass
+
+    # Un elemento mal formado falla de inmediato, sin leer el resto del archivo
+    contenido = b'[{"valor":1 oops}' + b', {"valor": 1}' * 100000 + b']'
+    lector = _LectorJSON(io.BytesIO(contenido), tamano_lectura=64)
+    try:
+        list(_iterar_lector_json(lector))
+        assert False, "Se esperaba JSONDecodeError"
+    except json.JSONDecodeError:
+        pass
+    assert lector.bytes_leidos <= 64 and len(lector.texto) <= 64
+
+
+def test_importar_json_y_migracion():
+    """Verifica la importación de JSON por bloques y la migración desde el archivo antiguo."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ruta = os.path.join(tmp_dir, 'facturas_qt.json')
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(
+                generar_facturas(12000, tipos=tipos_numerados(7), valor=lambda i: 100.0 + i)
+                + ["no es una factura", {'fecha': '01/01/2025', 'tipo': 'Mercado', 'valor': 5}],
+                f
+            )
+
+        db = Database(":memory:")
+        resultado = importar_json(db, ruta, tamano_bloque=1000)
+        assert resultado['importadas'] == 12000
+        assert resultado['errores'].mensajes == [
+            "Factura 12001: Faltan campos obligatorios",
+            "Factura 12002: Faltan campos obligatorios",
+        ]
+        assert db.contar_facturas()['total'] == sum(100.0 + i for i in range(12000))
+        assert {t['nombre'] for t in db.obtener_tipos_gasto()} >= {f"Tipo {i}" for i in range(7)}
+
+        # La migración conserva su comportamiento: todo elemento con tipo y valor se inserta
+        ruta_lineas = os.path.join(tmp_dir, 'facturas.jsonl')
+        with open(ruta_lineas, 'w', encoding='utf-8') as f:
+            for i in range(7000):
+                f.write(json.dumps({'fecha': '02/02/2025', 'tipo': 'Mercado', 'descripcion': f"L{i}", 'valor': 1}) + "\n")
+        db = Database(":memory:")
+        assert db.migrar_desde_json(ruta_lineas) == 7000
+        assert db.contar_facturas(anio=2025, mes=2)['cantidad'] == 7000
+
+        # Una factura sin fecha no detiene la migración: se guarda con la fecha de hoy
+        ruta_sin_fecha = os.path.join(tmp_dir, 'sin_fecha.json')
+        with open(ruta_sin_fecha, 'w', encoding='utf-8') as f:
+            json.dump([{'tipo': 'Mercado', 'descripcion': 'x', 'valor': 5}], f)
+        db = Database(":memory:")
+        assert db.migrar_desde_json(ruta_sin_fecha) == 1
+        assert db.obtener_facturas()[0]['fecha'] == datetime.now().strftime('%d/%m/%Y')
+
+
+if __name__ == "__main__":
+    test_importar_csv()
+    test_importar_csv_memoria_acotada()
+    test_importar_csv_cancelado_y_formato()
+    test_validar_valores_nativos()
+    test_importar_excel()
+    test_iterar_json()
+    test_importar_json_y_migracion()
+    logger.info("¡Pruebas de importación completadas!")
@@ -0,0 +1,203 @@
+import sys
+import logging
+import time
+from datetime import date
+from facturas_prueba import generar_facturas
+from indices import IndiceFechas, IndiceCalendario, IndiceFilas, IndiceIds, ordinal_fecha, partes_fecha
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def facturas_con_id(cantidad):
+    """Genera facturas de prueba repartidas en varios años y tipos."""
+    return generar_facturas(cantidad, anios=(2023, 2024, 2025), primer_id=1)
+
+
+def filtrar_lineal(facturas, desde, hasta, tipo=None):
+    """Filtro de referencia que recorre todas las facturas."""
+    return [
+        f for f in facturas
+        if desde.toordinal() <= ordinal_fecha(f['fecha']) <= hasta.toordinal()
+        and (tipo is None or f['tipo'] == tipo)
+    ]
+
+
+def test_indice_fechas_rango():
+    """Verifica que el rango del índice coincida con el filtro lineal."""
+    facturas = facturas_con_id(20000)
+    inicio = time.perf_counter()
+    indice = IndiceFechas(facturas)
+    logger.info(f"Índice de {len(indice)} facturas construido en {time.perf_counter() - inicio:.3f}s")
+
+    desde, hasta = date(2024, 3, 1), date(2024, 6, 15)
+    for tipo in (None, "Mercado", "Inexistente"):
+        esperado = filtrar_lineal(facturas, desde, hasta, tipo)
+        obtenido = indice.rango(desde, hasta, tipo)
+        assert sorted(f['id'] for f in obtenido) == sorted(f['id'] for f in esperado)
+
+    # Resultados de la más reciente a la más antigua
+    ordinales = [ordinal_fecha(f['fecha']) for f in indice.rango(desde, hasta)]
+    assert ordinales == sorted(ordinales, reverse=True)
+
+
+def test_indice_fechas_mantenimiento():
+    """Verifica que agregar, actualizar y eliminar mantengan el índice."""
+    facturas = facturas_con_id(100)
+    indice = IndiceFechas(facturas)
+    dia = date(2030, 1, 1)
+
+    nueva = {'fecha': '01/01/2030', 'tipo': 'Mercado', 'descripcion': 'Sin ID', 'valor': 5.0}
+    indice.agregar(nueva)
+    assert indice.rango(dia, dia) == [nueva]
+    assert indice.rango(dia, dia, 'Mercado') == [nueva]
+
+    nueva['tipo'] = 'Transporte'
+    nueva['fecha'] = '2030-01-02'
+    indice.actualizar(nueva)
+    assert indice.rango(dia, dia) == []
+    assert indice.rango(dia, date(2030, 1, 2), 'Transporte') == [nueva]
+    assert indice.rango(dia, date(2030, 1, 2), 'Mercado') == []
+
+    assert indice.eliminar(nueva)
+    assert not indice.eliminar(nueva)
+    assert len(indice) == 100
+
+    # Las fechas inválidas se ignoran
+    indice.agregar({'fecha': '31/02/2025', 'tipo': 'Mercado', 'valor': 1.0})
+    assert len(indice) == 100
+
+    # Varias bajas juntas dejan el mismo índice que eliminarlas una por una
+    eliminadas = facturas[::3] + [nueva]
+    assert indice.eliminar_varias(eliminadas) == len(facturas[::3])
+    restantes = [f for f in facturas if f not in eliminadas]
+    assert len(indice) == len(restantes)
+    desde, hasta = date(2023, 1, 1), date(2025, 12, 31)
+    for tipo in (None, "Mercado", "Transporte"):
+        esperado = filtrar_lineal(restantes, desde, hasta, tipo)
+        assert sorted(f['id'] for f in indice.rango(desde, hasta, tipo)) == sorted(f['id'] for f in esperado)
+    assert indice.eliminar_varias(restantes) == len(restantes)
+    assert len(indice) == 0 and indice.rango(desde, hasta, "Mercado") == []
+
+
+def test_indice_calendario():
+    """Verifica consultas y totales del índice año/mes/día contra un filtro lineal."""
+    facturas = facturas_con_id(5000)
+    indice = IndiceCalendario(facturas)
+    assert indice.anios() == [2025, 2024, 2023]
+
+    for anio, mes, dia, tipo in [(None, None, None, None), (2024, None, None, None),
+                                 (2024, 3, None, "Mercado"), (None, None, 15, None),
+                                 (2025, 7, 7, None), (2022, None, None, None)]:
+        esperado = [
+            f for f in facturas
+            if (anio is None or partes_fecha(f['fecha'])[0] == anio)
+            and (mes is None or partes_fecha(f['fecha'])[1] == mes)
+            and (dia is None or partes_fecha(f['fecha'])[2] == dia)
+            and (tipo is None or f['tipo'] == tipo)
+        ]
+        obtenido = indice.consultar(anio, mes, dia, tipo)
+        assert sorted(f['id'] for f in obtenido) == sorted(f['id'] for f in esperado)
+        cantidad, suma = indice.totales(anio, mes, dia, tipo)
+        assert cantidad == len(esperado)
+        assert abs(suma - sum(f['valor'] for f in esperado)) < 1e-6
+
+    # Editar el valor y la fecha de una factura mueve sus totales
+    factura = facturas[0]
+    antes = indice.totales(2023)
+    factura['valor'] += 500
+    factura['fecha'] = '01/01/2026'
+    indice.actualizar(factura)
+    assert indice.anios()[0] == 2026
+    assert indice.totales(2026) == (1, factura['valor'])
+    assert indice.totales(2023)[0] == antes[0] - 1
+
+    indice.eliminar(factura)
+    assert 2026 not in indice.anios()
+    assert len(indice) == 4999
+
+
+def test_agregados_calendario():
+    """Verifica los totales por tipo y por mes del cubo y que no acumulen error."""
+    facturas = facturas_con_id(3000)
+    for i, factura in enumerate(facturas):
+        factura['valor'] = 0.1 + i % 7 / 100
+    indice = IndiceCalendario(facturas)
+
+    esperado = {}
+    for f in facturas:
+        if partes_fecha(f['fecha'])[:2] == (2024, 5):
+            cantidad, suma = esperado.get(f['tipo'], (0, 0.0))
+            esperado[f['tipo']] = (cantidad + 1, suma + f['valor'])
+    obtenido = indice.totales_por_tipo(2024, 5)
+    assert obtenido.keys() == esperado.keys()
+    assert all(obtenido[t][0] == esperado[t][0] and abs(obtenido[t][1] - esperado[t][1]) < 1e-9 for t in esperado)
+    assert sum(c for c, _ in indice.totales_por_tipo().values()) == 3000
+
+    mensuales = indice.totales_mensuales(2025)
+    assert len(mensuales) == 12
+    assert abs(sum(mensuales) - indice.totales(2025)[1]) < 1e-9
+    assert indice.totales_mensuales(1999) == [0.0] * 12
+
+    # Editar el mismo valor muchas veces no deja residuos en los totales
+    factura = facturas[0]
+    antes = indice.totales(2023, 1, 1)
+    for _ in range(1000):
+        factura['valor'] += 0.1
+        indice.actualizar(factura)
+    factura['valor'] = 0.1
+    indice.actualizar(factura)
+    assert indice.totales(2023, 1, 1) == antes
+
+    # La copia de los totales no cambia con las ediciones posteriores
+    totales = indice.instantanea_totales()
+    assert abs(totales.centavos_total / 100 - indice.totales()[1]) < 1e-9
+    assert totales.totales_mensuales()[0][:2] == (2023, 1)
+    indice.eliminar(factura)
+    assert totales.centavos_total == sum(round(f['valor'] * 100) for f in facturas)
+
+
+def test_indice_filas_e_ids():
+    """Verifica las filas por factura y las facturas por ID al agregar, reordenar y guardar."""
+    facturas = facturas_con_id(1000)
+    filas = IndiceFilas(facturas)
+    assert filas.fila(facturas[500]) == 500
+    assert filas.fila(dict(facturas[500])) is None
+
+    nueva = {'fecha': '01/01/2030', 'tipo': 'Mercado', 'descripcion': 'Sin ID', 'valor': 5.0}
+    facturas.append(nueva)
+    assert filas.agregar(nueva) == 1000 and nueva in filas
+
+    facturas.sort(key=lambda f: f['valor'], reverse=True)
+    filas.reconstruir(facturas)
+    assert all(filas.fila(f) == i for i, f in enumerate(facturas))
+
+    ids = IndiceIds(facturas)
+    assert len(ids) == 1001
+    assert ids.obtener(42) is next(f for f in facturas if f['id'] == 42)
+
+    # Las facturas nuevas pasan al índice por ID cuando se guardan, salvo si se eliminaron
+    eliminada = {'fecha': '02/01/2030', 'tipo': 'Mercado', 'valor': 1.0}
+    ids.agregar(eliminada)
+    assert ids.eliminar(eliminada)
+    nueva['id'], eliminada['id'] = 2001, 2002
+    ids.ids_asignados([nueva, eliminada])
+    assert ids.obtener(2001) is nueva and ids.obtener(2002) is None
+    assert ids.eliminar(nueva) and not ids.eliminar(nueva)
+    assert len(ids) == 1000
+
+
+if __name__ == "__main__":
+    test_indice_fechas_rango()
+    test_indice_fechas_mantenimiento()
+    test_indice_calendario()
+    test_agregados_calendario()
+    test_indice_filas_e_ids()
+    logger.info("¡Pruebas de índices completadas!")
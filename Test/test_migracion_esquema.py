@@ -0,0 +1,169 @@
+import os
+import sys
+import sqlite3
+import logging
+import tempfile
+from database import Database, VERSION_ESQUEMA
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def crear_base_antigua(db_path):
+    """Crea una base con el esquema original: fecha TEXT y valor REAL."""
+    conn = sqlite3.connect(db_path)
+    conn.executescript('''
+        CREATE TABLE tipos_gasto (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT UNIQUE NOT NULL,
+            descripcion TEXT,
+            color TEXT
+        );
+        CREATE TABLE facturas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha DATE NOT NULL,
+            tipo_id INTEGER NOT NULL,
+            descripcion TEXT NOT NULL,
+            valor REAL NOT NULL,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (tipo_id) REFERENCES tipos_gasto (id)
+        );
+        CREATE INDEX idx_facturas_fecha ON facturas(fecha);
+        CREATE INDEX idx_facturas_tipo ON facturas(tipo_id);
+        INSERT INTO tipos_gasto (nombre) VALUES ('Mercado'), ('Transporte');
+        INSERT INTO facturas (fecha, tipo_id, descripcion, valor) VALUES
+            ('2025-01-15', 1, 'Compra', 12345.67),
+            ('2025-02-01', 2, 'Bus', 0.1),
+            ('03/02/2025', 1, 'Fecha en formato antiguo', 2500),
+            ('2024-12-31', 2, 'Eliminada', 1);
+        DELETE FROM facturas WHERE descripcion = 'Eliminada';
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def test_migracion_esquema():
+    """Verifica la migración a fecha YYYYMMDD y valor en centavos."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'facturas.db')
+        crear_base_antigua(db_path)
+
+        db = Database(db_path)
+        with db._get_connection() as conn:
+            assert conn.execute('PRAGMA user_version').fetchone()[0] == VERSION_ESQUEMA
+            filas = conn.execute(
+                'SELECT id, fecha, valor_centavos FROM facturas ORDER BY id'
+            ).fetchall()
+            assert [tuple(f) for f in filas] == [
+                (1, 20250115, 1234567),
+                (2, 20250201, 10),
+                (3, 20250203, 250000),
+            ]
+
+            # La vista de compatibilidad conserva la forma anterior
+            compat = conn.execute(
+                'SELECT fecha, valor FROM facturas_compat WHERE id = 1'
+            ).fetchone()
+            assert tuple(compat) == ('2025-01-15', 12345.67)
+
+        # Las lecturas devuelven el formato de siempre
+        facturas = db.obtener_facturas()
+        assert facturas[0]['fecha'] == '03/02/2025'
+        assert facturas[-1]['valor'] == 12345.67
+
+        # Los IDs eliminados no se reutilizan
+        nuevo_id = db.agregar_factura('10/03/2025', 'Mercado', 'Nueva', 0.3)
+        assert nuevo_id == 5
+        assert db.obtener_resumen_mensual(2025)[-1] == {'mes': '2025-03', 'total': 0.3}
+        db.cerrar()
+
+        # Abrir de nuevo no vuelve a migrar
+        db = Database(db_path)
+        assert len(db.obtener_facturas()) == 4
+        db.cerrar()
+
+
+def test_sumas_exactas():
+    """Verifica que las sumas en centavos no acumulen error de punto flotante."""
+    db = Database(":memory:")
+    db.agregar_facturas_lote([
+        {'fecha': '01/01/2025', 'tipo': 'Mercado', 'descripcion': f'F{i}', 'valor': 0.1}
+        for i in range(1000)
+    ])
+    assert db.contar_facturas(anio=2025)['total'] == 100.0
+    assert db.obtener_resumen_por_tipo('2025-01-01', '2025-01-31')[0]['total'] == 100.0
+
+
+def test_migracion_sin_resumen_diario():
+    """Verifica que la versión 2 elimine el resumen diario de una base de la versión 1."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'facturas.db')
+        Database(db_path).cerrar()
+        conn = sqlite3.connect(db_path)
+        conn.executescript('''
+            CREATE TABLE resumen_diario (
+                fecha INTEGER NOT NULL,
+                tipo_id INTEGER NOT NULL,
+                cantidad INTEGER NOT NULL,
+                total_centavos INTEGER NOT NULL,
+                PRIMARY KEY (fecha, tipo_id)
+            ) WITHOUT ROWID;
+            CREATE TRIGGER trg_resumen_diario_insert AFTER INSERT ON facturas
+            BEGIN
+                INSERT INTO resumen_diario VALUES (NEW.fecha, NEW.tipo_id, 1, NEW.valor_centavos);
+            END;
+            PRAGMA user_version = 1;
+        ''')
+        conn.close()
+
+        db = Database(db_path)
+        with db._get_connection() as conn:
+            assert conn.execute('PRAGMA user_version').fetchone()[0] == VERSION_ESQUEMA
+            assert conn.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE name LIKE '%resumen_diario%'"
+            ).fetchone()[0] == 0
+        db.agregar_factura('05/01/2025', 'Mercado', 'A', 1.0)
+        db.agregar_factura('05/01/2025', 'Mercado', 'B', 1.0)
+        assert len(db.obtener_facturas()) == 2
+        db.cerrar()
+
+
+def test_resumenes_por_tipo_y_mes():
+    """Verifica los resúmenes por tipo y mensual leídos de la tabla de facturas."""
+    db = Database(":memory:")
+    db.agregar_factura("05/01/2025", "Mercado", "A", 1000.0)
+    db.agregar_factura("05/01/2025", "Mercado", "B", 500.0)
+    db.agregar_factura("20/03/2025", "Transporte", "C", 250.0)
+    db.agregar_factura("20/03/2024", "Transporte", "D", 999.0)
+
+    por_tipo = {r['tipo']: r for r in db.obtener_resumen_por_tipo('2025-01-01', '2025-12-31')}
+    assert por_tipo['Mercado']['total'] == 1500.0
+    assert por_tipo['Mercado']['cantidad'] == 2
+    assert por_tipo['Transporte']['total'] == 250.0
+
+    mensual = db.obtener_resumen_mensual(2025)
+    assert mensual == [{'mes': '2025-01', 'total': 1500.0}, {'mes': '2025-03', 'total': 250.0}]
+
+    # El filtro por año recorre un rango del índice de fechas
+    with db._get_connection() as conn:
+        plan = ' '.join(fila[-1] for fila in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT SUM(valor_centavos) FROM facturas '
+            'WHERE fecha >= 20250000 AND fecha < 20260000'
+        ))
+    assert 'idx_facturas_fecha' in plan
+
+
+if __name__ == "__main__":
+    test_migracion_esquema()
+    test_sumas_exactas()
+    test_migracion_sin_resumen_diario()
+    test_resumenes_por_tipo_y_mes()
+    logger.info("¡Pruebas de migración completadas!")
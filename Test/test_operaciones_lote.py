@@ -0,0 +1,139 @@
+import sys
+import logging
+import time
+from database import Database, UnitOfWork
+from facturas_prueba import generar_facturas
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def facturas_lote(cantidad):
+    """Genera facturas de prueba; una de cada tres usa un tipo que aún no existe."""
+    return generar_facturas(cantidad, tipos=["Mercado", "Transporte", "Tipo Nuevo Lote"],
+                            descripcion=lambda i: f"Factura lote {i}")
+
+
+def test_agregar_facturas_lote():
+    """Verifica que el lote inserte todas las filas y devuelva los IDs en orden."""
+    db = Database(":memory:")
+    id_previo = db.agregar_factura("01/01/2025", "Mercado", "Previa", 500.0)
+
+    facturas = facturas_lote(5000)
+    inicio = time.perf_counter()
+    ids = db.agregar_facturas_lote(facturas)
+    logger.info(f"Lote de {len(ids)} facturas insertado en {time.perf_counter() - inicio:.3f}s")
+
+    assert len(ids) == len(facturas)
+    assert ids == list(range(id_previo + 1, id_previo + 1 + len(facturas)))
+
+    por_id = {f['id']: f for f in db.obtener_facturas()}
+    assert len(por_id) == len(facturas) + 1
+    for factura_id, factura in zip(ids[:50], facturas[:50]):
+        guardada = por_id[factura_id]
+        assert guardada['fecha'] == factura['fecha']
+        assert guardada['tipo'] == factura['tipo']
+        assert guardada['valor'] == factura['valor']
+
+    # El tipo nuevo se creó una sola vez
+    nombres = [t['nombre'] for t in db.obtener_tipos_gasto()]
+    assert nombres.count("Tipo Nuevo Lote") == 1
+
+    assert db.agregar_facturas_lote([]) == []
+
+
+def test_unit_of_work():
+    """Verifica que solo se confirmen los cambios registrados."""
+    db = Database(":memory:")
+    cambios = UnitOfWork(db)
+
+    facturas = facturas_lote(100)
+    cambios.registrar_nuevas(facturas)
+    estadisticas = cambios.confirmar()
+    assert estadisticas['insertadas'] == 100
+    assert all('id' in f for f in facturas)
+    assert not cambios.hay_cambios
+
+    # Una modificación, una baja y un alta
+    facturas[0]['descripcion'] = "Modificada"
+    cambios.registrar_modificada(facturas[0])
+    cambios.registrar_eliminada(facturas[1])
+    nueva = {'fecha': "15/03/2025", 'tipo': "Mercado", 'descripcion': "Nueva", 'valor': 42.0}
+    cambios.registrar_nueva(nueva)
+
+    # Una factura nueva eliminada antes de confirmar nunca llega a la base de datos
+    efimera = {'fecha': "16/03/2025", 'tipo': "Mercado", 'descripcion': "Efímera", 'valor': 1.0}
+    cambios.registrar_nueva(efimera)
+    cambios.registrar_eliminada(efimera)
+    assert cambios.pendientes() == {'nuevas': 1, 'modificadas': 1, 'eliminadas': 1}
+
+    estadisticas = cambios.confirmar()
+    logger.info(f"Confirmación: {estadisticas}")
+    assert estadisticas['insertadas'] == 1
+    assert estadisticas['actualizadas'] == 1
+    assert estadisticas['eliminadas'] == 1
+    assert estadisticas['duracion_ms'] >= 0
+
+    por_id = {f['id']: f for f in db.obtener_facturas()}
+    assert len(por_id) == 100
+    assert por_id[facturas[0]['id']]['descripcion'] == "Modificada"
+    assert facturas[1]['id'] not in por_id
+    assert por_id[nueva['id']]['descripcion'] == "Nueva"
+
+
+
+def test_lote_en_segundo_plano():
+    """Verifica el ciclo tomar/confirmar/finalizar con cambios durante el guardado."""
+    db = Database(":memory:")
+    cambios = UnitOfWork(db)
+    facturas = facturas_lote(12000)
+    cambios.registrar_nuevas(facturas)
+
+    lote = cambios.tomar_pendientes()
+    assert not cambios.hay_cambios
+
+    # Cambios que llegan mientras el lote se guarda en otro hilo
+    facturas[0]['descripcion'] = "Editada durante el guardado"
+    cambios.registrar_modificada(facturas[0])
+    cambios.registrar_eliminada(facturas[1])
+    facturas[2]['valor'] = 1.0  # No afecta a la copia ya tomada
+    assert not cambios.hay_cambios
+
+    avances = []
+    resultado = cambios.confirmar_lote(lote, progreso=lambda hechas, total: avances.append((hechas, total)))
+    assert avances[-1] == (12000, 12000)
+    assert len(avances) == 3
+    estadisticas = cambios.finalizar_lote(lote, resultado)
+    assert estadisticas['insertadas'] == 12000
+    assert all('id' in f for f in facturas)
+
+    # Los cambios diferidos quedan pendientes con sus IDs ya asignados
+    assert cambios.pendientes() == {'nuevas': 0, 'modificadas': 1, 'eliminadas': 1}
+    cambios.confirmar()
+    por_id = {f['id']: f for f in db.obtener_facturas()}
+    assert len(por_id) == 11999
+    assert por_id[facturas[0]['id']]['descripcion'] == "Editada durante el guardado"
+    assert facturas[1]['id'] not in por_id
+
+    # Si el lote falla, sus cambios vuelven a quedar pendientes
+    nueva = {'fecha': "01/01/2025", 'tipo': "Mercado", 'descripcion': "Reintento", 'valor': 5.0}
+    cambios.registrar_nueva(nueva)
+    lote = cambios.tomar_pendientes()
+    cambios.finalizar_lote(lote, None)
+    assert cambios.pendientes() == {'nuevas': 1, 'modificadas': 0, 'eliminadas': 0}
+    cambios.confirmar()
+    assert 'id' in nueva
+
+
+if __name__ == "__main__":
+    test_agregar_facturas_lote()
+    test_unit_of_work()
+    test_lote_en_segundo_plano()
+    logger.info("¡Pruebas de operaciones en lote completadas!")
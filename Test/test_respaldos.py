@@ -0,0 +1,241 @@
+import os
+import sys
+import gzip
+import zlib
+import shutil
+import sqlite3
+import logging
+import tempfile
+import threading
+from database import Database
+from facturas_prueba import generar_facturas, tipos_numerados
+from datetime import datetime, timedelta
+from respaldos import (respaldar, verificar_respaldo, compresiones_disponibles, RepositorioRespaldos,
+                       PoliticaRetencion, respaldar_incremental, RespaldoCancelado, RespaldoInvalido)
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def crear_base(ruta, cantidad):
+    """Crea una base con facturas de prueba."""
+    db = Database(ruta)
+    db.agregar_facturas_lote(generar_facturas(cantidad, tipos=tipos_numerados(4),
+                                              descripcion=lambda i: f"Factura {i} " + "x" * 200))
+    return db
+
+
+def contar(ruta):
+    """Cuenta las facturas de una copia."""
+    conn = sqlite3.connect(ruta)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM facturas').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_respaldo_por_pasos():
+    """Verifica la copia por pasos, el progreso y la compresión gzip."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = crear_base(os.path.join(tmp_dir, 'facturas.db'), 3000)
+
+        ruta = os.path.join(tmp_dir, 'respaldo.db')
+        avances = []
+        resultado = respaldar(db, ruta, progreso=lambda hechas, total: avances.append((hechas, total)),
+                                   paginas_por_paso=16)
+        assert resultado['verificado'] and resultado['paginas'] > 16
+        assert len(avances) > 1 and avances[-1] == (resultado['paginas'], resultado['paginas'])
+        assert contar(ruta) == 3000
+        assert verificar_respaldo(ruta) == []
+        assert not os.path.exists(ruta + '-wal')
+
+        ruta_gz = os.path.join(tmp_dir, 'respaldo.db.gz')
+        avances = []
+        resultado = respaldar(db, ruta_gz, compresion='gzip',
+                                   progreso=lambda hechas, total: avances.append((hechas, total)))
+        paginas = resultado['paginas']
+        assert avances[-1] == (2 * paginas, 2 * paginas)
+        assert resultado['bytes'] < os.path.getsize(ruta)
+        descomprimido = os.path.join(tmp_dir, 'descomprimido.db')
+        with gzip.open(ruta_gz, 'rb') as origen, open(descomprimido, 'wb') as destino:
+            shutil.copyfileobj(origen, destino)
+        assert contar(descomprimido) == 3000
+
+        if 'zstd' in compresiones_disponibles():
+            assert respaldar(db, os.path.join(tmp_dir, 'respaldo.db.zst'), compresion='zstd')['bytes'] > 0
+        else:
+            logger.warning("zstd no está disponible; se omite la prueba de zstd")
+        db.cerrar()
+
+
+def test_respaldo_con_ediciones():
+    """Verifica que las ediciones sigan durante el respaldo y que la copia sea coherente."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = crear_base(os.path.join(tmp_dir, 'facturas.db'), 3000)
+        ruta = os.path.join(tmp_dir, 'respaldo.db')
+        agregadas = []
+
+        def editar(hechas, total):
+            # Otro hilo escribe entre pasos; la escritura no espera al respaldo
+            if len(agregadas) < 3:
+                hilo = threading.Thread(target=lambda: agregadas.append(
+                    db.agregar_factura('01/01/2026', 'Mercado', 'Durante el respaldo', 1.0)))
+                hilo.start()
+                hilo.join(timeout=5)
+                assert not hilo.is_alive()
+
+        respaldar(db, ruta, progreso=editar, paginas_por_paso=8)
+        assert len(agregadas) == 3
+        assert contar(ruta) in (3000, 3001, 3002, 3003)
+        assert verificar_respaldo(ruta) == []
+        db.cerrar()
+
+
+def test_respaldo_cancelado_e_invalido():
+    """Verifica que cancelar no modifique el destino y que se detecte una copia dañada."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = crear_base(os.path.join(tmp_dir, 'facturas.db'), 2000)
+        ruta = os.path.join(tmp_dir, 'respaldo.db.gz')
+        with open(ruta, 'wb') as f:
+            f.write(b'respaldo anterior')
+        archivos = sorted(os.listdir(tmp_dir))
+
+        for fase in ('copia', 'compresion'):
+            pedido = []
+
+            def progreso(hechas, total):
+                # Durante la compresión el avance pasa de la mitad del total
+                if fase == 'copia' or hechas > total // 2:
+                    pedido.append(True)
+
+            try:
+                respaldar(db, ruta, compresion='gzip', progreso=progreso, paginas_por_paso=16,
+                               cancelado=lambda: bool(pedido))
+                assert False, "Se esperaba RespaldoCancelado"
+            except RespaldoCancelado:
+                pass
+            with open(ruta, 'rb') as f:
+                assert f.read() == b'respaldo anterior'
+            assert sorted(os.listdir(tmp_dir)) == archivos
+
+        # Una copia dañada no pasa la verificación
+        dañada = os.path.join(tmp_dir, 'dañada.db')
+        respaldar(db, dañada)
+        with open(dañada, 'r+b') as f:
+            f.seek(4096 * 3)
+            f.write(b'\xff' * 4096 * 4)
+        assert verificar_respaldo(dañada) != []
+        try:
+            respaldar(db, ruta, compresion='desconocida')
+            assert False, "Se esperaba ValueError"
+        except ValueError:
+            pass
+        db.cerrar()
+
+
+def leer_facturas(ruta):
+    """Lee las facturas de una copia."""
+    conn = sqlite3.connect(ruta)
+    try:
+        return conn.execute('SELECT id, fecha, descripcion, valor_centavos FROM facturas ORDER BY id').fetchall()
+    finally:
+        conn.close()
+
+
+def test_repositorio_incremental():
+    """Verifica que una instantánea nueva solo guarde lo que cambió y que se pueda restaurar."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = crear_base(os.path.join(tmp_dir, 'facturas.db'), 20000)
+        repositorio = RepositorioRespaldos(os.path.join(tmp_dir, 'repositorio'))
+
+        primera = repositorio.crear_instantanea(db)
+        assert primera['fragmentos_nuevos'] > 0
+        facturas_primera = leer_facturas(os.path.join(tmp_dir, 'facturas.db'))
+
+        # Una edición pequeña solo agrega unos pocos fragmentos
+        db.actualizar_factura(1, '02/02/2025', 'Tipo 1', 'Editada', 5.0)
+        db.agregar_factura('03/03/2025', 'Tipo 2', 'Nueva', 7.0)
+        segunda = repositorio.crear_instantanea(db)
+        assert segunda['fragmentos'] >= primera['fragmentos']
+        assert segunda['fragmentos_nuevos'] <= 10
+        assert segunda['bytes_nuevos'] * 20 < segunda['bytes']
+        logger.info(f"Primera: {primera['bytes_nuevos']} bytes; segunda: {segunda['bytes_nuevos']} bytes")
+
+        sin_cambios = repositorio.crear_instantanea(db)
+        assert sin_cambios['fragmentos_nuevos'] == 0
+
+        assert [i['id'] for i in repositorio.instantaneas()] == [primera['id'], segunda['id'], sin_cambios['id']]
+
+        # Restaurar cualquier instantánea reconstruye su contenido
+        restaurada = os.path.join(tmp_dir, 'restaurada.db')
+        repositorio.restaurar(primera['id'], restaurada)
+        assert leer_facturas(restaurada) == facturas_primera
+        repositorio.restaurar(segunda['id'], restaurada)
+        assert leer_facturas(restaurada) == leer_facturas(os.path.join(tmp_dir, 'facturas.db'))
+
+        # Un fragmento dañado se detecta al restaurar y no reemplaza el destino
+        clave = repositorio._leer_manifiesto(primera['id'])['fragmentos'][0]
+        with open(repositorio._ruta_objeto(clave), 'wb') as f:
+            f.write(zlib.compress(b'x'))
+        repositorio._leer_objeto.cache_clear()
+        try:
+            repositorio.restaurar(primera['id'], restaurada)
+            assert False, "Se esperaba RespaldoInvalido"
+        except RespaldoInvalido:
+            pass
+        assert leer_facturas(restaurada) == leer_facturas(os.path.join(tmp_dir, 'facturas.db'))
+        db.cerrar()
+
+
+def test_retencion():
+    """Verifica la política de retención y el borrado de fragmentos sin referencias."""
+    inicio = datetime(2025, 1, 1, 0, 0)
+    instantaneas = [{'id': str(h), 'fecha': (inicio + timedelta(hours=h)).isoformat()} for h in range(24 * 60)]
+    conservadas = PoliticaRetencion(ultimas=3, diarias=2, semanales=2, mensuales=2).conservadas(instantaneas)
+    # La última es el 1 de marzo a las 23:00 (sábado). Se conservan las tres
+    # últimas, la última del 28 de febrero (día y mes anteriores) y la del
+    # domingo 23 de febrero (semana anterior)
+    assert conservadas == {'1439', '1438', '1437', '1415', '1295'}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = crear_base(os.path.join(tmp_dir, 'facturas.db'), 2000)
+        ruta = os.path.join(tmp_dir, 'repositorio')
+        repositorio = RepositorioRespaldos(ruta)
+        ids = []
+        for dia in range(5):
+            db.agregar_factura('01/01/2025', 'Mercado', f"Día {dia} " + "y" * 3000, 1.0)
+            ids.append(repositorio.crear_instantanea(db, fecha=datetime(2025, 1, 1 + dia, 12))['id'])
+
+        resultado = repositorio.aplicar_retencion(PoliticaRetencion(ultimas=2, diarias=0, semanales=0, mensuales=0))
+        assert resultado['instantaneas'] == 3 and resultado['fragmentos'] > 0
+        assert [i['id'] for i in repositorio.instantaneas()] == ids[-2:]
+        repositorio.restaurar(ids[-2], os.path.join(tmp_dir, 'restaurada.db'))
+
+        # Una instantánea cancelada no se registra
+        try:
+            repositorio.crear_instantanea(db, cancelado=lambda: True)
+            assert False, "Se esperaba RespaldoCancelado"
+        except RespaldoCancelado:
+            pass
+        assert len(repositorio.instantaneas()) == 2
+
+        resultado = respaldar_incremental(db, ruta, PoliticaRetencion(ultimas=1, diarias=0, semanales=0, mensuales=0))
+        assert resultado['retencion']['instantaneas'] == 2
+        assert resultado['bytes_repositorio'] == repositorio.tamano()
+        db.cerrar()
+
+
+if __name__ == "__main__":
+    test_respaldo_por_pasos()
+    test_respaldo_con_ediciones()
+    test_respaldo_cancelado_e_invalido()
+    test_repositorio_incremental()
+    test_retencion()
+    logger.info("¡Pruebas de respaldo completadas!")
@@ -0,0 +1,90 @@
+import sys
+import logging
+from datetime import date
+from resumenes import CambioFactura
+from indices import IndiceCalendario
+from facturas_prueba import generar_facturas, tipos_numerados
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def editar(factura, campo, valor):
+    """Aplica una edición a la factura y devuelve el evento correspondiente."""
+    anterior = factura[campo]
+    factura[campo] = valor
+    return CambioFactura(factura, campo, anterior)
+
+
+def test_cambio_factura():
+    """Verifica los datos anteriores y nuevos del evento."""
+    factura = {'id': 1, 'fecha': '15/03/2025', 'tipo': 'Mercado', 'descripcion': 'A', 'valor': 100.0}
+
+    cambio = editar(factura, 'descripcion', 'B')
+    assert not cambio.afecta_resumenes
+    assert cambio.valor_anterior == 'A' and cambio.nuevo_valor == 'B'
+
+    cambio = editar(factura, 'valor', 250.0)
+    assert cambio.afecta_resumenes and cambio.diferencia_centavos == 15000
+    assert cambio.antes[1:] == ('Mercado', 100.0)
+
+    # Las diferencias en centavos se acumulan sin error de redondeo
+    centavos = 0
+    for _ in range(10):
+        centavos += editar(factura, 'valor', factura['valor'] + 0.1).diferencia_centavos
+    assert centavos == 100 and factura['valor'] != 251.0
+    factura['valor'] = 250.0
+
+    cambio = editar(factura, 'fecha', '01/04/2025')
+    assert cambio.antes[0] == date(2025, 3, 15).toordinal()
+    assert cambio.despues[0] == date(2025, 4, 1).toordinal()
+
+
+def test_resumenes_desde_el_calendario():
+    """Verifica que los totales releídos tras cada cambio coincidan con recalcular el período."""
+    facturas = generar_facturas(600, tipos=tipos_numerados(3), primer_id=0)
+    indice = IndiceCalendario()
+    indice.reconstruir(facturas)
+
+    def recalcular(mes=None):
+        totales = {}
+        for f in facturas:
+            dia, mes_f, anio = (int(p) for p in f['fecha'].split('/'))
+            if anio == 2025 and mes in (None, mes_f):
+                cantidad, suma = totales.get(f['tipo'], (0, 0.0))
+                totales[f['tipo']] = (cantidad + 1, suma + f['valor'])
+        return totales
+
+    # Una descripción no cambia nada; el valor, el tipo y la fecha mueven los totales
+    cambios = [
+        editar(facturas[2], 'descripcion', 'Otra'),
+        editar(facturas[2], 'valor', 5.0),
+        editar(facturas[14], 'tipo', 'Nuevo'),
+        editar(facturas[26], 'fecha', '01/01/2026'),
+        editar(facturas[0], 'valor', 7.01),
+    ]
+    assert [cambio.afecta_resumenes for cambio in cambios] == [False, True, True, True, True]
+    for cambio in cambios:
+        if cambio.afecta_resumenes:
+            indice.actualizar(cambio.factura)
+
+    for mes in (None, 1, 3):
+        esperados = recalcular(mes)
+        obtenidos = indice.totales_por_tipo(2025, mes)
+        assert obtenidos.keys() == esperados.keys()
+        assert all(obtenidos[t][0] == esperados[t][0] and abs(obtenidos[t][1] - esperados[t][1]) < 1e-6
+                   for t in esperados)
+    assert indice.totales_por_tipo(2026) == {'Tipo 2': (1, 1026.0)}
+
+
+if __name__ == "__main__":
+    test_cambio_factura()
+    test_resumenes_desde_el_calendario()
+    logger.info("¡Pruebas de resúmenes completadas!")
@@ -0,0 +1,146 @@
+"""
+Almacén compacto de facturas en memoria.
+
+Cada factura es un registro con __slots__ en lugar de un diccionario: no
+necesita una tabla hash propia, y los textos (fecha, tipo, descripción y
+color) se internan, así que las facturas del mismo día, del mismo tipo o con
+la misma descripción comparten un solo objeto de texto. El registro se
+comporta como un diccionario (factura['valor'], factura.get('id'),
+'id' in factura, dict(factura)), de modo que el código que trabaja con
+diccionarios lo sigue aceptando. Las claves que no son campos de la factura
+(por ejemplo 'timestamp') se guardan en un diccionario aparte que solo se
+crea cuando hace falta.
+"""
+import sys
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Iterable, Iterator, List, Tuple, Union
+
+# Campos con espacio propio en cada registro, en el orden de la base de datos
+CAMPOS_FACTURA = ('id', 'fecha', 'tipo', 'descripcion', 'valor', 'color')
+
+_CAMPOS = frozenset(CAMPOS_FACTURA)
+
+# Campos de texto que se repiten entre facturas y se comparten en lugar de duplicarse
+_CAMPOS_INTERNADOS = frozenset(('fecha', 'tipo', 'descripcion', 'color'))
+
+
+class Factura(MutableMapping):
+    """
+    Factura con __slots__ y la interfaz de un diccionario.
+    
+    Un campo que nunca se asignó no existe, igual que una clave ausente:
+    factura['id'] lanza KeyError y factura.get('id') devuelve None.
+    """
+    __slots__ = CAMPOS_FACTURA + ('_extra',)
+    
+    def __init__(self, datos: Union[Mapping, Iterable[Tuple[str, Any]], None] = None, **campos: Any):
+        """
+        Args:
+            datos: Diccionario o pares (clave, valor) con los datos de la factura
+            **campos: Campos adicionales, como en dict()
+        """
+        self._extra = None
+        if datos is not None:
+            self._asignar(datos.items() if isinstance(datos, Mapping) else datos)
+        if campos:
+            self._asignar(campos.items())
+    
+    def _asignar(self, pares: Iterable[Tuple[str, Any]]) -> None:
+        # Igual que __setitem__ para cada par, sin una llamada por campo (se usa al cargar miles de facturas)
+        intern = sys.intern
+        for clave, valor in pares:
+            if clave in _CAMPOS:
+                setattr(self, clave, intern(valor) if clave in _CAMPOS_INTERNADOS and type(valor) is str else valor)
+            else:
+                self[clave] = valor
+    
+    @classmethod
+    def desde(cls, datos: Mapping) -> 'Factura':
+        """
+        Convierte un diccionario en Factura; una Factura se devuelve tal cual.
+        
+        Args:
+            datos: Datos de la factura
+        
+        Returns:
+            Factura: Registro con los mismos datos
+        """
+        return datos if isinstance(datos, cls) else cls(datos)
+    
+    def __getitem__(self, clave: str) -> Any:
+        if clave in _CAMPOS:
+            try:
+                return getattr(self, clave)
+            except AttributeError:
+                raise KeyError(clave) from None
+        extra = self._extra
+        if extra is not None and clave in extra:
+            return extra[clave]
+        raise KeyError(clave)
+    
+    def __setitem__(self, clave: str, valor: Any) -> None:
+        if clave in _CAMPOS:
+            if clave in _CAMPOS_INTERNADOS and type(valor) is str:
+                valor = sys.intern(valor)
+            setattr(self, clave, valor)
+            return
+        if self._extra is None:
+            self._extra = {}
+        self._extra[clave] = valor
+    
+    def __delitem__(self, clave: str) -> None:
+        if clave in _CAMPOS:
+            try:
+                delattr(self, clave)
+            except AttributeError:
+                raise KeyError(clave) from None
+            return
+        extra = self._extra
+        if extra is None or clave not in extra:
+            raise KeyError(clave)
+        del extra[clave]
+        if not extra:
+            self._extra = None
+    
+    def __contains__(self, clave: object) -> bool:
+        if clave in _CAMPOS:
+            return hasattr(self, clave)
+        return self._extra is not None and clave in self._extra
+    
+    def __iter__(self) -> Iterator[str]:
+        for campo in CAMPOS_FACTURA:
+            if hasattr(self, campo):
+                yield campo
+        if self._extra is not None:
+            yield from list(self._extra)
+    
+    def __len__(self) -> int:
+        cantidad = sum(1 for campo in CAMPOS_FACTURA if hasattr(self, campo))
+        return cantidad + (len(self._extra) if self._extra is not None else 0)
+    
+    def get(self, clave: str, defecto: Any = None) -> Any:
+        # Más rápido que MutableMapping.get, que pasa por __getitem__ y KeyError
+        if clave in _CAMPOS:
+            return getattr(self, clave, defecto)
+        extra = self._extra
+        return extra.get(clave, defecto) if extra is not None else defecto
+    
+    def copy(self) -> 'Factura':
+        """Copia superficial, como dict.copy()"""
+        return Factura(self)
+    
+    def __repr__(self) -> str:
+        return f"Factura({dict(self)!r})"
+
+
+def crear_facturas(filas: Iterable[Union[Mapping, Iterable[Tuple[str, Any]]]]) -> List[Factura]:
+    """
+    Convierte diccionarios (o pares clave, valor) en una lista de Factura.
+    
+    Args:
+        filas: Datos de las facturas
+    
+    Returns:
+        List[Factura]: Facturas en el mismo orden
+    """
+    return [Factura.desde(fila) if isinstance(fila, Mapping) else Factura(fila) for fila in filas]
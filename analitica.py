@@ -0,0 +1,299 @@
+"""
+Informes vectorizados sobre columnas de facturas.
+
+ColumnasFacturas copia una instantánea de las facturas en columnas ordenadas
+por fecha: ordinal de la fecha, año, mes, día, ID del tipo de gasto y valor
+en centavos. Con NumPy, un rango de fechas se resuelve con searchsorted, los
+demás filtros son máscaras booleanas y los totales salen de bincount (por
+tipo) y add.reduceat (por mes), sin recorrer las facturas en Python; así un
+informe de varios años sobre millones de facturas tarda milisegundos. Sin
+NumPy se usan las mismas columnas en listas y los resultados son iguales.
+
+Las tablas y los resúmenes de la ventana siguen usando los índices de
+indices.py, que responden con búsquedas en lugar de recorrer columnas
+completas. Estas columnas alimentan los informes de varios años, como el
+comparativo de exportacion.exportar_comparativo_anios, que se calcula en
+segundo plano sobre una instantánea de las facturas.
+"""
+import logging
+from bisect import bisect_left, bisect_right
+from calendar import monthrange
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from indices import ordinal_fecha
+
+# NumPy es opcional: sin él se usa la implementación en Python puro
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+def _centavos(factura: Dict[str, Any]) -> int:
+    try:
+        return round(float(factura.get('valor', 0)) * 100)
+    except (TypeError, ValueError):
+        return 0
+
+
+class ColumnasFacturas:
+    """
+    Instantánea de las facturas en columnas, para filtros y totales en bloque.
+    
+    Las facturas con fecha inválida no se incluyen, igual que en
+    IndiceCalendario. La instantánea no sigue las ediciones posteriores:
+    se vuelve a crear cuando cambian las facturas.
+    """
+    
+    def __init__(self, facturas: Sequence[Dict[str, Any]], usar_numpy: Optional[bool] = None):
+        """
+        Args:
+            facturas: Facturas a copiar
+            usar_numpy: True o False para elegir la implementación; None usa NumPy si está instalado
+        
+        Raises:
+            ImportError: Si se pide NumPy y no está instalado
+        """
+        if usar_numpy is None:
+            usar_numpy = np is not None
+        elif usar_numpy and np is None:
+            raise ImportError("NumPy no está instalado")
+        self.usa_numpy = usar_numpy
+        
+        self.tipos: List[str] = []
+        self._ids_tipo: Dict[str, int] = {}
+        partes: Dict[int, Tuple[int, int, int]] = {}
+        filas = []
+        for factura in facturas:
+            ordinal = ordinal_fecha(factura.get('fecha'))
+            if ordinal is None:
+                continue
+            tipo = factura.get('tipo', '')
+            id_tipo = self._ids_tipo.get(tipo)
+            if id_tipo is None:
+                id_tipo = self._ids_tipo[tipo] = len(self.tipos)
+                self.tipos.append(tipo)
+            if ordinal not in partes:
+                fecha = date.fromordinal(ordinal)
+                partes[ordinal] = (fecha.year, fecha.month, fecha.day)
+            filas.append((ordinal, id_tipo, _centavos(factura), factura))
+        
+        # Orden por fecha: los rangos de fechas y de meses quedan contiguos
+        filas.sort(key=lambda fila: fila[0])
+        self._facturas = [fila[3] for fila in filas]
+        ordinales = [fila[0] for fila in filas]
+        columnas = {
+            'ordinal': ordinales,
+            'tipo': [fila[1] for fila in filas],
+            'centavos': [fila[2] for fila in filas],
+            'anio': [partes[o][0] for o in ordinales],
+            'mes': [partes[o][1] for o in ordinales],
+            'dia': [partes[o][2] for o in ordinales],
+        }
+        if usar_numpy:
+            tipos_dato = {'ordinal': np.int32, 'tipo': np.int32, 'centavos': np.int64,
+                          'anio': np.int16, 'mes': np.int8, 'dia': np.int8}
+            columnas = {nombre: np.array(valores, dtype=tipos_dato[nombre])
+                        for nombre, valores in columnas.items()}
+        self._columnas = columnas
+        logger.debug(f"Columnas de {len(self._facturas)} facturas creadas "
+                     f"({'NumPy' if usar_numpy else 'Python'})")
+    
+    def __len__(self) -> int:
+        return len(self._facturas)
+    
+    def rango_anios(self) -> Optional[Tuple[int, int]]:
+        """
+        Obtiene el primer y el último año con facturas.
+        
+        Returns:
+            Optional[Tuple[int, int]]: (primer año, último año), o None si no hay facturas
+        """
+        if not self._facturas:
+            return None
+        anios = self._columnas['anio']
+        return int(anios[0]), int(anios[-1])
+    
+    def _seleccion(self, desde: Optional[date], hasta: Optional[date], tipo: Optional[str],
+                   anio: Optional[int], mes: Optional[int], dia: Optional[int]):
+        """
+        Traduce los filtros a un tramo de las columnas y, si hace falta, una selección dentro de él.
+        
+        Returns:
+            Tuple: (inicio, fin, seleccion); seleccion es None si entra todo el
+            tramo, una máscara booleana con NumPy o una lista de posiciones sin él.
+            Devuelve None si ninguna factura puede cumplir los filtros.
+        """
+        condiciones = []
+        if tipo is not None:
+            if tipo not in self._ids_tipo:
+                return None
+            condiciones.append(('tipo', self._ids_tipo[tipo]))
+        
+        # El año (y el mes y día si vienen con él) acotan el rango de fechas
+        inicio_ord = desde.toordinal() if desde is not None else None
+        fin_ord = hasta.toordinal() if hasta is not None else None
+        if anio is not None:
+            try:
+                if mes is None:
+                    limites = (date(anio, 1, 1), date(anio, 12, 31))
+                elif dia is None:
+                    limites = (date(anio, mes, 1), date(anio, mes, monthrange(anio, mes)[1]))
+                else:
+                    limites = (date(anio, mes, dia), date(anio, mes, dia))
+            except ValueError:
+                return None
+            inicio_ord = max(filter(None, (inicio_ord, limites[0].toordinal())))
+            fin_ord = min(filter(None, (fin_ord, limites[1].toordinal())))
+        if anio is None and mes is not None:
+            condiciones.append(('mes', mes))
+        if dia is not None and (anio is None or mes is None):
+            condiciones.append(('dia', dia))
+        
+        ordinales = self._columnas['ordinal']
+        if self.usa_numpy:
+            inicio = int(np.searchsorted(ordinales, inicio_ord, 'left')) if inicio_ord is not None else 0
+            fin = int(np.searchsorted(ordinales, fin_ord, 'right')) if fin_ord is not None else len(self)
+        else:
+            inicio = bisect_left(ordinales, inicio_ord) if inicio_ord is not None else 0
+            fin = bisect_right(ordinales, fin_ord) if fin_ord is not None else len(self)
+        if inicio >= fin:
+            return None
+        if not condiciones:
+            return inicio, fin, None
+        
+        if self.usa_numpy:
+            mascara = None
+            for nombre, valor in condiciones:
+                cumple = self._columnas[nombre][inicio:fin] == valor
+                mascara = cumple if mascara is None else mascara & cumple
+            return inicio, fin, mascara
+        columnas = [(self._columnas[nombre], valor) for nombre, valor in condiciones]
+        posiciones = [i for i in range(inicio, fin)
+                      if all(columna[i] == valor for columna, valor in columnas)]
+        return inicio, fin, posiciones
+    
+    def filtrar(self, desde: Optional[date] = None, hasta: Optional[date] = None,
+                tipo: Optional[str] = None, anio: Optional[int] = None,
+                mes: Optional[int] = None, dia: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Obtiene las facturas que cumplen los filtros, de la más reciente a la más antigua.
+        
+        Args:
+            desde: Fecha inicial (incluida)
+            hasta: Fecha final (incluida)
+            tipo: Tipo de gasto
+            anio: Año
+            mes: Mes (1-12), con o sin año
+            dia: Día del mes, con o sin año y mes
+        
+        Returns:
+            List[Dict]: Facturas encontradas
+        """
+        seleccion = self._seleccion(desde, hasta, tipo, anio, mes, dia)
+        if seleccion is None:
+            return []
+        inicio, fin, filtro = seleccion
+        if filtro is None:
+            posiciones = range(fin - 1, inicio - 1, -1)
+        elif self.usa_numpy:
+            posiciones = (np.flatnonzero(filtro)[::-1] + inicio).tolist()
+        else:
+            posiciones = reversed(filtro)
+        return [self._facturas[i] for i in posiciones]
+    
+    def totales(self, desde: Optional[date] = None, hasta: Optional[date] = None,
+                tipo: Optional[str] = None, anio: Optional[int] = None,
+                mes: Optional[int] = None, dia: Optional[int] = None) -> Tuple[int, float]:
+        """
+        Cuenta y suma las facturas que cumplen los filtros (los mismos de filtrar()).
+        
+        Returns:
+            Tuple[int, float]: (cantidad, suma)
+        """
+        seleccion = self._seleccion(desde, hasta, tipo, anio, mes, dia)
+        if seleccion is None:
+            return 0, 0.0
+        inicio, fin, filtro = seleccion
+        centavos = self._columnas['centavos']
+        if self.usa_numpy:
+            tramo = centavos[inicio:fin]
+            if filtro is not None:
+                tramo = tramo[filtro]
+            return len(tramo), int(tramo.sum()) / 100
+        posiciones = range(inicio, fin) if filtro is None else filtro
+        return len(posiciones), sum(centavos[i] for i in posiciones) / 100
+    
+    def totales_por_tipo(self, desde: Optional[date] = None, hasta: Optional[date] = None,
+                         anio: Optional[int] = None, mes: Optional[int] = None,
+                         dia: Optional[int] = None) -> Dict[str, Tuple[int, float]]:
+        """
+        Cuenta y suma por tipo de gasto las facturas que cumplen los filtros.
+        
+        Returns:
+            Dict[str, Tuple[int, float]]: {tipo: (cantidad, suma)}, solo tipos con facturas
+        """
+        seleccion = self._seleccion(desde, hasta, None, anio, mes, dia)
+        if seleccion is None:
+            return {}
+        inicio, fin, filtro = seleccion
+        tipos, centavos = self._columnas['tipo'], self._columnas['centavos']
+        if self.usa_numpy:
+            tipos, centavos = tipos[inicio:fin], centavos[inicio:fin]
+            if filtro is not None:
+                tipos, centavos = tipos[filtro], centavos[filtro]
+            cantidades = np.bincount(tipos, minlength=len(self.tipos))
+            # Sumas en float64: exactas mientras el total no pase de 2**53 centavos
+            sumas = np.bincount(tipos, weights=centavos, minlength=len(self.tipos))
+            return {self.tipos[i]: (int(cantidades[i]), round(sumas[i]) / 100)
+                    for i in np.flatnonzero(cantidades).tolist()}
+        
+        acumulado: Dict[int, List[int]] = {}
+        for i in (range(inicio, fin) if filtro is None else filtro):
+            totales = acumulado.setdefault(tipos[i], [0, 0])
+            totales[0] += 1
+            totales[1] += centavos[i]
+        return {self.tipos[i]: (cantidad, suma / 100) for i, (cantidad, suma) in acumulado.items()}
+    
+    def totales_mensuales(self, anio_inicio: int, anio_fin: int,
+                          tipo: Optional[str] = None) -> Dict[int, List[float]]:
+        """
+        Obtiene los totales de cada mes de un rango de años.
+        
+        Args:
+            anio_inicio: Primer año (incluido)
+            anio_fin: Último año (incluido)
+            tipo: Tipo de gasto, o None para todos
+        
+        Returns:
+            Dict[int, List[float]]: {año: [total de enero, ..., total de diciembre]}
+        """
+        resultado = {anio: [0.0] * 12 for anio in range(anio_inicio, anio_fin + 1)}
+        seleccion = self._seleccion(date(anio_inicio, 1, 1), date(anio_fin, 12, 31), tipo, None, None, None)
+        if seleccion is None:
+            return resultado
+        inicio, fin, filtro = seleccion
+        anios, meses, centavos = (self._columnas[nombre] for nombre in ('anio', 'mes', 'centavos'))
+        if self.usa_numpy:
+            meses_corridos = anios[inicio:fin].astype(np.int32) * 12 + meses[inicio:fin] - 1
+            centavos = centavos[inicio:fin]
+            if filtro is not None:
+                centavos = np.where(filtro, centavos, 0)
+            # Las columnas están ordenadas por fecha: cada mes es un tramo contiguo
+            cortes = np.flatnonzero(np.diff(meses_corridos)) + 1
+            inicios = np.concatenate(([0], cortes))
+            sumas = np.add.reduceat(centavos, inicios)
+            for mes_corrido, suma in zip(meses_corridos[inicios].tolist(), sumas.tolist()):
+                resultado[mes_corrido // 12][mes_corrido % 12] = suma / 100
+            return resultado
+        
+        acumulado: Dict[Tuple[int, int], int] = {}
+        for i in (range(inicio, fin) if filtro is None else filtro):
+            clave = (anios[i], meses[i])
+            acumulado[clave] = acumulado.get(clave, 0) + centavos[i]
+        for (anio, mes), suma in acumulado.items():
+            resultado[anio][mes - 1] = suma / 100
+        return resultado
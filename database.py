@@ -1,43 +1,378 @@
 import sqlite3
-import json
 import logging
+import threading
+import time
+import traceback
 from pathlib import Path
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import islice
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+from almacen import Factura
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Perfiles de PRAGMA que se aplican a cada conexión al abrirla.
+# cache_size negativo indica KiB; mmap_size está en bytes.
+PERFILES_PRAGMA: Dict[str, Dict[str, Any]] = {
+    # Máxima seguridad ante cortes de energía: fsync en cada commit
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -8000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 5000,
+    },
+    # Uso interactivo: WAL con fsync solo en los checkpoints
+    'balanced': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -32000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    # Importaciones masivas: sin fsync y con caché amplia
+    'bulk-load': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -128000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+}
+PERFIL_PRAGMA_POR_DEFECTO = 'balanced'
+
+# Filas por executemany al confirmar cambios; entre bloques se reporta el progreso
+TAMANO_BLOQUE_ESCRITURA = 5000
+
+# Páginas que copia cada paso de la API de respaldo y pausa entre pasos (segundos)
+PAGINAS_RESPALDO_POR_PASO = 1024
+PAUSA_RESPALDO = 0.005
+
+# Segundos mínimos entre dos reportes de progreso de importaciones y exportaciones
+INTERVALO_PROGRESO = 0.1
+
+# Filas leídas o escritas entre dos revisiones de cancelación y progreso
+FILAS_ENTRE_REVISIONES = 1000
+
+
+def aplicar_perfil_pragma(conn: sqlite3.Connection, perfil: str) -> Dict[str, Any]:
+    """
+    Aplica un perfil de PRAGMA a una conexión.
+    
+    Args:
+        conn: Conexión a configurar.
+        perfil: Nombre del perfil en PERFILES_PRAGMA.
+        
+    Returns:
+        Dict[str, Any]: Valores efectivos reportados por SQLite para cada PRAGMA.
+    """
+    if perfil not in PERFILES_PRAGMA:
+        raise ValueError(
+            f"Perfil de PRAGMA desconocido: {perfil}. "
+            f"Opciones válidas: {', '.join(PERFILES_PRAGMA)}"
+        )
+    
+    efectivos = {}
+    for pragma, valor in PERFILES_PRAGMA[perfil].items():
+        conn.execute(f'PRAGMA {pragma} = {valor}')
+        fila = conn.execute(f'PRAGMA {pragma}').fetchone()
+        efectivos[pragma] = fila[0] if fila is not None else None
+    return efectivos
+
+
+# Versión del esquema guardada en PRAGMA user_version.
+# 1: fecha como entero YYYYMMDD y valor como entero en centavos.
+# 2: sin la tabla resumen_diario ni sus triggers; los resúmenes de la interfaz
+#    salen de IndiceCalendario y las consultas de resumen leen facturas.
+VERSION_ESQUEMA = 2
+
+# Expresiones SQL para mostrar una fecha YYYYMMDD como texto
+SQL_FECHA_DD_MM_YYYY = "printf('%02d/%02d/%04d', {0} % 100, {0} / 100 % 100, {0} / 10000)"
+SQL_FECHA_ISO = "printf('%04d-%02d-%02d', {0} / 10000, {0} / 100 % 100, {0} % 100)"
+
+
+@lru_cache(maxsize=8192)
+def _fecha_a_db(fecha: str) -> Optional[int]:
+    """
+    Convierte una fecha DD/MM/YYYY al entero YYYYMMDD de la base de datos.
+    
+    Las fechas se repiten mucho en los lotes, por lo que el resultado se cachea.
+    
+    Returns:
+        Optional[int]: Fecha convertida o None si no es válida.
+    """
+    try:
+        fecha = datetime.strptime(fecha, '%d/%m/%Y')
+    except (ValueError, TypeError):
+        return None
+    return fecha.year * 10000 + fecha.month * 100 + fecha.day
+
+
+def _fecha_hoy_db() -> int:
+    """Fecha actual como entero YYYYMMDD."""
+    hoy = date.today()
+    return hoy.year * 10000 + hoy.month * 100 + hoy.day
+
+
+def _centavos(valor: Any) -> int:
+    """Convierte un valor en pesos a centavos enteros."""
+    return int(round(float(valor) * 100))
+
+
+_SQL_TABLA_FACTURAS = '''
+                CREATE TABLE IF NOT EXISTS {nombre} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fecha INTEGER NOT NULL,
+                    tipo_id INTEGER NOT NULL,
+                    descripcion TEXT NOT NULL,
+                    valor_centavos INTEGER NOT NULL,
+                    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (tipo_id) REFERENCES tipos_gasto (id)
+                )'''
+
+
+class ConnectionManager:
+    """
+    Mantiene una conexión SQLite persistente por hilo.
+    
+    Abrir una conexión implica abrir el archivo y leer el esquema, por lo que
+    reutilizarla entre llamadas evita ese costo en cada operación. Cada hilo
+    recibe su propia conexión; las bases de datos en memoria comparten una
+    única conexión porque cada conexión a ':memory:' es una base distinta.
+    """
+    
+    def __init__(self, db_path: str, perfil: str = PERFIL_PRAGMA_POR_DEFECTO):
+        self.db_path = db_path
+        self.perfil = perfil
+        self._is_memory_db = db_path == ':memory:'
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conexiones: List[sqlite3.Connection] = []
+        self._compartida: Optional[sqlite3.Connection] = None
+        
+        # Contadores para verificar la reutilización de conexiones
+        self.abiertas = 0
+        self.reutilizadas = 0
+        self.cerradas = 0
+    
+    def _abrir(self) -> sqlite3.Connection:
+        """Abre una nueva conexión y la registra."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        efectivos = aplicar_perfil_pragma(conn, self.perfil)
+        with self._lock:
+            self._conexiones.append(conn)
+            self.abiertas += 1
+        logger.debug(f"Conexión abierta a {self.db_path} (hilo {threading.get_ident()})")
+        if self.abiertas == 1:
+            logger.info(f"Perfil PRAGMA activo: {self.perfil} {efectivos}")
+        return conn
+    
+    def cambiar_perfil(self, perfil: str) -> Dict[str, Any]:
+        """
+        Cambia el perfil para las conexiones nuevas y lo aplica a la del hilo actual.
+        
+        Args:
+            perfil: Nombre del perfil en PERFILES_PRAGMA.
+            
+        Returns:
+            Dict[str, Any]: Valores efectivos en la conexión del hilo actual.
+        """
+        if perfil not in PERFILES_PRAGMA:
+            raise ValueError(f"Perfil de PRAGMA desconocido: {perfil}")
+        self.perfil = perfil
+        efectivos = aplicar_perfil_pragma(self.obtener(), perfil)
+        logger.info(f"Perfil PRAGMA activo: {perfil} {efectivos}")
+        return efectivos
+    
+    def obtener(self) -> sqlite3.Connection:
+        """
+        Obtiene la conexión del hilo actual, abriéndola si aún no existe.
+        
+        Returns:
+            sqlite3.Connection: Conexión lista para usar.
+        """
+        if self._is_memory_db:
+            if self._compartida is None:
+                self._compartida = self._abrir()
+                return self._compartida
+            with self._lock:
+                self.reutilizadas += 1
+            return self._compartida
+        
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._abrir()
+            self._local.conn = conn
+            return conn
+        
+        with self._lock:
+            self.reutilizadas += 1
+        return conn
+    
+    def cerrar_hilo_actual(self):
+        """Cierra la conexión del hilo actual, si existe."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        self._cerrar(conn)
+    
+    def cerrar_todas(self):
+        """Cierra todas las conexiones abiertas por este administrador."""
+        with self._lock:
+            conexiones = list(self._conexiones)
+        for conn in conexiones:
+            self._cerrar(conn)
+        self._local = threading.local()
+        self._compartida = None
+    
+    def _cerrar(self, conn: sqlite3.Connection):
+        """Cierra una conexión y la elimina del registro."""
+        with self._lock:
+            if conn not in self._conexiones:
+                return
+            self._conexiones.remove(conn)
+            self.cerradas += 1
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Error al cerrar la conexión: {str(e)}")
+    
+    def estadisticas(self) -> Dict[str, int]:
+        """
+        Devuelve los contadores de uso de conexiones.
+        
+        Returns:
+            Dict[str, int]: Conexiones abiertas, reutilizadas, cerradas y activas.
+        """
+        with self._lock:
+            return {
+                'abiertas': self.abiertas,
+                'reutilizadas': self.reutilizadas,
+                'cerradas': self.cerradas,
+                'activas': len(self._conexiones),
+            }
+
+
 class Database:
-    def __init__(self, db_path: str = 'facturas.db'):
-        """Inicializa la conexión a la base de datos SQLite."""
+    def __init__(self, db_path: str = 'facturas.db', perfil_pragma: str = PERFIL_PRAGMA_POR_DEFECTO):
+        """
+        Inicializa la conexión a la base de datos SQLite.
+        
+        Args:
+            db_path: Ruta al archivo de la base de datos o ':memory:'.
+            perfil_pragma: Perfil de PRAGMA ('durable', 'balanced' o 'bulk-load').
+        """
+        if perfil_pragma not in PERFILES_PRAGMA:
+            raise ValueError(
+                f"Perfil de PRAGMA desconocido: {perfil_pragma}. "
+                f"Opciones válidas: {', '.join(PERFILES_PRAGMA)}"
+            )
         self.db_path = db_path
-        self._conn = None
         self._is_memory_db = db_path == ':memory:'
+        self._pool = ConnectionManager(db_path, perfil_pragma)
         
-        # Para bases de datos en memoria, creamos una conexión persistente
+        # Para bases de datos en memoria, la conexión compartida se crea de inmediato
+        self._conn = self._pool.obtener() if self._is_memory_db else None
         if self._is_memory_db:
-            self._conn = sqlite3.connect(':memory:')
-            self._conn.row_factory = sqlite3.Row
             logger.info("Conexión a base de datos en memoria creada")
         
         self._create_tables()
     
     def _get_connection(self):
-        """Obtiene una conexión a la base de datos."""
-        if self._is_memory_db and self._conn is not None:
-            return self._conn
+        """Obtiene la conexión persistente del hilo actual."""
+        return self._pool.obtener()
+    
+    @property
+    def en_memoria(self) -> bool:
+        """Indica si la base de datos está en memoria (una sola conexión compartida)."""
+        return self._is_memory_db
+    
+    @property
+    def perfil_pragma(self) -> str:
+        """Nombre del perfil de PRAGMA activo."""
+        return self._pool.perfil
+    
+    def cambiar_perfil_pragma(self, perfil: str) -> Dict[str, Any]:
+        """
+        Cambia el perfil de PRAGMA de la base de datos.
         
-        # Para bases de datos de archivo, creamos una nueva conexión cada vez
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        Args:
+            perfil: Nombre del perfil ('durable', 'balanced' o 'bulk-load').
+            
+        Returns:
+            Dict[str, Any]: Valores efectivos de cada PRAGMA.
+        """
+        return self._pool.cambiar_perfil(perfil)
+    
+    def estadisticas_conexiones(self) -> Dict[str, int]:
+        """
+        Obtiene los contadores del administrador de conexiones.
+        
+        Returns:
+            Dict[str, int]: Conexiones abiertas, reutilizadas, cerradas y activas.
+        """
+        return self._pool.estadisticas()
+    
+    def respaldar_en(self, ruta_destino: str, paginas_por_paso: int = PAGINAS_RESPALDO_POR_PASO,
+                     progreso: Optional[Callable[[int, int], None]] = None) -> int:
+        """
+        Copia la base de datos a un archivo con la API de respaldo de SQLite.
+        
+        La copia avanza de a paginas_por_paso páginas desde la conexión del hilo
+        actual y suelta la base entre pasos, así que las ediciones siguen
+        mientras tanto; con journal_mode=WAL tampoco esperan durante un paso. Si
+        otra conexión escribe, SQLite reinicia la copia en el paso siguiente, de
+        modo que el resultado siempre es una instantánea coherente.
+        
+        Args:
+            ruta_destino: Archivo donde se escribe la copia; se sobrescribe.
+            paginas_por_paso: Páginas por paso; -1 copia todo en un solo paso.
+            progreso: Función opcional que recibe (páginas copiadas, total de
+                páginas) tras cada paso. Si lanza una excepción, la copia se
+                interrumpe y la excepción se propaga.
+            
+        Returns:
+            int: Número de páginas de la copia.
+        """
+        origen = self._get_connection()
+        destino = sqlite3.connect(ruta_destino)
+        total_paginas = 0
+        
+        def avance(estado, restantes, total):
+            nonlocal total_paginas
+            total_paginas = total
+            if progreso:
+                progreso(total - restantes, total)
+        
+        try:
+            origen.backup(destino, pages=paginas_por_paso, progress=avance, sleep=PAUSA_RESPALDO)
+            # La copia es un archivo independiente: sin archivo -wal al abrirla
+            destino.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            destino.close()
+        logger.info(f"Respaldo de {total_paginas} páginas copiado a {ruta_destino}")
+        return total_paginas
+    
+    def cerrar(self):
+        """Cierra todas las conexiones abiertas a la base de datos."""
+        self._pool.cerrar_todas()
+        self._conn = None
+        logger.info(f"Conexiones a la base de datos cerradas: {self._pool.estadisticas()}")
     
     def __del__(self):
-        """Cierra la conexión a la base de datos al destruir la instancia."""
-        if self._is_memory_db and self._conn is not None:
-            self._conn.close()
-            logger.info("Conexión a base de datos en memoria cerrada")
+        """Cierra las conexiones a la base de datos al destruir la instancia."""
+        pool = getattr(self, '_pool', None)
+        if pool is not None:
+            pool.cerrar_todas()
     
     def _create_tables(self):
         """Crea las tablas necesarias si no existen."""
@@ -58,27 +393,35 @@ class Database:
                 )''')
                 logger.info("Tabla 'tipos_gasto' creada o verificada")
                 
-                # Tabla de facturas
+                # Migrar bases creadas con fecha TEXT y valor REAL
+                self._migrar_esquema(cursor)
+                
+                # Tabla de facturas: fecha como entero YYYYMMDD y valor en centavos
                 logger.info("Creando tabla 'facturas' si no existe...")
-                cursor.execute('''
-                CREATE TABLE IF NOT EXISTS facturas (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    fecha DATE NOT NULL,
-                    tipo_id INTEGER NOT NULL,
-                    descripcion TEXT NOT NULL,
-                    valor REAL NOT NULL,
-                    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (tipo_id) REFERENCES tipos_gasto (id)
-                )''')
+                cursor.execute(_SQL_TABLA_FACTURAS.format(nombre='facturas'))
                 logger.info("Tabla 'facturas' creada o verificada")
-                
+
                 # Índices para mejorar el rendimiento de las consultas
                 logger.info("Creando índices...")
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_facturas_fecha ON facturas(fecha)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_facturas_tipo ON facturas(tipo_id)')
                 logger.info("Índices creados o verificados")
                 
+                # Vista con fecha en texto y valor REAL para lectores anteriores
+                cursor.execute(f'''
+                CREATE VIEW IF NOT EXISTS facturas_compat AS
+                SELECT
+                    id,
+                    {SQL_FECHA_ISO.format('fecha')} AS fecha,
+                    tipo_id,
+                    descripcion,
+                    valor_centavos / 100.0 AS valor,
+                    fecha_creacion,
+                    fecha_actualizacion
+                FROM facturas''')
+                
+                cursor.execute(f'PRAGMA user_version = {VERSION_ESQUEMA}')
+                
                 # Insertar tipos de gastos por defecto si no existen
                 logger.info("Insertando tipos de gasto por defecto...")
                 self._insert_default_tipos_gasto(cursor)
@@ -96,6 +439,74 @@ class Database:
             logger.error(traceback.format_exc())
             raise
     
+    def _migrar_esquema(self, cursor):
+        """
+        Migra la base a la versión VERSION_ESQUEMA.
+        
+        Versión 1: la tabla facturas pasa del esquema original (fecha TEXT,
+        valor REAL) a fecha entera YYYYMMDD y valor entero en centavos. Sigue el
+        procedimiento de SQLite para cambiar columnas: crear la tabla nueva,
+        copiar, eliminar la anterior y renombrar, todo en una transacción. La
+        vista se elimina porque se recrea a continuación.
+        
+        Versión 2: se eliminan la tabla resumen_diario y sus triggers, que ya no
+        tienen lectores y encarecían cada escritura.
+        """
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        if version >= VERSION_ESQUEMA:
+            return
+        
+        cursor.execute('DROP TABLE IF EXISTS resumen_diario')
+        for nombre in ('trg_resumen_diario_insert', 'trg_resumen_diario_delete', 'trg_resumen_diario_update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {nombre}')
+        
+        columnas = {fila['name'] for fila in cursor.execute('PRAGMA table_info(facturas)')}
+        if 'valor' not in columnas or 'valor_centavos' in columnas:
+            return
+        
+        logger.info(f"Migrando el esquema de la versión {version} a la {VERSION_ESQUEMA}...")
+        inicio = time.perf_counter()
+        if not cursor.connection.in_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+        
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'facturas'")
+        fila = cursor.fetchone()
+        secuencia = fila[0] if fila else 0
+        
+        cursor.execute('DROP VIEW IF EXISTS facturas_compat')
+        
+        cursor.execute(_SQL_TABLA_FACTURAS.format(nombre='facturas_nueva'))
+        cursor.execute('''
+            INSERT INTO facturas_nueva
+                (id, fecha, tipo_id, descripcion, valor_centavos, fecha_creacion, fecha_actualizacion)
+            SELECT
+                id,
+                CASE
+                    WHEN substr(fecha, 3, 1) = '/'
+                        THEN CAST(substr(fecha, 7, 4) || substr(fecha, 4, 2) || substr(fecha, 1, 2) AS INTEGER)
+                    ELSE CAST(replace(substr(fecha, 1, 10), '-', '') AS INTEGER)
+                END,
+                tipo_id,
+                descripcion,
+                CAST(ROUND(valor * 100) AS INTEGER),
+                fecha_creacion,
+                fecha_actualizacion
+            FROM facturas
+        ''')
+        migradas = cursor.rowcount
+        cursor.execute('DROP TABLE facturas')
+        cursor.execute('ALTER TABLE facturas_nueva RENAME TO facturas')
+        
+        # Conservar la secuencia de AUTOINCREMENT para no reutilizar IDs eliminados
+        cursor.execute(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'facturas'",
+            (secuencia,)
+        )
+        logger.info(
+            f"Migración completada: {migradas} facturas en "
+            f"{(time.perf_counter() - inicio) * 1000:.1f} ms"
+        )
+    
     def _insert_default_tipos_gasto(self, cursor):
         """Inserta los tipos de gastos por defecto."""
         default_tipos = [
@@ -125,59 +536,24 @@ class Database:
         """
         Migra los datos desde un archivo JSON a la base de datos SQLite.
         
+        El archivo (un arreglo JSON o JSON Lines) se lee de forma incremental y
+        las facturas se insertan por bloques en una sola transacción, así que la
+        memoria no crece con el tamaño del archivo.
+        
         Args:
             json_path: Ruta al archivo JSON con los datos a migrar.
             
         Returns:
             int: Número de facturas migradas.
         """
+        # Importación local: importacion depende de este módulo
+        from importacion import iterar_json
+        
         try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                facturas = json.load(f)
-            
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                count = 0
-                
-                for factura in facturas:
-                    # Obtener o crear el tipo de gasto
-                    cursor.execute(
-                        'SELECT id FROM tipos_gasto WHERE nombre = ?',
-                        (factura['tipo'],)
-                    )
-                    tipo = cursor.fetchone()
-                    
-                    if not tipo:
-                        cursor.execute(
-                            'INSERT INTO tipos_gasto (nombre) VALUES (?)',
-                            (factura['tipo'],)
-                        )
-                        tipo_id = cursor.lastrowid
-                    else:
-                        tipo_id = tipo['id']
-                    
-                    # Convertir la fecha al formato YYYY-MM-DD
-                    try:
-                        fecha = datetime.strptime(factura['fecha'], '%d/%m/%Y').strftime('%Y-%m-%d')
-                    except (ValueError, KeyError):
-                        # Si hay un error con la fecha, usar la fecha actual
-                        fecha = datetime.now().strftime('%Y-%m-%d')
-                    
-                    # Insertar la factura
-                    cursor.execute('''
-                        INSERT INTO facturas (fecha, tipo_id, descripcion, valor)
-                        VALUES (?, ?, ?, ?)
-                    ''', (
-                        fecha,
-                        tipo_id,
-                        factura.get('descripcion', ''),
-                        float(factura['valor'])
-                    ))
-                    
-                    count += 1
-                
-                conn.commit()
-                return count
+            with open(json_path, 'rb') as f:
+                facturas = iterar_json(f)
+                bloques = iter(lambda: list(islice(facturas, TAMANO_BLOQUE_ESCRITURA)), [])
+                return self.insertar_bloques(bloques)
                 
         except Exception as e:
             logger.error(f"Error al migrar datos desde JSON: {str(e)}")
@@ -192,15 +568,15 @@ class Database:
             fecha_fin: Fecha de fin en formato YYYY-MM-DD (opcional).
             
         Returns:
-            List[Dict]: Lista de diccionarios con los datos de las facturas.
+            List[Factura]: Facturas con la interfaz de un diccionario (ver almacen.Factura).
         """
-        query = '''
+        query = f'''
             SELECT 
                 f.id,
-                f.fecha,
+                {SQL_FECHA_DD_MM_YYYY.format('f.fecha')} as fecha,
                 tg.nombre as tipo,
                 f.descripcion,
-                f.valor,
+                f.valor_centavos / 100.0 as valor,
                 tg.color
             FROM facturas f
             JOIN tipos_gasto tg ON f.tipo_id = tg.id
@@ -210,28 +586,199 @@ class Database:
         
         if fecha_inicio and fecha_fin:
             query += ' WHERE f.fecha BETWEEN ? AND ?'
-            params.extend([fecha_inicio, fecha_fin])
+            params.extend([self._fecha_filtro(fecha_inicio), self._fecha_filtro(fecha_fin)])
         
         query += ' ORDER BY f.fecha DESC'
         
+        # La fecha ya llega en formato DD/MM/YYYY desde SQLite; cada fila se
+        # convierte en un registro compacto a medida que se lee
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
+            columnas = [descripcion[0] for descripcion in cursor.description]
+            return [Factura(zip(columnas, fila)) for fila in cursor]
+    
+    @staticmethod
+    def _fecha_filtro(fecha: Any) -> int:
+        """
+        Normaliza una fecha de filtro al entero YYYYMMDD de la base de datos.
+        
+        Acepta objetos date/datetime, texto DD/MM/YYYY o texto YYYY-MM-DD.
+        """
+        if not isinstance(fecha, (date, datetime)):
+            convertida = _fecha_a_db(fecha)
+            if convertida is not None:
+                return convertida
+            try:
+                fecha = datetime.strptime(fecha, '%Y-%m-%d')
+            except (ValueError, TypeError):
+                raise ValueError(f"Fecha de filtro no válida: {fecha}")
+        return fecha.year * 10000 + fecha.month * 100 + fecha.day
+    
+    def _condiciones_filtro(self, fecha_desde: Any = None, fecha_hasta: Any = None,
+                            anio: int = None, mes: int = None, dia: int = None,
+                            tipo_ids: Iterable[int] = None, valor_min: float = None,
+                            valor_max: float = None, texto: str = None) -> Tuple[List[str], List[Any]]:
+        """
+        Construye las condiciones WHERE de una consulta de facturas.
+        
+        Año, año+mes y año+mes+día se traducen a un rango entero sobre f.fecha
+        (YYYYMMDD) para que SQLite pueda usar idx_facturas_fecha; solo mes o día
+        sin año requieren aritmética sobre la fecha.
+        
+        Returns:
+            Tuple[List[str], List[Any]]: Condiciones y parámetros.
+        """
+        condiciones: List[str] = []
+        params: List[Any] = []
+        
+        if fecha_desde is not None:
+            condiciones.append('f.fecha >= ?')
+            params.append(self._fecha_filtro(fecha_desde))
+        if fecha_hasta is not None:
+            condiciones.append('f.fecha <= ?')
+            params.append(self._fecha_filtro(fecha_hasta))
+        
+        if anio is not None:
+            if mes is not None:
+                inicio = anio * 10000 + mes * 100 + (dia if dia is not None else 1)
+                fin = anio * 10000 + mes * 100 + (dia if dia is not None else 31)
+            else:
+                inicio, fin = anio * 10000 + 101, anio * 10000 + 1231
+            condiciones.append('f.fecha BETWEEN ? AND ?')
+            params.extend([inicio, fin])
+            if mes is None and dia is not None:
+                condiciones.append('f.fecha % 100 = ?')
+                params.append(dia)
+        else:
+            if mes is not None:
+                condiciones.append('f.fecha / 100 % 100 = ?')
+                params.append(mes)
+            if dia is not None:
+                condiciones.append('f.fecha % 100 = ?')
+                params.append(dia)
+        
+        if tipo_ids is not None:
+            tipo_ids = list(tipo_ids)
+            if not tipo_ids:
+                condiciones.append('0')
+            else:
+                condiciones.append(f"f.tipo_id IN ({', '.join('?' * len(tipo_ids))})")
+                params.extend(tipo_ids)
+        
+        if valor_min is not None:
+            condiciones.append('f.valor_centavos >= ?')
+            params.append(_centavos(valor_min))
+        if valor_max is not None:
+            condiciones.append('f.valor_centavos <= ?')
+            params.append(_centavos(valor_max))
+        
+        if texto:
+            escapado = texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            condiciones.append("f.descripcion LIKE ? ESCAPE '\\'")
+            params.append(f"%{escapado}%")
+        
+        return condiciones, params
+    
+    def consultar_facturas(self, limite: int = 200, despues_de: Optional[Tuple[str, int]] = None,
+                           **filtros) -> Dict[str, Any]:
+        """
+        Obtiene una página de facturas filtradas, de la más reciente a la más antigua.
+        
+        La paginación es por conjunto de claves sobre (fecha, id): cada página
+        continúa donde terminó la anterior sin usar OFFSET, así que pedir la
+        página 500 cuesta lo mismo que pedir la primera.
+        
+        Args:
+            limite: Cantidad máxima de facturas por página.
+            despues_de: Cursor 'siguiente' devuelto por la página anterior (opcional).
+            **filtros: fecha_desde, fecha_hasta (date, DD/MM/YYYY o YYYY-MM-DD),
+                anio, mes, dia, tipo_ids, valor_min, valor_max y texto
+                (coincidencia parcial en la descripción).
             
-            # Convertir los resultados a una lista de diccionarios
-            facturas = []
-            for row in cursor.fetchall():
-                factura = dict(row)
-                # Convertir la fecha al formato DD/MM/YYYY
-                try:
-                    fecha = datetime.strptime(factura['fecha'], '%Y-%m-%d').strftime('%d/%m/%Y')
-                    factura['fecha'] = fecha
-                except (ValueError, KeyError):
-                    pass
-                
-                facturas.append(factura)
+        Returns:
+            Dict[str, Any]: 'facturas' con la página (fecha en DD/MM/YYYY) y
+                'siguiente' con el cursor de la próxima página, o None si no hay más.
+        """
+        condiciones, params = self._condiciones_filtro(**filtros)
+        
+        if despues_de is not None:
+            fecha_cursor, id_cursor = despues_de
+            condiciones.append('f.fecha <= ? AND (f.fecha < ? OR f.id < ?)')
+            params.extend([fecha_cursor, fecha_cursor, id_cursor])
+        
+        query = f'''
+            SELECT 
+                f.id,
+                f.fecha as fecha_db,
+                {SQL_FECHA_DD_MM_YYYY.format('f.fecha')} as fecha,
+                tg.nombre as tipo,
+                f.descripcion,
+                f.valor_centavos / 100.0 as valor,
+                tg.color
+            FROM facturas f
+            JOIN tipos_gasto tg ON f.tipo_id = tg.id
+        '''
+        if condiciones:
+            query += ' WHERE ' + ' AND '.join(condiciones)
+        query += ' ORDER BY f.fecha DESC, f.id DESC LIMIT ?'
+        params.append(limite + 1)
+        
+        with self._get_connection() as conn:
+            filas = conn.execute(query, params).fetchall()
+        
+        siguiente = None
+        if len(filas) > limite:
+            filas = filas[:limite]
+            siguiente = (filas[-1]['fecha_db'], filas[-1]['id'])
+        
+        facturas = []
+        for fila in filas:
+            factura = dict(fila)
+            del factura['fecha_db']
+            facturas.append(factura)
+        
+        return {'facturas': facturas, 'siguiente': siguiente}
+    
+    def iterar_facturas(self, tamano_pagina: int = 1000, **filtros) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre todas las facturas filtradas página por página.
+        
+        Args:
+            tamano_pagina: Cantidad de facturas por consulta.
+            **filtros: Los mismos filtros de consultar_facturas.
             
-            return facturas
+        Yields:
+            Dict[str, Any]: Cada factura, de la más reciente a la más antigua.
+        """
+        cursor = None
+        while True:
+            pagina = self.consultar_facturas(limite=tamano_pagina, despues_de=cursor, **filtros)
+            yield from pagina['facturas']
+            cursor = pagina['siguiente']
+            if cursor is None:
+                break
+    
+    def contar_facturas(self, **filtros) -> Dict[str, Any]:
+        """
+        Cuenta y suma las facturas que cumplen los filtros.
+        
+        Args:
+            **filtros: Los mismos filtros de consultar_facturas.
+            
+        Returns:
+            Dict[str, Any]: 'cantidad' y 'total'.
+        """
+        condiciones, params = self._condiciones_filtro(**filtros)
+        query = (
+            'SELECT COUNT(*) as cantidad, COALESCE(SUM(f.valor_centavos), 0) / 100.0 as total '
+            'FROM facturas f'
+        )
+        if condiciones:
+            query += ' WHERE ' + ' AND '.join(condiciones)
+        
+        with self._get_connection() as conn:
+            return dict(conn.execute(query, params).fetchone())
     
     def agregar_factura(self, fecha: str, tipo: str, descripcion: str, valor: float) -> int:
         """
@@ -266,21 +813,18 @@ class Database:
                 else:
                     tipo_id = tipo_row['id']
                 
-                # Convertir la fecha al formato YYYY-MM-DD
-                try:
-                    fecha_db = datetime.strptime(fecha, '%d/%m/%Y').strftime('%Y-%m-%d')
-                except ValueError:
-                    fecha_db = datetime.now().strftime('%Y-%m-%d')
-                
+                # Convertir la fecha al entero YYYYMMDD
+                fecha_db = _fecha_a_db(fecha) or _fecha_hoy_db()
+
                 # Insertar la factura
                 cursor.execute('''
-                    INSERT INTO facturas (fecha, tipo_id, descripcion, valor)
+                    INSERT INTO facturas (fecha, tipo_id, descripcion, valor_centavos)
                     VALUES (?, ?, ?, ?)
                 ''', (
                     fecha_db,
                     tipo_id,
                     descripcion,
-                    float(valor)
+                    _centavos(valor)
                 ))
                 
                 factura_id = cursor.lastrowid
@@ -291,6 +835,261 @@ class Database:
             logger.error(f"Error al agregar factura: {str(e)}")
             raise
     
+    def _resolver_tipos(self, cursor, nombres: Iterable[str],
+                        tipo_ids: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """
+        Obtiene los IDs de varios tipos de gasto, creando los que no existan.
+        
+        Args:
+            cursor: Cursor de la transacción en curso.
+            nombres: Nombres de los tipos de gasto.
+            tipo_ids: Mapa en memoria que se reutiliza entre bloques de una misma
+                transacción; se llena desde la tabla la primera vez y se
+                actualiza con los tipos creados.
+            
+        Returns:
+            Dict[str, int]: Mapa de nombre de tipo a ID.
+        """
+        if tipo_ids is None:
+            tipo_ids = {}
+        if not tipo_ids:
+            cursor.execute('SELECT id, nombre FROM tipos_gasto')
+            tipo_ids.update((row['nombre'], row['id']) for row in cursor.fetchall())
+        
+        faltantes = sorted(set(nombres) - tipo_ids.keys())
+        for nombre in faltantes:
+            cursor.execute('INSERT INTO tipos_gasto (nombre) VALUES (?)', (nombre,))
+            tipo_ids[nombre] = cursor.lastrowid
+        
+        return tipo_ids
+    
+    def _insertar_lote(self, cursor, facturas: List[Dict[str, Any]],
+                       tipo_ids: Optional[Dict[str, int]] = None) -> List[int]:
+        """
+        Inserta facturas con executemany dentro de la transacción en curso.
+        
+        Args:
+            cursor: Cursor de una transacción IMMEDIATE ya iniciada.
+            facturas: Diccionarios con 'fecha' (DD/MM/YYYY), 'tipo', 'descripcion' y 'valor'.
+            tipo_ids: Mapa de tipos compartido entre bloques (ver _resolver_tipos).
+            
+        Returns:
+            List[int]: IDs asignados, en el mismo orden que las facturas.
+        """
+        if not facturas:
+            return []
+        
+        tipo_ids = self._resolver_tipos(cursor, (f['tipo'] for f in facturas), tipo_ids)
+        
+        # Siguiente ID disponible respetando AUTOINCREMENT
+        cursor.execute('''
+            SELECT MAX(
+                COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'facturas'), 0),
+                COALESCE((SELECT MAX(id) FROM facturas), 0)
+            )
+        ''')
+        primer_id = cursor.fetchone()[0] + 1
+        ids = list(range(primer_id, primer_id + len(facturas)))
+        
+        hoy = _fecha_hoy_db()
+        cursor.executemany('''
+            INSERT INTO facturas (id, fecha, tipo_id, descripcion, valor_centavos)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            (
+                factura_id,
+                _fecha_a_db(factura.get('fecha')) or hoy,
+                tipo_ids[factura['tipo']],
+                factura.get('descripcion', ''),
+                _centavos(factura['valor'])
+            )
+            for factura_id, factura in zip(ids, facturas)
+        ))
+        return ids
+    
+    def _actualizar_lote(self, cursor, facturas: List[Dict[str, Any]],
+                         tipo_ids: Optional[Dict[str, int]] = None) -> int:
+        """
+        Actualiza facturas existentes con executemany dentro de la transacción en curso.
+        
+        Args:
+            cursor: Cursor de una transacción ya iniciada.
+            facturas: Diccionarios con 'id', 'fecha' (DD/MM/YYYY), 'tipo', 'descripcion' y 'valor'.
+            tipo_ids: Mapa de tipos compartido entre bloques (ver _resolver_tipos).
+            
+        Returns:
+            int: Número de filas actualizadas.
+        """
+        if not facturas:
+            return 0
+        
+        tipo_ids = self._resolver_tipos(cursor, (f['tipo'] for f in facturas), tipo_ids)
+        hoy = _fecha_hoy_db()
+        cursor.executemany('''
+            UPDATE facturas
+            SET fecha = ?,
+                tipo_id = ?,
+                descripcion = ?,
+                valor_centavos = ?,
+                fecha_actualizacion = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (
+            (
+                _fecha_a_db(factura.get('fecha')) or hoy,
+                tipo_ids[factura['tipo']],
+                factura.get('descripcion', ''),
+                _centavos(factura['valor']),
+                factura['id']
+            )
+            for factura in facturas
+        ))
+        return cursor.rowcount
+    
+    def agregar_facturas_lote(self, facturas: Iterable[Dict[str, Any]]) -> List[int]:
+        """
+        Agrega varias facturas en una sola transacción.
+        
+        Los tipos de gasto se resuelven en una sola pasada y las filas se insertan
+        con executemany. Los IDs se asignan de forma explícita dentro de una
+        transacción IMMEDIATE para poder devolverlos en orden.
+        
+        Args:
+            facturas: Diccionarios con las claves 'fecha' (DD/MM/YYYY), 'tipo',
+                'descripcion' y 'valor'.
+            
+        Returns:
+            List[int]: IDs asignados, en el mismo orden que las facturas recibidas.
+        """
+        facturas = list(facturas)
+        if not facturas:
+            return []
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                if not conn.in_transaction:
+                    cursor.execute('BEGIN IMMEDIATE')
+                ids = self._insertar_lote(cursor, facturas)
+                conn.commit()
+                logger.info(f"Se agregaron {len(ids)} facturas en lote")
+                return ids
+                
+        except Exception as e:
+            logger.error(f"Error al agregar facturas en lote: {str(e)}")
+            raise
+    
+    def insertar_bloques(self, bloques: Iterable[List[Dict[str, Any]]], reemplazar: bool = False) -> int:
+        """
+        Inserta facturas que llegan por bloques, en una sola transacción.
+        
+        Pensado para importaciones: los bloques se consumen a medida que se
+        generan, así que nunca hay más de uno en memoria. Si el generador lanza
+        una excepción (por ejemplo, al cancelar), no queda nada insertado.
+        
+        Args:
+            bloques: Iterable de listas de facturas con 'fecha' (DD/MM/YYYY),
+                'tipo', 'descripcion' y 'valor'.
+            reemplazar: Si es True, elimina antes todas las facturas existentes.
+            
+        Returns:
+            int: Número de facturas insertadas.
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                if not conn.in_transaction:
+                    cursor.execute('BEGIN IMMEDIATE')
+                if reemplazar:
+                    cursor.execute('DELETE FROM facturas')
+                
+                # Los tipos se leen una vez y se resuelven en memoria en cada bloque
+                tipo_ids: Dict[str, int] = {}
+                insertadas = 0
+                for bloque in bloques:
+                    insertadas += len(self._insertar_lote(cursor, bloque, tipo_ids))
+                
+                conn.commit()
+                logger.info(f"Se insertaron {insertadas} facturas por bloques")
+                return insertadas
+                
+        except Exception as e:
+            logger.error(f"Error al insertar facturas por bloques: {str(e)}")
+            raise
+    
+    def aplicar_cambios(self, nuevas: Iterable[Dict[str, Any]] = (),
+                        modificadas: Iterable[Dict[str, Any]] = (),
+                        eliminadas: Iterable[int] = (),
+                        progreso: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Aplica altas, modificaciones y bajas de facturas en una sola transacción.
+        
+        Las filas se escriben en bloques de TAMANO_BLOQUE_ESCRITURA; la transacción
+        sigue siendo una sola, así que un error no deja cambios a medias.
+        
+        Args:
+            nuevas: Facturas a insertar (sin 'id').
+            modificadas: Facturas existentes a actualizar (con 'id').
+            eliminadas: IDs de las facturas a eliminar.
+            progreso: Función opcional que recibe (filas escritas, total) tras cada bloque.
+            
+        Returns:
+            Dict[str, Any]: 'ids' asignados a las nuevas (en orden) y el número de
+            filas 'insertadas', 'actualizadas' y 'eliminadas'.
+        """
+        nuevas = list(nuevas)
+        modificadas = list(modificadas)
+        eliminadas = list(eliminadas)
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                if not conn.in_transaction:
+                    cursor.execute('BEGIN IMMEDIATE')
+                
+                total = len(eliminadas) + len(modificadas) + len(nuevas)
+                escritas = 0
+                tipo_ids: Dict[str, int] = {}
+                
+                filas_eliminadas = 0
+                for inicio in range(0, len(eliminadas), TAMANO_BLOQUE_ESCRITURA):
+                    bloque = eliminadas[inicio:inicio + TAMANO_BLOQUE_ESCRITURA]
+                    cursor.executemany(
+                        'DELETE FROM facturas WHERE id = ?',
+                        ((factura_id,) for factura_id in bloque)
+                    )
+                    filas_eliminadas += cursor.rowcount
+                    escritas += len(bloque)
+                    if progreso:
+                        progreso(escritas, total)
+                
+                filas_actualizadas = 0
+                for inicio in range(0, len(modificadas), TAMANO_BLOQUE_ESCRITURA):
+                    bloque = modificadas[inicio:inicio + TAMANO_BLOQUE_ESCRITURA]
+                    filas_actualizadas += self._actualizar_lote(cursor, bloque, tipo_ids)
+                    escritas += len(bloque)
+                    if progreso:
+                        progreso(escritas, total)
+                
+                ids = []
+                for inicio in range(0, len(nuevas), TAMANO_BLOQUE_ESCRITURA):
+                    bloque = nuevas[inicio:inicio + TAMANO_BLOQUE_ESCRITURA]
+                    ids.extend(self._insertar_lote(cursor, bloque, tipo_ids))
+                    escritas += len(bloque)
+                    if progreso:
+                        progreso(escritas, total)
+                
+                conn.commit()
+                return {
+                    'ids': ids,
+                    'insertadas': len(ids),
+                    'actualizadas': filas_actualizadas,
+                    'eliminadas': filas_eliminadas,
+                }
+                
+        except Exception as e:
+            logger.error(f"Error al aplicar cambios: {str(e)}")
+            raise
+    
     def actualizar_factura(self, factura_id: int, fecha: str, tipo: str, descripcion: str, valor: float) -> bool:
         """
         Actualiza una factura existente.
@@ -325,26 +1124,23 @@ class Database:
                 else:
                     tipo_id = tipo_row['id']
                 
-                # Convertir la fecha al formato YYYY-MM-DD
-                try:
-                    fecha_db = datetime.strptime(fecha, '%d/%m/%Y').strftime('%Y-%m-%d')
-                except ValueError:
-                    fecha_db = datetime.now().strftime('%Y-%m-%d')
-                
+                # Convertir la fecha al entero YYYYMMDD
+                fecha_db = _fecha_a_db(fecha) or _fecha_hoy_db()
+
                 # Actualizar la factura
                 cursor.execute('''
                     UPDATE facturas
                     SET fecha = ?,
                         tipo_id = ?,
                         descripcion = ?,
-                        valor = ?,
+                        valor_centavos = ?,
                         fecha_actualizacion = CURRENT_TIMESTAMP
                     WHERE id = ?
                 ''', (
                     fecha_db,
                     tipo_id,
                     descripcion,
-                    float(valor),
+                    _centavos(valor),
                     factura_id
                 ))
                 
@@ -409,7 +1205,7 @@ class Database:
                 tg.nombre as tipo,
                 tg.color,
                 COUNT(f.id) as cantidad,
-                SUM(f.valor) as total
+                SUM(f.valor_centavos) / 100.0 as total
             FROM tipos_gasto tg
             LEFT JOIN facturas f ON tg.id = f.tipo_id
         '''
@@ -419,7 +1215,7 @@ class Database:
         
         if fecha_inicio and fecha_fin:
             where_clause.append('f.fecha BETWEEN ? AND ?')
-            params.extend([fecha_inicio, fecha_fin])
+            params.extend([self._fecha_filtro(fecha_inicio), self._fecha_filtro(fecha_fin)])
         
         if where_clause:
             query += ' WHERE ' + ' AND '.join(where_clause)
@@ -435,6 +1231,9 @@ class Database:
         """
         Obtiene un resumen de gastos por mes.
         
+        El año se filtra con un rango semiabierto sobre la fecha, así que
+        SQLite recorre con idx_facturas_fecha solo las facturas de ese año.
+        
         Args:
             anio: Año para el resumen (opcional, si no se especifica usa el año actual).
             
@@ -446,20 +1245,221 @@ class Database:
         
         query = '''
             SELECT 
-                strftime('%Y-%m', f.fecha) as mes,
-                SUM(f.valor) as total
+                printf('%04d-%02d', f.fecha / 10000, f.fecha / 100 % 100) as mes,
+                SUM(f.valor_centavos) / 100.0 as total
             FROM facturas f
-            WHERE strftime('%Y', f.fecha) = ?
-            GROUP BY strftime('%Y-%m', f.fecha)
+            WHERE f.fecha >= ? AND f.fecha < ?
+            GROUP BY f.fecha / 100
             ORDER BY mes
         '''
         
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(query, (str(anio),))
+            cursor.execute(query, (anio * 10000, (anio + 1) * 10000))
             return [dict(row) for row in cursor.fetchall()]
 
 
+class UnitOfWork:
+    """
+    Registra las altas, modificaciones y bajas de facturas a medida que ocurren
+    y las confirma juntas en una sola transacción.
+    
+    Las facturas se registran por referencia: al confirmar se guarda su estado
+    actual y las facturas nuevas reciben su 'id'.
+    
+    Para confirmar en otro hilo, tomar_pendientes() extrae una copia de los
+    cambios en el hilo que los registra, confirmar_lote() la escribe en el hilo
+    de trabajo y finalizar_lote() asigna los IDs de vuelta en el hilo original.
+    Mientras un lote está en curso se pueden seguir registrando cambios.
+    """
+    
+    def __init__(self, db: Database):
+        self.db = db
+        self._nuevas: Dict[int, Dict[str, Any]] = {}
+        self._modificadas: Dict[int, Dict[str, Any]] = {}
+        self._eliminadas: set = set()
+        # Facturas nuevas que se están insertando en otro hilo y cambios que
+        # llegaron para ellas antes de que recibieran su 'id'
+        self._en_curso: Dict[int, Dict[str, Any]] = {}
+        self._diferidas: Dict[int, Tuple[str, Dict[str, Any]]] = {}
+        self.ultima_confirmacion: Dict[str, Any] = {}
+    
+    @property
+    def hay_cambios(self) -> bool:
+        """Indica si hay cambios pendientes de confirmar."""
+        return bool(self._nuevas or self._modificadas or self._eliminadas)
+    
+    def pendientes(self) -> Dict[str, int]:
+        """
+        Obtiene el número de cambios pendientes por tipo.
+        
+        Returns:
+            Dict[str, int]: Cantidad de altas, modificaciones y bajas pendientes.
+        """
+        return {
+            'nuevas': len(self._nuevas),
+            'modificadas': len(self._modificadas),
+            'eliminadas': len(self._eliminadas),
+        }
+    
+    def registrar_nueva(self, factura: Dict[str, Any]):
+        """Registra una factura que aún no existe en la base de datos."""
+        self._nuevas[id(factura)] = factura
+    
+    def registrar_nuevas(self, facturas: Iterable[Dict[str, Any]]):
+        """Registra varias facturas nuevas."""
+        for factura in facturas:
+            self._nuevas[id(factura)] = factura
+    
+    def registrar_modificada(self, factura: Dict[str, Any]):
+        """Registra una factura cuyos datos cambiaron."""
+        if id(factura) in self._nuevas:
+            return  # Se insertará con sus datos actuales
+        if id(factura) in self._en_curso:
+            self._diferidas.setdefault(id(factura), ('modificada', factura))
+            return
+        factura_id = factura.get('id')
+        if factura_id is None or factura_id in self._eliminadas:
+            return
+        self._modificadas[factura_id] = factura
+    
+    def registrar_eliminada(self, factura: Dict[str, Any]):
+        """Registra una factura que debe eliminarse."""
+        if self._nuevas.pop(id(factura), None) is not None:
+            return  # Nunca llegó a la base de datos
+        if id(factura) in self._en_curso:
+            self._diferidas[id(factura)] = ('eliminada', factura)
+            return
+        factura_id = factura.get('id')
+        if factura_id is None:
+            return
+        self._modificadas.pop(factura_id, None)
+        self._eliminadas.add(factura_id)
+    
+    def registrar_eliminadas(self, facturas: Iterable[Dict[str, Any]]):
+        """Registra varias facturas que deben eliminarse."""
+        for factura in facturas:
+            self.registrar_eliminada(factura)
+    
+    def descartar(self):
+        """Descarta todos los cambios pendientes."""
+        self._nuevas.clear()
+        self._modificadas.clear()
+        self._eliminadas.clear()
+    
+    def tomar_pendientes(self) -> Dict[str, Any]:
+        """
+        Extrae los cambios pendientes para confirmarlos en otro hilo.
+        
+        Los datos se copian en este momento, así que las ediciones posteriores
+        no afectan al lote y quedan registradas para la siguiente confirmación.
+        
+        Returns:
+            Dict[str, Any]: Lote para confirmar_lote() y finalizar_lote().
+        """
+        lote = {
+            'nuevas': list(self._nuevas.values()),
+            'modificadas': list(self._modificadas.values()),
+            'eliminadas': list(self._eliminadas),
+        }
+        lote['datos_nuevas'] = [dict(factura) for factura in lote['nuevas']]
+        lote['datos_modificadas'] = [dict(factura) for factura in lote['modificadas']]
+        self._en_curso.update(self._nuevas)
+        self._nuevas.clear()
+        self._modificadas.clear()
+        self._eliminadas.clear()
+        return lote
+    
+    def confirmar_lote(self, lote: Dict[str, Any],
+                       progreso: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Escribe en una sola transacción un lote extraído con tomar_pendientes().
+        
+        Solo lee la copia del lote, por lo que puede ejecutarse en otro hilo.
+        
+        Args:
+            lote: Lote devuelto por tomar_pendientes().
+            progreso: Función opcional que recibe (filas escritas, total).
+            
+        Returns:
+            Dict[str, Any]: Resultado de Database.aplicar_cambios() más 'duracion_ms'.
+        """
+        inicio = time.perf_counter()
+        if lote['datos_nuevas'] or lote['datos_modificadas'] or lote['eliminadas']:
+            resultado = self.db.aplicar_cambios(
+                nuevas=lote['datos_nuevas'],
+                modificadas=lote['datos_modificadas'],
+                eliminadas=lote['eliminadas'],
+                progreso=progreso
+            )
+        else:
+            resultado = {'ids': [], 'insertadas': 0, 'actualizadas': 0, 'eliminadas': 0}
+        resultado['duracion_ms'] = (time.perf_counter() - inicio) * 1000
+        return resultado
+    
+    def finalizar_lote(self, lote: Dict[str, Any], resultado: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Cierra un lote en el hilo que registra los cambios.
+        
+        Si el lote se guardó, asigna los IDs a las facturas nuevas; si falló
+        (resultado None), sus cambios vuelven a quedar pendientes. En ambos casos
+        se registran los cambios que llegaron mientras el lote estaba en curso.
+        
+        Args:
+            lote: Lote devuelto por tomar_pendientes().
+            resultado: Resultado de confirmar_lote(), o None si falló.
+            
+        Returns:
+            Dict[str, Any]: Estadísticas de la confirmación (vacías si falló).
+        """
+        for factura in lote['nuevas']:
+            self._en_curso.pop(id(factura), None)
+        
+        if resultado is None:
+            self.registrar_nuevas(lote['nuevas'])
+            for factura in lote['modificadas']:
+                self.registrar_modificada(factura)
+            self._eliminadas.update(lote['eliminadas'])
+        else:
+            for factura, factura_id in zip(lote['nuevas'], resultado['ids']):
+                factura['id'] = factura_id
+        
+        for clave in [clave for clave in self._diferidas if clave not in self._en_curso]:
+            accion, factura = self._diferidas.pop(clave)
+            if accion == 'eliminada':
+                self.registrar_eliminada(factura)
+            else:
+                self.registrar_modificada(factura)
+        
+        if resultado is None:
+            return {}
+        
+        self.ultima_confirmacion = {
+            'insertadas': resultado['insertadas'],
+            'actualizadas': resultado['actualizadas'],
+            'eliminadas': resultado['eliminadas'],
+            'duracion_ms': resultado['duracion_ms'],
+        }
+        logger.info(f"Cambios confirmados: {self.ultima_confirmacion}")
+        return self.ultima_confirmacion
+    
+    def confirmar(self) -> Dict[str, Any]:
+        """
+        Confirma los cambios pendientes en una sola transacción.
+        
+        Returns:
+            Dict[str, Any]: Filas 'insertadas', 'actualizadas' y 'eliminadas' y
+            la duración de la confirmación en milisegundos ('duracion_ms').
+        """
+        lote = self.tomar_pendientes()
+        try:
+            resultado = self.confirmar_lote(lote)
+        except Exception:
+            self.finalizar_lote(lote, None)
+            raise
+        return self.finalizar_lote(lote, resultado)
+
+
 def migrar_datos_desde_json(json_path: str, db_path: str = 'facturas.db') -> int:
     """
     Función de conveniencia para migrar datos desde un archivo JSON a SQLite.
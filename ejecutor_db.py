@@ -0,0 +1,256 @@
+"""
+Ejecución de operaciones de la base de datos fuera del hilo de la interfaz.
+
+Las lecturas se reparten en un QThreadPool de varios hilos; cada hilo usa su
+propia conexión persistente (ConnectionManager) y, con journal_mode=WAL, las
+lecturas no se bloquean entre sí ni con la escritura en curso. Las escrituras
+van a un pool de un solo hilo, así que se aplican una a una y en el orden en
+que se enviaron. Las tareas que no usan la base de datos (por ejemplo, una
+exportación) van a un tercer pool, para no ocupar los hilos de la base de
+datos. Los resultados, errores y el progreso llegan por señales al hilo de la
+interfaz.
+"""
+import logging
+from typing import Any, Callable, Optional
+
+from PyQt6.QtCore import QCoreApplication, QEvent, QObject, QRunnable, QThreadPool, pyqtSignal
+
+from database import Database
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Hilos de lectura simultáneos
+MAX_HILOS_LECTURA = 4
+
+# Tareas simultáneas que no usan la base de datos
+MAX_HILOS_TAREAS = 2
+
+
+class _SenalesTarea(QObject):
+    """Señales de una tarea; QRunnable no es un QObject y no puede emitirlas."""
+    terminada = pyqtSignal(object, object)
+    fallida = pyqtSignal(object, object)
+    progreso = pyqtSignal(object, int, int)
+
+
+class TareaDB(QRunnable):
+    """
+    Ejecuta una función de la base de datos en un hilo del pool.
+    
+    Si la tarea se creó con progreso, la función recibe el argumento
+    'progreso', una función (hechas, total) que emite la señal del mismo nombre.
+    """
+    
+    def __init__(self, funcion: Callable, args: tuple, kwargs: dict,
+                 mensaje: str = "", escritura: bool = False, con_progreso: bool = False,
+                 al_terminar: Optional[Callable[[Any], None]] = None,
+                 al_fallar: Optional[Callable[[Exception], None]] = None,
+                 al_progreso: Optional[Callable[[int, int], None]] = None):
+        super().__init__()
+        # La tarea la libera Python cuando el ejecutor suelta su referencia
+        self.setAutoDelete(False)
+        self.funcion = funcion
+        self.args = args
+        self.kwargs = kwargs
+        self.mensaje = mensaje
+        self.escritura = escritura
+        self.con_progreso = con_progreso
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self.al_progreso = al_progreso
+        self.senales = _SenalesTarea()
+    
+    def run(self):
+        """Ejecuta la función y emite el resultado o el error."""
+        try:
+            if self.con_progreso:
+                self.kwargs['progreso'] = lambda hechas, total: self.senales.progreso.emit(self, hechas, total)
+            resultado = self.funcion(*self.args, **self.kwargs)
+        except Exception as e:
+            logger.error(f"Error en la tarea de base de datos '{self.mensaje}': {str(e)}", exc_info=True)
+            self.senales.fallida.emit(self, e)
+        else:
+            self.senales.terminada.emit(self, resultado)
+
+
+class EjecutorDB(QObject):
+    """
+    Cola de operaciones de la base de datos para la interfaz.
+    
+    Una lectura enviada mientras hay escrituras pendientes se encola detrás de
+    ellas, para que vea sus cambios. Con una base de datos en memoria (una sola
+    conexión compartida) todas las tareas pasan por la cola de escritura.
+    
+    Señales:
+        actividad(str, int, int): Mensaje de la tarea activa y su progreso
+            (hechas, total); total 0 indica progreso indeterminado.
+        inactivo(): No quedan tareas pendientes.
+    """
+    actividad = pyqtSignal(str, int, int)
+    inactivo = pyqtSignal()
+    
+    def __init__(self, db: Database, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.db = db
+        
+        # Los hilos no expiran: cada uno conserva su conexión hasta Database.cerrar()
+        self._pool_lectura = QThreadPool(self)
+        self._pool_lectura.setMaxThreadCount(1 if db.en_memoria else MAX_HILOS_LECTURA)
+        self._pool_lectura.setExpiryTimeout(-1)
+        self._pool_escritura = QThreadPool(self)
+        self._pool_escritura.setMaxThreadCount(1)
+        self._pool_escritura.setExpiryTimeout(-1)
+        self._pool_tareas = QThreadPool(self)
+        self._pool_tareas.setMaxThreadCount(MAX_HILOS_TAREAS)
+        
+        self._pendientes = set()
+        self._escrituras_pendientes = 0
+    
+    @property
+    def ocupado(self) -> bool:
+        """Indica si hay tareas en cola o en ejecución."""
+        return bool(self._pendientes)
+    
+    @property
+    def escrituras_pendientes(self) -> int:
+        """Número de escrituras enviadas que aún no terminan."""
+        return self._escrituras_pendientes
+    
+    def leer(self, funcion: Callable, *args,
+             al_terminar: Optional[Callable[[Any], None]] = None,
+             al_fallar: Optional[Callable[[Exception], None]] = None,
+             mensaje: str = "Consultando la base de datos...",
+             con_progreso: bool = False,
+             al_progreso: Optional[Callable[[int, int], None]] = None, **kwargs) -> TareaDB:
+        """
+        Ejecuta una consulta en un hilo de lectura.
+        
+        Args:
+            funcion: Función a ejecutar (normalmente un método de Database).
+            *args, **kwargs: Argumentos de la función.
+            al_terminar: Recibe el resultado en el hilo de la interfaz.
+            al_fallar: Recibe la excepción en el hilo de la interfaz.
+            mensaje: Texto para la barra de estado mientras se ejecuta.
+            con_progreso: Pasa a la función el argumento 'progreso'.
+            al_progreso: Recibe (hechas, total) en el hilo de la interfaz;
+                implica con_progreso.
+        
+        Returns:
+            TareaDB: La tarea enviada.
+        """
+        tarea = TareaDB(funcion, args, kwargs, mensaje, False, con_progreso or al_progreso is not None,
+                        al_terminar, al_fallar, al_progreso)
+        en_cola_escritura = self._escrituras_pendientes > 0 or self.db.en_memoria
+        return self._enviar(tarea, self._pool_escritura if en_cola_escritura else self._pool_lectura)
+    
+    def escribir(self, funcion: Callable, *args,
+                 al_terminar: Optional[Callable[[Any], None]] = None,
+                 al_fallar: Optional[Callable[[Exception], None]] = None,
+                 mensaje: str = "Guardando cambios...",
+                 con_progreso: bool = False,
+                 al_progreso: Optional[Callable[[int, int], None]] = None, **kwargs) -> TareaDB:
+        """
+        Encola una escritura; las escrituras se ejecutan una a una y en orden.
+        
+        Los argumentos son los mismos que en leer().
+        
+        Returns:
+            TareaDB: La tarea enviada.
+        """
+        tarea = TareaDB(funcion, args, kwargs, mensaje, True, con_progreso or al_progreso is not None,
+                        al_terminar, al_fallar, al_progreso)
+        self._escrituras_pendientes += 1
+        return self._enviar(tarea, self._pool_escritura)
+    
+    def ejecutar(self, funcion: Callable, *args,
+                 al_terminar: Optional[Callable[[Any], None]] = None,
+                 al_fallar: Optional[Callable[[Exception], None]] = None,
+                 mensaje: str = "Procesando...",
+                 con_progreso: bool = False,
+                 al_progreso: Optional[Callable[[int, int], None]] = None, **kwargs) -> TareaDB:
+        """
+        Ejecuta en segundo plano una función que no usa la base de datos.
+        
+        Los argumentos son los mismos que en leer(). La función no debe tocar
+        la base de datos ni objetos que la interfaz siga modificando; debe
+        recibir una copia de los datos que necesita.
+        
+        Returns:
+            TareaDB: La tarea enviada.
+        """
+        tarea = TareaDB(funcion, args, kwargs, mensaje, False, con_progreso or al_progreso is not None,
+                        al_terminar, al_fallar, al_progreso)
+        return self._enviar(tarea, self._pool_tareas)
+    
+    def _enviar(self, tarea: TareaDB, pool: QThreadPool) -> TareaDB:
+        """Conecta las señales de la tarea y la envía al pool."""
+        # El ejecutor vive en el hilo de la interfaz, así que las señales
+        # emitidas desde el pool se entregan en cola en ese hilo
+        tarea.senales.progreso.connect(self._progreso)
+        tarea.senales.terminada.connect(self._terminada)
+        tarea.senales.fallida.connect(self._fallida)
+        
+        # Se conserva una referencia hasta que termina para que Python no la libere
+        self._pendientes.add(tarea)
+        self.actividad.emit(tarea.mensaje, 0, 0)
+        pool.start(tarea)
+        return tarea
+    
+    def _progreso(self, tarea: TareaDB, hechas: int, total: int):
+        """Reenvía el progreso de una tarea."""
+        self.actividad.emit(tarea.mensaje, hechas, total)
+        if tarea.al_progreso is not None:
+            tarea.al_progreso(hechas, total)
+    
+    def _terminada(self, tarea: TareaDB, resultado: Any):
+        """Entrega el resultado de una tarea."""
+        self._finalizar(tarea, tarea.al_terminar, resultado)
+    
+    def _fallida(self, tarea: TareaDB, error: Exception):
+        """Entrega el error de una tarea."""
+        self._finalizar(tarea, tarea.al_fallar, error)
+    
+    def _finalizar(self, tarea: TareaDB, callback: Optional[Callable], valor: Any):
+        """Entrega el resultado o el error de una tarea en el hilo de la interfaz."""
+        self._pendientes.discard(tarea)
+        if tarea.escritura:
+            self._escrituras_pendientes -= 1
+        try:
+            if callback is not None:
+                callback(valor)
+        finally:
+            if not self._pendientes:
+                self.inactivo.emit()
+    
+    def esperar(self, milisegundos: int = -1) -> bool:
+        """
+        Espera a que terminen las tareas en curso y entrega sus resultados.
+        
+        Los resultados llegan por señales en cola, que solo se entregan cuando el
+        hilo de la interfaz procesa sus eventos. Después de esperar a los pools
+        se entregan esos eventos, así que al volver ya se ejecutaron los
+        al_terminar/al_fallar de las tareas (por ejemplo, el finalizar_lote() de
+        la última escritura). Si un callback envía tareas nuevas, también se
+        esperan.
+        
+        Args:
+            milisegundos: Tiempo máximo de espera de cada pool; -1 espera sin límite.
+        
+        Returns:
+            bool: True si todas las tareas terminaron y se entregaron sus resultados.
+        """
+        while self._pendientes:
+            escritura = self._pool_escritura.waitForDone(milisegundos)
+            lectura = self._pool_lectura.waitForDone(milisegundos)
+            tareas = self._pool_tareas.waitForDone(milisegundos)
+            if not (escritura and lectura and tareas):
+                return False
+            
+            antes = set(self._pendientes)
+            QCoreApplication.sendPostedEvents(None, QEvent.Type.MetaCall.value)
+            if antes <= self._pendientes:
+                # Ninguna tarea entregó su resultado; no tiene sentido seguir esperando
+                logger.warning(f"Quedan {len(self._pendientes)} tarea(s) sin entregar su resultado")
+                return False
+        return True
@@ -0,0 +1,698 @@
+"""
+Exportación de facturas a Excel por flujo.
+
+Las hojas se crean en el modo de solo escritura de openpyxl: cada fila se
+escribe una sola vez, en orden, y no queda en memoria. Una única pasada sobre
+las facturas las agrupa por mes y por tipo, suma los totales y lleva la
+longitud máxima de cada columna de cada hoja. Una hoja de solo escritura fija
+los anchos de columna antes de su primera fila, por eso esa pasada va antes
+de escribir.
+
+Las exportaciones pueden ejecutarse en segundo plano sobre una copia de las
+facturas (instantanea_facturas): informan el avance, se pueden cancelar y
+escriben el libro en un archivo temporal que reemplaza al destino solo al
+terminar, así que una exportación cancelada o fallida no deja un libro dañado.
+"""
+import logging
+import os
+import tempfile
+import time
+import warnings
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from database import FILAS_ENTRE_REVISIONES, INTERVALO_PROGRESO
+from analitica import ColumnasFacturas
+from indices import partes_fecha, TotalesCalendario
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+ENCABEZADOS_DETALLE = ["Fecha", "Tipo", "Descripción", "Valor (COP)"]
+ENCABEZADOS_RESUMEN_TIPO = ["Tipo de Gasto", "Total (COP)", "Porcentaje"]
+ENCABEZADOS_RESUMEN_MENSUAL = ["Mes", "Año", "Total (COP)"]
+FORMATO_MONEDA = '#,##0.00" COP"'
+FORMATO_PORCENTAJE = '0.00%'
+COLOR_ENCABEZADO = "4F81BD"
+MESES = [
+    "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+    "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
+]
+
+# Ancho máximo de columna y ancho mínimo de la columna de valor de las hojas mensuales
+ANCHO_MAXIMO = 50
+ANCHO_MINIMO_VALOR = 15
+
+
+class ExportacionCancelada(Exception):
+    """El usuario canceló la exportación; el archivo de destino no se modificó."""
+
+
+class AvanceExportacion:
+    """
+    Avance de una exportación: filas y hojas escritas y bytes del archivo.
+    
+    Lo actualiza el hilo que exporta y lo lee la interfaz al recibir el
+    progreso; cada campo es un entero que se reemplaza completo.
+    """
+    __slots__ = ('filas', 'total_filas', 'hojas', 'total_hojas', 'bytes')
+    
+    def __init__(self):
+        self.filas = 0
+        self.total_filas = 0
+        self.hojas = 0
+        self.total_hojas = 0
+        self.bytes = 0
+    
+    def texto(self) -> str:
+        """Descripción del avance para mostrar al usuario."""
+        partes = [
+            f"Filas: {self.filas:,} de {self.total_filas:,}",
+            f"Hojas: {self.hojas} de {self.total_hojas}"
+        ]
+        if self.bytes:
+            partes.append(f"{self.bytes / (1024 * 1024):.1f} MB escritos")
+        return " · ".join(partes)
+
+
+class _Seguimiento:
+    """Cuenta lo escrito, revisa la cancelación y limita la frecuencia del progreso."""
+    
+    def __init__(self, avance: Optional[AvanceExportacion], total_filas: int, total_hojas: int,
+                 progreso: Optional[Callable[[int, int], None]],
+                 cancelado: Optional[Callable[[], bool]]):
+        self.avance = avance if avance is not None else AvanceExportacion()
+        self.avance.total_filas = total_filas
+        self.avance.total_hojas = total_hojas
+        self._progreso = progreso
+        self._cancelado = cancelado
+        self._ultimo_reporte = 0.0
+    
+    def revisar(self, forzar: bool = False):
+        """Lanza ExportacionCancelada si se pidió cancelar e informa el progreso."""
+        if self._cancelado and self._cancelado():
+            raise ExportacionCancelada("Exportación cancelada por el usuario")
+        self.informar(forzar)
+    
+    def informar(self, forzar: bool = False):
+        """Informa el progreso si pasó INTERVALO_PROGRESO desde el último reporte."""
+        if self._progreso:
+            ahora = time.monotonic()
+            if forzar or ahora - self._ultimo_reporte >= INTERVALO_PROGRESO:
+                self._ultimo_reporte = ahora
+                self._progreso(self.avance.filas, self.avance.total_filas)
+    
+    def fila(self):
+        """Registra una fila de facturas escrita."""
+        self.avance.filas += 1
+        if self.avance.filas % FILAS_ENTRE_REVISIONES == 0:
+            self.revisar()
+    
+    def hoja(self):
+        """Registra una hoja terminada."""
+        self.avance.hojas += 1
+        self.revisar(forzar=True)
+    
+    def bytes_escritos(self, posicion: int):
+        """
+        Registra la posición alcanzada en el archivo de destino.
+        
+        No revisa la cancelación: interrumpir ZipFile a mitad de una entrada
+        lo deja abierto; se revisa al terminar de guardar, antes de renombrar.
+        """
+        if posicion > self.avance.bytes:
+            self.avance.bytes = posicion
+        self.informar()
+
+
+class _ArchivoConAvance:
+    """
+    Archivo binario que avisa la posición tras cada escritura; lo demás lo delega.
+    
+    Se informa la posición y no los bytes escritos porque ZipFile vuelve atrás
+    para reescribir los encabezados de cada entrada.
+    """
+    
+    def __init__(self, archivo, al_escribir: Callable[[int], None]):
+        self._archivo = archivo
+        self._al_escribir = al_escribir
+    
+    def write(self, datos) -> int:
+        escritos = self._archivo.write(datos)
+        self._al_escribir(self._archivo.tell())
+        return escritos
+    
+    def __getattr__(self, nombre):
+        return getattr(self._archivo, nombre)
+
+
+def _guardar_atomico(wb, ruta: str, seguimiento: _Seguimiento):
+    """
+    Guarda el libro en un temporal del mismo directorio y lo renombra al destino.
+    
+    os.replace es atómico dentro de un mismo sistema de archivos: el destino
+    queda con el libro anterior o con el nuevo completo, nunca a medias.
+    """
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    descriptor, temporal = tempfile.mkstemp(prefix=f".{os.path.basename(ruta)}.", suffix='.tmp',
+                                            dir=directorio)
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            wb.save(_ArchivoConAvance(archivo, seguimiento.bytes_escritos))
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        seguimiento.revisar(forzar=True)
+        os.replace(temporal, ruta)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+
+
+def _descartar_libro(wb):
+    """
+    Cierra un libro de solo escritura que no se guardó.
+    
+    openpyxl escribe cada hoja en un archivo temporal a medida que se agregan
+    filas; close() de cada hoja lo termina y lo cierra, y openpyxl borra esos
+    temporales al salir. El destino no se tocó: _guardar_atomico escribe en su
+    propio temporal y lo borra si falla.
+    """
+    for ws in wb.worksheets:
+        if ws.closed:
+            continue
+        try:
+            ws.close()
+        except (OSError, ValueError) as e:
+            logger.debug(f"No se pudo cerrar la hoja '{ws.title}': {str(e)}")
+    wb.close()
+
+
+def instantanea_facturas(facturas: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Copia los campos que se exportan de cada factura.
+    
+    Se toma en el hilo de la interfaz antes de exportar en segundo plano, para
+    que las ediciones posteriores no cambien un libro a medio escribir. Un
+    valor que no es numérico se exporta como 0.
+    
+    Args:
+        facturas: Facturas a exportar
+    
+    Returns:
+        List[Dict[str, Any]]: Copias con fecha, tipo, descripcion y valor
+    """
+    copia = []
+    for factura in facturas:
+        try:
+            valor = float(factura.get('valor', 0))
+        except (ValueError, TypeError):
+            valor = 0.0
+        copia.append({
+            'fecha': factura.get('fecha', ''),
+            'tipo': factura.get('tipo', ''),
+            'descripcion': factura.get('descripcion', ''),
+            'valor': valor
+        })
+    return copia
+
+
+def _texto_moneda(valor: float) -> str:
+    """Texto con el que Excel muestra un valor en FORMATO_MONEDA."""
+    return f"{valor:,.2f} COP"
+
+
+class AnchosColumnas:
+    """Longitud máxima de cada columna, actualizada fila a fila."""
+    __slots__ = ('maximos',)
+    
+    def __init__(self, encabezados: List[str]):
+        self.maximos = [len(encabezado) for encabezado in encabezados]
+    
+    def medir(self, *longitudes: int):
+        """Actualiza los máximos con las longitudes de una fila."""
+        maximos = self.maximos
+        for i, longitud in enumerate(longitudes):
+            if longitud > maximos[i]:
+                maximos[i] = longitud
+    
+    def anchos(self, minimos: Optional[List[int]] = None) -> List[float]:
+        """
+        Calcula el ancho de cada columna con margen para el borde y el filtro.
+        
+        Args:
+            minimos: Longitud mínima de cada columna
+        
+        Returns:
+            List[float]: Ancho de cada columna, sin pasar de ANCHO_MAXIMO
+        """
+        if minimos:
+            maximos = [max(longitud, minimo) for longitud, minimo in zip(self.maximos, minimos)]
+        else:
+            maximos = self.maximos
+        return [min((longitud + 4) * 1.1, ANCHO_MAXIMO) for longitud in maximos]
+
+
+class _GrupoMes:
+    """Facturas de un mes con su total y los anchos de su hoja."""
+    __slots__ = ('anio', 'mes', 'facturas', 'centavos', 'anchos')
+    
+    def __init__(self, anio: int, mes: int):
+        self.anio = anio
+        self.mes = mes
+        self.facturas: List[Dict[str, Any]] = []
+        self.centavos = 0
+        self.anchos = AnchosColumnas(ENCABEZADOS_DETALLE)
+
+
+class AgrupacionFacturas:
+    """
+    Resultado de la pasada única sobre las facturas.
+    
+    Los totales se suman en centavos, como en la base de datos, para que no
+    acumulen error de punto flotante.
+    """
+    
+    def __init__(self, facturas: Iterable[Dict[str, Any]]):
+        self.facturas: List[Dict[str, Any]] = []
+        self.anchos_detalle = AnchosColumnas(ENCABEZADOS_DETALLE)
+        self.meses: Dict[Tuple[int, int], _GrupoMes] = {}
+        self.centavos_por_tipo: Dict[str, int] = {}
+        self.centavos_total = 0
+        
+        meses = self.meses
+        por_tipo = self.centavos_por_tipo
+        for factura in facturas:
+            self.facturas.append(factura)
+            tipo = factura['tipo']
+            valor = float(factura['valor'])
+            centavos = round(valor * 100)
+            longitudes = (len(str(factura['fecha'])), len(str(tipo)),
+                          len(str(factura['descripcion'])), len(_texto_moneda(valor)))
+            self.anchos_detalle.medir(*longitudes)
+            por_tipo[tipo] = por_tipo.get(tipo, 0) + centavos
+            self.centavos_total += centavos
+            
+            partes = partes_fecha(factura['fecha'])
+            if partes is None:
+                logger.warning(f"No se pudo parsear la fecha: {factura['fecha']}")
+                continue
+            clave = partes[:2]
+            grupo = meses.get(clave)
+            if grupo is None:
+                grupo = meses[clave] = _GrupoMes(*clave)
+            grupo.facturas.append(factura)
+            grupo.centavos += centavos
+            grupo.anchos.medir(*longitudes)
+    
+    def totales_por_tipo(self) -> List[Tuple[str, float]]:
+        """Total de cada tipo, de mayor a menor."""
+        return sorted(((tipo, centavos / 100) for tipo, centavos in self.centavos_por_tipo.items()),
+                      key=lambda x: x[1], reverse=True)
+    
+    def totales_mensuales(self) -> List[Tuple[int, int, float]]:
+        """(año, mes, total) de cada mes, en orden cronológico."""
+        return [(anio, mes, self.meses[(anio, mes)].centavos / 100) for anio, mes in sorted(self.meses)]
+
+
+class _Estilos:
+    """Estilos compartidos por las celdas del libro."""
+    
+    def __init__(self):
+        from openpyxl.styles import Alignment, Font, PatternFill
+        self.fuente_encabezado = Font(bold=True, color="FFFFFF")
+        self.relleno_encabezado = PatternFill(start_color=COLOR_ENCABEZADO, end_color=COLOR_ENCABEZADO,
+                                              fill_type="solid")
+        self.fuente_titulo = Font(size=14, bold=True)
+        self.alineacion_titulo = Alignment(horizontal='center')
+        self.fuente_negrita = Font(bold=True)
+
+
+def _crear_hoja(wb, titulo: str, anchos: List[float]):
+    """Crea una hoja de solo escritura con los anchos de columna ya fijados."""
+    from openpyxl.utils import get_column_letter
+    ws = wb.create_sheet(titulo)
+    for i, ancho in enumerate(anchos, 1):
+        ws.column_dimensions[get_column_letter(i)].width = ancho
+    return ws
+
+
+def _celda(ws, valor: Any, formato: Optional[str] = None, fuente=None, relleno=None, alineacion=None):
+    """Crea una celda con estilo para una hoja de solo escritura."""
+    from openpyxl.cell import WriteOnlyCell
+    celda = WriteOnlyCell(ws, value=valor)
+    if formato:
+        celda.number_format = formato
+    if fuente is not None:
+        celda.font = fuente
+    if relleno is not None:
+        celda.fill = relleno
+    if alineacion is not None:
+        celda.alignment = alineacion
+    return celda
+
+
+def _encabezados(ws, estilos: _Estilos, encabezados: List[str]) -> list:
+    """Fila de encabezados con el estilo del libro."""
+    return [_celda(ws, encabezado, fuente=estilos.fuente_encabezado, relleno=estilos.relleno_encabezado)
+            for encabezado in encabezados]
+
+
+def _agregar_tabla(ws, nombre: str, ref: str, encabezados: List[str], estilo: str):
+    """
+    Agrega una tabla con filas alternas; en solo escritura se guarda al cerrar la hoja.
+    
+    Las columnas se declaran a mano porque la hoja no conserva las celdas del encabezado.
+    """
+    from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+    tabla = Table(displayName=nombre, ref=ref)
+    tabla.tableColumns = [TableColumn(id=i, name=encabezado) for i, encabezado in enumerate(encabezados, 1)]
+    tabla.tableStyleInfo = TableStyleInfo(name=estilo, showFirstColumn=False, showLastColumn=False,
+                                          showRowStripes=True, showColumnStripes=False)
+    with warnings.catch_warnings():
+        # openpyxl avisa siempre en solo escritura, aunque las columnas ya estén declaradas
+        warnings.simplefilter('ignore', UserWarning)
+        ws.add_table(tabla)
+
+
+def _escribir_facturas(ws, facturas: List[Dict[str, Any]], seguimiento: _Seguimiento):
+    """Escribe las filas de facturas con el valor en formato de moneda."""
+    for factura in facturas:
+        ws.append([factura['fecha'], factura['tipo'], factura['descripcion'],
+                   _celda(ws, float(factura['valor']), FORMATO_MONEDA)])
+        seguimiento.fila()
+
+
+def _hoja_detalle(wb, estilos: _Estilos, grupos: AgrupacionFacturas, seguimiento: _Seguimiento):
+    """Hoja con todas las facturas."""
+    ws = _crear_hoja(wb, "Todas las Facturas", grupos.anchos_detalle.anchos())
+    ws.append(_encabezados(ws, estilos, ENCABEZADOS_DETALLE))
+    _escribir_facturas(ws, grupos.facturas, seguimiento)
+    if grupos.facturas:
+        _agregar_tabla(ws, "TablaDetalle", f"A1:D{len(grupos.facturas) + 1}", ENCABEZADOS_DETALLE,
+                       "TableStyleMedium9")
+
+
+def _hoja_mes(wb, estilos: _Estilos, grupo: _GrupoMes, seguimiento: _Seguimiento):
+    """Hoja de un mes: título, total del mes y tabla de facturas desde la fila 4."""
+    nombre_mes = MESES[grupo.mes - 1]
+    anchos = grupo.anchos.anchos([0, 0, 0, ANCHO_MINIMO_VALOR])
+    # Nombre 'YYYY-MM Mes', dentro del límite de 31 caracteres de Excel
+    ws = _crear_hoja(wb, f"{grupo.anio}-{grupo.mes:02d} {nombre_mes}"[:31], anchos)
+    
+    ws.append([_celda(ws, f"Facturas de {nombre_mes} {grupo.anio}",
+                      fuente=estilos.fuente_titulo, alineacion=estilos.alineacion_titulo)])
+    ws.append([_celda(ws, f"Total del mes: ${grupo.centavos / 100:,.0f} COP", fuente=estilos.fuente_negrita)])
+    ws.merged_cells.add("A1:D1")
+    ws.merged_cells.add("A2:D2")
+    ws.append([])
+    
+    ws.append(_encabezados(ws, estilos, ENCABEZADOS_DETALLE))
+    _escribir_facturas(ws, grupo.facturas, seguimiento)
+    _agregar_tabla(ws, f"Tabla_{grupo.anio}_{grupo.mes:02d}", f"A4:D{4 + len(grupo.facturas)}",
+                   ENCABEZADOS_DETALLE, "TableStyleMedium9")
+
+
+def _hoja_resumen_tipo(wb, estilos: _Estilos, resumen: Union[AgrupacionFacturas, TotalesCalendario]):
+    """Hoja con el total y el porcentaje de cada tipo de gasto."""
+    totales = resumen.totales_por_tipo()
+    total_general = resumen.centavos_total / 100
+    
+    anchos = AnchosColumnas(ENCABEZADOS_RESUMEN_TIPO)
+    anchos.medir(len("TOTAL"), len(_texto_moneda(total_general)), len("100.00%"))
+    for tipo, total in totales:
+        anchos.medir(len(str(tipo)), len(_texto_moneda(total)))
+    
+    ws = _crear_hoja(wb, "Resumen por Tipo", anchos.anchos())
+    ws.append(_encabezados(ws, estilos, ENCABEZADOS_RESUMEN_TIPO))
+    for tipo, total in totales:
+        porcentaje = total / total_general if total_general > 0 else 0
+        ws.append([tipo, _celda(ws, total, FORMATO_MONEDA), _celda(ws, porcentaje, FORMATO_PORCENTAJE)])
+    if totales:
+        _agregar_tabla(ws, "TablaResumenTipo", f"A1:C{len(totales) + 1}", ENCABEZADOS_RESUMEN_TIPO,
+                       "TableStyleMedium2")
+    
+    # Fila de total, fuera de la tabla
+    negrita = estilos.fuente_negrita
+    ws.append([
+        _celda(ws, "TOTAL", fuente=negrita),
+        _celda(ws, total_general, FORMATO_MONEDA, fuente=negrita),
+        _celda(ws, 1.0 if total_general > 0 else 0, FORMATO_PORCENTAJE, fuente=negrita)
+    ])
+
+
+def _hoja_resumen_mensual(wb, estilos: _Estilos, resumen: Union[AgrupacionFacturas, TotalesCalendario]):
+    """Hoja con el total de cada mes."""
+    totales = resumen.totales_mensuales()
+    
+    anchos = AnchosColumnas(ENCABEZADOS_RESUMEN_MENSUAL)
+    for anio, mes, total in totales:
+        anchos.medir(len(MESES[mes - 1]), len(str(anio)), len(_texto_moneda(total)))
+    
+    ws = _crear_hoja(wb, "Resumen Mensual", anchos.anchos())
+    ws.append(_encabezados(ws, estilos, ENCABEZADOS_RESUMEN_MENSUAL))
+    for anio, mes, total in totales:
+        ws.append([MESES[mes - 1], str(anio), _celda(ws, total, FORMATO_MONEDA)])
+    if totales:
+        _agregar_tabla(ws, "TablaResumenMensual", f"A1:C{len(totales) + 1}",
+                       ENCABEZADOS_RESUMEN_MENSUAL, "TableStyleMedium3")
+
+
+def exportar_excel(facturas: Iterable[Dict[str, Any]], ruta: str,
+                   progreso: Optional[Callable[[int, int], None]] = None,
+                   cancelado: Optional[Callable[[], bool]] = None,
+                   avance: Optional[AvanceExportacion] = None,
+                   totales: Optional[TotalesCalendario] = None) -> Dict[str, Any]:
+    """
+    Exporta las facturas a un libro de Excel en modo de solo escritura.
+    
+    El libro tiene la hoja de detalle, una hoja por mes, el resumen por tipo
+    y el resumen mensual, todos a partir de una sola agrupación de los datos.
+    Si se reciben los totales del índice de calendario, las hojas de resumen
+    los usan, de modo que coinciden con los resúmenes de la interfaz.
+    
+    Args:
+        facturas: Facturas con fecha, tipo, descripcion y valor
+        ruta: Archivo de destino; se reemplaza solo si la exportación termina
+        progreso: Función opcional que recibe (filas escritas, total de filas),
+            como máximo una vez cada INTERVALO_PROGRESO segundos
+        cancelado: Función opcional que devuelve True para cancelar
+        avance: Objeto opcional donde se lleva el avance detallado
+        totales: Totales opcionales de IndiceCalendario.instantanea_totales()
+    
+    Returns:
+        Dict[str, Any]: facturas, meses, bytes del archivo y duracion_ms
+    
+    Raises:
+        ExportacionCancelada: Si se canceló; el destino queda como estaba
+    """
+    from openpyxl import Workbook
+    
+    inicio = time.perf_counter()
+    grupos = AgrupacionFacturas(facturas)
+    total_filas = len(grupos.facturas) + sum(len(grupo.facturas) for grupo in grupos.meses.values())
+    seguimiento = _Seguimiento(avance, total_filas, len(grupos.meses) + 3, progreso, cancelado)
+    wb = Workbook(write_only=True)
+    estilos = _Estilos()
+    
+    try:
+        _hoja_detalle(wb, estilos, grupos, seguimiento)
+        seguimiento.hoja()
+        for grupo in grupos.meses.values():
+            _hoja_mes(wb, estilos, grupo, seguimiento)
+            seguimiento.hoja()
+        resumen = totales if totales is not None else grupos
+        _hoja_resumen_tipo(wb, estilos, resumen)
+        seguimiento.hoja()
+        _hoja_resumen_mensual(wb, estilos, resumen)
+        seguimiento.hoja()
+        
+        _guardar_atomico(wb, ruta, seguimiento)
+    except BaseException:
+        _descartar_libro(wb)
+        raise
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    logger.info(f"Exportadas {len(grupos.facturas)} facturas y {len(grupos.meses)} meses a {ruta} "
+                f"({seguimiento.avance.bytes} bytes, {duracion_ms:.0f} ms)")
+    return {
+        'facturas': len(grupos.facturas),
+        'meses': len(grupos.meses),
+        'bytes': seguimiento.avance.bytes,
+        'duracion_ms': duracion_ms
+    }
+
+
+def exportar_filtro_excel(facturas: List[Dict[str, Any]], ruta: str, titulo: str,
+                          filtros: List[str], nombre_tabla: str,
+                          progreso: Optional[Callable[[int, int], None]] = None,
+                          cancelado: Optional[Callable[[], bool]] = None,
+                          avance: Optional[AvanceExportacion] = None) -> Dict[str, Any]:
+    """
+    Exporta facturas filtradas a un libro de una hoja en modo de solo escritura.
+    
+    La hoja tiene el título del reporte, una línea por filtro aplicado, la
+    tabla de facturas y la fila de total.
+    
+    Args:
+        facturas: Facturas con fecha, tipo, descripcion y valor
+        ruta: Archivo de destino; se reemplaza solo si la exportación termina
+        titulo: Nombre de la hoja y del reporte
+        filtros: Líneas que describen el filtro aplicado
+        nombre_tabla: Nombre de la tabla de Excel
+        progreso, cancelado, avance: Como en exportar_excel
+    
+    Returns:
+        Dict[str, Any]: facturas, bytes del archivo y duracion_ms
+    
+    Raises:
+        ExportacionCancelada: Si se canceló; el destino queda como estaba
+    """
+    from openpyxl import Workbook
+    
+    inicio = time.perf_counter()
+    anchos = AnchosColumnas(ENCABEZADOS_DETALLE)
+    centavos = 0
+    for factura in facturas:
+        valor = float(factura['valor'])
+        centavos += round(valor * 100)
+        anchos.medir(len(str(factura['fecha'])), len(str(factura['tipo'])),
+                     len(str(factura['descripcion'])), len(_texto_moneda(valor)))
+    total = centavos / 100
+    anchos.medir(0, 0, len("Total:"), len(_texto_moneda(total)))
+    
+    seguimiento = _Seguimiento(avance, len(facturas), 1, progreso, cancelado)
+    wb = Workbook(write_only=True)
+    estilos = _Estilos()
+    ws = _crear_hoja(wb, titulo[:31], anchos.anchos())
+    
+    try:
+        # Título y filtros, cada uno en una fila combinada de A a D
+        ws.append([_celda(ws, f"Reporte de Facturas - {titulo}",
+                          fuente=estilos.fuente_titulo, alineacion=estilos.alineacion_titulo)])
+        for linea in filtros:
+            ws.append([linea])
+        fila_encabezado = len(filtros) + 2
+        for fila in range(1, fila_encabezado):
+            ws.merged_cells.add(f"A{fila}:D{fila}")
+        
+        ws.append(_encabezados(ws, estilos, ENCABEZADOS_DETALLE))
+        _escribir_facturas(ws, facturas, seguimiento)
+        if facturas:
+            _agregar_tabla(ws, nombre_tabla, f"A{fila_encabezado}:D{fila_encabezado + len(facturas)}",
+                           ENCABEZADOS_DETALLE, "TableStyleMedium9")
+        
+        # Fila de total, fuera de la tabla
+        negrita = estilos.fuente_negrita
+        ws.append([
+            _celda(ws, None, fuente=negrita),
+            _celda(ws, None, fuente=negrita),
+            _celda(ws, "Total:", fuente=negrita),
+            _celda(ws, total, FORMATO_MONEDA, fuente=negrita)
+        ])
+        seguimiento.hoja()
+        
+        _guardar_atomico(wb, ruta, seguimiento)
+    except BaseException:
+        _descartar_libro(wb)
+        raise
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    logger.info(f"Exportadas {len(facturas)} facturas filtradas a {ruta} ({duracion_ms:.0f} ms)")
+    return {'facturas': len(facturas), 'bytes': seguimiento.avance.bytes, 'duracion_ms': duracion_ms}
+
+
+def _hoja_comparativo(wb, estilos: _Estilos, titulo: str, nombre_tabla: str, encabezados: List[str],
+                      filas: List[Tuple[str, List[float]]], seguimiento: _Seguimiento):
+    """Hoja con una fila por concepto, una columna por año y la fila de totales."""
+    from openpyxl.utils import get_column_letter
+    totales = [round(sum(columna), 2) for columna in zip(*(valores for _, valores in filas))]
+    if not totales:
+        totales = [0.0] * (len(encabezados) - 1)
+    
+    anchos = AnchosColumnas(encabezados)
+    for etiqueta, valores in filas + [("TOTAL", totales)]:
+        anchos.medir(len(etiqueta), *(len(_texto_moneda(valor)) for valor in valores))
+    
+    ws = _crear_hoja(wb, titulo, anchos.anchos())
+    ws.append(_encabezados(ws, estilos, encabezados))
+    for etiqueta, valores in filas:
+        ws.append([etiqueta] + [_celda(ws, valor, FORMATO_MONEDA) for valor in valores])
+        seguimiento.fila()
+    if filas:
+        _agregar_tabla(ws, nombre_tabla, f"A1:{get_column_letter(len(encabezados))}{len(filas) + 1}",
+                       encabezados, "TableStyleMedium2")
+    
+    # Fila de total, fuera de la tabla
+    negrita = estilos.fuente_negrita
+    ws.append([_celda(ws, "TOTAL", fuente=negrita)]
+              + [_celda(ws, valor, FORMATO_MONEDA, fuente=negrita) for valor in totales])
+
+
+def exportar_comparativo_anios(facturas: Iterable[Dict[str, Any]], ruta: str,
+                               anio_inicio: Optional[int] = None, anio_fin: Optional[int] = None,
+                               progreso: Optional[Callable[[int, int], None]] = None,
+                               cancelado: Optional[Callable[[], bool]] = None,
+                               avance: Optional[AvanceExportacion] = None) -> Dict[str, Any]:
+    """
+    Exporta un comparativo de varios años: totales por mes y por tipo de cada año.
+    
+    Los totales salen de ColumnasFacturas (analitica), que los calcula con
+    NumPy cuando está instalado; el libro solo tiene una fila por mes y por
+    tipo, así que el costo lo pone la agregación y no la escritura.
+    
+    Args:
+        facturas: Facturas con fecha, tipo y valor
+        ruta: Archivo de destino; se reemplaza solo si la exportación termina
+        anio_inicio: Primer año (por defecto el primero con facturas)
+        anio_fin: Último año, incluido (por defecto el último con facturas)
+        progreso, cancelado, avance: Como en exportar_excel
+    
+    Returns:
+        Dict[str, Any]: facturas, anios, bytes del archivo y duracion_ms
+    
+    Raises:
+        ExportacionCancelada: Si se canceló; el destino queda como estaba
+    """
+    from openpyxl import Workbook
+    
+    inicio = time.perf_counter()
+    columnas = ColumnasFacturas(facturas)
+    rango = columnas.rango_anios() or (time.localtime().tm_year,) * 2
+    anio_inicio = anio_inicio if anio_inicio is not None else rango[0]
+    anio_fin = anio_fin if anio_fin is not None else rango[1]
+    anios = list(range(anio_inicio, anio_fin + 1))
+    
+    # Matriz año × mes y, por cada año, los totales de cada tipo
+    mensuales = columnas.totales_mensuales(anio_inicio, anio_fin)
+    filas_mes = [(MESES[mes], [mensuales[anio][mes] for anio in anios]) for mes in range(12)]
+    por_tipo = {anio: columnas.totales_por_tipo(anio=anio) for anio in anios}
+    tipos = {tipo for totales in por_tipo.values() for tipo in totales}
+    filas_tipo = [(tipo, [por_tipo[anio].get(tipo, (0, 0.0))[1] for anio in anios]) for tipo in tipos]
+    filas_tipo.sort(key=lambda fila: sum(fila[1]), reverse=True)
+    
+    seguimiento = _Seguimiento(avance, len(filas_mes) + len(filas_tipo), 2, progreso, cancelado)
+    wb = Workbook(write_only=True)
+    estilos = _Estilos()
+    encabezados_anios = [str(anio) for anio in anios]
+    
+    try:
+        _hoja_comparativo(wb, estilos, "Comparativo Mensual", "TablaComparativoMensual",
+                          ["Mes"] + encabezados_anios, filas_mes, seguimiento)
+        seguimiento.hoja()
+        _hoja_comparativo(wb, estilos, "Comparativo por Tipo", "TablaComparativoTipo",
+                          ["Tipo de Gasto"] + encabezados_anios, filas_tipo, seguimiento)
+        seguimiento.hoja()
+        
+        _guardar_atomico(wb, ruta, seguimiento)
+    except BaseException:
+        _descartar_libro(wb)
+        raise
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    logger.info(f"Comparativo de {anio_inicio} a {anio_fin} con {len(columnas)} facturas exportado a {ruta} "
+                f"({'NumPy' if columnas.usa_numpy else 'Python'}, {duracion_ms:.0f} ms)")
+    return {
+        'facturas': len(columnas),
+        'anios': len(anios),
+        'bytes': seguimiento.avance.bytes,
+        'duracion_ms': duracion_ms
+    }
@@ -4,32 +4,40 @@ import csv
 import locale
 import logging
 import os
+import threading
 import ctypes
 from ctypes import wintypes
 from datetime import datetime, date
 from pathlib import Path
-from collections import defaultdict
+from collections.abc import Mapping
 import webbrowser
 import configparser
-from database import Database
-import openpyxl
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, numbers
-from openpyxl.worksheet.table import Table, TableStyleInfo
+from database import Database, UnitOfWork, PERFIL_PRAGMA_POR_DEFECTO
+from almacen import Factura
+from indices import IndiceFechas, IndiceCalendario, IndiceFilas, IndiceIds
+from resumenes import CambioFactura
+from ejecutor_db import EjecutorDB
+from exportacion import (exportar_excel, exportar_filtro_excel, exportar_comparativo_anios,
+                         instantanea_facturas, AvanceExportacion, ExportacionCancelada)
+from respaldos import (respaldar, respaldar_incremental, compresiones_disponibles, RepositorioRespaldos,
+                       EXTENSIONES_COMPRESION, RespaldoCancelado)
+from importacion import (importar_csv, importar_excel, importar_json, hojas_excel,
+                         ImportacionCancelada, ESCALA_PROGRESO)
 
 # Importaciones de PyQt6
 from PyQt6.QtCore import Qt, QDate, QEvent
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QLabel, QLineEdit, QPushButton, QComboBox, QDateEdit, QAbstractItemView, 
-                             QTableWidget, QTableWidgetItem, QTabWidget, QMessageBox, 
+                             QTableWidget, QTableWidgetItem, QTableView, QTabWidget, QMessageBox, 
                              QFileDialog, QHeaderView, QTextEdit, QCheckBox, QSplitter,
                              QStyleFactory, QStyle, QTableWidgetSelectionRange, QStatusBar,
                              QGroupBox, QFormLayout, QSpacerItem, QSizePolicy, QTreeWidget, 
                              QTreeWidgetItem, QMenu, QDialog, QListWidget, QDialogButtonBox, 
-                             QListWidgetItem, QProgressDialog, QStyledItemDelegate)
+                             QListWidgetItem, QProgressDialog, QStyledItemDelegate, QProgressBar,
+                             QInputDialog)
 from PyQt6.QtGui import (QAction, QFont, QColor, QIcon, QDoubleValidator, 
                         QTextCursor, QBrush)
-from PyQt6.QtCore import Qt, QSize, QDate, QTimer, QModelIndex
+from PyQt6.QtCore import Qt, QSize, QDate, QTimer, QModelIndex, QAbstractTableModel, pyqtSignal
 
 
 class EditableDelegate(QStyledItemDelegate):
@@ -111,22 +119,261 @@ class TipoGastoDelegate(QStyledItemDelegate):
             super().updateEditorGeometry(editor, option, index)
 
 
+class FacturasTableModel(QAbstractTableModel):
+    """Modelo de la lista de facturas que genera los textos bajo demanda.
+    
+    Solo se consultan las filas visibles, por lo que el costo de dibujar la
+    tabla no depende del número total de facturas.
+    """
+    COLUMNAS = ["ID", "Fecha", "Tipo", "Descripción", "Valor"]
+    CAMPOS = ['id', 'fecha', 'tipo', 'descripcion', 'valor']
+    COLUMNAS_EDITABLES = {1, 2, 3, 4}
+    
+    def __init__(self, facturas=None, on_edit=None, parent=None):
+        """
+        Args:
+            facturas: Lista de facturas (se usa por referencia)
+            on_edit: Función (factura, campo, texto) -> bool que valida y guarda una edición
+            parent: Objeto padre de Qt
+        """
+        super().__init__(parent)
+        self._facturas = facturas if facturas is not None else []
+        self._filas = IndiceFilas(self._facturas)
+        self._on_edit = on_edit
+    
+    @property
+    def facturas(self):
+        """Lista de facturas mostrada"""
+        return self._facturas
+    
+    def set_facturas(self, facturas):
+        """Reemplazar la lista de facturas mostrada"""
+        self.beginResetModel()
+        self._facturas = facturas
+        self._filas.reconstruir(facturas)
+        self.endResetModel()
+    
+    def agregar_factura(self, factura):
+        """Agregar una factura al final de la lista sin reiniciar el modelo"""
+        fila = len(self._facturas)
+        self.beginInsertRows(QModelIndex(), fila, fila)
+        self._facturas.append(factura)
+        self._filas.agregar(factura)
+        self.endInsertRows()
+    
+    def factura(self, row):
+        """Obtener la factura de una fila"""
+        if 0 <= row < len(self._facturas):
+            return self._facturas[row]
+        return None
+    
+    def factura_modificada(self, cambio):
+        """Reflejar un CambioFactura; solo se vuelve a dibujar la fila de la factura"""
+        fila = self._filas.fila(cambio.factura)
+        if fila is not None:
+            self.dataChanged.emit(self.index(fila, 0), self.index(fila, len(self.COLUMNAS) - 1))
+    
+    def refrescar(self):
+        """Notificar que los datos cambiaron; la vista vuelve a pedir solo las filas visibles"""
+        if self._facturas:
+            self.dataChanged.emit(
+                self.index(0, 0),
+                self.index(len(self._facturas) - 1, len(self.COLUMNAS) - 1)
+            )
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._facturas)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNAS)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return None
+        
+        factura = self._facturas[index.row()]
+        campo = self.CAMPOS[index.column()]
+        
+        if campo == 'id':
+            return str(factura.get('id', index.row()))
+        if campo == 'valor':
+            return f"${float(factura.get('valor', 0)):,.0f} COP".replace(',', '.')
+        return str(factura.get(campo, ''))
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNAS[section]
+        return str(section + 1)
+    
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        flags = Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled
+        if index.column() in self.COLUMNAS_EDITABLES:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+    
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        """Validar y guardar la edición de una celda a través de on_edit"""
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole or self._on_edit is None:
+            return False
+        
+        factura = self._facturas[index.row()]
+        campo = self.CAMPOS[index.column()]
+        if not self._on_edit(factura, campo, str(value)):
+            return False
+        
+        self.dataChanged.emit(index.siblingAtColumn(0), index.siblingAtColumn(len(self.COLUMNAS) - 1))
+        return True
 
-# Importaciones para Excel
-try:
-    from openpyxl import Workbook, load_workbook
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, numbers
-    from openpyxl.utils import get_column_letter
-    from openpyxl.worksheet.table import Table, TableStyleInfo
-except ImportError as e:
-    logging.error(f"Error al importar dependencias de Excel: {str(e)}")
-    QMessageBox.critical(None, "Error", "Error al importar dependencias de Excel. Asegúrate de tener openpyxl instalado.")
-    sys.exit(1)
 
-    # Crear directorio de datos si no existe
-    data_dir = Path.home() / 'FacturasApp'
-    data_dir.mkdir(exist_ok=True, parents=True)
+class FiltroFacturasModel(QAbstractTableModel):
+    """Modelo de las tablas de filtro con una fila final de TOTAL.
+    
+    El total se calcula una sola vez al aplicar el filtro y luego se ajusta
+    con la diferencia de cada edición, sin volver a recorrer las facturas.
+    """
+    COLUMNAS = ["Fecha", "Tipo", "Descripción", "Valor"]
+    CAMPOS = ['fecha', 'tipo', 'descripcion', 'valor']
+    COLUMNAS_EDITABLES = {0, 1, 2, 3}
+    
+    def __init__(self, on_edit=None, parent=None):
+        """
+        Args:
+            on_edit: Función (factura, campo, texto) -> bool que valida y guarda una edición
+            parent: Objeto padre de Qt
+        """
+        super().__init__(parent)
+        self._facturas = []
+        self._filas = IndiceFilas()
+        # Igual que IndiceCalendario, el total se lleva en centavos enteros para que
+        # las ediciones sucesivas no acumulen errores de redondeo
+        self._total_centavos = 0
+        self._on_edit = on_edit
+        self.tema_oscuro = False
+    
+    @property
+    def facturas(self):
+        """Facturas filtradas (sin la fila de total)"""
+        return self._facturas
+    
+    @property
+    def total(self):
+        """Suma de los valores de las facturas filtradas"""
+        return self._total_centavos / 100
+    
+    def set_facturas(self, facturas, total=None):
+        """Reemplazar el conjunto filtrado; el total se recalcula solo si no se recibe"""
+        self.beginResetModel()
+        self._facturas = [f for f in facturas if isinstance(f, Mapping)]
+        self._filas.reconstruir(self._facturas)
+        if total is not None:
+            self._total_centavos = round(float(total) * 100)
+        else:
+            self._total_centavos = 0
+            for factura in self._facturas:
+                try:
+                    self._total_centavos += round(float(factura.get('valor', 0)) * 100)
+                except (TypeError, ValueError):
+                    pass
+        self.endResetModel()
+    
+    def factura(self, row):
+        """Obtener la factura de una fila (None para la fila de total)"""
+        if 0 <= row < len(self._facturas):
+            return self._facturas[row]
+        return None
+    
+    def factura_modificada(self, cambio):
+        """
+        Reflejar una edición hecha en cualquier tabla.
+        
+        Solo se vuelven a dibujar la celda editada y, si cambió el valor, la fila de TOTAL.
+        
+        Args:
+            cambio: CambioFactura con la factura, el campo y los valores anterior y nuevo
+        """
+        fila = self._filas.fila(cambio.factura)
+        if fila is None:
+            return
+        
+        if cambio.campo == 'valor':
+            self._total_centavos += cambio.diferencia_centavos
+            fila_total = len(self._facturas)
+            self.dataChanged.emit(self.index(fila_total, 0), self.index(fila_total, len(self.COLUMNAS) - 1))
+        
+        if cambio.campo in self.CAMPOS:
+            celda = self.index(fila, self.CAMPOS.index(cambio.campo))
+            self.dataChanged.emit(celda, celda)
+    
+    def es_fila_total(self, row):
+        return row == len(self._facturas)
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._facturas) + 1
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNAS)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        
+        columna = index.column()
+        if self.es_fila_total(index.row()):
+            if role == Qt.ItemDataRole.DisplayRole:
+                if columna == 2:
+                    return "TOTAL:"
+                if columna == 3:
+                    return f"${self.total:,.0f} COP".replace(',', '.')
+                return ""
+            if role == Qt.ItemDataRole.FontRole:
+                font = QFont()
+                font.setBold(True)
+                return font
+            if role == Qt.ItemDataRole.BackgroundRole:
+                return QColor(100, 100, 100) if self.tema_oscuro else QColor(230, 230, 230)
+            if role == Qt.ItemDataRole.ForegroundRole:
+                return QColor(255, 255, 255) if self.tema_oscuro else QColor(0, 0, 0)
+            return None
+        
+        if role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return None
+        
+        factura = self._facturas[index.row()]
+        campo = self.CAMPOS[columna]
+        if campo == 'valor':
+            return f"${float(factura.get('valor', 0)):,.0f} COP".replace(',', '.')
+        return str(factura.get(campo, ''))
     
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNAS[section]
+        return str(section + 1)
+    
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        flags = Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled
+        if not self.es_fila_total(index.row()) and index.column() in self.COLUMNAS_EDITABLES:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+    
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        """Validar y guardar la edición; la actualización de la vista llega por factura_modificada"""
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole or self._on_edit is None:
+            return False
+        
+        factura = self.factura(index.row())
+        if factura is None:
+            return False
+        return bool(self._on_edit(factura, self.CAMPOS[index.column()], str(value)))
+
+
 def check_single_instance():
     """Verifica si ya hay una instancia de la aplicación en ejecución"""
     # Usar un nombre único para el mutex
@@ -225,6 +472,8 @@ def get_config():
         config['APP'] = {}
     if 'last_export_dir' not in config['APP']:
         config['APP']['last_export_dir'] = str(Path.home() / 'Documents')
+    if 'perfil_pragma' not in config['APP']:
+        config['APP']['perfil_pragma'] = PERFIL_PRAGMA_POR_DEFECTO
     
     return config
 
@@ -243,6 +492,9 @@ except:
         locale.setlocale(locale.LC_ALL, '')
 
 class MainWindow(QMainWindow):
+    # Evento "factura modificada": lo reciben las tablas y los resúmenes (ver notificar_cambio_factura)
+    factura_cambiada = pyqtSignal(object)
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Gestor de Facturas")
@@ -263,7 +515,22 @@ class MainWindow(QMainWindow):
         
         # Inicializar la base de datos SQLite en el directorio de datos
         db_path = DATA_DIR / "facturas.db"
-        self.db = Database(str(db_path))
+        perfil_pragma = get_config()['APP'].get('perfil_pragma', PERFIL_PRAGMA_POR_DEFECTO)
+        try:
+            self.db = Database(str(db_path), perfil_pragma)
+        except ValueError as e:
+            logger.warning(f"{str(e)}. Se usará el perfil '{PERFIL_PRAGMA_POR_DEFECTO}'")
+            self.db = Database(str(db_path))
+        
+        # Registro de cambios pendientes de guardar en la base de datos
+        self.cambios = UnitOfWork(self.db)
+        
+        # Las operaciones de la base de datos se ejecutan fuera del hilo de la interfaz
+        self.ejecutor_db = EjecutorDB(self.db, self)
+        # Señales de cancelación de las exportaciones en segundo plano
+        self._exportaciones_en_curso = set()
+        # Al cerrar, los errores de guardado los informa closeEvent
+        self._cerrando = False
         
         # Verificar si hay que migrar datos desde el archivo JSON antiguo
         self._migrar_datos_desde_json()
@@ -273,6 +540,11 @@ class MainWindow(QMainWindow):
         
         # Inicializar atributos
         self.facturas = []
+        self.indice_fechas = IndiceFechas()
+        self.indice_calendario = IndiceCalendario()
+        self.indice_ids = IndiceIds()
+        # Los resúmenes afectados por una edición se vuelven a leer del índice de calendario
+        self.factura_cambiada.connect(self._aplicar_cambio_resumenes)
         self.tipos_gasto = []
         self.ultimo_tipo_gasto_seleccionado = None  # Almacenará el último tipo de gasto seleccionado
         
@@ -299,8 +571,7 @@ class MainWindow(QMainWindow):
         if json_path.exists():
             try:
                 # Verificar si ya hay datos en la base de datos
-                facturas = self.db.obtener_facturas()
-                if not facturas:
+                if not self.db.contar_facturas()['cantidad']:
                     # Migrar solo si no hay datos en la base de datos
                     self.db.migrar_desde_json(str(json_path))
                     # Opcional: respaldar el archivo JSON después de la migración
@@ -309,7 +580,43 @@ class MainWindow(QMainWindow):
                     logging.info(f"Datos migrados exitosamente. Archivo original respaldado como {backup_path}")
             except Exception as e:
                 logging.error(f"Error al migrar datos desde JSON: {str(e)}")
-    
+
+    def closeEvent(self, event):
+        """Guardar lo pendiente y cerrar las conexiones a la base de datos al cerrar la ventana"""
+        try:
+            # Cancelar las exportaciones y terminar las operaciones en curso. esperar()
+            # también entrega sus resultados: los lotes que se estaban guardando quedan
+            # cerrados (IDs asignados y ediciones diferidas registradas) y los que
+            # fallaron vuelven a pendientes, así que confirmar() guarda todo lo que falta
+            self._cerrando = True
+            for cancelar in self._exportaciones_en_curso:
+                cancelar.set()
+            if not self.ejecutor_db.esperar():
+                logger.warning("Algunas operaciones no terminaron antes de cerrar")
+            if self.cambios.hay_cambios:
+                self.cambios.confirmar()
+        except Exception as e:
+            logger.error(f"Error al guardar los cambios al cerrar: {str(e)}", exc_info=True)
+            respuesta = QMessageBox.question(
+                self,
+                "Error al guardar",
+                f"No se pudieron guardar los cambios pendientes: {str(e)}\n\n"
+                "¿Desea cerrar de todos modos? Los cambios no guardados se perderán.",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No
+            )
+            if respuesta != QMessageBox.StandardButton.Yes:
+                # Los cambios siguen pendientes y se guardarán con la próxima modificación
+                self._cerrando = False
+                event.ignore()
+                return
+        
+        try:
+            self.db.cerrar()
+        except Exception as e:
+            logger.error(f"Error al cerrar la base de datos: {str(e)}")
+        super().closeEvent(event)
+
     def init_ui(self):
         """Inicializar la interfaz de usuario"""
         # Widget central
@@ -421,9 +728,27 @@ class MainWindow(QMainWindow):
         self.tabs.addTab(self.tab_lista, "Lista de Facturas")
         self.setup_lista_tab()
         
-        # Barra de estado
+        # Barra de estado con el progreso de las operaciones de la base de datos
+        self.progreso_db = QProgressBar()
+        self.progreso_db.setMaximumWidth(200)
+        self.progreso_db.setTextVisible(False)
+        self.progreso_db.hide()
+        self.statusBar().addPermanentWidget(self.progreso_db)
+        self.ejecutor_db.actividad.connect(self._mostrar_actividad_db)
+        self.ejecutor_db.inactivo.connect(self.progreso_db.hide)
         self.statusBar().showMessage("Listo")
     
+    def _mostrar_actividad_db(self, mensaje, hechas, total):
+        """Mostrar en la barra de estado la operación de base de datos en curso"""
+        self.statusBar().showMessage(mensaje)
+        if total:
+            self.progreso_db.setRange(0, total)
+            self.progreso_db.setValue(hechas)
+        else:
+            # Progreso indeterminado
+            self.progreso_db.setRange(0, 0)
+        self.progreso_db.show()
+    
     def setup_registro_tab(self):
         """Configurar la pestaña de registro de facturas"""
         layout = QFormLayout(self.tab_registro)
@@ -624,6 +949,13 @@ class MainWindow(QMainWindow):
         control_layout.addWidget(self.combo_anio_anual)
         control_layout.addStretch()
         
+        # Comparativo de todos los años con facturas, por mes y por tipo
+        btn_comparativo = QPushButton("Exportar comparativo de años")
+        btn_comparativo.setToolTip("Exportar a Excel los totales por mes y por tipo de cada año")
+        btn_comparativo.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DialogSaveButton))
+        btn_comparativo.clicked.connect(self.exportar_comparativo_anual)
+        control_layout.addWidget(btn_comparativo)
+        
         # Área de texto para el resumen
         self.texto_resumen_anual = QTextEdit()
         self.texto_resumen_anual.setReadOnly(True)
@@ -784,10 +1116,12 @@ class MainWindow(QMainWindow):
         
         container_layout.addLayout(btn_layout)
         
-        # Crear tabla
-        tabla = QTableWidget()
-        tabla.setColumnCount(4)
-        tabla.setHorizontalHeaderLabels(["Fecha", "Tipo", "Descripción", "Valor"])
+        # Crear tabla respaldada por un modelo del conjunto filtrado
+        modelo = FiltroFacturasModel(self._editar_factura_desde_filtro, self)
+        self.factura_cambiada.connect(modelo.factura_modificada)
+        tabla = QTableView()
+        tabla.setModel(modelo)
+        tabla.verticalHeader().setDefaultSectionSize(30)  # Altura de fila de 30 píxeles
         
         # Configurar el ancho de las columnas
         header = tabla.horizontalHeader()
@@ -798,8 +1132,8 @@ class MainWindow(QMainWindow):
         
         # Configurar edición de celdas
         tabla.setEditTriggers(
-            QTableWidget.EditTrigger.DoubleClicked | 
-            QTableWidget.EditTrigger.EditKeyPressed
+            QAbstractItemView.EditTrigger.DoubleClicked | 
+            QAbstractItemView.EditTrigger.EditKeyPressed
         )
         
         # Configurar delegado para columnas editables (excepto tipo)
@@ -816,16 +1150,15 @@ class MainWindow(QMainWindow):
         # Asignar el delegado general para las demás columnas
         tabla.setItemDelegate(delegate)
         
-        # Conectar la señal itemChanged al manejador de cambios
-        tabla.itemChanged.connect(self.guardar_cambios_celda)
-        
-        # Guardar referencia a la tabla según el tipo
+        # Guardar referencia a la tabla y su modelo según el tipo
         if tipo == "rango":
             self.tabla_filtro_rango = tabla
             self.tabla_filtro_rango.setProperty("tipo_filtro", "rango")
+            self.modelo_filtro_rango = modelo
         else:  # fechas
             self.tabla_filtro_fechas = tabla
             self.tabla_filtro_fechas.setProperty("tipo_filtro", "fechas")
+            self.modelo_filtro_fechas = modelo
         
         # Agregar la tabla al contenedor
         container_layout.addWidget(tabla)
@@ -939,15 +1272,19 @@ class MainWindow(QMainWindow):
         # Layout para la tabla y botón de eliminar seleccionadas
         table_layout = QVBoxLayout()
         
-        # Tabla de facturas
-        self.tabla_facturas = QTableWidget()
-        self.tabla_facturas.setColumnCount(5)  # Una columna extra para el ID
-        self.tabla_facturas.setHorizontalHeaderLabels(["ID", "Fecha", "Tipo", "Descripción", "Valor"])
-        self.tabla_facturas.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.tabla_facturas.setSelectionMode(QTableWidget.SelectionMode.ExtendedSelection)
+        # Tabla de facturas (vista sobre un modelo que genera las celdas bajo demanda)
+        self.modelo_facturas = FacturasTableModel(self.facturas, self._editar_factura_desde_modelo, self)
+        self.factura_cambiada.connect(self.modelo_facturas.factura_modificada)
+        self.tabla_facturas = QTableView()
+        self.tabla_facturas.setModel(self.modelo_facturas)
+        self.tabla_facturas.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.tabla_facturas.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        
+        # Altura de fila uniforme para mejor legibilidad
+        self.tabla_facturas.verticalHeader().setDefaultSectionSize(30)
         
         # Conectar la señal de cambio de selección
-        self.tabla_facturas.itemSelectionChanged.connect(self.actualizar_boton_eliminar)
+        self.tabla_facturas.selectionModel().selectionChanged.connect(self.actualizar_boton_eliminar)
         
         # Configurar las columnas
         self.tabla_facturas.setColumnHidden(0, True)  # Ocultar columna de checkboxes
@@ -967,11 +1304,8 @@ class MainWindow(QMainWindow):
         header.setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)  # Descripción
         header.setSectionResizeMode(4, QHeaderView.ResizeMode.ResizeToContents)  # Valor
         
-        # Configurar edición de celdas
-        self.tabla_facturas.setEditTriggers(QTableWidget.EditTrigger.DoubleClicked | QTableWidget.EditTrigger.EditKeyPressed)
-        
-        # Conectar señal de cambio de celda
-        self.tabla_facturas.itemChanged.connect(self.guardar_cambios_celda)
+        # Configurar edición de celdas (los cambios se guardan desde el modelo)
+        self.tabla_facturas.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked | QAbstractItemView.EditTrigger.EditKeyPressed)
         
         # Layout para el botón de eliminar seleccionadas
         bottom_btn_layout = QHBoxLayout()
@@ -997,9 +1331,6 @@ class MainWindow(QMainWindow):
             }
         """)
         
-        # Conectar señal de selección para habilitar/deshabilitar el botón
-        self.tabla_facturas.itemSelectionChanged.connect(self.actualizar_boton_eliminar)
-        
         bottom_btn_layout.addWidget(self.btn_eliminar)
         bottom_btn_layout.addStretch()
         
@@ -1012,6 +1343,7 @@ class MainWindow(QMainWindow):
         """Cargar datos desde la base de datos"""
         try:
             self.facturas = self.db.obtener_facturas()
+            self._reconstruir_indices()
             logger.info(f"Datos cargados correctamente desde la base de datos")
         except Exception as e:
             logger.error(f"Error al cargar los datos: {str(e)}")
@@ -1033,22 +1365,31 @@ class MainWindow(QMainWindow):
         if not self.validar_campos():
             return
         
-        # Crear diccionario con los datos de la factura
-        factura = {
-            'fecha': self.date_fecha.date().toString("dd/MM/yyyy"),
-            'tipo': self.cmb_tipo_gasto.currentText(),
-            'descripcion': self.txt_descripcion.text().strip(),
-            'valor': float(self.txt_valor.text().replace(',', '.'))
-        }
+        # Crear el registro de la factura (se usa como un diccionario)
+        factura = Factura(
+            fecha=self.date_fecha.date().toString("dd/MM/yyyy"),
+            tipo=self.cmb_tipo_gasto.currentText(),
+            descripcion=self.txt_descripcion.text().strip(),
+            valor=float(self.txt_valor.text().replace(',', '.'))
+        )
         
-        # Agregar a la lista
-        self.facturas.append(factura)
+        # Agregar a la lista; si la tabla muestra esta misma lista, solo se inserta la fila nueva
+        fila_insertada = hasattr(self, 'modelo_facturas') and self.modelo_facturas.facturas is self.facturas
+        if fila_insertada:
+            self.modelo_facturas.agregar_factura(factura)
+        else:
+            self.facturas.append(factura)
+        self.cambios.registrar_nueva(factura)
+        self.indice_fechas.agregar(factura)
+        self.indice_calendario.agregar(factura)
+        self.indice_ids.agregar(factura)
         
         # Guardar datos
         if self.guardar_datos():
             # Actualizar interfaz
             self.limpiar_campos()
-            self.actualizar_lista_facturas()
+            if not fila_insertada:
+                self.actualizar_lista_facturas()
             self.actualizar_resumen()
             self.statusBar().showMessage("Factura guardada correctamente", 3000)
     
@@ -1086,59 +1427,82 @@ class MainWindow(QMainWindow):
             # Si no hay selección previa, usar el primer elemento
             self.cmb_tipo_gasto.setCurrentIndex(0)
     
+    def _reconstruir_indices(self):
+        """Reconstruir los índices en memoria después de reemplazar la lista de facturas"""
+        self.indice_fechas.reconstruir(self.facturas)
+        self.indice_calendario.reconstruir(self.facturas)
+        self.indice_ids.reconstruir(self.facturas)
+    
+    def _quitar_de_indices(self, facturas):
+        """Quitar de los índices las facturas eliminadas, sin reconstruirlos"""
+        self.indice_fechas.eliminar_varias(facturas)
+        for factura in facturas:
+            self.indice_calendario.eliminar(factura)
+            self.indice_ids.eliminar(factura)
+    
+    def _actualizar_indices(self, factura, campo):
+        """Volver a indexar una factura después de editar uno de sus campos"""
+        if campo in ('fecha', 'tipo'):
+            self.indice_fechas.actualizar(factura)
+        if campo in ('fecha', 'tipo', 'valor'):
+            self.indice_calendario.actualizar(factura)
+    
     def actualizar_lista_facturas(self):
         """Actualizar la tabla de facturas"""
-        # Desconectar temporalmente la señal para evitar múltiples llamadas
-        try:
-            self.tabla_facturas.itemChanged.disconnect(self.guardar_cambios_celda)
-        except:
-            pass
-            
-        # Cerrar cualquier editor activo
-        self.tabla_facturas.closePersistentEditor(self.tabla_facturas.currentItem())
-            
-        self.tabla_facturas.setRowCount(len(self.facturas))
-        
-        # Establecer altura de fila para mejor legibilidad
-        for i in range(len(self.facturas)):
-            self.tabla_facturas.setRowHeight(i, 30)  # Aumentar altura de fila a 30 píxeles
-            
-        for i, factura in enumerate(self.facturas):
-            # Columna 0 oculta para el ID de la factura
-            item_id = QTableWidgetItem(str(factura.get('id', i)))
-            item_id.setFlags(item_id.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            self.tabla_facturas.setItem(i, 0, item_id)
-            
-            # Fecha (editable)
-            item_fecha = QTableWidgetItem(factura['fecha'])
-            item_fecha.setFlags(item_fecha.flags() | Qt.ItemFlag.ItemIsEditable)
-            self.tabla_facturas.setItem(i, 1, item_fecha)
-            
-            # Tipo (editable)
-            item_tipo = QTableWidgetItem(factura['tipo'])
-            item_tipo.setFlags(item_tipo.flags() | Qt.ItemFlag.ItemIsEditable)
-            self.tabla_facturas.setItem(i, 2, item_tipo)
-            
-            # Descripción (editable)
-            item_desc = QTableWidgetItem(factura['descripcion'])
-            item_desc.setFlags(item_desc.flags() | Qt.ItemFlag.ItemIsEditable)
-            self.tabla_facturas.setItem(i, 3, item_desc)
-            
-            # Valor (editable)
-            valor_str = f"${float(factura['valor']):,.0f} COP".replace(',', '.')
-            item_valor = QTableWidgetItem(valor_str)
-            item_valor.setFlags(item_valor.flags() | Qt.ItemFlag.ItemIsEditable)
-            self.tabla_facturas.setItem(i, 4, item_valor)
-        
-        # Reconectar la señal después de actualizar la tabla
-        self.tabla_facturas.itemChanged.connect(self.guardar_cambios_celda)
-    
-    def actualizar_resumen(self):
-        """Actualizar todos los resúmenes"""
+        if not hasattr(self, 'modelo_facturas'):
+            return
+        
+        # El modelo solo necesita la referencia actual; las celdas se generan al dibujarlas
+        self.modelo_facturas.set_facturas(self.facturas)
+    
+    def actualizar_resumen(self, actualizar_filtros=True):
+        """Actualizar todos los resúmenes
+        
+        Args:
+            actualizar_filtros (bool): Si es False no se vuelven a aplicar los filtros
+                (las tablas de filtro ya reflejan el cambio por sí mismas)
+        """
         self.actualizar_resumen_diario()
         self.actualizar_resumen_mensual()
         self.actualizar_resumen_anual()
-        self.actualizar_filtros()
+        if actualizar_filtros:
+            self.actualizar_filtros()
+    
+    def _resumen_por_tipo(self, anio, mes=None, dia=None):
+        """Obtener {tipo: total} de un año, mes o día de los agregados del índice de calendario"""
+        totales = self.indice_calendario.totales_por_tipo(anio, mes, dia)
+        return {tipo: total for tipo, (_, total) in totales.items() if total}
+    
+    @staticmethod
+    def _anio_seleccionado(combo):
+        """Año elegido en un combo de años, o None si el combo está vacío"""
+        texto = combo.currentText()
+        return int(texto) if texto.isdigit() else None
+    
+    def _aplicar_cambio_resumenes(self, cambio):
+        """Volver a leer los resúmenes que incluyen la factura de un CambioFactura
+        
+        El índice de calendario ya refleja la edición, así que cada resumen
+        afectado solo vuelve a consultar sus agregados.
+        """
+        if not cambio.afecta_resumenes:
+            return
+        fechas = [date.fromordinal(ordinal) for ordinal, _, _ in (cambio.antes, cambio.despues)
+                  if ordinal is not None]
+        
+        def incluye(anio, mes=None, dia=None):
+            return any(f.year == anio and mes in (None, f.month) and dia in (None, f.day) for f in fechas)
+        
+        if hasattr(self, 'date_resumen_diario'):
+            dia = self.date_resumen_diario.date().toPyDate()
+            if incluye(dia.year, dia.month, dia.day):
+                self.actualizar_resumen_diario()
+        if hasattr(self, 'combo_anio_resumen') and hasattr(self, 'combo_mes_resumen'):
+            if incluye(self._anio_seleccionado(self.combo_anio_resumen), self.combo_mes_resumen.currentIndex() + 1):
+                self.actualizar_resumen_mensual()
+        if hasattr(self, 'combo_anio_anual'):
+            if incluye(self._anio_seleccionado(self.combo_anio_anual)):
+                self.actualizar_resumen_anual()
     
     def actualizar_resumen_diario(self):
         """Actualizar el resumen diario"""
@@ -1150,15 +1514,9 @@ class MainWindow(QMainWindow):
             fecha_seleccionada = self.date_resumen_diario.date()
             fecha_str = fecha_seleccionada.toString("dd/MM/yyyy")
             
-            resumen = defaultdict(float)
-            total = 0.0
-            
-            for factura in self.facturas:
-                if factura['fecha'] == fecha_str:
-                    tipo = factura['tipo']
-                    valor = factura['valor']
-                    resumen[tipo] += valor
-                    total += valor
+            dia = fecha_seleccionada.toPyDate()
+            resumen = self._resumen_por_tipo(dia.year, dia.month, dia.day)
+            total = sum(resumen.values())
             
             # Formatear el resumen
             texto = f"Resumen de gastos para {fecha_str}\n\n"
@@ -1182,21 +1540,8 @@ class MainWindow(QMainWindow):
             mes = self.combo_mes_resumen.currentIndex() + 1
             anio = int(self.combo_anio_resumen.currentText())
             
-            resumen = defaultdict(float)
-            total = 0.0
-            
-            for factura in self.facturas:
-                try:
-                    fecha = datetime.strptime(factura['fecha'], '%d/%m/%Y')
-                    if fecha.month == mes and fecha.year == anio:
-                        tipo = factura['tipo']
-                        valor = factura['valor']
-                        resumen[tipo] += valor
-                        total += valor
-                except Exception as e:
-                    logger.warning(f"Error al procesar factura: {str(e)}")
-                    continue
-            
+            resumen = self._resumen_por_tipo(anio, mes)
+            total = sum(resumen.values())
             
             # Formatear el resumen
             nombre_mes = self.combo_mes_resumen.currentText()
@@ -1225,24 +1570,11 @@ class MainWindow(QMainWindow):
         try:
             anio = int(self.combo_anio_anual.currentText())
             
-            resumen_mensual = defaultdict(lambda: defaultdict(float))
-            resumen_anual = defaultdict(float)
-            total_anual = 0.0
+            resumen_anual = self._resumen_por_tipo(anio)
+            total_anual = sum(resumen_anual.values())
             
-            for factura in self.facturas:
-                try:
-                    fecha = datetime.strptime(factura['fecha'], '%d/%m/%Y')
-                    if fecha.year == anio:
-                        mes = fecha.month
-                        tipo = factura['tipo']
-                        valor = factura['valor']
-                        
-                        resumen_mensual[mes][tipo] += valor
-                        resumen_anual[tipo] += valor
-                        total_anual += valor
-                except Exception as e:
-                    logger.warning(f"Error al procesar factura: {str(e)}")
-                    continue
+            # Totales por mes del año (índice 0 = enero) de los subtotales del índice de calendario
+            totales_mes = self.indice_calendario.totales_mensuales(anio)
             
             # Formatear el resumen
             texto = f"Resumen de gastos para el año {anio}\n\n"
@@ -1260,7 +1592,7 @@ class MainWindow(QMainWindow):
                         "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
                 
                 for mes in range(1, 13):
-                    total_mes = sum(resumen_mensual[mes].values())
+                    total_mes = totales_mes[mes - 1]
                     if total_mes > 0:
                         porcentaje = (total_mes / total_anual) * 100 if total_anual > 0 else 0
                         texto += f"{meses[mes-1]}: ${total_mes:,.0f} COP ({porcentaje:.1f}%)\n"
@@ -1276,17 +1608,8 @@ class MainWindow(QMainWindow):
     
     def inicializar_filtros(self):
         """Inicializar los valores de los filtros"""
-        # Obtener años únicos
-        anios = set()
-        for factura in self.facturas:
-            try:
-                fecha = datetime.strptime(factura['fecha'], '%d/%m/%Y')
-                anios.add(fecha.year)
-            except:
-                continue
-        
-        # Ordenar años de mayor a menor
-        anios_ordenados = sorted(anios, reverse=True)
+        # Obtener años del índice de calendario (ya ordenados de mayor a menor)
+        anios_ordenados = self.indice_calendario.anios()
         
         # Actualizar combo de años
         self.combo_filtro_anio.clear()
@@ -1369,43 +1692,15 @@ class MainWindow(QMainWindow):
             qdate_desde = self.date_edit_desde.date()
             qdate_hasta = self.date_edit_hasta.date()
             
-            # Convertir QDate a datetime para comparación
-            fecha_desde = datetime(qdate_desde.year(), qdate_desde.month(), qdate_desde.day())
-            fecha_hasta = datetime(qdate_hasta.year(), qdate_hasta.month(), qdate_hasta.day(), 23, 59, 59)
+            # Convertir QDate a date para la consulta al índice
+            fecha_desde = date(qdate_desde.year(), qdate_desde.month(), qdate_desde.day())
+            fecha_hasta = date(qdate_hasta.year(), qdate_hasta.month(), qdate_hasta.day())
             
             # Obtener el tipo de gasto seleccionado
             tipo = self.combo_filtro_tipo_rango.currentData()
             
-            # Filtrar facturas
-            facturas_filtradas = []
-            for factura in self.facturas:
-                try:
-                    # Verificar si la factura tiene el formato de fecha esperado
-                    if 'fecha' not in factura or not isinstance(factura['fecha'], str):
-                        continue
-                        
-                    # Manejar diferentes formatos de fecha
-                    try:
-                        fecha = datetime.strptime(factura['fecha'], '%d/%m/%Y')
-                    except ValueError:
-                        try:
-                            fecha = datetime.strptime(factura['fecha'], '%Y-%m-%d')
-                        except ValueError:
-                            logger.warning(f"Formato de fecha no reconocido: {factura['fecha']}")
-                            continue
-                    
-                    # Verificar rango de fechas
-                    if fecha < fecha_desde or fecha > fecha_hasta:
-                        continue
-                    
-                    # Verificar tipo de gasto
-                    if tipo is not None and factura.get('tipo') != tipo:
-                        continue
-                    
-                    facturas_filtradas.append(factura)
-                except Exception as e:
-                    logger.error(f"Error al procesar factura: {str(e)}", exc_info=True)
-                    continue
+            # Filtrar facturas con dos búsquedas binarias sobre el índice de fechas
+            facturas_filtradas = self.indice_fechas.rango(fecha_desde, fecha_hasta, tipo)
             
             # Mostrar resultados en la tabla de rango
             self.mostrar_resultados_filtrados(facturas_filtradas, self.tabla_filtro_rango)
@@ -1423,47 +1718,19 @@ class MainWindow(QMainWindow):
             dia = self.combo_filtro_dia.currentIndex()  # 0 = Todos, 1-31 = días
             tipo = self.combo_filtro_tipo_fechas.currentData()
             
-            # Filtrar facturas
-            facturas_filtradas = []
-            for factura in self.facturas:
-                try:
-                    # Verificar si la factura tiene el formato de fecha esperado
-                    if 'fecha' not in factura or not isinstance(factura['fecha'], str):
-                        continue
-                        
-                    # Manejar diferentes formatos de fecha
-                    try:
-                        fecha = datetime.strptime(factura['fecha'], '%d/%m/%Y')
-                    except ValueError:
-                        try:
-                            fecha = datetime.strptime(factura['fecha'], '%Y-%m-%d')
-                        except ValueError:
-                            logger.warning(f"Formato de fecha no reconocido: {factura['fecha']}")
-                            continue
-                    
-                    # Verificar año
-                    if anio is not None and fecha.year != anio:
-                        continue
-                    
-                    # Verificar mes
-                    if mes > 0 and fecha.month != mes:  # Si no es "Todos los meses"
-                        continue
-                    
-                    # Verificar día
-                    if dia > 0 and fecha.day != dia:  # Si no es "Todos los días"
-                        continue
-                    
-                    # Verificar tipo de gasto
-                    if tipo is not None and factura.get('tipo') != tipo:
-                        continue
-                    
-                    facturas_filtradas.append(factura)
-                except Exception as e:
-                    logger.error(f"Error al procesar factura: {str(e)}", exc_info=True)
-                    continue
+            # Resolver la combinación de filtros en el índice de calendario;
+            # el total sale de las sumas de los nodos
+            criterios = dict(
+                anio=anio,
+                mes=mes if mes > 0 else None,  # Si no es "Todos los meses"
+                dia=dia if dia > 0 else None,  # Si no es "Todos los días"
+                tipo=tipo
+            )
+            facturas_filtradas = self.indice_calendario.consultar(**criterios)
+            _, total = self.indice_calendario.totales(**criterios)
             
             # Mostrar resultados en la tabla de fechas
-            self.mostrar_resultados_filtrados(facturas_filtradas, self.tabla_filtro_fechas)
+            self.mostrar_resultados_filtrados(facturas_filtradas, self.tabla_filtro_fechas, total)
             
         except Exception as e:
             logger.error(f"Error en aplicar_filtros_fechas: {str(e)}", exc_info=True)
@@ -1501,12 +1768,13 @@ class MainWindow(QMainWindow):
             # Aplicar filtros
             self.aplicar_filtros_fechas()
     
-    def mostrar_resultados_filtrados(self, facturas, tabla_destino=None):
+    def mostrar_resultados_filtrados(self, facturas, tabla_destino=None, total=None):
         """Mostrar las facturas filtradas en la tabla especificada
         
         Args:
             facturas: Lista de facturas a mostrar
             tabla_destino: Tabla donde se mostrarán los resultados (opcional, por defecto usa la tabla activa)
+            total: Total ya calculado de las facturas (opcional, si no se calcula al mostrar)
         """
         try:
             # Determinar qué tabla usar
@@ -1518,823 +1786,241 @@ class MainWindow(QMainWindow):
                 else:  # Fecha específica
                     tabla_destino = self.tabla_filtro_fechas
             
-            # Cerrar cualquier editor activo antes de actualizar
-            if tabla_destino.currentItem() is not None:
-                tabla_destino.closePersistentEditor(tabla_destino.currentItem())
-                
-            # Desconectar la señal temporalmente para evitar múltiples llamadas
-            try:
-                tabla_destino.itemChanged.disconnect(self.guardar_cambios_celda)
-            except:
-                pass  # La señal no estaba conectada
-                
-            # Configurar el número de filas
-            tabla_destino.setRowCount(0)  # Limpiar la tabla
-            tabla_destino.setRowCount(len(facturas) + 1)  # +1 para la fila de total
-            
-            # Establecer altura de fila para mejor legibilidad
-            for i in range(len(facturas) + 1):
-                tabla_destino.setRowHeight(i, 30)  # Aumentar altura de fila a 30 píxeles
-            
-            # Llenar la tabla con los datos de las facturas
-            for i, factura in enumerate(facturas):
-                if not isinstance(factura, dict):
-                    continue
-                
-                try:
-                    # Fecha (editable)
-                    fecha = factura.get('fecha', '')
-                    fecha_item = QTableWidgetItem(str(fecha))
-                    factura_id = factura.get('id')
-                    if factura_id is not None:
-                        fecha_item.setData(Qt.ItemDataRole.UserRole, factura_id)  # Store the ID for updates
-                    tabla_destino.setItem(i, 0, fecha_item)
-                    
-                    # Tipo (editable con dropdown)
-                    tipo = factura.get('tipo', '')
-                    tipo_item = QTableWidgetItem(str(tipo))
-                    tipo_item.setFlags(tipo_item.flags() | Qt.ItemFlag.ItemIsEditable | Qt.ItemFlag.ItemIsEnabled)
-                    tabla_destino.setItem(i, 1, tipo_item)
-                    
-                    # Descripción (editable)
-                    descripcion = factura.get('descripcion', '')
-                    desc_item = QTableWidgetItem(str(descripcion))
-                    desc_item.setFlags(desc_item.flags() | Qt.ItemFlag.ItemIsEditable)
-                    tabla_destino.setItem(i, 2, desc_item)
-                    
-                    # Valor (editable)
-                    valor = float(factura.get('valor', 0))
-                    valor_formateado = f"${valor:,.0f} COP".replace(',', '.')
-                    valor_item = QTableWidgetItem(valor_formateado)
-                    valor_item.setData(Qt.ItemDataRole.UserRole + 1, valor)  # Store raw value for editing
-                    valor_item.setFlags(valor_item.flags() | Qt.ItemFlag.ItemIsEditable)
-                    tabla_destino.setItem(i, 3, valor_item)
-                    
-                except Exception as e:
-                    logger.error(f"Error al mostrar factura {i}: {str(e)}", exc_info=True)
-                    continue
-            
-            # Calcular total
-            try:
-                total = sum(float(factura.get('valor', 0)) for factura in facturas if isinstance(factura, dict))
-            except Exception as e:
-                logger.error(f"Error al calcular el total: {str(e)}")
-                total = 0
-            
-            # Agregar fila de total
-            total_row = len(facturas)
-            
-            # Celda vacía
-            empty_item = QTableWidgetItem("")
-            empty_item.setFlags(empty_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            tabla_destino.setItem(total_row, 0, empty_item)
-            
-            # Celda vacía
-            empty_item2 = QTableWidgetItem("")
-            empty_item2.setFlags(empty_item2.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            tabla_destino.setItem(total_row, 1, empty_item2)
-            
-            # Celda de TOTAL:
-            total_label = QTableWidgetItem("TOTAL:")
-            total_label.setFlags(total_label.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            font = total_label.font()
-            font.setBold(True)
-            total_label.setFont(font)
-            tabla_destino.setItem(total_row, 2, total_label)
-            
-            # Celda de valor total
-            total_value = QTableWidgetItem(f"${total:,.0f} COP".replace(',', '.'))
-            total_value.setFlags(total_value.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            total_value.setFont(font)
-            tabla_destino.setItem(total_row, 3, total_value)
-            
-            # Resaltar la fila de total
-            for col in range(tabla_destino.columnCount()):
-                item = tabla_destino.item(total_row, col)
-                if item:
-                    if self.tema_oscuro:
-                        item.setBackground(QColor(100, 100, 100))  # Gris oscuro para el tema oscuro
-                        item.setForeground(QColor(255, 255, 255))  # Texto en blanco para mejor contraste
-                    else:
-                        item.setBackground(QColor(230, 230, 230))  # Gris claro para el tema claro
-                        item.setForeground(QColor(0, 0, 0))  # Texto en negro
+            # El modelo reemplaza el conjunto filtrado y calcula el total una sola vez;
+            # la vista solo pide las filas visibles
+            modelo = tabla_destino.model()
+            modelo.tema_oscuro = self.tema_oscuro
+            modelo.set_facturas(facturas, total)
             
         except Exception as e:
             logger.error(f"Error en mostrar_resultados_filtrados: {str(e)}", exc_info=True)
             QMessageBox.critical(self, "Error", f"Se produjo un error al mostrar los resultados: {str(e)}")
-        finally:
-            # Reconectar la señal al final, solo si no está ya conectada
-            try:
-                tabla_destino.itemChanged.disconnect()
-            except:
-                pass
-            tabla_destino.itemChanged.connect(self.guardar_cambios_celda)
 
-    def _mostrar_vista_previa(self, facturas, tipo_archivo):
-        """Mostrar una vista previa de las facturas a importar"""
-        dialog = QDialog(self)
-        dialog.setWindowTitle(f"Vista Previa - {tipo_archivo}")
-        dialog.resize(800, 500)
-        
-        layout = QVBoxLayout(dialog)
-        
-        # Crear tabla para la vista previa
-        tabla = QTableWidget(dialog)
-        tabla.setColumnCount(5)
-        tabla.setHorizontalHeaderLabels(["Fecha", "Tipo", "Descripción", "Valor (COP)", "Estado"])
-        tabla.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        
-        # Mostrar hasta 10 filas como vista previa
-        num_filas = min(10, len(facturas))
-        tabla.setRowCount(num_filas)
-        
-        # Llenar la tabla con datos de vista previa
-        for i in range(num_filas):
-            factura = facturas[i]
-            tabla.setItem(i, 0, QTableWidgetItem(factura.get('fecha', '')))
-            tabla.setItem(i, 1, QTableWidgetItem(factura.get('tipo', '')))
-            tabla.setItem(i, 2, QTableWidgetItem(factura.get('descripcion', '')))
-            tabla.setItem(i, 3, QTableWidgetItem(f"${factura.get('valor', 0):,.0f} COP".replace(',', '.')))
-            tabla.setItem(i, 4, QTableWidgetItem("✅ Válido"))
-        
-        # Mostrar resumen
-        total_facturas = len(facturas)
-        resumen = QLabel(f"Mostrando {num_filas} de {total_facturas} facturas encontradas.")
+    def importar_desde_csv(self):
+        """Importar facturas desde un archivo CSV
         
-        # Botones
-        btn_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
-        btn_box.accepted.connect(dialog.accept)
-        btn_box.rejected.connect(dialog.reject)
+        El archivo se lee, valida e inserta por bloques en segundo plano, sin
+        cargarlo completo en memoria; al terminar se recargan los datos.
+        """
+        # Abrir diálogo para seleccionar archivo
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Seleccionar archivo CSV",
+            "",
+            "Archivos CSV (*.csv);;Todos los archivos (*)"
+        )
         
-        layout.addWidget(QLabel("Vista previa de las primeras facturas a importar:"))
-        layout.addWidget(tabla)
-        layout.addWidget(resumen)
-        layout.addWidget(btn_box)
+        if not file_path:
+            return  # Usuario canceló el diálogo
         
-        return dialog.exec() == QDialog.DialogCode.Accepted
+        self._iniciar_importacion(importar_csv, file_path, "CSV")
     
-    def _procesar_importacion(self, facturas_importadas, tipo_archivo):
-        """Procesar la importación con diálogo de progreso"""
-        # Crear diálogo de progreso
-        progress = QProgressDialog(
-            f"Importando {len(facturas_importadas)} facturas desde {tipo_archivo}...",
-            "Cancelar", 0, len(facturas_importadas), self)
-        progress.setWindowTitle("Importando facturas")
-        progress.setWindowModality(Qt.WindowModality.WindowModal)
-        progress.setMinimumDuration(1000)  # Mostrar después de 1 segundo
-        
-        # Mostrar diálogo de confirmación con vista previa
-        if not self._mostrar_vista_previa(facturas_importadas, tipo_archivo):
-            return False
+    def _iniciar_importacion(self, importar, file_path, tipo_archivo, **opciones):
+        """Importar un archivo por flujo en el ejecutor de la base de datos
         
-        # Preguntar al usuario si desea sobrescribir o agregar
+        Args:
+            importar (callable): importar_csv o importar_excel
+            file_path (str): Ruta del archivo
+            tipo_archivo (str): Nombre del formato para los mensajes
+            **opciones: Argumentos adicionales para la función de importación
+        """
+        # Preguntar antes de leer, porque el archivo se importa mientras se lee
         reply = QMessageBox.question(
             self,
             f'Importar {tipo_archivo}',
-            f'¿Desea sobrescribir las facturas existentes con las {len(facturas_importadas)} facturas del archivo?\n' \
+            '¿Desea sobrescribir las facturas existentes con las facturas del archivo?\n'
             '"No" agregará las facturas a las existentes.',
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel,
             QMessageBox.StandardButton.Cancel
         )
-        
         if reply == QMessageBox.StandardButton.Cancel:
-            return False
+            return
         
-        # Guardar copia de seguridad de los datos actuales
-        facturas_originales = self.facturas.copy()
+        # Los cambios pendientes se guardan antes; las escrituras se aplican en orden
+        self.guardar_datos()
         
-        try:
-            # Actualizar la barra de estado
-            self.statusBar().showMessage(f"Importando {len(facturas_importadas)} facturas...")
-            
-            # Procesar la importación con barra de progreso
-            for i, factura in enumerate(facturas_importadas, 1):
-                if progress.wasCanceled():
-                    break
-                    
-                progress.setValue(i)
-                QApplication.processEvents()  # Mantener la interfaz responsiva
-                
-            # Aplicar los cambios según la opción seleccionada
-            if reply == QMessageBox.StandardButton.Yes:
-                self.facturas = facturas_importadas
-            else:
-                self.facturas.extend(facturas_importadas)
-            
-            # Guardar los datos
-            if not self.guardar_datos():
-                raise Exception("No se pudieron guardar los datos")
-            
-            # Actualizar la interfaz
-            self.actualizar_tabla_facturas()
-            self.actualizar_resumenes()
-            
-            # Mostrar notificación de éxito
-            self.statusBar().showMessage(
-                f"Se importaron {len(facturas_importadas)} facturas correctamente.", 
-                5000  # Mostrar por 5 segundos
-            )
-            
-            # Mostrar mensaje de éxito con más detalles
+        cancelar = threading.Event()
+        progress = QProgressDialog(f"Importando archivo {tipo_archivo}...", "Cancelar", 0, ESCALA_PROGRESO, self)
+        progress.setWindowTitle("Importando facturas")
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setMinimumDuration(500)
+        progress.canceled.connect(cancelar.set)
+        
+        self.ejecutor_db.escribir(
+            importar, self.db, file_path,
+            reemplazar=reply == QMessageBox.StandardButton.Yes,
+            cancelado=cancelar.is_set,
+            mensaje=f"Importando archivo {tipo_archivo}...",
+            al_progreso=lambda hechas, total: progress.setValue(hechas),
+            al_terminar=lambda resultado: self._importacion_terminada(resultado, progress, tipo_archivo, file_path),
+            al_fallar=lambda error: self._importacion_fallida(error, progress, tipo_archivo),
+            **opciones
+        )
+    
+    def _importacion_terminada(self, resultado, progress, tipo_archivo, file_path):
+        """Mostrar el resultado de una importación por flujo y recargar los datos"""
+        progress.close()
+        self.cargar_datos(actualizar_ui=True)
+        
+        importadas = resultado['importadas']
+        errores = resultado['errores']
+        logger.info(f"Se importaron {importadas} facturas desde {file_path}")
+        self.statusBar().showMessage(f"Se importaron {importadas} facturas correctamente.", 5000)
+        
+        if not errores:
             QMessageBox.information(
-                self, 
-                "Importación exitosa", 
-                f"Se importaron {len(facturas_importadas)} facturas desde el archivo {tipo_archivo}.\n\n"
-                f"Total de facturas actuales: {len(self.facturas)}"
+                self,
+                "Importación exitosa",
+                f"Se importaron {importadas} facturas desde el archivo {tipo_archivo}."
             )
-            
-            return True
-            
-        except Exception as e:
-            # En caso de error, restaurar los datos originales
-            self.facturas = facturas_originales
+            return
+        
+        # Mostrar las advertencias (solo se conservan las primeras)
+        error_dialog = QDialog(self)
+        error_dialog.setWindowTitle("Advertencias de importación")
+        error_dialog.resize(600, 400)
+        
+        layout = QVBoxLayout()
+        resumen = QLabel(
+            f"Se encontraron {len(errores)} filas con errores que no se importaron.\n"
+            f"Se importaron {importadas} facturas correctamente."
+        )
+        error_text = QTextEdit()
+        error_text.setReadOnly(True)
+        error_text.setPlainText(errores.texto())
+        btn_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok)
+        btn_box.accepted.connect(error_dialog.accept)
+        
+        layout.addWidget(resumen)
+        layout.addWidget(QLabel("Detalles de las advertencias:"))
+        layout.addWidget(error_text)
+        layout.addWidget(btn_box)
+        error_dialog.setLayout(layout)
+        error_dialog.exec()
+    
+    def _importacion_fallida(self, error, progress, tipo_archivo):
+        """Informar por qué no se completó una importación por flujo"""
+        progress.close()
+        if isinstance(error, ImportacionCancelada):
+            self.statusBar().showMessage("Importación cancelada; no se importó ninguna factura.", 5000)
+        elif isinstance(error, json.JSONDecodeError):
+            QMessageBox.critical(self, "Error", f"El archivo seleccionado no es un JSON válido.\n\n{str(error)}")
+        elif isinstance(error, ValueError):
+            QMessageBox.critical(self, "Error de formato", str(error))
+        else:
             error_msg = (
-                f"Error al importar las facturas:\n\n"
-                f"Error: {str(e)}\n\n"
-                f"Se han restaurado los datos originales."
+                f"Error al procesar el archivo {tipo_archivo}:\n\n"
+                f"Error: {str(error)}\n\n"
+                f"Asegúrese de que el archivo no esté abierto en otro programa y que tenga el formato correcto."
             )
-            logger.error(f"Error en importación: {str(e)}", exc_info=True)
             QMessageBox.critical(self, "Error en la importación", error_msg)
-            return False
     
-    def importar_desde_csv(self):
-        """Importar facturas desde un archivo CSV"""
+    def importar_desde_excel(self):
+        """Importar facturas desde un archivo Excel
+        
+        El libro se lee en modo de solo lectura, fila por fila, en segundo plano.
+        """
         # Abrir diálogo para seleccionar archivo
         file_path, _ = QFileDialog.getOpenFileName(
             self,
-            "Seleccionar archivo CSV",
+            "Seleccionar archivo Excel",
             "",
-            "Archivos CSV (*.csv);;Todos los archivos (*)"
+            "Archivos Excel (*.xlsx *.xls);;Todos los archivos (*)"
         )
         
         if not file_path:
             return  # Usuario canceló el diálogo
         
-        # Mostrar indicador de carga
-        loading_box = QMessageBox(self)
-        loading_box.setWindowTitle("Cargando archivo")
-        loading_box.setText("Procesando archivo CSV, por favor espere...")
-        loading_box.setStandardButtons(QMessageBox.StandardButton.NoButton)
-        loading_box.show()
-        QApplication.processEvents()
-        
         try:
-            facturas_importadas = []
-            errores = []
-            total_lineas = 0
-            
-            # Primera pasada: contar líneas para la barra de progreso
-            with open(file_path, 'r', encoding='utf-8') as f:
-                total_lineas = sum(1 for _ in f) - 1  # Restar 1 por el encabezado
-            
-            # Crear diálogo de progreso para la lectura
-            progress = QProgressDialog("Leyendo archivo CSV...", "Cancelar", 0, total_lineas, self)
-            progress.setWindowModality(Qt.WindowModality.WindowModal)
-            progress.setMinimumDuration(0)
-            progress.setValue(0)
-            
-            # Segunda pasada: procesar el archivo
-            with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                lineas_procesadas = 0
-                
-                # Verificar que el CSV tenga las columnas necesarias
-                required_columns = {'fecha', 'tipo', 'descripcion', 'valor'}
-                if not required_columns.issubset(reader.fieldnames):
-                    progress.close()
-                    QMessageBox.critical(
-                        self, 
-                        "Error de formato", 
-                        f"El archivo CSV debe contener las columnas: {', '.join(required_columns)}\n\n"
-                        f"Columnas encontradas: {', '.join(reader.fieldnames) if reader.fieldnames else 'Ninguna'}"
-                    )
-                    return
-                
-                for row in reader:
-                    if progress.wasCanceled():
-                        return
-                        
-                    lineas_procesadas += 1
-                    progress.setValue(lineas_procesadas)
-                    QApplication.processEvents()
-                    
-                    try:
-                        # Validar y convertir los datos
-                        fecha = row['fecha'].strip()
-                        tipo = row['tipo'].strip()
-                        descripcion = row['descripcion'].strip()
-                        
-                        # Validar campos obligatorios
-                        if not all([fecha, tipo, descripcion, row['valor']]):
-                            errores.append(f"Fila {lineas_procesadas + 1}: Faltan campos obligatorios")
-                            continue
-                        
-                        try:
-                            # Manejar diferentes formatos de valor (con comas, puntos, etc.)
-                            valor_str = str(row['valor']).replace('$', '').replace(',', '').strip()
-                            valor = float(valor_str)
-                            if valor <= 0:
-                                raise ValueError("El valor debe ser mayor a cero")
-                        except (ValueError, TypeError) as ve:
-                            errores.append(f"Fila {lineas_procesadas + 1}: Valor inválido - {str(ve)}")
-                            continue
-                        
-                        # Validar formato de fecha (DD/MM/YYYY)
-                        try:
-                            fecha_dt = datetime.strptime(fecha, '%d/%m/%Y')
-                            fecha = fecha_dt.strftime('%d/%m/%Y')  # Estandarizar formato
-                        except ValueError:
-                            errores.append(f"Fila {lineas_procesadas + 1}: Formato de fecha inválido (debe ser DD/MM/YYYY)")
-                            continue
-                        
-                        # Crear objeto de factura
-                        factura = {
-                            'fecha': fecha,
-                            'tipo': tipo,
-                            'descripcion': descripcion,
-                            'valor': valor,
-                            'timestamp': datetime.now().isoformat()
-                        }
-                        facturas_importadas.append(factura)
-                        
-                    except Exception as e:
-                        error_msg = f"Fila {lineas_procesadas + 1}: {str(e)}"
-                        logger.error(f"Error al procesar fila del CSV: {row}. Error: {error_msg}")
-                        errores.append(error_msg)
-                        continue
-            
-            progress.close()
-            loading_box.close()
-            
-            # Mostrar advertencias si hay errores
-            if errores:
-                error_dialog = QDialog(self)
-                error_dialog.setWindowTitle("Advertencias de importación")
-                error_dialog.resize(600, 400)
-                
-                layout = QVBoxLayout()
-                
-                # Mostrar resumen
-                resumen = QLabel(
-                    f"Se encontraron {len(errores)} advertencias durante la importación.\n"
-                    f"Se importaron {len(facturas_importadas)} facturas correctamente."
-                )
-                
-                # Área de texto para mostrar los errores
-                error_text = QTextEdit()
-                error_text.setReadOnly(True)
-                error_text.setPlainText("\n".join(errores))
-                
-                # Botón para continuar
-                btn_continuar = QPushButton("Continuar con la importación")
-                btn_continuar.clicked.connect(error_dialog.accept)
-                
-                # Botón para cancelar
-                btn_cancelar = QPushButton("Cancelar importación")
-                btn_cancelar.clicked.connect(error_dialog.reject)
-                
-                # Layout de botones
-                btn_layout = QHBoxLayout()
-                btn_layout.addStretch()
-                btn_layout.addWidget(btn_continuar)
-                btn_layout.addWidget(btn_cancelar)
-                
-                # Agregar widgets al layout
-                layout.addWidget(resumen)
-                layout.addWidget(QLabel("Detalles de las advertencias:"))
-                layout.addWidget(error_text)
-                layout.addLayout(btn_layout)
-                
-                error_dialog.setLayout(layout)
-                
-                if error_dialog.exec() != QDialog.DialogCode.Accepted:
-                    return False
-            
-            if not facturas_importadas:
-                QMessageBox.warning(
-                    self, 
-                    "Ninguna factura válida", 
-                    "No se encontraron facturas válidas en el archivo."
-                )
-                return
-            
-            # Procesar la importación con la nueva función de ayuda
-            return self._procesar_importacion(facturas_importadas, "CSV")
-            
+            # Solo se leen los nombres de las hojas, no sus celdas
+            nombres_hojas = hojas_excel(file_path)
         except Exception as e:
-            loading_box.close()
             error_msg = (
-                f"Error al procesar el archivo CSV:\n\n"
+                f"Error al procesar el archivo Excel:\n\n"
                 f"Error: {str(e)}\n\n"
                 f"Asegúrese de que el archivo no esté abierto en otro programa y que tenga el formato correcto."
             )
-            logger.error(f"Error al importar desde CSV: {str(e)}", exc_info=True)
+            logger.error(f"Error al importar desde Excel: {str(e)}", exc_info=True)
             QMessageBox.critical(self, "Error en la importación", error_msg)
             return False
+        
+        # Crear diálogo para seleccionar hoja
+        sheet_dialog = QDialog(self)
+        sheet_dialog.setWindowTitle("Seleccionar hoja")
+        sheet_dialog.setMinimumWidth(300)
+        
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel("Seleccione la hoja que contiene los datos:"))
+        
+        # Lista de hojas disponibles
+        sheet_list = QListWidget()
+        sheet_list.addItems(nombres_hojas)
+        sheet_list.setCurrentRow(0)  # Seleccionar la primera hoja por defecto
+        layout.addWidget(sheet_list)
+        
+        # Botones
+        btn_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        btn_box.accepted.connect(sheet_dialog.accept)
+        btn_box.rejected.connect(sheet_dialog.reject)
+        layout.addWidget(btn_box)
+        
+        sheet_dialog.setLayout(layout)
+        
+        if sheet_dialog.exec() != QDialog.DialogCode.Accepted or sheet_list.currentItem() is None:
+            return
+        
+        self._iniciar_importacion(importar_excel, file_path, "Excel", hoja=sheet_list.currentItem().text())
     
-    def importar_desde_excel(self):
-        """Importar facturas desde un archivo Excel"""
-        # Abrir diálogo para seleccionar archivo
-        file_path, _ = QFileDialog.getOpenFileName(
-            self,
-            "Seleccionar archivo Excel",
-            "",
-            "Archivos Excel (*.xlsx *.xls);;Todos los archivos (*)"
-        )
+    def cargar_datos(self, actualizar_ui=True):
+        """Cargar datos desde la base de datos
         
-        if not file_path:
-            return  # Usuario canceló el diálogo
+        Con actualizar_ui la lectura se hace en segundo plano y la interfaz se
+        actualiza cuando termina; sin ella (al iniciar, antes de mostrar la
+        ventana) la lectura es inmediata.
+        
+        Args:
+            actualizar_ui (bool): Si es True, actualiza la interfaz de usuario
+        """
+        if actualizar_ui:
+            self.ejecutor_db.leer(
+                self._leer_datos,
+                al_terminar=lambda datos: self._aplicar_datos(*datos, actualizar_ui=True),
+                al_fallar=self._error_al_cargar_datos,
+                mensaje="Cargando facturas..."
+            )
+            return True
         
-        # Mostrar indicador de carga
-        loading_box = QMessageBox(self)
-        loading_box.setWindowTitle("Cargando archivo")
-        loading_box.setText("Procesando archivo Excel, por favor espere...")
-        loading_box.setStandardButtons(QMessageBox.StandardButton.NoButton)
-        loading_box.show()
-        QApplication.processEvents()
+        try:
+            return self._aplicar_datos(*self._leer_datos(), actualizar_ui=False)
+        except Exception as e:
+            self._error_al_cargar_datos(e)
+            return False
+    
+    def _leer_datos(self):
+        """Leer tipos de gasto y facturas; se puede ejecutar en cualquier hilo"""
+        return self.db.obtener_tipos_gasto(), self.db.obtener_facturas()
+    
+    def _aplicar_datos(self, tipos_gasto, facturas, actualizar_ui):
+        """Reemplazar los datos en memoria por los leídos de la base de datos
         
+        Args:
+            tipos_gasto (list): Tipos de gasto leídos
+            facturas (list): Facturas leídas
+            actualizar_ui (bool): Si es True, actualiza la interfaz de usuario
+        """
         try:
-            # Cargar el libro de trabajo de Excel
-            wb = openpyxl.load_workbook(file_path, data_only=True)
-            
-            # Crear diálogo para seleccionar hoja
-            sheet_dialog = QDialog(self)
-            sheet_dialog.setWindowTitle("Seleccionar hoja")
-            sheet_dialog.setMinimumWidth(300)
-            
-            layout = QVBoxLayout()
-            
-            # Mostrar resumen
-            resumen = QLabel("Seleccione la hoja que contiene los datos:")
-            
-            # Lista de hojas disponibles
-            sheet_list = QListWidget()
-            sheet_list.addItems(wb.sheetnames)
-            sheet_list.setCurrentRow(0)  # Seleccionar la primera hoja por defecto
-            layout.addWidget(sheet_list)
-            
-            # Botones
-            btn_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
-            btn_box.accepted.connect(sheet_dialog.accept)
-            btn_box.rejected.connect(sheet_dialog.reject)
-            layout.addWidget(btn_box)
-            
-            sheet_dialog.setLayout(layout)
-            
-            if sheet_dialog.exec() != QDialog.DialogCode.Accepted:
-                loading_box.close()
-                return
-            
-            # Obtener la hoja seleccionada
-            selected_sheet = sheet_list.currentItem().text()
-            sheet = wb[selected_sheet]
-            
-            # Actualizar mensaje de carga
-            loading_box.setText(f"Procesando hoja: {selected_sheet}...")
-            QApplication.processEvents()
-            
-            # Obtener los encabezados
-            headers = [str(cell.value).strip().lower() if cell.value else '' for cell in sheet[1]]
-            
-            # Verificar que los encabezados requeridos estén presentes
-            required_columns = ['fecha', 'tipo', 'descripcion', 'valor']
-            
-            # Mapear los índices de las columnas
-            column_indices = {}
-            missing_columns = []
-            
-            for col in required_columns:
-                try:
-                    column_indices[col] = headers.index(col)
-                except ValueError:
-                    missing_columns.append(col)
-            
-            if missing_columns:
-                loading_box.close()
-                QMessageBox.critical(
-                    self, 
-                    "Error de formato", 
-                    f"El archivo Excel debe contener las columnas: {', '.join(required_columns)}.\n"
-                    f"Columnas faltantes: {', '.join(missing_columns)}\n\n"
-                    f"Columnas encontradas: {', '.join([h for h in headers if h]) or 'Ninguna'}"
-                )
-                return
-            
-            # Contar filas para la barra de progreso
-            total_rows = sheet.max_row - 1  # Restar la fila de encabezados
-            
-            # Crear diálogo de progreso para la lectura
-            progress = QProgressDialog("Leyendo archivo Excel...", "Cancelar", 0, total_rows, self)
-            progress.setWindowModality(Qt.WindowModality.WindowModal)
-            progress.setMinimumDuration(0)
-            progress.setValue(0)
-            
-            # Leer las facturas
-            facturas_importadas = []
-            errores = []
-            
-            for i, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), 2):  # Empezar desde la fila 2
-                if progress.wasCanceled():
-                    loading_box.close()
-                    return
-                
-                progress.setValue(i-1)  # Ajustar para empezar desde 0
-                QApplication.processEvents()
-                
-                try:
-                    # Obtener los valores de las celdas
-                    fecha = str(row[column_indices['fecha']]).strip() if row[column_indices['fecha']] else ""
-                    tipo = str(row[column_indices['tipo']]).strip() if row[column_indices['tipo']] else ""
-                    descripcion = str(row[column_indices['descripcion']]).strip() if row[column_indices['descripcion']] else ""
-                    valor_celda = row[column_indices['valor']]
-                    
-                    # Validar campos obligatorios
-                    if not all([fecha, tipo, descripcion, valor_celda is not None]):
-                        errores.append(f"Fila {i}: Faltan campos obligatorios")
-                        continue
-                    
-                    try:
-                        # Manejar diferentes formatos de valor
-                        valor_str = str(valor_celda).replace('$', '').replace(',', '').strip()
-                        valor = float(valor_str)
-                        if valor <= 0:
-                            raise ValueError("El valor debe ser mayor a cero")
-                    except (ValueError, TypeError) as ve:
-                        errores.append(f"Fila {i}: Valor inválido - {str(ve)}")
-                        continue
-                    
-                    # Validar formato de fecha (DD/MM/YYYY)
-                    try:
-                        fecha_dt = datetime.strptime(fecha, '%d/%m/%Y')
-                        fecha = fecha_dt.strftime('%d/%m/%Y')  # Estandarizar formato
-                    except ValueError:
-                        errores.append(f"Fila {i}: Formato de fecha inválido (debe ser DD/MM/YYYY)")
-                        continue
-                    
-                    # Crear objeto de factura
-                    factura = {
-                        'fecha': fecha,
-                        'tipo': tipo,
-                        'descripcion': descripcion,
-                        'valor': valor,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    facturas_importadas.append(factura)
-                    
-                except Exception as e:
-                    error_msg = f"Fila {i}: {str(e)}"
-                    logger.error(f"Error al procesar fila del Excel: {row}. Error: {error_msg}")
-                    errores.append(error_msg)
-                    continue
-            
-            progress.close()
-            loading_box.close()
-            
-            # Mostrar advertencias si hay errores
-            if errores:
-                error_dialog = QDialog(self)
-                error_dialog.setWindowTitle("Advertencias de importación")
-                error_dialog.resize(600, 400)
-                
-                layout = QVBoxLayout()
-                
-                # Mostrar resumen
-                resumen = QLabel(
-                    f"Se encontraron {len(errores)} advertencias durante la importación.\n"
-                    f"Se importaron {len(facturas_importadas)} facturas correctamente."
-                )
-                
-                # Área de texto para mostrar los errores
-                error_text = QTextEdit()
-                error_text.setReadOnly(True)
-                error_text.setPlainText("\n".join(errores))
-                
-                # Botón para continuar
-                btn_continuar = QPushButton("Continuar con la importación")
-                btn_continuar.clicked.connect(error_dialog.accept)
-                
-                # Botón para cancelar
-                btn_cancelar = QPushButton("Cancelar importación")
-                btn_cancelar.clicked.connect(error_dialog.reject)
-                
-                # Layout de botones
-                btn_layout = QHBoxLayout()
-                btn_layout.addStretch()
-                btn_layout.addWidget(btn_continuar)
-                btn_layout.addWidget(btn_cancelar)
-                
-                # Agregar widgets al layout
-                layout.addWidget(resumen)
-                layout.addWidget(QLabel("Detalles de las advertencias:"))
-                layout.addWidget(error_text)
-                layout.addLayout(btn_layout)
-                
-                error_dialog.setLayout(layout)
-                
-                if error_dialog.exec() != QDialog.DialogCode.Accepted:
-                    return False
-            
-            if not facturas_importadas:
-                QMessageBox.warning(
-                    self, 
-                    "Ninguna factura válida", 
-                    "No se encontraron facturas válidas en el archivo."
-                )
-                return
-            
-            # Procesar la importación con la nueva función de ayuda
-            return self._procesar_importacion(facturas_importadas, "Excel")
-            
-        except Exception as e:
-            loading_box.close()
-            error_msg = (
-                f"Error al procesar el archivo Excel:\n\n"
-                f"Error: {str(e)}\n\n"
-                f"Asegúrese de que el archivo no esté abierto en otro programa y que tenga el formato correcto."
-            )
-            logger.error(f"Error al importar desde Excel: {str(e)}", exc_info=True)
-            QMessageBox.critical(self, "Error en la importación", error_msg)
-            return False
-    
-    def importar_desde_json(self):
-        """Importar facturas desde un archivo JSON con diálogo de progreso y validación"""  
-        # Abrir diálogo para seleccionar archivo
-        file_path, _ = QFileDialog.getOpenFileName(
-            self,
-            "Seleccionar archivo JSON",
-            "",
-            "Archivos JSON (*.json);;Todos los archivos (*)"
-        )
-    
-        if not file_path:
-            return  # Usuario canceló el diálogo
-        
-        # Mostrar indicador de carga
-        loading_box = QMessageBox(self)
-        loading_box.setWindowTitle("Cargando archivo")
-        loading_box.setText("Procesando archivo JSON, por favor espere...")
-        loading_box.setStandardButtons(QMessageBox.StandardButton.NoButton)
-        loading_box.show()
-        QApplication.processEvents()
-        
-        try:
-            # Leer el archivo JSON
-            with open(file_path, 'r', encoding='utf-8') as f:
-                facturas_importadas = json.load(f)
-            
-            loading_box.close()
-            
-            if not isinstance(facturas_importadas, list):
-                QMessageBox.critical(
-                    self,
-                    "Error",
-                    "El archivo JSON debe contener una lista de facturas."
-                )
-                return
-                
-            # Validar facturas
-            facturas_validas = []
-            errores = []
-            
-            # Crear diálogo de progreso
-            progress = QProgressDialog(
-                f"Validando {len(facturas_importadas)} facturas...",
-                "Cancelar", 0, len(facturas_importadas), self)
-            progress.setWindowTitle("Validando facturas")
-            progress.setWindowModality(Qt.WindowModality.WindowModal)
-            progress.setMinimumDuration(500)  # Mostrar después de 500ms
-            
-            # Validar cada factura
-            for i, factura in enumerate(facturas_importadas):
-                if progress.wasCanceled():
-                    QMessageBox.information(self, "Importación cancelada", 
-                                        "La importación ha sido cancelada por el usuario.")
-                    return
-                    
-                progress.setValue(i)
-                progress.setLabelText(f"Validando factura {i+1} de {len(facturas_importadas)}...")
-                QApplication.processEvents()
-                
-                try:
-                    # Validar campos obligatorios
-                    if not all(key in factura for key in ['tipo', 'descripcion', 'valor', 'fecha']):
-                        errores.append(f"Factura {i+1}: Faltan campos obligatorios")
-                        continue
-                    
-                    # Validar y convertir tipos de datos
-                    try:
-                        factura['valor'] = float(factura['valor'])
-                        if factura['valor'] <= 0:
-                            raise ValueError("El valor debe ser mayor a cero")
-                    except (ValueError, TypeError) as e:
-                        errores.append(f"Factura {i+1}: Valor inválido - {str(e)}")
-                        continue
-                    
-                    # Validar fecha
-                    try:
-                        datetime.strptime(factura['fecha'], '%d/%m/%Y')
-                    except (ValueError, TypeError):
-                        errores.append(f"Factura {i+1}: Formato de fecha inválido. Use DD/MM/AAAA")
-                        continue
-                    
-                    facturas_validas.append(factura)
-                    
-                except Exception as e:
-                    errores.append(f"Factura {i+1}: Error inesperado - {str(e)}")
-                    continue
-                    
-            progress.close()
-            
-            # Mostrar advertencias si hay errores
-            if errores:
-                error_dialog = QDialog(self)
-                error_dialog.setWindowTitle("Advertencias de importación")
-                error_dialog.resize(600, 400)
-                
-                layout = QVBoxLayout()
-                
-                label = QLabel(f"Se encontraron {len(errores)} advertencias al importar {len(facturas_importadas)} facturas. "
-                            f"Se importarán {len(facturas_validas)} facturas correctas.")
-                label.setWordWrap(True)
-                layout.addWidget(label)
-                
-                text_area = QTextEdit()
-                text_area.setReadOnly(True)
-                text_area.setPlainText("\n".join(errores))
-                layout.addWidget(text_area)
-                
-                button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok)
-                button_box.accepted.connect(error_dialog.accept)
-                layout.addWidget(button_box)
-                
-                error_dialog.setLayout(layout)
-                error_dialog.exec()
-                
-                if not facturas_validas:
-                    return  # No hay facturas válidas para importar
-            
-            # Usar el método _procesar_importacion para manejar la importación
-            if facturas_validas:
-                # Guardar copia de seguridad
-                facturas_originales = self.facturas.copy()
-                
-                try:
-                    # Agregar facturas importadas
-                    self.facturas.extend(facturas_validas)
-                    
-                    # Actualizar interfaz
-                    self.actualizar_lista_facturas()
-                    
-                    # Actualizar resumen solo si el widget existe
-                    if hasattr(self, 'actualizar_resumen'):
-                        try:
-                            self.actualizar_resumen()
-                        except AttributeError as e:
-                            logger.warning(f"No se pudo actualizar el resumen: {str(e)}")
-                    
-                    # Guardar datos
-                    self.guardar_datos()
-                    
-                    QMessageBox.information(
-                        self,
-                        "Importación exitosa",
-                        f"Se importaron {len(facturas_validas)} facturas desde {file_path}."
-                    )
-                    logger.info(f"Se importaron {len(facturas_validas)} facturas desde {file_path}")
-                    
-                except Exception as e:
-                    # Revertir cambios en caso de error
-                    self.facturas = facturas_originales
-                    self.actualizar_lista_facturas()
-                    if hasattr(self, 'actualizar_resumen'):
-                        try:
-                            self.actualizar_resumen()
-                        except:
-                            pass
-                    
-                    error_msg = f"Error al procesar las facturas: {str(e)}"
-                    logger.error(error_msg, exc_info=True)
-                    QMessageBox.critical(self, "Error", error_msg)
-        
-        except json.JSONDecodeError:
-            QMessageBox.critical(self, "Error", "El archivo seleccionado no es un JSON válido.")
-        except Exception as e:
-            error_msg = f"Error al importar desde JSON: {str(e)}"
-            logger.error(error_msg, exc_info=True)
-            QMessageBox.critical(self, "Error", error_msg)
-    
-    def cargar_datos(self, actualizar_ui=True):
-        """Cargar datos desde la base de datos
-        
-        Args:
-            actualizar_ui (bool): Si es True, actualiza la interfaz de usuario
-        """
-        try:
-            # Obtener todos los tipos de gasto de la base de datos
-            self.tipos_gasto = self.db.obtener_tipos_gasto()
-            
-            # Obtener todas las facturas de la base de datos
-            self.facturas = self.db.obtener_facturas()
+            if actualizar_ui and (self.cambios.hay_cambios or self.ejecutor_db.escrituras_pendientes):
+                # Hubo ediciones mientras se leía y la lectura no las incluye: se
+                # guardan y se vuelve a leer detrás de esas escrituras, en lugar de
+                # descartarlas al reemplazar las facturas
+                logger.info("Hay cambios sin guardar; se vuelven a leer los datos después de guardarlos")
+                self.guardar_datos()
+                return self.cargar_datos()
+            
+            self.tipos_gasto = tipos_gasto
+            self.facturas = facturas
+            self.cambios.descartar()
+            self._reconstruir_indices()
             
             # Actualizar la interfaz si está solicitado y los componentes existen
             if actualizar_ui:
@@ -2349,53 +2035,50 @@ class MainWindow(QMainWindow):
             return True
             
         except Exception as e:
-            error_msg = f"Error al cargar los datos de la base de datos: {str(e)}"
-            logger.error(error_msg, exc_info=True)
-            if hasattr(self, 'isVisible'):  # Solo mostrar mensaje si la ventana está visible
-                QMessageBox.critical(self, "Error", error_msg)
-            self.facturas = []
-            self.tipos_gasto = []
+            self._error_al_cargar_datos(e)
             return False
+    
+    def _error_al_cargar_datos(self, error):
+        """Informar un error de carga y dejar los datos vacíos"""
+        error_msg = f"Error al cargar los datos de la base de datos: {str(error)}"
+        logger.error(error_msg, exc_info=error)
+        if hasattr(self, 'isVisible'):  # Solo mostrar mensaje si la ventana está visible
+            QMessageBox.critical(self, "Error", error_msg)
+        self.facturas = []
+        self.tipos_gasto = []
+        self._reconstruir_indices()
             
-    def guardar_datos(self):
-        """Guardar datos en la base de datos"""
+    def guardar_datos(self, al_terminar=None):
+        """Guardar en la base de datos solo los cambios registrados
+        
+        Los cambios ya están aplicados en memoria; la escritura se encola en el
+        ejecutor de la base de datos y la interfaz sigue respondiendo mientras
+        se guarda. Si falla, los cambios quedan pendientes para el siguiente guardado.
+        
+        Args:
+            al_terminar (callable): Opcional, recibe las estadísticas cuando
+                los cambios quedan guardados
+        
+        Returns:
+            bool: True si los cambios se enviaron a guardar
+        """
         try:
-            # Guardar todas las facturas en la base de datos
-            if hasattr(self, 'facturas'):
-                # Obtener las facturas actuales de la base de datos
-                facturas_actuales = {f['id']: f for f in self.db.obtener_facturas()}
-                
-                # Actualizar o insertar facturas
-                for factura in self.facturas:
-                    if 'id' in factura and factura['id'] in facturas_actuales:
-                        # Actualizar factura existente
-                        self.db.actualizar_factura(
-                            factura_id=factura['id'],
-                            fecha=factura['fecha'],
-                            tipo=factura['tipo'],
-                            descripcion=factura['descripcion'],
-                            valor=factura['valor']
-                        )
-                        # Eliminar de facturas_actuales para marcar como procesada
-                        facturas_actuales.pop(factura['id'], None)
-                    else:
-                        # Insertar nueva factura
-                        factura_id = self.db.agregar_factura(
-                            fecha=factura['fecha'],
-                            tipo=factura['tipo'],
-                            descripcion=factura['descripcion'],
-                            valor=factura['valor']
-                        )
-                        # Actualizar el ID en la factura local
-                        factura['id'] = factura_id
-                
-                # Eliminar facturas que ya no están en self.facturas
-                for factura_id in facturas_actuales:
-                    self.db.eliminar_factura(factura_id)
-                
-                logger.info(f"Se guardaron {len(self.facturas)} facturas en la base de datos")
+            if not self.cambios.hay_cambios:
+                if al_terminar:
+                    al_terminar({'insertadas': 0, 'actualizadas': 0, 'eliminadas': 0, 'duracion_ms': 0.0})
                 return True
-            return False
+            
+            # Copiar los cambios ahora; las ediciones posteriores van al siguiente lote
+            pendientes = self.cambios.pendientes()
+            lote = self.cambios.tomar_pendientes()
+            self.ejecutor_db.escribir(
+                self.cambios.confirmar_lote, lote,
+                con_progreso=True,
+                mensaje=f"Guardando {sum(pendientes.values())} cambio(s)...",
+                al_terminar=lambda resultado: self._cambios_guardados(lote, resultado, al_terminar),
+                al_fallar=lambda error: self._error_al_guardar(lote, error)
+            )
+            return True
             
         except Exception as e:
             error_msg = f"Error al guardar los datos en la base de datos: {str(e)}"
@@ -2403,6 +2086,32 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "Error", error_msg)
             return False
     
+    def _cambios_guardados(self, lote, resultado, al_terminar=None):
+        """Cerrar un lote guardado en segundo plano"""
+        estadisticas = self.cambios.finalizar_lote(lote, resultado)
+        self.indice_ids.ids_asignados(lote['nuevas'])
+        logger.info(
+            f"Se guardaron los cambios en {estadisticas['duracion_ms']:.1f} ms: "
+            f"{estadisticas['insertadas']} nuevas, {estadisticas['actualizadas']} actualizadas, "
+            f"{estadisticas['eliminadas']} eliminadas"
+        )
+        
+        # Los resúmenes salen del índice de calendario en memoria, que ya refleja los cambios
+        self.statusBar().showMessage("Cambios guardados correctamente", 3000)
+        if al_terminar:
+            al_terminar(estadisticas)
+    
+    def _error_al_guardar(self, lote, error):
+        """Devolver a pendientes los cambios de un lote que no se pudo guardar"""
+        self.cambios.finalizar_lote(lote, None)
+        error_msg = (
+            f"Error al guardar los datos en la base de datos: {str(error)}\n\n"
+            "Los cambios siguen pendientes y se guardarán con la próxima modificación."
+        )
+        logger.error(error_msg, exc_info=error)
+        if not self._cerrando:  # Al cerrar se reintenta y closeEvent informa si vuelve a fallar
+            QMessageBox.critical(self, "Error", error_msg)
+    
     def exportar_filtros_a_excel(self):
         """Exportar los datos filtrados a un archivo Excel"""
         try:
@@ -2428,7 +2137,8 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Error", "Las tablas de filtro no están inicializadas correctamente.")
                 return
                 
-            if tabla.rowCount() == 0:
+            modelo = tabla.model()
+            if not modelo.facturas:
                 QMessageBox.warning(self, "Exportar a Excel", "No hay datos filtrados para exportar.")
                 return
                 
@@ -2437,6 +2147,7 @@ class MainWindow(QMainWindow):
                 config = get_config()
                 last_dir = config['APP'].get('last_export_dir', str(Path.home() / 'Documents'))
             except Exception as e:
+                config = None
                 last_dir = str(Path.home() / 'Documents')
             
             # Nombre de archivo predeterminado con la fecha actual
@@ -2458,39 +2169,14 @@ class MainWindow(QMainWindow):
             if not file_path.lower().endswith('.xlsx'):
                 file_path += '.xlsx'
                 
-            # Crear un nuevo libro de Excel
-            wb = Workbook()
-            
-            # Eliminar la hoja por defecto
-            for sheet in wb.sheetnames:
-                wb.remove(wb[sheet])
-            
-            # Crear una nueva hoja con el título adecuado
-            ws = wb.create_sheet(title=titulo[:31])  # Limitar a 31 caracteres para Excel
-            
-            # Verificar que la hoja se creó correctamente
-            if not ws:
-                raise Exception("No se pudo crear la hoja de cálculo")
-            
-            # Estilos
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-            
-            # Agregar título
-            ws.append([f"Reporte de Facturas - {titulo}"])
-            ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=4)
-            titulo_cell = ws.cell(row=1, column=1)
-            titulo_cell.font = Font(size=14, bold=True)
-            titulo_cell.alignment = Alignment(horizontal='center')
-            
-            # Agregar rango de fechas o filtro aplicado
+            # Describir el filtro aplicado
             if tipo_filtro == "rango":
                 fecha_desde = self.date_edit_desde.date().toString("dd/MM/yyyy")
                 fecha_hasta = self.date_edit_hasta.date().toString("dd/MM/yyyy")
                 tipo_gasto = self.combo_filtro_tipo_rango.currentText()
-                ws.append([f"Filtro: Desde {fecha_desde} hasta {fecha_hasta}"])
+                filtros = [f"Filtro: Desde {fecha_desde} hasta {fecha_hasta}"]
                 if tipo_gasto != "Todos los tipos":
-                    ws.append([f"Tipo de gasto: {tipo_gasto}"])
+                    filtros.append(f"Tipo de gasto: {tipo_gasto}")
             else:  # fechas
                 anio = self.combo_filtro_anio.currentText()
                 mes = self.combo_filtro_mes.currentText()
@@ -2507,138 +2193,159 @@ class MainWindow(QMainWindow):
                 if tipo_gasto != "Todos los tipos":
                     filtro_texto.append(f"Tipo: {tipo_gasto}")
                     
-                ws.append([" | ".join(filtro_texto) if filtro_texto else "Sin filtros"])
-            
-            # Agregar encabezados
-            headers = ["Fecha", "Tipo", "Descripción", "Valor (COP)"]
-            header_row = ws.max_row + 1
-            
-            # Escribir encabezados manualmente para asegurar la posición correcta
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=header_row, column=col, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-            
-            # Agregar datos de la tabla
-            total = 0
-            data_start_row = header_row + 1  # Empezar después de los encabezados
-            
-            # Primero obtener todos los datos
-            datos = []
-            for row in range(tabla.rowCount()):
-                fecha = tabla.item(row, 0).text()
-                tipo = tabla.item(row, 1).text()
-                descripcion = tabla.item(row, 2).text()
-                valor_texto = tabla.item(row, 3).text().replace('$', '').replace('COP', '').replace('.', '').replace(',', '.').strip()
-                
-                try:
-                    valor = float(valor_texto)
-                    total += valor
-                except (ValueError, AttributeError):
-                    valor = 0
-                
-                datos.append([fecha, tipo, descripcion, valor])
-            
-            # Escribir todos los datos de una vez
-            for fila in datos:
-                ws.append(fila)
-            
-            data_end_row = ws.max_row  # Última fila de datos
-            
-            # Formatear columna de valor como moneda (solo la columna de valor)
-            for row in ws.iter_rows(min_row=data_start_row, max_row=data_end_row, min_col=4, max_col=4):
-                for cell in row:
-                    cell.number_format = '#,##0.00" COP"'
-            
-            # Agregar fila de total (solo una vez)
-            if not hasattr(self, '_total_added'):
-                total_row = ws.max_row + 1
-                ws.cell(row=total_row, column=3, value="Total:")
-                total_cell = ws.cell(row=total_row, column=4, value=total)
-                total_cell.number_format = '#,##0.00" COP"'
-                
-                # Aplicar negrita solo a la fila de total
-                for col in range(1, 5):
-                    ws.cell(row=total_row, column=col).font = Font(bold=True)
-                
-                # Marcar que ya se agregó el total
-                self._total_added = True
-            
-            # Usar data_end_row para la tabla (sin incluir el total)
-            table_end_row = data_end_row
-            
-            # Ajustar ancho de columnas
-            for col_idx in range(1, 5):  # 4 columnas: Fecha, Tipo, Descripción, Valor
-                max_length = 0
-                column_letter = get_column_letter(col_idx)
-                
-                # Obtener el ancho máximo del contenido de la columna
-                for row in range(1, ws.max_row + 1):
-                    cell = ws.cell(row=row, column=col_idx)
-                    if cell.value is not None:
-                        try:
-                            # Verificar si la celda está en un rango combinado
-                            is_merged = any(cell.coordinate in merged_range for merged_range in ws.merged_cells.ranges)
-                            if not is_merged:
-                                value_length = len(str(cell.value).encode('utf-8'))
-                                if value_length > max_length:
-                                    max_length = value_length
-                        except Exception as e:
-                            print(f"Error procesando celda {cell.coordinate}: {e}")
-                
-                # Establecer el ancho de la columna
-                if max_length > 0:
-                    adjusted_width = (max_length + 4) * 1.1
-                    ws.column_dimensions[column_letter].width = min(adjusted_width, 40)
-                else:
-                    ws.column_dimensions[column_letter].width = 15  # Ancho por defecto
+                filtros = [" | ".join(filtro_texto) if filtro_texto else "Sin filtros"]
             
-            # Crear tabla con formato (excluyendo la fila de total)
-            if tabla.rowCount() > 0:
-                # Usar las filas ya calculadas
-                first_data_row = header_row  # Incluye los encabezados
-                last_data_row = data_end_row  # Hasta la última fila de datos
-                
-                # Crear la referencia de rango para la tabla
-                table_ref = f"A{first_data_row}:D{last_data_row}"
-                
-                # Crear la tabla con el rango ajustado
-                table = Table(displayName=f"TablaFiltro{tipo_filtro.capitalize()}", ref=table_ref)
+            def abrir_archivo(ruta):
+                # Abrir el archivo después de exportar
+                try:
+                    os.startfile(ruta)
+                except:
+                    pass  # No se pudo abrir el archivo, pero la exportación fue exitosa
+            
+            # El libro se escribe en segundo plano sobre una copia de las facturas filtradas
+            self._iniciar_exportacion(
+                exportar_filtro_excel, file_path, modelo.facturas, config,
+                al_exportar=abrir_archivo,
+                titulo=titulo,
+                filtros=filtros,
+                nombre_tabla=f"TablaFiltro{tipo_filtro.capitalize()}"
+            )
                 
-                # Configurar el estilo de la tabla
-                style = TableStyleInfo(
-                    name="TableStyleMedium9",
-                    showFirstColumn=False,
-                    showLastColumn=False,
-                    showRowStripes=True,
-                    showColumnStripes=False
-                )
-                table.tableStyleInfo = style
-                ws.add_table(table)
-            
-            # Guardar el archivo
-            wb.save(file_path)
-            
-            # Actualizar el directorio de exportación en la configuración
+        except Exception as e:
+            error_msg = f"Error al exportar a Excel: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            QMessageBox.critical(self, "Error", error_msg)
+    
+    def _iniciar_exportacion(self, exportar, file_path, facturas, config, al_exportar=None, **opciones):
+        """Exportar a Excel en segundo plano sin bloquear la interfaz
+        
+        Se exporta una copia de las facturas tomada ahora, así que el usuario
+        puede seguir trabajando mientras se escribe el libro. El archivo de
+        destino solo se reemplaza cuando el libro está completo.
+        
+        Args:
+            exportar (callable): exportar_excel o exportar_filtro_excel
+            file_path (str): Ruta del archivo de destino
+            facturas (list): Facturas a exportar
+            config (ConfigParser): Configuración donde se guarda el directorio de exportación
+            al_exportar (callable): Función opcional que recibe la ruta al terminar
+            **opciones: Argumentos adicionales para la función de exportación
+        """
+        avance = AvanceExportacion()
+        cancelar = threading.Event()
+        self._exportaciones_en_curso.add(cancelar)
+        
+        progress = self._dialogo_progreso("Exportando a Excel...", "Exportando facturas", cancelar)
+        
+        def mostrar_avance(hechas, total):
+            self._mostrar_avance(progress, hechas, total)
+            progress.setLabelText(f"Exportando a Excel...\n{avance.texto()}")
+        
+        self.ejecutor_db.ejecutar(
+            exportar, instantanea_facturas(facturas), file_path,
+            cancelado=cancelar.is_set,
+            avance=avance,
+            mensaje=f"Exportando a {Path(file_path).name}...",
+            al_progreso=mostrar_avance,
+            al_terminar=lambda resultado: self._exportacion_terminada(
+                resultado, progress, cancelar, file_path, config, al_exportar),
+            al_fallar=lambda error: self._exportacion_fallida(error, progress, cancelar),
+            **opciones
+        )
+    
+    def _dialogo_progreso(self, texto, titulo, cancelar):
+        """Crear el diálogo de progreso de una tarea en segundo plano
+        
+        El diálogo no es modal, así que se puede seguir trabajando mientras
+        tanto; el botón Cancelar activa el evento `cancelar`.
+        """
+        progress = QProgressDialog(texto, "Cancelar", 0, 0, self)
+        progress.setWindowTitle(titulo)
+        progress.setWindowModality(Qt.WindowModality.NonModal)
+        progress.setMinimumDuration(500)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+        progress.canceled.connect(cancelar.set)
+        return progress
+    
+    def _mostrar_avance(self, progress, hechas, total):
+        """Actualizar un diálogo de progreso; total 0 indica progreso indeterminado"""
+        progress.setMaximum(total)
+        progress.setValue(hechas)
+    
+    def _exportacion_terminada(self, resultado, progress, cancelar, file_path, config, al_exportar):
+        """Informar el final de una exportación en segundo plano"""
+        self._exportaciones_en_curso.discard(cancelar)
+        progress.close()
+        
+        # Actualizar el directorio de exportación en la configuración
+        if config is not None:
             config['APP']['last_export_dir'] = str(Path(file_path).parent)
             save_config(config)
-            
-            QMessageBox.information(
+        
+        logger.info(f"Datos exportados exitosamente a {file_path}")
+        self.statusBar().showMessage(f"Se exportaron {resultado['facturas']} facturas a {file_path}", 5000)
+        QMessageBox.information(
+            self,
+            "Exportación exitosa",
+            f"Se exportaron {resultado['facturas']} facturas a:\n{file_path}"
+        )
+        if al_exportar is not None:
+            al_exportar(file_path)
+    
+    def _exportacion_fallida(self, error, progress, cancelar):
+        """Informar por qué no se completó una exportación en segundo plano"""
+        self._exportaciones_en_curso.discard(cancelar)
+        progress.close()
+        if isinstance(error, ExportacionCancelada):
+            self.statusBar().showMessage("Exportación cancelada; el archivo no se modificó.", 5000)
+        elif isinstance(error, PermissionError):
+            QMessageBox.critical(
                 self,
-                "Exportación exitosa",
-                f"Se exportaron {tabla.rowCount()} facturas a:\n{file_path}"
+                "Error de permisos",
+                "No se pudo guardar el archivo. Asegúrese de que el archivo no esté abierto en otro programa."
             )
-            
-            # Abrir el archivo después de exportar
-            try:
-                os.startfile(file_path)
-            except:
-                pass  # No se pudo abrir el archivo, pero la exportación fue exitosa
-                
+        else:
+            QMessageBox.critical(
+                self,
+                "Error al exportar",
+                f"Ocurrió un error al exportar a Excel: {str(error)}\n\n"
+                f"Por favor, revise los logs para más detalles."
+            )
+    
+    def exportar_comparativo_anual(self):
+        """Exportar a Excel el comparativo de todos los años por mes y por tipo de gasto
+        
+        Las columnas y los totales se calculan en segundo plano sobre una copia
+        de las facturas (ver analitica.ColumnasFacturas).
+        """
+        if not self.facturas:
+            QMessageBox.warning(self, "Exportar comparativo", "No hay datos para exportar.")
+            return
+        
+        config = get_config()
+        last_dir = config['APP'].get('last_export_dir', str(Path.home() / 'Documents'))
+        default_filename = f"Comparativo_Anios_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Guardar comparativo como",
+            str(Path(last_dir) / default_filename),
+            "Archivos Excel (*.xlsx);;Todos los archivos (*)"
+        )
+        
+        if not file_path:
+            return  # Usuario canceló el diálogo
+        
+        if not file_path.lower().endswith('.xlsx'):
+            file_path += '.xlsx'
+        
+        try:
+            self._iniciar_exportacion(exportar_comparativo_anios, file_path, self.facturas, config)
         except Exception as e:
-            error_msg = f"Error al exportar a Excel: {str(e)}"
+            error_msg = f"Ocurrió un error al exportar el comparativo: {str(e)}"
             logger.error(error_msg, exc_info=True)
-            QMessageBox.critical(self, "Error", error_msg)
+            QMessageBox.critical(self, "Error al exportar", error_msg)
     
     def exportar_a_excel(self):
         """Exportar los datos a un archivo Excel con formato de tabla"""
@@ -2670,388 +2377,10 @@ class MainWindow(QMainWindow):
             file_path += '.xlsx'
             
         try:
-            # Crear un nuevo libro de Excel
-            wb = Workbook()
-            
-            # Eliminar la hoja por defecto si no tiene datos
-            if 'Sheet' in wb.sheetnames:
-                wb.remove(wb['Sheet'])
-            
-            # Estilos
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-            money_format = '#,##0.00" COP"'
-            
-            # 1. Hoja de Detalle (todas las facturas)
-            ws_detalle = wb.create_sheet("Todas las Facturas")
-            
-            # Encabezados
-            headers = ["Fecha", "Tipo", "Descripción", "Valor (COP)"]
-            for col_num, header in enumerate(headers, 1):
-                cell = ws_detalle.cell(row=1, column=col_num, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-            
-            # Datos
-            for row_num, factura in enumerate(self.facturas, 2):
-                ws_detalle.cell(row=row_num, column=1, value=factura['fecha'])
-                ws_detalle.cell(row=row_num, column=2, value=factura['tipo'])
-                ws_detalle.cell(row=row_num, column=3, value=factura['descripcion'])
-                
-                # Formato de moneda para la columna de valor
-                cell_valor = ws_detalle.cell(row=row_num, column=4, value=float(factura['valor']))
-                cell_valor.number_format = money_format
-            
-            # Crear tabla
-            table = Table(displayName="TablaDetalle", ref=f"A1:D{len(self.facturas) + 1}")
-            style = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False,
-                                 showLastColumn=False, showRowStripes=True, showColumnStripes=False)
-            table.tableStyleInfo = style
-            ws_detalle.add_table(table)
-            
-            # Ajustar ancho de columnas
-            for column in ws_detalle.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        value_length = len(str(cell.value).encode('utf-8'))
-                        if value_length > max_length:
-                            max_length = value_length
-                    except:
-                        pass
-                adjusted_width = (max_length + 4) * 1.1
-                ws_detalle.column_dimensions[column_letter].width = min(adjusted_width, 40)
-            
-            # 2. Agrupar facturas por mes y año
-            facturas_por_mes = {}
-            for factura in self.facturas:
-                try:
-                    # Intentar parsear la fecha en formato dd/mm/yyyy
-                    fecha = datetime.strptime(factura['fecha'], '%d/%m/%Y')
-                    mes_anio = fecha.strftime('%Y-%m')  # Formato: YYYY-MM
-
-                    if mes_anio not in facturas_por_mes:
-                        facturas_por_mes[mes_anio] = []
-                    facturas_por_mes[mes_anio].append(factura)
-                except ValueError as e:
-                    logger.warning(f"No se pudo parsear la fecha: {factura['fecha']}. Error: {e}")
-                    continue
-            
-            # 3. Crear una hoja para cada mes
-            for mes_anio, facturas_mes in facturas_por_mes.items():
-                try:
-                    # Crear nombre de hoja en formato 'YYYY-MM Mes' (ej. '2025-08 Agosto')
-                    fecha = datetime.strptime(mes_anio, '%Y-%m')
-                    nombre_mes = f"{fecha.strftime('%Y-%m')} {fecha.strftime('%B').capitalize()}"
-
-                    # Limitar el nombre de la hoja a 31 caracteres (límite de Excel)
-                    nombre_hoja = nombre_mes[:31]
-
-                    # Crear hoja para el mes
-                    ws_mes = wb.create_sheet(nombre_hoja)
-
-                    # Título del mes
-                    titulo_mes = f"Facturas de {fecha.strftime('%B').capitalize()} {fecha.year}"
-                    ws_mes.append([titulo_mes])
-                    ws_mes.merge_cells(start_row=1, start_column=1, end_row=1, end_column=4)
-                    titulo_cell = ws_mes.cell(row=1, column=1)
-                    titulo_cell.font = Font(size=14, bold=True)
-                    titulo_cell.alignment = Alignment(horizontal='center')
-
-                    # Resumen del mes
-                    total_mes = sum(f['valor'] for f in facturas_mes)
-                    ws_mes.append([f"Total del mes: ${total_mes:,.0f} COP"])
-                    ws_mes.merge_cells(start_row=2, start_column=1, end_row=2, end_column=4)
-                    total_cell = ws_mes.cell(row=2, column=1)
-                    total_cell.font = Font(bold=True)
-
-                    # Espacio antes de la tabla
-                    ws_mes.append([])
-
-                    # Encabezados de la tabla
-                    for col_num, header in enumerate(headers, 1):
-                        cell = ws_mes.cell(row=4, column=col_num, value=header)
-                        cell.font = header_font
-                        cell.fill = header_fill
-
-                    # Datos de las facturas del mes
-                    # Escribir los datos de las facturas
-                    for row_num, factura in enumerate(facturas_mes, 5):
-                        ws_mes.cell(row=row_num, column=1, value=factura['fecha'])
-                        ws_mes.cell(row=row_num, column=2, value=factura['tipo'])
-                        ws_mes.cell(row=row_num, column=3, value=factura['descripcion'])
-
-                        # Formato de moneda para la columna de valor
-                        cell_valor = ws_mes.cell(row=row_num, column=4, value=float(factura['valor']))
-                        cell_valor.number_format = money_format
-                    
-                    # Crear tabla para el mes después de escribir todos los datos
-                    if facturas_mes:  # Solo crear tabla si hay datos
-                        try:
-                            # Calcular la última fila de datos (5 + len - 1 ya que empezamos en 5)
-                            last_row = 4 + len(facturas_mes)
-                            table_ref = f"A4:D{last_row}"  # Rango desde A4 hasta D{última fila}
-                            
-                            # Crear un nombre de tabla único y válido para Excel
-                            table_name = f"Tabla_{mes_anio.replace('-', '_')}"
-                            
-                            # Asegurarse de que no haya tablas con el mismo nombre
-                            if table_name in ws_mes._tables:
-                                del ws_mes._tables[table_name]
-                            
-                            # Crear la tabla
-                            table = Table(displayName=table_name, ref=table_ref)
-                            
-                            # Configurar el estilo de la tabla
-                            style = TableStyleInfo(
-                                name="TableStyleMedium9",
-                                showFirstColumn=False,
-                                showLastColumn=False,
-                                showRowStripes=True,
-                                showColumnStripes=False
-                            )
-                            table.tableStyleInfo = style
-                            
-                            # Agregar la tabla a la hoja
-                            ws_mes.add_table(table)
-                            
-                        except Exception as e:
-                            logger.warning(f"No se pudo crear la tabla para el mes {mes_anio}: {str(e)}")
-                            # Continuar con la ejecución a pesar del error en la tabla
-                        
-                        # Ajustar ancho de columnas
-                        # Primero, obtener el rango de celdas que no están fusionadas
-                        data_rows = []
-                        for row in ws_mes.iter_rows(min_row=4):  # Empezar después de los títulos
-                            if all(cell.value is not None for cell in row):
-                                data_rows.append(row)
-                        
-                        # Si no hay filas de datos, saltar el ajuste
-                        if not data_rows:
-                            continue
-                            
-                        # Obtener el número de columnas
-                        num_columns = len(data_rows[0])
-                        
-                        # Ajustar el ancho de cada columna
-                        for col_idx in range(num_columns):
-                            try:
-                                # Obtener la letra de la columna
-                                column_letter = get_column_letter(col_idx + 1)
-                                max_length = 0
-                                
-                                # Ajustar para el encabezado (fila 4)
-                                header_cell = ws_mes.cell(row=4, column=col_idx + 1)
-                                if header_cell and header_cell.value:
-                                    max_length = len(str(header_cell.value))
-                                
-                                # Especificar un ancho mínimo para la columna de valor (columna D)
-                                if column_letter == 'D':
-                                    max_length = max(max_length, 15)  # Mínimo para valores monetarios
-                                
-                                # Revisar las celdas de datos
-                                for row in data_rows:
-                                    cell = row[col_idx]
-                                    if cell and cell.value is not None:
-                                        # Para celdas con formato de moneda
-                                        if hasattr(cell, 'number_format') and 'COP' in str(cell.number_format):
-                                            formatted_value = f"{float(cell.value):,.2f} COP"
-                                            value_length = len(formatted_value)
-                                        else:
-                                            value_length = len(str(cell.value))
-                                        
-                                        if value_length > max_length:
-                                            max_length = value_length
-                                
-                                # Ajustar el ancho con espacio adicional
-                                if max_length > 0:
-                                    adjusted_width = (max_length + 2) * 1.2
-                                    # Limitar el ancho máximo a 50 caracteres
-                                    ws_mes.column_dimensions[column_letter].width = min(adjusted_width, 50)
-                                    
-                                    # Asegurar que la columna de valor tenga un ancho mínimo
-                                    if column_letter == 'D':
-                                        ws_mes.column_dimensions[column_letter].width = max(
-                                            ws_mes.column_dimensions[column_letter].width, 15
-                                        )
-                                        
-                            except Exception as e:
-                                logger.warning(f"No se pudo ajustar el ancho de la columna {col_idx + 1}: {str(e)}")
-                                continue
-                
-                except Exception as e:
-                    logger.error(f"Error al crear la hoja para el mes {mes_anio}: {str(e)}")
-                    continue
-
-            
-            # 4. Hoja de Resumen por Tipo de Gasto
-            ws_resumen = wb.create_sheet("Resumen por Tipo")
-            
-            # Calcular totales por tipo
-            total_por_tipo = defaultdict(float)
-            for factura in self.facturas:
-                total_por_tipo[factura['tipo']] += factura['valor']
-            
-            # Ordenar por valor descendente
-            total_por_tipo = dict(sorted(total_por_tipo.items(), key=lambda x: x[1], reverse=True))
-            
-            # Escribir encabezados
-            ws_resumen.append(["Tipo de Gasto", "Total (COP)", "Porcentaje"])
-            
-            # Calcular total general para porcentajes
-            total_general = sum(total_por_tipo.values())
-            
-            # Escribir datos
-            for tipo, total in total_por_tipo.items():
-                if total_general > 0:
-                    porcentaje = (total / total_general) * 100
-                    ws_resumen.append([tipo, total, porcentaje/100])
-                else:
-                    ws_resumen.append([tipo, total, 0])
-            
-            # Aplicar formato a la tabla de resumen
-            table_resumen = Table(displayName="TablaResumenTipo", ref=f"A1:C{len(total_por_tipo) + 1}")
-            style_resumen = TableStyleInfo(name="TableStyleMedium2", showFirstColumn=False,
-                                         showLastColumn=False, showRowStripes=True, showColumnStripes=False)
-            table_resumen.tableStyleInfo = style_resumen
-            ws_resumen.add_table(table_resumen)
-            
-            # Formato de moneda para la columna de total
-            for row in ws_resumen.iter_rows(min_row=2, min_col=2, max_col=2):
-                for cell in row:
-                    cell.number_format = money_format
-            
-            # Formato de porcentaje
-            for row in ws_resumen.iter_rows(min_row=2, min_col=3, max_col=3):
-                for cell in row:
-                    cell.number_format = '0.00%'
-            
-            # Añadir fila de total
-            total_row = len(total_por_tipo) + 2
-            ws_resumen.cell(row=total_row, column=1, value="TOTAL").font = Font(bold=True)
-            
-            cell_total = ws_resumen.cell(row=total_row, column=2, value=float(total_general))
-            cell_total.number_format = money_format
-            cell_total.font = Font(bold=True)
-            
-            cell_porcentaje = ws_resumen.cell(row=total_row, column=3, value=1.0 if total_general > 0 else 0)
-            cell_porcentaje.number_format = '0.00%'
-            cell_porcentaje.font = Font(bold=True)
-            
-            # Ajustar ancho de columnas
-            for column in ws_resumen.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        # Considerar el ancho del encabezado también
-                        value_length = len(str(cell.value).encode('utf-8'))  # Contar bytes para caracteres especiales
-                        if value_length > max_length:
-                            max_length = value_length
-                    except:
-                        pass
-                # Añadir un poco más de espacio para el borde y padding
-                adjusted_width = (max_length + 4) * 1.1
-                ws_resumen.column_dimensions[column_letter].width = min(adjusted_width, 50)  # Ajustado el ancho máximo a 50
-            
-            # 5. Hoja de Resumen Mensual
-            ws_mensual = wb.create_sheet("Resumen Mensual")
-            
-            # Calcular totales por mes y año
-            total_por_mes = defaultdict(float)
-            for factura in self.facturas:
-                try:
-                    fecha = datetime.strptime(factura['fecha'], '%d/%m/%Y')
-                    mes_anio = fecha.strftime('%Y-%m')
-                    total_por_mes[mes_anio] += factura['valor']
-                except Exception as e:
-                    logger.warning(f"Error al procesar fecha: {factura['fecha']} - {str(e)}")
-                    continue
-            
-            # Ordenar por fecha
-            total_por_mes = dict(sorted(total_por_mes.items()))
-            
-            # Escribir encabezados
-            ws_mensual.append(["Mes", "Año", "Total (COP)"])
-            
-            # Escribir datos
-            for mes_anio, total in total_por_mes.items():
-                anio, mes = mes_anio.split('-')
-                nombre_mes = [
-                    "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
-                    "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
-                ][int(mes) - 1]
-                ws_mensual.append([nombre_mes, anio, total])
-            
-            # Aplicar formato a la tabla de resumen mensual
-            if len(total_por_mes) > 0:
-                table_mensual = Table(displayName="TablaResumenMensual", ref=f"A1:C{len(total_por_mes) + 1}")
-                style_mensual = TableStyleInfo(name="TableStyleMedium3", showFirstColumn=False,
-                                             showLastColumn=False, showRowStripes=True, showColumnStripes=False)
-                table_mensual.tableStyleInfo = style_mensual
-                ws_mensual.add_table(table_mensual)
-                
-                # Formato de moneda para la columna de total
-                for row in ws_mensual.iter_rows(min_row=2, min_col=3, max_col=3):
-                    for cell in row:
-                        cell.number_format = money_format
-                
-                # Ajustar ancho de columnas
-                for column in ws_mensual.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            # Considerar el ancho del encabezado también
-                            value_length = len(str(cell.value).encode('utf-8'))  # Contar bytes para caracteres especiales
-                            if value_length > max_length:
-                                max_length = value_length
-                        except:
-                            pass
-                    # Añadir un poco más de espacio para el borde y padding
-                    adjusted_width = (max_length + 4) * 1.1
-                    ws_mensual.column_dimensions[column_letter].width = min(adjusted_width, 40)  # Ajustado el ancho máximo
-            
-            # Guardar el archivo con configuración para evitar advertencias
-            temp_file = file_path + '.tmp'
-            try:
-                # Guardar primero en un archivo temporal
-                wb.save(temp_file)
-                
-                # Si el archivo de destino existe, eliminarlo
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                
-                # Renombrar el archivo temporal al nombre final
-                os.rename(temp_file, file_path)
-                
-                # Actualizar el directorio de exportación en la configuración
-                config['APP']['last_export_dir'] = str(Path(file_path).parent)
-                save_config(config)
-                
-                # Mostrar mensaje de éxito
-                QMessageBox.information(
-                    self,
-                    "Exportación exitosa",
-                    f"Los datos se han exportado correctamente a:\n{file_path}"
-                )
-                
-                logger.info(f"Datos exportados exitosamente a {file_path}")
-                
-            except Exception as e:
-                # Si hay un error, intentar limpiar el archivo temporal
-                if os.path.exists(temp_file):
-                    try:
-                        os.remove(temp_file)
-                    except:
-                        pass
-                raise e
-            
-        except PermissionError:
-            error_msg = "No se pudo guardar el archivo. Asegúrese de que el archivo no esté abierto en otro programa."
-            logger.error(error_msg, exc_info=True)
-            QMessageBox.critical(self, "Error de permisos", error_msg)
+            # El libro se escribe en segundo plano sobre una copia de las facturas; las
+            # hojas de resumen usan los mismos totales que los resúmenes de la interfaz
+            self._iniciar_exportacion(exportar_excel, file_path, self.facturas, config,
+                                      totales=self.indice_calendario.instantanea_totales())
             
         except Exception as e:
             error_msg = f"Ocurrió un error al exportar a Excel: {str(e)}"
@@ -3061,139 +2390,6 @@ class MainWindow(QMainWindow):
                 "Error al exportar",
                 f"{error_msg}\n\nPor favor, revise los logs para más detalles."
             )
-            # Encabezados
-            headers = ["Tipo de Gasto", "Total (COP)", "Porcentaje"]
-            for col_num, header in enumerate(headers, 1):
-                cell = ws_resumen.cell(row=1, column=col_num, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-            
-            # Datos
-            total_general = sum(total_por_tipo.values())
-            for row_num, (tipo, total) in enumerate(total_por_tipo.items(), 2):
-                ws_resumen.cell(row=row_num, column=1, value=tipo)
-                
-                # Formato de moneda para el total
-                cell_total = ws_resumen.cell(row=row_num, column=2, value=float(total))
-                cell_total.number_format = money_format
-                
-                # Porcentaje
-                if total_general > 0:
-                    porcentaje = (total / total_general) * 100
-                    cell_porcentaje = ws_resumen.cell(row=row_num, column=3, value=porcentaje/100)
-                    cell_porcentaje.number_format = '0.00%'
-            
-            # Fila de total
-            row_num = len(total_por_tipo) + 2
-            ws_resumen.cell(row=row_num, column=1, value="TOTAL").font = Font(bold=True)
-            
-            cell_total = ws_resumen.cell(row=row_num, column=2, value=float(total_general))
-            cell_total.number_format = money_format
-            cell_total.font = Font(bold=True)
-            
-            # Ajustar ancho de columnas
-            for col in ws_resumen.columns:
-                max_length = 0
-                column = col[0].column_letter
-                for cell in col:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2) * 1.1
-                ws_resumen.column_dimensions[column].width = min(adjusted_width, 30)
-            
-            # 3. Hoja de Resumen Mensual
-            ws_mensual = wb.create_sheet("Resumen Mensual")
-            
-            # Calcular totales por mes y tipo
-            total_por_mes_tipo = defaultdict(lambda: defaultdict(float))
-            meses = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
-                    "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
-            
-            for factura in self.facturas:
-                try:
-                    fecha = datetime.strptime(factura['fecha'], '%d/%m/%Y')
-                    mes = fecha.month - 1  # 0-11
-                    total_por_mes_tipo[mes][factura['tipo']] += factura['valor']
-                except:
-                    continue
-            
-            # Obtener todos los tipos únicos
-            tipos = sorted({tipo for factura in self.facturas for tipo in [factura['tipo']]})
-            
-            # Encabezados
-            headers = ["Mes"] + tipos + ["Total"]
-            for col_num, header in enumerate(headers, 1):
-                cell = ws_mensual.cell(row=1, column=col_num, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-            
-            # Datos por mes
-            for mes in range(12):
-                if mes in total_por_mes_tipo:
-                    row_num = mes + 2  # +2 porque la fila 1 es el encabezado
-                    ws_mensual.cell(row=row_num, column=1, value=meses[mes])
-                    
-                    # Valores por tipo
-                    total_mes = 0
-                    for col_num, tipo in enumerate(tipos, 2):  # Empieza en columna 2
-                        valor = total_por_mes_tipo[mes].get(tipo, 0)
-                        if valor > 0:
-                            cell = ws_mensual.cell(row=row_num, column=col_num, value=float(valor))
-                            cell.number_format = money_format
-                            total_mes += valor
-                    
-                    # Total del mes
-                    cell_total = ws_mensual.cell(row=row_num, column=len(tipos)+2, value=float(total_mes))
-                    cell_total.number_format = money_format
-            
-            # Fila de totales por tipo
-            row_num = 14  # Después de los 12 meses
-            ws_mensual.cell(row=row_num, column=1, value="TOTAL").font = Font(bold=True)
-            
-            # Calcular totales por tipo
-            for col_num, tipo in enumerate(tipos, 2):
-                total_tipo = sum(total_por_mes_tipo[mes].get(tipo, 0) for mes in range(12))
-                if total_tipo > 0:
-                    cell = ws_mensual.cell(row=row_num, column=col_num, value=float(total_tipo))
-                    cell.number_format = money_format
-                    cell.font = Font(bold=True)
-            
-            # Total general
-            cell_total = ws_mensual.cell(row=row_num, column=len(tipos)+2, 
-                                       value=float(sum(sum(m.values()) for m in total_por_mes_tipo.values())))
-            cell_total.number_format = money_format
-            cell_total.font = Font(bold=True)
-            
-            # Ajustar ancho de columnas
-            for col in ws_mensual.columns:
-                max_length = 0
-                column = col[0].column_letter
-                for cell in col:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2) * 1.1
-                ws_mensual.column_dimensions[column].width = min(adjusted_width, 20)
-            
-            # Guardar el archivo
-            wb.save(file_path)
-            
-            # Mostrar mensaje de éxito
-            QMessageBox.information(
-                self, 
-                "Exportación exitosa", 
-                f"Los datos se han exportado correctamente a:\n{file_path}"
-            )
-            
-            logger.info(f"Datos exportados exitosamente a {file_path}")
-            
-        except Exception as e:
-            error_msg = f"Error al exportar a Excel: {str(e)}"
     
     def actualizar_boton_eliminar(self):
         """Actualizar el estado del botón de eliminar basado en la selección"""
@@ -3203,8 +2399,8 @@ class MainWindow(QMainWindow):
                 return
                 
             # Obtener las filas seleccionadas
-            selected_items = self.tabla_facturas.selectedItems()
-            has_selection = len(selected_items) > 0
+            selected_rows = self.tabla_facturas.selectionModel().selectedRows()
+            has_selection = len(selected_rows) > 0
             
             # Actualizar el estado del botón
             self.btn_eliminar.setEnabled(has_selection)
@@ -3212,7 +2408,7 @@ class MainWindow(QMainWindow):
             # Debug
             print(f"Botón de eliminar: {'Habilitado' if has_selection else 'Deshabilitado'}")
             if has_selection:
-                rows = set(item.row() for item in selected_items)
+                rows = set(index.row() for index in selected_rows)
                 print(f"Filas seleccionadas: {rows}")
                 
         except Exception as e:
@@ -3220,326 +2416,156 @@ class MainWindow(QMainWindow):
             if hasattr(self, 'btn_eliminar'):
                 self.btn_eliminar.setEnabled(False)
     
-    def actualizar_otra_tabla(self, factura_id, campo, nuevo_valor, es_tabla_filtro):
+    def notificar_cambio_factura(self, factura, campo, valor_anterior):
+        """
+        Emitir el evento "factura modificada" después de una edición guardada
+        
+        Las tablas ubican la fila de la factura en su índice de filas y los
+        resúmenes aplican la diferencia entre los datos anteriores y los nuevos.
+        
+        Args:
+            factura: Factura modificada (el mismo objeto de la lista en memoria)
+            campo: Nombre del campo que se modificó
+            valor_anterior: Valor del campo antes del cambio
+        """
+        try:
+            self.factura_cambiada.emit(CambioFactura(factura, campo, valor_anterior))
+        except Exception as e:
+            logger.error(f"Error al notificar el cambio de la factura: {str(e)}", exc_info=True)
+    
+    def actualizar_otra_tabla(self, factura_id, campo, nuevo_valor, es_tabla_filtro, valor_anterior=None):
         """
-        Actualiza el valor en las otras tablas cuando se realiza un cambio en una de ellas
+        Refleja en todas las tablas un cambio realizado en una de ellas
+        
+        Se conserva para el código que solo conoce el ID; busca la factura y
+        emite el mismo evento que notificar_cambio_factura.
         
         Args:
             factura_id: ID de la factura que se está actualizando
             campo: Nombre del campo que se modificó
             nuevo_valor: Nuevo valor del campo
             es_tabla_filtro: Booleano que indica si el cambio vino de una tabla de filtro
+            valor_anterior: Valor del campo antes del cambio (para ajustar los totales)
         """
-        try:
-            # Determinar qué tablas actualizar (todas excepto la que generó el cambio)
-            if es_tabla_filtro:
-                # Si el cambio vino de una tabla de filtro, actualizar la tabla principal
-                # y la otra tabla de filtro
-                tablas_actualizar = [self.tabla_facturas]
-                if hasattr(self, 'tabla_filtro_rango') and hasattr(self, 'tabla_filtro_fechas'):
-                    # Determinar cuál es la tabla de filtro actual
-                    if hasattr(self, 'tab_widget_filtros') and self.tab_widget_filtros.currentIndex() == 0:  # Pestaña de rango
-                        tablas_actualizar.append(self.tabla_filtro_fechas)
-                    else:  # Pestaña de fechas
-                        tablas_actualizar.append(self.tabla_filtro_rango)
-            else:
-                # Si el cambio vino de la tabla principal, actualizar ambas tablas de filtro
-                tablas_actualizar = []
-                if hasattr(self, 'tabla_filtro_rango'):
-                    tablas_actualizar.append(self.tabla_filtro_rango)
-                if hasattr(self, 'tabla_filtro_fechas'):
-                    tablas_actualizar.append(self.tabla_filtro_fechas)
-            
-            # Mapear campos a columnas para cada tipo de tabla
-            mapeo_campos_principal = {
-                'fecha': 1,   # Columna 1 en tabla principal (0 es ID)
-                'tipo': 2,    # Columna 2 en tabla principal
-                'descripcion': 3,  # Columna 3 en tabla principal
-                'valor': 4     # Columna 4 en tabla principal
-            }
+        factura = self.indice_ids.obtener(factura_id)
+        if factura is not None:
+            self.notificar_cambio_factura(factura, campo, valor_anterior)
+
+    def _validar_valor_celda(self, campo, texto):
+        """
+        Valida y normaliza el texto ingresado en una celda editable.
+        
+        Args:
+            campo: Nombre del campo que se está editando
+            texto: Texto ingresado por el usuario
             
-            mapeo_campos_filtro = {
-                'fecha': 0,   # Columna 0 en tabla filtrada
-                'tipo': 1,    # Columna 1 en tabla filtrada
-                'descripcion': 2,  # Columna 2 en tabla filtrada
-                'valor': 3     # Columna 3 en tabla filtrada
-            }
+        Returns:
+            str or None: Valor normalizado, o None si no es válido
+        """
+        nuevo_valor = texto.strip()
+        
+        # Validar que el campo no esté vacío
+        if not nuevo_valor:
+            QMessageBox.warning(self, "Error", "El campo no puede estar vacío")
+            return None
             
-            # Actualizar cada tabla de destino
-            for tabla_destino in tablas_actualizar:
-                # Determinar qué mapeo de campos usar
-                if tabla_destino == self.tabla_facturas:
-                    mapeo_campos = mapeo_campos_principal
-                    es_tabla_principal = True
-                else:
-                    mapeo_campos = mapeo_campos_filtro
-                    es_tabla_principal = False
-                
-                # Obtener el índice de la columna
-                columna = mapeo_campos.get(campo)
-                if columna is None:
-                    continue
-                    
-                # Buscar la fila que contiene la factura en la tabla de destino
-                for fila in range(tabla_destino.rowCount()):
-                    # Obtener el ID de la factura de la fila actual
-                    item_id = tabla_destino.item(fila, 0 if not es_tabla_principal else 0)
-                    if not item_id:
-                        continue
-                        
-                    # Obtener el ID de la factura, ya sea de UserRole o del texto
-                    if not es_tabla_principal:
-                        # Para tablas de filtro, el ID está en UserRole
-                        current_id = item_id.data(Qt.ItemDataRole.UserRole)
-                    else:
-                        # Para la tabla principal, el ID está en el texto de la columna 0
-                        current_id = int(item_id.text()) if item_id.text().isdigit() else None
+        # Validaciones específicas por tipo de campo
+        if campo == 'fecha':
+            try:
+                # Validar formato de fecha (DD/MM/YYYY)
+                datetime.strptime(nuevo_valor, '%d/%m/%Y')
+            except ValueError:
+                QMessageBox.warning(self, "Formato inválido", 
+                                 "El formato de fecha debe ser DD/MM/YYYY")
+                return None
                 
-                    if current_id == factura_id:
-                        # Actualizar la celda correspondiente
-                        item = tabla_destino.item(fila, columna)
-                        if not item:
-                            # Si no existe el ítem, crearlo
-                            item = QTableWidgetItem()
-                            tabla_destino.setItem(fila, columna, item)
-                        
-                        # Bloquear señales temporalmente para evitar bucles
-                        tabla_destino.blockSignals(True)
-                        try:
-                            if campo == 'valor':
-                                # Formatear valor numérico
-                                try:
-                                    valor = float(nuevo_valor)
-                                    item.setText(f"${valor:,.2f} COP".replace(",", "X").replace(".", ",").replace("X", "."))
-                                except (ValueError, TypeError):
-                                    item.setText(str(nuevo_valor))
-                            else:
-                                item.setText(str(nuevo_valor))
-                        finally:
-                            # Restaurar señales
-                            tabla_destino.blockSignals(False)
-                        # Salir del bucle una vez actualizado
-                        break
-        except Exception as e:
-            logger.error(f"Error al actualizar la otra tabla: {str(e)}")
+        elif campo == 'valor':
+            # Obtener solo los dígitos del valor (ignora "$", "COP" y separadores de miles)
+            solo_digitos = ''.join(c for c in nuevo_valor if c.isdigit())
+            if not solo_digitos:
+                return None
+            nuevo_valor = str(int(solo_digitos))
+        
+        return nuevo_valor
 
-    def guardar_cambios_celda(self, item):
+    def _guardar_cambio_factura(self, factura, campo, nuevo_valor, es_tabla_filtro):
         """
-        Maneja los cambios en las celdas editables de las tablas.
+        Aplica un cambio validado a una factura y lo guarda en la base de datos.
         
         Args:
-            item: El ítem de la tabla que fue modificado
-        """
-        # Evitar llamadas recursivas durante la actualización
-        if not hasattr(self, '_updating_cell'):
-            self._updating_cell = False
-            
-        if self._updating_cell:
-            return
+            factura: Diccionario de la factura modificada
+            campo: Nombre del campo modificado
+            nuevo_valor: Valor ya validado por _validar_valor_celda
+            es_tabla_filtro: Indica si el cambio vino de una tabla de filtro
             
+        Returns:
+            bool: True si el cambio se guardó (o no había cambio), False si falló
+        """
+        # Verificar si el valor realmente cambió
+        if campo in factura and str(factura[campo]) == nuevo_valor:
+            return True
+        
+        # Guardar el valor anterior para restaurar en caso de error
+        valor_anterior = factura.get(campo)
+        
         try:
-            self._updating_cell = True
-            
-            # Determinar qué tabla generó el evento
-            tabla = self.sender()
+            # Actualizar el valor en el diccionario de la factura
+            if campo == 'valor':
+                factura[campo] = float(nuevo_valor)
+            else:
+                factura[campo] = str(nuevo_valor).strip()
             
-            # Verificar si la tabla es una de las tablas de filtros
-            es_tabla_filtro_rango = (tabla == self.tabla_filtro_rango)
-            es_tabla_filtro_fechas = (tabla == self.tabla_filtro_fechas)
+            # Guardar los cambios en la base de datos en segundo plano
+            self.cambios.registrar_modificada(factura)
+            if not self.guardar_datos():
+                raise Exception("No se pudo actualizar la base de datos")
             
-            # Si no es ninguna de las tablas esperadas, salir
-            if tabla not in [self.tabla_facturas, self.tabla_filtro_rango, self.tabla_filtro_fechas]:
-                return
-                
-            # Determinar si es una tabla de filtro (cualquiera de las dos)
-            es_tabla_filtro = es_tabla_filtro_rango or es_tabla_filtro_fechas
-            
-            # Mapeo de columnas a campos de factura según la tabla
-            # (es_tabla_filtro, column_index): 'field_name'
-            column_mapping = {
-                # Tabla de filtro (sin columna ID)
-                (True, 0): 'fecha',      # Columna 0: Fecha
-                (True, 1): 'tipo',       # Columna 1: Tipo
-                (True, 2): 'descripcion', # Columna 2: Descripción
-                (True, 3): 'valor',      # Columna 3: Valor
-                # Tabla principal (con columna ID)
-                (False, 0): 'id',        # Columna 0: ID (no editable)
-                (False, 1): 'fecha',     # Columna 1: Fecha
-                (False, 2): 'tipo',      # Columna 2: Tipo
-                (False, 3): 'descripcion', # Columna 3: Descripción
-                (False, 4): 'valor'      # Columna 4: Valor
-            }
+            # Mantener los índices en memoria
+            self._actualizar_indices(factura, campo)
             
-            # Obtener el campo que se está editando
-            campo = column_mapping.get((es_tabla_filtro, item.column()))
-            if not campo or campo == 'id':  # No permitir editar el ID
-                return
-                
-            # Obtener el nuevo valor y limpiarlo
-            nuevo_valor = item.text().strip()
+            # Cada tabla redibuja solo la fila de la factura y cada resumen ajusta sus
+            # totales con la diferencia; los filtros solo se vuelven a aplicar si la
+            # factura pudo entrar o salir de ellos
+            self.notificar_cambio_factura(factura, campo, valor_anterior)
+            if campo in ('fecha', 'tipo'):
+                self.actualizar_filtros()
             
-            # Validar que el campo no esté vacío
-            if not nuevo_valor:
-                QMessageBox.warning(self, "Error", "El campo no puede estar vacío")
-                self._restaurar_valor_anterior(tabla, item, campo)
-                return
+            return True
                 
-            # Validaciones específicas por tipo de campo
-            if campo == 'fecha':
-                try:
-                    # Validar formato de fecha (DD/MM/YYYY)
-                    datetime.strptime(nuevo_valor, '%d/%m/%Y')
-                except ValueError:
-                    QMessageBox.warning(self, "Formato inválido", 
-                                     "El formato de fecha debe ser DD/MM/YYYY")
-                    self._restaurar_valor_anterior(tabla, item, campo)
-                    return
-                    
-            elif campo == 'valor':
-                try:
-                    # Obtener el texto actual del ítem
-                    texto_actual = item.text().strip()
-                    
-                    # Si el usuario está borrando el valor, establecerlo a 0
-                    if not texto_actual:
-                        item.setText("$0 COP")
-                        nuevo_valor = "0"
-                        return
-                    
-                    # Obtener solo los dígitos del valor actual
-                    solo_digitos = ''.join(c for c in texto_actual if c.isdigit())
-                    
-                    # Si el usuario está editando, usar el valor exacto que está escribiendo
-                    if nuevo_valor != texto_actual:
-                        # Si el usuario está agregando o quitando dígitos, actualizar el valor
-                        if len(nuevo_valor) != len(texto_actual) or not any(c.isdigit() for c in nuevo_valor):
-                            solo_digitos = ''.join(c for c in nuevo_valor if c.isdigit())
-                    
-                    # Si no hay dígitos, establecer a 0
-                    if not solo_digitos:
-                        item.setText("$0 COP")
-                        nuevo_valor = "0"
-                        return
-                    
-                    # Convertir a entero
-                    valor_entero = int(solo_digitos)
-                    
-                    # Formatear el valor con separadores de miles
-                    valor_formateado = f"${valor_entero:,} COP".replace(",", ".")
-                    
-                    # Actualizar el ítem con el valor formateado
-                    item.setText(valor_formateado)
-                    nuevo_valor = str(valor_entero)
-                except (ValueError, TypeError) as e:
-                    QMessageBox.warning(self, "Valor inválido", 
-                                     f"El valor debe ser un número mayor a cero: {str(e)}")
-                    self._restaurar_valor_anterior(tabla, item, campo)
-                    return
-            
-            # Obtener el ID de la factura usando el método _obtener_id_factura
-            fila = item.row()
-            factura_id = self._obtener_id_factura(tabla, fila, es_tabla_filtro)
-            
-            if factura_id is None:
-                logger.error("No se pudo obtener el ID de la factura")
-                self._restaurar_valor_anterior(tabla, item, campo)
-                return
-            
-            # Encontrar la factura en la lista de facturas
-            factura = next((f for f in self.facturas if f.get('id') == factura_id), None)
-            if not factura:
-                logger.error(f"No se encontró la factura con ID {factura_id}")
-                self._restaurar_valor_anterior(tabla, item, campo)
-                return
-            
-            # Verificar si el valor realmente cambió
-            if campo in factura and str(factura[campo]) == nuevo_valor:
-                return
-            
-            # Guardar el valor anterior para restaurar en caso de error
-            valor_anterior = factura.get(campo)
+        except Exception as e:
+            # Revertir el cambio
+            factura[campo] = valor_anterior
+            self._actualizar_indices(factura, campo)
             
-            try:
-                # Actualizar el valor en el diccionario de la factura
-                if campo == 'valor':
-                    # Para el campo valor, guardar como float
-                    factura[campo] = float(nuevo_valor) if isinstance(nuevo_valor, (int, float)) else float(nuevo_valor.replace('.', '').replace(',', '.'))
-                else:
-                    # Para los demás campos, guardar como string
-                    factura[campo] = str(nuevo_valor).strip()
-                
-                # Guardar los cambios en la base de datos
-                if self.db.actualizar_factura(
-                    factura_id=factura_id,
-                    fecha=factura.get('fecha', ''),
-                    tipo=factura.get('tipo', ''),
-                    descripcion=factura.get('descripcion', ''),
-                    valor=float(factura.get('valor', 0))
-                ):
-                    # Actualizar la otra tabla si es necesario
-                    self.actualizar_otra_tabla(factura_id, campo, nuevo_valor, es_tabla_filtro)
-                    
-                    # Actualizar la lista de facturas para reflejar los cambios
-                    self.actualizar_lista_facturas()
-                    
-                    # Actualizar resúmenes
-                    self.actualizar_resumen()
-                    
-                    # Mostrar mensaje de éxito en la barra de estado
-                    self.statusBar().showMessage("Cambios guardados correctamente", 3000)
-                    
-                    # Forzar actualización visual de las tablas
-                    tabla.viewport().update()
-                    if es_tabla_filtro:
-                        # Si estamos en una tabla de filtro, actualizar la tabla principal
-                        self.tabla_facturas.viewport().update()
-                        # Y actualizar la otra tabla de filtro
-                        if es_tabla_filtro_rango:
-                            self.tabla_filtro_fechas.viewport().update()
-                        else:
-                            self.tabla_filtro_rango.viewport().update()
-                else:
-                    raise Exception("No se pudo actualizar la base de datos")
-                    
-            except Exception as e:
-                # Revertir el cambio en la interfaz
-                factura[campo] = valor_anterior
-                self._restaurar_valor_anterior(tabla, item, campo, valor_anterior)
-                
-                # Mostrar mensaje de error
-                error_msg = f"Error al guardar los cambios: {str(e)}"
-                logger.error(error_msg, exc_info=True)
-                QMessageBox.critical(self, "Error", error_msg)
-                
-        finally:
-            self._updating_cell = False
-    
-    def _restaurar_valor_anterior(self, tabla, item, campo, valor_anterior=None):
-        """
-        Restaura el valor anterior de una celda después de un error de validación
+            # Mostrar mensaje de error
+            error_msg = f"Error al guardar los cambios: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            QMessageBox.critical(self, "Error", error_msg)
+            return False
+
+    def _editar_factura_desde_modelo(self, factura, campo, texto):
+        """Guardar una edición hecha en la tabla principal (llamado desde FacturasTableModel.setData)"""
+        if factura.get('id') is None:
+            logger.error("No se pudo obtener el ID de la factura")
+            return False
         
-        Args:
-            tabla: Referencia a la tabla (self.tabla_facturas o self.tabla_filtrada)
-            item: El ítem de la tabla que se está editando
-            campo: Nombre del campo que se está editando
-            valor_anterior: Valor anterior a restaurar (opcional)
-        """
-        try:
-            tabla.blockSignals(True)
-            
-            if campo == 'valor' and valor_anterior is not None:
-                # Formatear valor numérico
-                try:
-                    valor = float(valor_anterior)
-                    item.setText(f"${valor:,.0f} COP".replace(',', '.'))
-                except (ValueError, TypeError):
-                    item.setText(str(valor_anterior))
-            elif valor_anterior is not None:
-                item.setText(str(valor_anterior))
-        except Exception as e:
-            logger.error(f"Error al restaurar valor anterior: {str(e)}")
-        finally:
-            tabla.blockSignals(False)
+        nuevo_valor = self._validar_valor_celda(campo, texto)
+        if nuevo_valor is None:
+            return False
+        
+        return self._guardar_cambio_factura(factura, campo, nuevo_valor, es_tabla_filtro=False)
+
+    def _editar_factura_desde_filtro(self, factura, campo, texto):
+        """Guardar una edición hecha en una tabla de filtro (llamado desde FiltroFacturasModel.setData)"""
+        if factura.get('id') is None:
+            logger.error("No se pudo obtener el ID de la factura")
+            return False
+        
+        nuevo_valor = self._validar_valor_celda(campo, texto)
+        if nuevo_valor is None:
+            return False
+        
+        return self._guardar_cambio_factura(factura, campo, nuevo_valor, es_tabla_filtro=True)
 
     def _procesar_valor(self, nuevo_valor, factura):
         """
@@ -3733,7 +2759,7 @@ class MainWindow(QMainWindow):
                 return
         
         # Buscar la factura correspondiente
-        factura = next((f for f in self.facturas if f.get('id') == factura_id), None)
+        factura = self.indice_ids.obtener(factura_id)
         if not factura:
             return
         
@@ -3750,43 +2776,21 @@ class MainWindow(QMainWindow):
     
     def eliminar_facturas_seleccionadas(self):
         """Eliminar las facturas seleccionadas de la lista"""
-        print("Botón 'Eliminar seleccionadas' presionado")  # Debug
-        
         # Obtener las filas seleccionadas (sin duplicados)
-        selected_ranges = self.tabla_facturas.selectedRanges()
-        filas_seleccionadas = set()
-        
-        print(f"Rangos seleccionados: {selected_ranges}")  # Debug
-        
-        for range_ in selected_ranges:
-            filas_seleccionadas.update(range(range_.topRow(), range_.bottomRow() + 1))
-        
-        print(f"Filas seleccionadas: {filas_seleccionadas}")  # Debug
+        filas_seleccionadas = {index.row() for index in self.tabla_facturas.selectionModel().selectedRows()}
         
         if not filas_seleccionadas:
-            print("No hay filas seleccionadas")  # Debug
             QMessageBox.warning(self, "Eliminar Facturas", "No hay filas seleccionadas para eliminar.")
             return
         
-        # Obtener los IDs de las facturas seleccionadas
+        # Obtener las facturas seleccionadas (las recién agregadas pueden no tener ID todavía)
         facturas_a_eliminar = []
         for fila in filas_seleccionadas:
-            if 0 <= fila < self.tabla_facturas.rowCount():
-                id_item = self.tabla_facturas.item(fila, 0)  # ID está en la columna 0 (oculta)
-                print(f"Fila {fila}: id_item = {id_item}")  # Debug
-                if id_item is not None:
-                    try:
-                        factura_id = int(id_item.text())
-                        facturas_a_eliminar.append(factura_id)
-                        print(f"ID de factura encontrado: {factura_id}")  # Debug
-                    except (ValueError, AttributeError) as e:
-                        print(f"Error al obtener ID de factura: {e}")  # Debug
-                        continue
-        
-        print(f"Facturas a eliminar: {facturas_a_eliminar}")  # Debug
+            factura = self.modelo_facturas.factura(fila)
+            if factura is not None:
+                facturas_a_eliminar.append(factura)
         
         if not facturas_a_eliminar:
-            print("No se encontraron IDs de facturas válidas")  # Debug
             QMessageBox.warning(self, "Eliminar Facturas", "No se pudieron identificar las facturas a eliminar.")
             return
         
@@ -3799,38 +2803,30 @@ class MainWindow(QMainWindow):
         )
         
         if confirmacion == QMessageBox.StandardButton.Yes:
-            print(f"Confirmada eliminación de {len(facturas_a_eliminar)} facturas")  # Debug
             # Eliminar las facturas de la base de datos
-            eliminaciones_exitosas = 0
             try:
-                for factura_id in facturas_a_eliminar:
-                    print(f"Intentando eliminar factura con ID: {factura_id}")  # Debug
-                    if self.db.eliminar_factura(factura_id):
-                        eliminaciones_exitosas += 1
-                        print(f"Factura {factura_id} eliminada correctamente")  # Debug
-                    else:
-                        print(f"No se pudo eliminar la factura {factura_id}")  # Debug
+                # Registrar las bajas y quitarlas de la memoria; la base de datos
+                # se actualiza en una sola transacción en segundo plano
+                seleccionadas = {id(f) for f in facturas_a_eliminar}
+                self.cambios.registrar_eliminadas(facturas_a_eliminar)
+                self.facturas = [f for f in self.facturas if id(f) not in seleccionadas]
+                self._quitar_de_indices(facturas_a_eliminar)
                 
                 # Actualizar la interfaz
-                print("Recargando datos...")  # Debug
-                self.cargar_datos(actualizar_ui=True)
+                self.actualizar_lista_facturas()
+                self.actualizar_resumen()
+                
+                cantidad = len(facturas_a_eliminar)
                 
-                mensaje = f"Se eliminaron {eliminaciones_exitosas} de {len(facturas_a_eliminar)} factura(s) correctamente."
-                self.statusBar().showMessage(mensaje, 5000)  # 5 segundos
-                print(mensaje)  # Debug
-                logger.info(mensaje)
+                def al_terminar(estadisticas):
+                    mensaje = f"Se eliminaron {cantidad} factura(s) correctamente."
+                    self.statusBar().showMessage(mensaje, 5000)  # 5 segundos
+                    logger.info(mensaje)
                 
-                # Mostrar mensaje si no se pudieron eliminar todas las facturas
-                if eliminaciones_exitosas < len(facturas_a_eliminar):
-                    QMessageBox.warning(
-                        self,
-                        "Advertencia",
-                        f"Solo se pudieron eliminar {eliminaciones_exitosas} de {len(facturas_a_eliminar)} facturas seleccionadas."
-                    )
+                self.guardar_datos(al_terminar=al_terminar)
                 
             except Exception as e:
                 error_msg = f"Error al eliminar las facturas: {str(e)}"
-                print(error_msg)  # Debug
                 logger.error(error_msg, exc_info=True)
                 QMessageBox.critical(self, "Error", error_msg)
     
@@ -3859,7 +2855,9 @@ class MainWindow(QMainWindow):
         
         try:
             # Limpiar la lista de facturas
+            self.cambios.registrar_eliminadas(self.facturas)
             self.facturas.clear()
+            self._quitar_de_indices(facturas_backup)
             
             # Guardar los cambios
             if self.guardar_datos():
@@ -3871,105 +2869,30 @@ class MainWindow(QMainWindow):
         except Exception as e:
             # Restaurar la copia de respaldo en caso de error
             self.facturas = facturas_backup
+            self.cambios.descartar()
+            # La lista restaurada reemplaza a la vacía: se indexa completa, como al cargar
+            self._reconstruir_indices()
             error_msg = f"Error al limpiar los datos: {str(e)}"
             logger.error(error_msg, exc_info=True)
             QMessageBox.critical(self, "Error", error_msg)
     
     def importar_desde_json(self):
-        """Importar facturas desde un archivo JSON"""
+        """Importar facturas desde un archivo JSON (arreglo de facturas o JSON Lines)
+        
+        El archivo se lee elemento por elemento en segundo plano, sin cargarlo completo.
+        """
         # Abrir diálogo para seleccionar archivo
         file_path, _ = QFileDialog.getOpenFileName(
             self,
             "Seleccionar archivo JSON",
             "",
-            "Archivos JSON (*.json);;Todos los archivos (*)"
+            "Archivos JSON (*.json *.jsonl);;Todos los archivos (*)"
         )
         
         if not file_path:
             return  # Usuario canceló el diálogo
         
-        try:
-            # Leer el archivo JSON
-            with open(file_path, 'r', encoding='utf-8') as f:
-                facturas_importadas = json.load(f)
-            
-            if not isinstance(facturas_importadas, list):
-                raise ValueError("El archivo no contiene una lista de facturas válida.")
-            
-            # Validar el formato de las facturas
-            facturas_validas = []
-            for i, factura in enumerate(facturas_importadas, 1):
-                if not all(key in factura for key in ['fecha', 'tipo', 'descripcion', 'valor']):
-                    logger.warning(f"Factura {i} omitida: formato incorrecto")
-                    continue
-                
-                try:
-                    # Validar y convertir los valores
-                    fecha_valida = bool(datetime.strptime(factura['fecha'], '%d/%m/%Y'))
-                    valor_valido = float(factura['valor']) > 0
-                    
-                    if fecha_valida and valor_valido:
-                        # Asegurar que el valor sea un número
-                        factura['valor'] = float(factura['valor'])
-                        facturas_validas.append(factura)
-                    else:
-                        logger.warning(f"Factura {i} omitida: fecha o valor inválidos")
-                except (ValueError, TypeError):
-                    logger.warning(f"Factura {i} omitida: error en los datos")
-            
-            if not facturas_validas:
-                QMessageBox.warning(self, "Importar Datos", "No se encontraron facturas válidas para importar.")
-                return
-            
-            # Mostrar resumen de importación
-            resumen = f"Se importarán {len(facturas_validas)} factura(s) de {len(facturas_importadas)} encontradas."
-            if len(facturas_validas) < len(facturas_importadas):
-                resumen += "\n\nAlgunas facturas se omitieron por tener formato incorrecto."
-            
-            confirmacion = QMessageBox.question(
-                self,
-                "Confirmar Importación",
-                f"{resumen}\n\n¿Desea continuar con la importación?",
-                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-            )
-            
-            if confirmacion == QMessageBox.StandardButton.Yes:
-                # Hacer una copia de respaldo
-                facturas_originales = self.facturas.copy()
-                
-                try:
-                    # Agregar las facturas importadas a la lista existente
-                    self.facturas.extend(facturas_validas)
-                    
-                    # Guardar los cambios
-                    if self.guardar_datos():
-                        # Actualizar la interfaz
-                        self.actualizar_lista_facturas()
-                        self.actualizar_resumen()
-                        self.actualizar_filtros()
-                        
-                        # Mostrar mensaje de éxito
-                        QMessageBox.information(
-                            self,
-                            "Importación Exitosa",
-                            f"Se importaron {len(facturas_validas)} factura(s) correctamente."
-                        )
-                        
-                        logger.info(f"Se importaron {len(facturas_validas)} facturas desde {file_path}")
-                        self.statusBar().showMessage("Importación completada correctamente.", 3000)
-                except Exception as e:
-                    # Restaurar la copia de respaldo en caso de error
-                    self.facturas = facturas_originales
-                    error_msg = f"Error al importar las facturas: {str(e)}"
-                    logger.error(error_msg, exc_info=True)
-                    QMessageBox.critical(self, "Error", error_msg)
-        
-        except json.JSONDecodeError:
-            QMessageBox.critical(self, "Error", "El archivo seleccionado no es un JSON válido.")
-        except Exception as e:
-            error_msg = f"Error al importar desde JSON: {str(e)}"
-            logger.error(error_msg, exc_info=True)
-            QMessageBox.critical(self, "Error", error_msg)
+        self._iniciar_importacion(importar_json, file_path, "JSON")
     
     def cargar_ultima_ruta_respaldo(self):
         """Carga la última ruta de respaldo utilizada desde la configuración"""
@@ -4007,14 +2930,45 @@ class MainWindow(QMainWindow):
             logging.error(f"Error al guardar la configuración: {str(e)}")
     
     def crear_respaldo(self):
-        """Crea una copia de respaldo de la base de datos"""
+        """Crea una copia de respaldo de la base de datos
+        
+        La copia se toma en segundo plano con la API de respaldo de SQLite, por
+        pasos, así que se puede seguir editando mientras tanto. Se verifica con
+        PRAGMA integrity_check y se puede comprimir con gzip o zstd. También se
+        puede guardar una instantánea en el repositorio incremental o restaurar
+        una de sus instantáneas.
+        """
         try:
             # Obtener la ruta de la base de datos
-            db_path = DATA_DIR / "facturas.db"
+            db_path = Path(self.db.db_path)
             if not db_path.exists():
                 QMessageBox.warning(self, "Respaldo", "No se encontró la base de datos para respaldar.")
                 return
             
+            # Elegir el tipo de respaldo
+            caja = QMessageBox(self)
+            caja.setWindowTitle("Respaldo")
+            caja.setText("¿Qué tipo de respaldo desea crear?")
+            caja.setInformativeText(
+                "La copia completa crea un archivo independiente. El repositorio incremental "
+                "solo guarda lo que cambió desde la última instantánea."
+            )
+            btn_completa = caja.addButton("Copia completa", QMessageBox.ButtonRole.AcceptRole)
+            btn_incremental = caja.addButton("Repositorio incremental", QMessageBox.ButtonRole.AcceptRole)
+            btn_restaurar = caja.addButton("Restaurar instantánea...", QMessageBox.ButtonRole.ActionRole)
+            caja.addButton(QMessageBox.StandardButton.Cancel)
+            caja.exec()
+            
+            elegido = caja.clickedButton()
+            if elegido is btn_incremental:
+                self.crear_respaldo_incremental()
+                return
+            if elegido is btn_restaurar:
+                self.restaurar_instantanea()
+                return
+            if elegido is not btn_completa:
+                return
+            
             # Obtener la fecha y hora actual para el nombre del archivo
             fecha_hora = datetime.now().strftime("%Y%m%d_%H%M%S")
             nombre_archivo = f"facturas_backup_{fecha_hora}.db"
@@ -4023,32 +2977,53 @@ class MainWindow(QMainWindow):
             ultima_ruta = self.cargar_ultima_ruta_respaldo()
             ruta_sugerida = str(Path(ultima_ruta) / nombre_archivo)
             
+            # Un filtro por formato; el elegido define la compresión
+            filtros = {
+                "Archivos de base de datos (*.db)": None,
+                "Base de datos comprimida con gzip (*.db.gz)": 'gzip',
+            }
+            if 'zstd' in compresiones_disponibles():
+                filtros["Base de datos comprimida con zstd (*.db.zst)"] = 'zstd'
+            
             # Abrir diálogo para seleccionar ubicación del respaldo
-            file_path, _ = QFileDialog.getSaveFileName(
+            file_path, filtro = QFileDialog.getSaveFileName(
                 self,
                 "Guardar copia de respaldo",
                 ruta_sugerida,
-                "Archivos de base de datos (*.db);;Todos los archivos (*)",
+                ";;".join(list(filtros) + ["Todos los archivos (*)"]),
                 options=QFileDialog.Option.DontUseNativeDialog
             )
             
-            if file_path:
-                # Asegurarse de que la extensión sea .db
-                if not file_path.lower().endswith('.db'):
-                    file_path += '.db'
-                
-                # Copiar el archivo de la base de datos
-                import shutil
-                shutil.copy2(db_path, file_path)
-                
-                # Guardar la ruta utilizada
-                self.guardar_ultima_ruta_respaldo(file_path)
-                
-                QMessageBox.information(
-                    self, 
-                    "Respaldo exitoso", 
-                    f"Se ha creado una copia de respaldo en:\n{file_path}"
-                )
+            if not file_path:
+                return  # Usuario canceló el diálogo
+            
+            # La extensión escrita manda sobre el filtro elegido
+            compresion = filtros.get(filtro)
+            for nombre, extension in EXTENSIONES_COMPRESION.items():
+                if file_path.lower().endswith('.db' + extension):
+                    compresion = nombre
+            
+            # Asegurarse de que la extensión corresponda al formato
+            extension = '.db' + EXTENSIONES_COMPRESION.get(compresion, '')
+            if not file_path.lower().endswith(extension):
+                file_path += extension
+            
+            # Los cambios pendientes se guardan antes para que entren en la copia
+            self.guardar_datos()
+            
+            cancelar = threading.Event()
+            progress = self._dialogo_progreso("Creando copia de respaldo...", "Respaldo", cancelar)
+            
+            self.ejecutor_db.leer(
+                respaldar, self.db, file_path,
+                compresion=compresion,
+                verificar=True,
+                cancelado=cancelar.is_set,
+                mensaje="Creando copia de respaldo...",
+                al_progreso=lambda hechas, total: self._mostrar_avance(progress, hechas, total),
+                al_terminar=lambda resultado: self._respaldo_terminado(resultado, progress),
+                al_fallar=lambda error: self._respaldo_fallido(error, progress)
+            )
                 
         except Exception as e:
             QMessageBox.critical(
@@ -4057,6 +3032,173 @@ class MainWindow(QMainWindow):
                 f"Ocurrió un error al crear el respaldo:\n{str(e)}"
             )
     
+    def cargar_repositorio_respaldos(self):
+        """Carga la carpeta del repositorio de respaldos incrementales desde la configuración"""
+        config_path = self.data_dir / "config.json"
+        if config_path.exists():
+            try:
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                    if 'repositorio_respaldos' in config:
+                        return config['repositorio_respaldos']
+            except Exception as e:
+                logging.error(f"Error al cargar la configuración: {str(e)}")
+        return None
+    
+    def guardar_repositorio_respaldos(self, ruta):
+        """Guarda la carpeta del repositorio de respaldos incrementales en la configuración"""
+        config_path = self.data_dir / "config.json"
+        config = {}
+        if config_path.exists():
+            try:
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+            except Exception as e:
+                logging.error(f"Error al cargar la configuración: {str(e)}")
+        config['repositorio_respaldos'] = ruta
+        try:
+            with open(config_path, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=4)
+        except Exception as e:
+            logging.error(f"Error al guardar la configuración: {str(e)}")
+    
+    def _elegir_repositorio_respaldos(self, preguntar=False):
+        """Devuelve la carpeta del repositorio; la pregunta si no hay una configurada"""
+        ruta = self.cargar_repositorio_respaldos()
+        if ruta and not preguntar:
+            return ruta
+        ruta = QFileDialog.getExistingDirectory(
+            self,
+            "Carpeta del repositorio de respaldos",
+            ruta or str(self.data_dir / "respaldos"),
+            QFileDialog.Option.DontUseNativeDialog
+        )
+        if ruta:
+            self.guardar_repositorio_respaldos(ruta)
+        return ruta or None
+    
+    def crear_respaldo_incremental(self):
+        """Guarda una instantánea incremental de la base de datos en el repositorio
+        
+        Solo se escriben los fragmentos que cambiaron desde las instantáneas
+        anteriores; después se aplica la política de retención.
+        """
+        ruta = self._elegir_repositorio_respaldos()
+        if not ruta:
+            return
+        
+        # Los cambios pendientes se guardan antes para que entren en la instantánea
+        self.guardar_datos()
+        
+        cancelar = threading.Event()
+        progress = self._dialogo_progreso("Guardando instantánea...", "Respaldo incremental", cancelar)
+        self.ejecutor_db.leer(
+            respaldar_incremental, self.db, ruta,
+            cancelado=cancelar.is_set,
+            mensaje="Guardando instantánea incremental...",
+            al_progreso=lambda hechas, total: self._mostrar_avance(progress, hechas, total),
+            al_terminar=lambda resultado: self._respaldo_incremental_terminado(resultado, progress, ruta),
+            al_fallar=lambda error: self._respaldo_fallido(error, progress)
+        )
+    
+    def _respaldo_incremental_terminado(self, resultado, progress, ruta):
+        """Informar el resultado de una instantánea incremental"""
+        progress.close()
+        mb = 1024 * 1024
+        mensaje = (
+            f"Instantánea guardada en el repositorio:\n{ruta}\n\n"
+            f"Tamaño de la base de datos: {resultado['bytes'] / mb:.1f} MB\n"
+            f"Datos nuevos: {resultado['bytes_nuevos'] / mb:.2f} MB\n"
+            f"Tamaño del repositorio: {resultado['bytes_repositorio'] / mb:.1f} MB"
+        )
+        if resultado['retencion']['instantaneas']:
+            mensaje += f"\n\nInstantáneas antiguas eliminadas: {resultado['retencion']['instantaneas']}"
+        QMessageBox.information(self, "Respaldo incremental", mensaje)
+    
+    def restaurar_instantanea(self):
+        """Reconstruye una instantánea del repositorio en un archivo de base de datos"""
+        ruta = self._elegir_repositorio_respaldos(preguntar=not self.cargar_repositorio_respaldos())
+        if not ruta:
+            return
+        try:
+            repositorio = RepositorioRespaldos(ruta)
+            instantaneas = list(reversed(repositorio.instantaneas()))
+        except Exception as e:
+            QMessageBox.critical(self, "Restaurar instantánea", f"No se pudo leer el repositorio:\n{str(e)}")
+            return
+        if not instantaneas:
+            QMessageBox.information(self, "Restaurar instantánea", "El repositorio no tiene instantáneas.")
+            return
+        
+        opciones = [
+            f"{datetime.fromisoformat(i['fecha']):%Y-%m-%d %H:%M:%S}  ({i['bytes'] / (1024 * 1024):.1f} MB)"
+            for i in instantaneas
+        ]
+        opcion, ok = QInputDialog.getItem(self, "Restaurar instantánea", "Instantánea:", opciones, 0, False)
+        if not ok:
+            return
+        instantanea = instantaneas[opciones.index(opcion)]
+        
+        # Se restaura en un archivo aparte; la base de datos en uso no se modifica
+        nombre = f"facturas_restaurada_{instantanea['id'][:15]}.db"
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Guardar instantánea restaurada",
+            str(Path(self.cargar_ultima_ruta_respaldo()) / nombre),
+            "Archivos de base de datos (*.db);;Todos los archivos (*)",
+            options=QFileDialog.Option.DontUseNativeDialog
+        )
+        if not file_path:
+            return
+        if not file_path.lower().endswith('.db'):
+            file_path += '.db'
+        
+        cancelar = threading.Event()
+        progress = self._dialogo_progreso("Restaurando instantánea...", "Restaurar instantánea", cancelar)
+        self.ejecutor_db.ejecutar(
+            repositorio.restaurar, instantanea['id'], file_path,
+            cancelado=cancelar.is_set,
+            mensaje="Restaurando instantánea...",
+            al_progreso=lambda hechas, total: self._mostrar_avance(progress, hechas, total),
+            al_terminar=lambda resultado: self._restauracion_terminada(resultado, progress),
+            al_fallar=lambda error: self._respaldo_fallido(error, progress)
+        )
+    
+    def _restauracion_terminada(self, resultado, progress):
+        """Informar el final de una restauración"""
+        progress.close()
+        QMessageBox.information(
+            self,
+            "Restaurar instantánea",
+            f"La instantánea se restauró y verificó en:\n{resultado['ruta']}"
+        )
+    
+    def _respaldo_terminado(self, resultado, progress):
+        """Informar el final de un respaldo en segundo plano"""
+        progress.close()
+        
+        # Guardar la ruta utilizada
+        self.guardar_ultima_ruta_respaldo(resultado['ruta'])
+        
+        QMessageBox.information(
+            self, 
+            "Respaldo exitoso", 
+            f"Se ha creado una copia de respaldo verificada en:\n{resultado['ruta']}\n\n"
+            f"Tamaño: {resultado['bytes'] / (1024 * 1024):.1f} MB"
+        )
+    
+    def _respaldo_fallido(self, error, progress):
+        """Informar por qué no se completó un respaldo en segundo plano"""
+        progress.close()
+        if isinstance(error, RespaldoCancelado):
+            self.statusBar().showMessage("Respaldo cancelado; no se modificó ningún archivo.", 5000)
+            return
+        QMessageBox.critical(
+            self,
+            "Error al crear respaldo",
+            f"Ocurrió un error al crear el respaldo:\n{str(error)}"
+        )
+    
     def cargar_preferencia_tema(self):
         """Cargar la preferencia de tema desde el archivo de configuración"""
         config_path = self.data_dir / "tema_config.json"
@@ -4343,7 +3485,7 @@ class MainWindow(QMainWindow):
             }
             
             /* Tablas */
-            QTableWidget {
+            QTableView {
                 background-color: #16213e;
                 color: #e6e6e6;
                 gridline-color: #0f3460;
@@ -4352,11 +3494,11 @@ class MainWindow(QMainWindow):
                 alternate-background-color: #1a1a2e;
             }
             
-            QTableWidget::item {
+            QTableView::item {
                 padding: 8px;
             }
             
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #e94560;
                 color: #ffffff;
             }
@@ -4576,7 +3718,7 @@ class MainWindow(QMainWindow):
             }
             
             /* Tablas */
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 color: #333333;
                 gridline-color: #d6dbe2;
@@ -4585,11 +3727,11 @@ class MainWindow(QMainWindow):
                 alternate-background-color: #f8f9fa;
             }
             
-            QTableWidget::item {
+            QTableView::item {
                 padding: 8px;
             }
             
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #3498db;
                 color: #ffffff;
             }
@@ -0,0 +1,557 @@
+"""
+Importación de facturas por flujo desde archivos.
+
+Las filas se leen, validan e insertan por bloques, sin cargar el archivo
+completo en memoria: en cada momento solo existe el bloque en curso y un
+número acotado de mensajes de error. Las funciones no usan Qt, así que pueden
+ejecutarse en un hilo de trabajo (ver ejecutor_db). openpyxl solo se importa
+al leer libros de Excel.
+"""
+import codecs
+import csv
+import json
+import logging
+import os
+import time
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from database import Database, FILAS_ENTRE_REVISIONES, INTERVALO_PROGRESO
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Filas que se validan e insertan juntas
+TAMANO_BLOQUE_IMPORTACION = 5000
+
+# Mensajes de error que se conservan; los demás solo se cuentan
+MAX_ERRORES_IMPORTACION = 200
+
+# Escala del progreso reportado (milésimas del archivo leído)
+ESCALA_PROGRESO = 1000
+
+COLUMNAS_REQUERIDAS = ('fecha', 'tipo', 'descripcion', 'valor')
+
+# Bytes que se leen de un archivo JSON en cada paso
+TAMANO_LECTURA_JSON = 1 << 16
+
+# Caracteres máximos de un elemento JSON; un elemento mayor se trata como archivo inválido
+TAMANO_MAXIMO_ELEMENTO_JSON = 1 << 24
+
+# Un error de JSON a menos de estos caracteres del final del texto leído puede
+# deberse a un elemento cortado (un número, un literal o un escape \uXXXX a medias)
+_COLA_ELEMENTO_CORTADO = 16
+
+
+class ImportacionCancelada(Exception):
+    """La importación se canceló; no se insertó ninguna factura."""
+
+
+class ErroresImportacion:
+    """
+    Acumula los errores de una importación con un límite de mensajes.
+    
+    Guarda los primeros `maximo` mensajes y cuenta el resto, de modo que un
+    archivo con millones de filas inválidas no agote la memoria.
+    """
+    
+    def __init__(self, maximo: int = MAX_ERRORES_IMPORTACION):
+        self.maximo = maximo
+        self.mensajes: List[str] = []
+        self.total = 0
+    
+    def __len__(self) -> int:
+        return self.total
+    
+    def agregar(self, mensaje: str):
+        """Registra un error; solo se guarda el texto si hay espacio."""
+        self.total += 1
+        if len(self.mensajes) < self.maximo:
+            self.mensajes.append(mensaje)
+    
+    @property
+    def omitidos(self) -> int:
+        """Errores contados pero sin mensaje guardado."""
+        return self.total - len(self.mensajes)
+    
+    def texto(self) -> str:
+        """Mensajes guardados, uno por línea, con el número de omitidos al final."""
+        lineas = list(self.mensajes)
+        if self.omitidos:
+            lineas.append(f"... y {self.omitidos} error(es) más")
+        return "\n".join(lineas)
+
+
+@lru_cache(maxsize=8192)
+def normalizar_fecha(texto: str) -> Optional[str]:
+    """
+    Valida una fecha DD/MM/YYYY y la devuelve con ceros a la izquierda.
+    
+    Las fechas se repiten mucho en un archivo, por lo que el resultado se cachea.
+    
+    Returns:
+        Optional[str]: Fecha normalizada o None si no es válida.
+    """
+    try:
+        return datetime.strptime(texto, '%d/%m/%Y').strftime('%d/%m/%Y')
+    except ValueError:
+        return None
+
+
+def validar_fila(fila: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Valida una fila leída de un archivo y la convierte en factura.
+    
+    Acepta tanto texto (CSV) como los valores nativos de una celda de Excel:
+    las fechas datetime/date y los números se usan directamente, sin pasar
+    por texto.
+    
+    Args:
+        fila: Diccionario con 'fecha', 'tipo', 'descripcion' y 'valor'.
+    
+    Returns:
+        Tuple: (factura, None) si la fila es válida, o (None, motivo) si no lo es.
+    """
+    fecha = fila.get('fecha')
+    if not isinstance(fecha, date):
+        fecha = str(fecha or '').strip()
+    tipo = str(fila.get('tipo') or '').strip()
+    descripcion = str(fila.get('descripcion') or '').strip()
+    valor = fila.get('valor')
+    
+    # Validar campos obligatorios
+    if not (fecha and tipo and descripcion and valor not in (None, '')):
+        return None, "Faltan campos obligatorios"
+    
+    try:
+        # Manejar diferentes formatos de valor (con comas, símbolo de moneda, etc.)
+        if not isinstance(valor, (int, float)):
+            valor = float(str(valor).replace('$', '').replace(',', '').strip())
+    except (ValueError, TypeError):
+        return None, f"Valor inválido: {fila.get('valor')}"
+    if valor <= 0:
+        return None, "Valor inválido - El valor debe ser mayor a cero"
+    
+    if isinstance(fecha, date):
+        fecha_normalizada = fecha.strftime('%d/%m/%Y')
+    else:
+        fecha_normalizada = normalizar_fecha(fecha)
+    if fecha_normalizada is None:
+        return None, "Formato de fecha inválido (debe ser DD/MM/YYYY)"
+    
+    return {
+        'fecha': fecha_normalizada,
+        'tipo': tipo,
+        'descripcion': descripcion,
+        'valor': float(valor)
+    }, None
+
+
+def validar_por_bloques(filas: Iterable[Tuple[int, Dict[str, Any]]], errores: ErroresImportacion,
+                        tamano_bloque: int = TAMANO_BLOQUE_IMPORTACION,
+                        etiqueta: str = "Fila") -> Iterator[List[Dict[str, Any]]]:
+    """
+    Agrupa filas válidas en bloques; las inválidas se registran en `errores`.
+    
+    Args:
+        filas: Pares (número de fila en el archivo, fila).
+        errores: Acumulador de errores.
+        tamano_bloque: Facturas por bloque.
+        etiqueta: Cómo se nombra cada fila en los mensajes de error.
+    
+    Yields:
+        List[Dict]: Bloques de facturas válidas.
+    """
+    bloque = []
+    for numero, fila in filas:
+        factura, error = validar_fila(fila)
+        if error:
+            errores.agregar(f"{etiqueta} {numero}: {error}")
+            continue
+        bloque.append(factura)
+        if len(bloque) >= tamano_bloque:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def _insertar_filas(db: Database, filas: Iterable[Tuple[int, Dict[str, Any]]],
+                    fraccion_leida: Callable[[int], int], errores: ErroresImportacion,
+                    reemplazar: bool, progreso: Optional[Callable[[int, int], None]],
+                    cancelado: Optional[Callable[[], bool]], tamano_bloque: int,
+                    etiqueta: str = "Fila") -> int:
+    """
+    Valida e inserta filas por bloques revisando cancelación y progreso.
+    
+    Args:
+        db: Base de datos destino.
+        filas: Pares (número de fila en el archivo, fila).
+        fraccion_leida: Recibe el número de fila y devuelve lo leído en ESCALA_PROGRESO.
+        errores: Acumulador de errores.
+        reemplazar: Si es True, elimina antes las facturas existentes.
+        progreso: Función opcional que recibe (hechas, total).
+        cancelado: Función opcional que devuelve True para cancelar.
+        tamano_bloque: Facturas por bloque.
+        etiqueta: Cómo se nombra cada fila en los mensajes de error.
+        
+    Returns:
+        int: Número de facturas insertadas.
+    """
+    def revisadas():
+        ultimo_reporte = 0.0
+        for numero, fila in filas:
+            if numero % FILAS_ENTRE_REVISIONES == 0:
+                if cancelado and cancelado():
+                    raise ImportacionCancelada("Importación cancelada por el usuario")
+                ahora = time.monotonic()
+                if progreso and ahora - ultimo_reporte >= INTERVALO_PROGRESO:
+                    ultimo_reporte = ahora
+                    progreso(min(fraccion_leida(numero), ESCALA_PROGRESO), ESCALA_PROGRESO)
+            yield numero, fila
+        if cancelado and cancelado():
+            raise ImportacionCancelada("Importación cancelada por el usuario")
+    
+    importadas = db.insertar_bloques(
+        validar_por_bloques(revisadas(), errores, tamano_bloque, etiqueta),
+        reemplazar=reemplazar
+    )
+    if progreso:
+        progreso(ESCALA_PROGRESO, ESCALA_PROGRESO)
+    return importadas
+
+
+class _LectorConProgreso:
+    """
+    Entrega las líneas de un archivo binario como texto y cuenta los bytes leídos.
+    
+    csv.reader consume cualquier iterable de líneas, y contar aquí evita
+    depender de tell(), que no está disponible mientras se itera un archivo de texto.
+    """
+    
+    def __init__(self, archivo, codificacion: str = 'utf-8'):
+        self._archivo = archivo
+        self._codificacion = codificacion
+        self.bytes_leidos = 0
+    
+    def __iter__(self):
+        for linea in self._archivo:
+            self.bytes_leidos += len(linea)
+            yield linea.decode(self._codificacion)
+
+
+def importar_csv(db: Database, ruta: str, reemplazar: bool = False,
+                 progreso: Optional[Callable[[int, int], None]] = None,
+                 cancelado: Optional[Callable[[], bool]] = None,
+                 tamano_bloque: int = TAMANO_BLOQUE_IMPORTACION,
+                 max_errores: int = MAX_ERRORES_IMPORTACION) -> Dict[str, Any]:
+    """
+    Importa facturas desde un CSV con columnas fecha, tipo, descripcion y valor.
+    
+    El archivo se lee una sola vez; las filas válidas se insertan por bloques
+    en una única transacción, así que un error o una cancelación no dejan la
+    importación a medias.
+    
+    Args:
+        db: Base de datos destino.
+        ruta: Ruta del archivo CSV (UTF-8).
+        reemplazar: Si es True, elimina antes las facturas existentes.
+        progreso: Función opcional que recibe (hechas, total) en milésimas del
+            archivo, como máximo una vez cada INTERVALO_PROGRESO segundos.
+        cancelado: Función opcional que devuelve True para cancelar.
+        tamano_bloque: Facturas por bloque.
+        max_errores: Mensajes de error que se conservan.
+    
+    Returns:
+        Dict[str, Any]: 'importadas', 'errores' (ErroresImportacion) y 'duracion_ms'.
+    
+    Raises:
+        ValueError: Si faltan columnas requeridas.
+        ImportacionCancelada: Si se canceló la importación.
+    """
+    inicio = time.perf_counter()
+    errores = ErroresImportacion(max_errores)
+    
+    tamano_total = max(os.path.getsize(ruta), 1)
+    
+    with open(ruta, 'rb') as archivo:
+        lector = _LectorConProgreso(archivo, 'utf-8-sig')
+        reader = csv.DictReader(lector)
+        
+        # Verificar que el CSV tenga las columnas necesarias
+        columnas = reader.fieldnames or []
+        faltantes = [c for c in COLUMNAS_REQUERIDAS if c not in columnas]
+        if faltantes:
+            raise ValueError(
+                f"El archivo CSV debe contener las columnas: {', '.join(COLUMNAS_REQUERIDAS)}\n\n"
+                f"Columnas encontradas: {', '.join(columnas) if columnas else 'Ninguna'}"
+            )
+        
+        # La fila 1 es el encabezado
+        importadas = _insertar_filas(
+            db, enumerate(reader, 2),
+            lambda numero: ESCALA_PROGRESO * lector.bytes_leidos // tamano_total,
+            errores, reemplazar, progreso, cancelado, tamano_bloque
+        )
+    
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    logger.info(
+        f"Importación CSV de {ruta}: {importadas} facturas, "
+        f"{len(errores)} filas con errores, {duracion_ms:.1f} ms"
+    )
+    return {'importadas': importadas, 'errores': errores, 'duracion_ms': duracion_ms}
+
+
+class _LectorJSON:
+    """
+    Decodifica incrementalmente un archivo JSON binario y cuenta los bytes leídos.
+    
+    Mantiene en memoria solo el texto aún no consumido: como mucho un
+    elemento más un bloque de lectura.
+    """
+    
+    _ESPACIOS = ' \t\r\n'
+    
+    def __init__(self, archivo, tamano_lectura: int = TAMANO_LECTURA_JSON):
+        self._archivo = archivo
+        self._tamano_lectura = tamano_lectura
+        self._decodificador = codecs.getincrementaldecoder('utf-8-sig')()
+        self._json = json.JSONDecoder()
+        self.texto = ''
+        self.pos = 0
+        self.fin = False
+        self.bytes_leidos = 0
+    
+    def leer_mas(self, tamano: Optional[int] = None) -> bool:
+        """Agrega otro bloque al texto pendiente; False si el archivo terminó."""
+        if self.fin:
+            return False
+        datos = self._archivo.read(tamano or self._tamano_lectura)
+        self.bytes_leidos += len(datos)
+        if not datos:
+            self.fin = True
+            self.texto = self.texto[self.pos:] + self._decodificador.decode(b'', final=True)
+        else:
+            self.texto = self.texto[self.pos:] + self._decodificador.decode(datos)
+        self.pos = 0
+        return True
+    
+    def siguiente_caracter(self) -> str:
+        """Salta los espacios y devuelve el siguiente carácter sin consumirlo ('' al final)."""
+        while True:
+            while self.pos < len(self.texto) and self.texto[self.pos] in self._ESPACIOS:
+                self.pos += 1
+            if self.pos < len(self.texto):
+                return self.texto[self.pos]
+            if not self.leer_mas():
+                return ''
+    
+    def valor(self) -> Any:
+        """Decodifica el siguiente valor JSON completo."""
+        self.siguiente_caracter()
+        tamano = self._tamano_lectura
+        while True:
+            try:
+                valor, fin = self._json.raw_decode(self.texto, self.pos)
+                # Un número al final del texto podría continuar en el siguiente bloque
+                if fin < len(self.texto) or self.fin:
+                    self.pos = fin
+                    return valor
+            except json.JSONDecodeError as e:
+                # Un error lejos del final del texto no se arregla leyendo más
+                cortado = (e.pos >= len(self.texto) - _COLA_ELEMENTO_CORTADO
+                           or e.msg.startswith('Unterminated string'))
+                if self.fin or not cortado or len(self.texto) - self.pos > TAMANO_MAXIMO_ELEMENTO_JSON:
+                    raise
+            # Elemento incompleto: leer bloques cada vez mayores
+            self.leer_mas(tamano)
+            tamano *= 2
+
+
+def iterar_json(archivo) -> Iterator[Any]:
+    """
+    Recorre los elementos de un archivo JSON sin cargarlo completo.
+    
+    Acepta un arreglo JSON ([{...}, {...}]) o JSON Lines (un valor por línea).
+    
+    Args:
+        archivo: Archivo abierto en modo binario.
+        
+    Yields:
+        Any: Cada elemento del arreglo o cada línea, ya decodificado.
+        
+    Raises:
+        json.JSONDecodeError: Si el contenido no es JSON válido.
+    """
+    yield from _iterar_lector_json(_LectorJSON(archivo))
+
+
+def _iterar_lector_json(lector: _LectorJSON) -> Iterator[Any]:
+    """Recorre los elementos usando un _LectorJSON ya creado (para medir el progreso)."""
+    if lector.siguiente_caracter() != '[':
+        # JSON Lines: valores seguidos separados por espacios o saltos de línea
+        while lector.siguiente_caracter():
+            yield lector.valor()
+        return
+    
+    lector.pos += 1
+    if lector.siguiente_caracter() == ']':
+        lector.pos += 1
+        return
+    while True:
+        yield lector.valor()
+        separador = lector.siguiente_caracter()
+        lector.pos += 1
+        if separador == ']':
+            return
+        if separador != ',':
+            raise json.JSONDecodeError("Se esperaba ',' o ']'", lector.texto, lector.pos - 1)
+
+
+def importar_json(db: Database, ruta: str, reemplazar: bool = False,
+                  progreso: Optional[Callable[[int, int], None]] = None,
+                  cancelado: Optional[Callable[[], bool]] = None,
+                  tamano_bloque: int = TAMANO_BLOQUE_IMPORTACION,
+                  max_errores: int = MAX_ERRORES_IMPORTACION) -> Dict[str, Any]:
+    """
+    Importa facturas desde un arreglo JSON o un archivo JSON Lines.
+    
+    Los elementos se leen de a uno y las facturas válidas se insertan por
+    bloques en una única transacción.
+    
+    Args:
+        db: Base de datos destino.
+        ruta: Ruta del archivo JSON (UTF-8).
+        reemplazar: Si es True, elimina antes las facturas existentes.
+        progreso: Función opcional que recibe (hechas, total) en milésimas del
+            archivo, como máximo una vez cada INTERVALO_PROGRESO segundos.
+        cancelado: Función opcional que devuelve True para cancelar.
+        tamano_bloque: Facturas por bloque.
+        max_errores: Mensajes de error que se conservan.
+        
+    Returns:
+        Dict[str, Any]: 'importadas', 'errores' (ErroresImportacion) y 'duracion_ms'.
+        
+    Raises:
+        json.JSONDecodeError: Si el archivo no es JSON válido.
+        ImportacionCancelada: Si se canceló la importación.
+    """
+    inicio = time.perf_counter()
+    errores = ErroresImportacion(max_errores)
+    tamano_total = max(os.path.getsize(ruta), 1)
+    
+    with open(ruta, 'rb') as archivo:
+        lector = _LectorJSON(archivo)
+        
+        def filas():
+            # Los elementos que no son objetos se validan como filas vacías
+            for numero, elemento in enumerate(_iterar_lector_json(lector), 1):
+                yield numero, elemento if isinstance(elemento, dict) else {}
+        
+        importadas = _insertar_filas(
+            db, filas(),
+            lambda numero: ESCALA_PROGRESO * lector.bytes_leidos // tamano_total,
+            errores, reemplazar, progreso, cancelado, tamano_bloque, etiqueta="Factura"
+        )
+    
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    logger.info(
+        f"Importación JSON de {ruta}: {importadas} facturas, "
+        f"{len(errores)} elementos con errores, {duracion_ms:.1f} ms"
+    )
+    return {'importadas': importadas, 'errores': errores, 'duracion_ms': duracion_ms}
+
+
+def hojas_excel(ruta: str) -> List[str]:
+    """
+    Obtiene los nombres de las hojas de un libro de Excel sin cargar sus celdas.
+    
+    Args:
+        ruta: Ruta del archivo .xlsx.
+        
+    Returns:
+        List[str]: Nombres de las hojas, en orden.
+    """
+    import openpyxl
+    
+    wb = openpyxl.load_workbook(ruta, read_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def importar_excel(db: Database, ruta: str, hoja: Optional[str] = None, reemplazar: bool = False,
+                   progreso: Optional[Callable[[int, int], None]] = None,
+                   cancelado: Optional[Callable[[], bool]] = None,
+                   tamano_bloque: int = TAMANO_BLOQUE_IMPORTACION,
+                   max_errores: int = MAX_ERRORES_IMPORTACION) -> Dict[str, Any]:
+    """
+    Importa facturas desde una hoja de Excel con columnas fecha, tipo, descripcion y valor.
+    
+    El libro se abre en modo de solo lectura, que recorre el XML de la hoja
+    fila por fila en lugar de construir todas las celdas en memoria. Los
+    valores llegan con su tipo nativo (fechas y números). Las filas válidas se
+    insertan por bloques en una única transacción.
+    
+    Args:
+        db: Base de datos destino.
+        ruta: Ruta del archivo .xlsx.
+        hoja: Nombre de la hoja (opcional, por defecto la activa).
+        reemplazar: Si es True, elimina antes las facturas existentes.
+        progreso: Función opcional que recibe (hechas, total) en milésimas de
+            las filas de la hoja, como máximo una vez cada INTERVALO_PROGRESO segundos.
+        cancelado: Función opcional que devuelve True para cancelar.
+        tamano_bloque: Facturas por bloque.
+        max_errores: Mensajes de error que se conservan.
+        
+    Returns:
+        Dict[str, Any]: 'importadas', 'errores' (ErroresImportacion) y 'duracion_ms'.
+        
+    Raises:
+        ValueError: Si faltan columnas requeridas.
+        ImportacionCancelada: Si se canceló la importación.
+    """
+    import openpyxl
+    
+    inicio = time.perf_counter()
+    errores = ErroresImportacion(max_errores)
+    
+    wb = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        sheet = wb[hoja] if hoja else wb.active
+        filas = sheet.iter_rows(values_only=True)
+        
+        # Mapear los índices de las columnas a partir de los encabezados
+        encabezados = [str(v).strip().lower() if v is not None else '' for v in next(filas, ())]
+        faltantes = [c for c in COLUMNAS_REQUERIDAS if c not in encabezados]
+        if faltantes:
+            raise ValueError(
+                f"El archivo Excel debe contener las columnas: {', '.join(COLUMNAS_REQUERIDAS)}.\n"
+                f"Columnas faltantes: {', '.join(faltantes)}\n\n"
+                f"Columnas encontradas: {', '.join(h for h in encabezados if h) or 'Ninguna'}"
+            )
+        indices = [(c, encabezados.index(c)) for c in COLUMNAS_REQUERIDAS]
+        
+        def como_diccionarios():
+            # La fila 1 es el encabezado
+            for numero, valores in enumerate(filas, 2):
+                yield numero, {c: valores[i] if i < len(valores) else None for c, i in indices}
+        
+        # max_row viene de la dimensión declarada en la hoja y puede faltar
+        total_filas = max(sheet.max_row or 0, 1)
+        importadas = _insertar_filas(
+            db, como_diccionarios(),
+            lambda numero: ESCALA_PROGRESO * numero // total_filas,
+            errores, reemplazar, progreso, cancelado, tamano_bloque
+        )
+    finally:
+        wb.close()
+    
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    logger.info(
+        f"Importación Excel de {ruta}: {importadas} facturas, "
+        f"{len(errores)} filas con errores, {duracion_ms:.1f} ms"
+    )
+    return {'importadas': importadas, 'errores': errores, 'duracion_ms': duracion_ms}
@@ -0,0 +1,678 @@
+"""
+Índices en memoria sobre la lista de facturas.
+
+Se construyen una sola vez al cargar los datos y se mantienen al agregar,
+modificar o eliminar facturas, de modo que los filtros de la interfaz no
+tengan que volver a interpretar todas las fechas en cada consulta.
+"""
+import logging
+from bisect import bisect_left, insort
+from datetime import date
+from functools import lru_cache
+from itertools import count
+from typing import Dict, List, Optional, Tuple, Any
+
+logger = logging.getLogger(__name__)
+
+# Textos de fecha distintos que se recuerdan ya interpretados (unos 20 años de días)
+FECHAS_EN_CACHE = 8192
+
+
+def ordinal_fecha(texto: Any) -> Optional[int]:
+    """
+    Convierte una fecha DD/MM/YYYY o YYYY-MM-DD a su ordinal (date.toordinal()).
+
+    Las facturas comparten pocas fechas distintas, así que cada texto se
+    interpreta una sola vez y los resultados se guardan en caché.
+
+    Args:
+        texto: Fecha en texto
+
+    Returns:
+        Optional[int]: Ordinal de la fecha, o None si el formato no es válido
+    """
+    if not isinstance(texto, str):
+        return None
+    return _ordinal_texto(texto)
+
+
+@lru_cache(maxsize=FECHAS_EN_CACHE)
+def _ordinal_texto(texto: str) -> Optional[int]:
+    try:
+        if '/' in texto:
+            dia, mes, anio = texto.split('/')
+        else:
+            anio, mes, dia = texto.split('-')
+        return date(int(anio), int(mes), int(dia)).toordinal()
+    except ValueError:
+        return None
+
+
+class IndiceFechas:
+    """
+    Índice de facturas ordenado por fecha para consultas por rango.
+
+    Guarda claves (ordinal, secuencia) en listas ordenadas: una global y una
+    por tipo de gasto. Un rango [desde, hasta] se resuelve con dos búsquedas
+    binarias, por lo que el costo es O(log N + k).
+
+    Las facturas se identifican por identidad del objeto, así que funciona
+    también con facturas nuevas que aún no tienen ID de la base de datos.
+    """
+
+    def __init__(self, facturas: Optional[List[Dict[str, Any]]] = None):
+        self._secuencia = count()
+        self._claves: List[Tuple[int, int]] = []
+        self._por_tipo: Dict[str, List[Tuple[int, int]]] = {}
+        self._facturas: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self._entradas: Dict[int, Tuple[Tuple[int, int], str]] = {}
+        if facturas:
+            self.reconstruir(facturas)
+
+    def __len__(self) -> int:
+        return len(self._claves)
+
+    def reconstruir(self, facturas: List[Dict[str, Any]]) -> None:
+        """
+        Reconstruye el índice completo a partir de una lista de facturas.
+
+        Args:
+            facturas: Lista de facturas
+        """
+        self._secuencia = count()
+        self._claves = []
+        self._por_tipo = {}
+        self._facturas = {}
+        self._entradas = {}
+
+        for factura in facturas:
+            clave = self._registrar(factura)
+            if clave is not None:
+                self._claves.append(clave)
+                self._por_tipo.setdefault(factura.get('tipo', ''), []).append(clave)
+
+        self._claves.sort()
+        for claves in self._por_tipo.values():
+            claves.sort()
+        logger.debug(f"Índice de fechas reconstruido con {len(self._claves)} facturas")
+
+    def _registrar(self, factura: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        """Crea la clave de una factura y la registra en los diccionarios auxiliares"""
+        ordinal = ordinal_fecha(factura.get('fecha'))
+        if ordinal is None:
+            logger.warning(f"Formato de fecha no reconocido: {factura.get('fecha')}")
+            return None
+        clave = (ordinal, next(self._secuencia))
+        self._facturas[clave] = factura
+        self._entradas[id(factura)] = (clave, factura.get('tipo', ''))
+        return clave
+
+    def agregar(self, factura: Dict[str, Any]) -> None:
+        """
+        Agrega una factura al índice.
+
+        Args:
+            factura: Factura a agregar
+        """
+        clave = self._registrar(factura)
+        if clave is None:
+            return
+        insort(self._claves, clave)
+        insort(self._por_tipo.setdefault(factura.get('tipo', ''), []), clave)
+
+    def eliminar(self, factura: Dict[str, Any]) -> bool:
+        """
+        Elimina una factura del índice.
+
+        Args:
+            factura: Factura a eliminar (el mismo objeto que se agregó)
+
+        Returns:
+            bool: True si la factura estaba en el índice
+        """
+        entrada = self._entradas.pop(id(factura), None)
+        if entrada is None:
+            return False
+        clave, tipo = entrada
+        del self._facturas[clave]
+        self._quitar_clave(self._claves, clave)
+        claves_tipo = self._por_tipo.get(tipo)
+        if claves_tipo is not None:
+            self._quitar_clave(claves_tipo, clave)
+            if not claves_tipo:
+                del self._por_tipo[tipo]
+        return True
+
+    def eliminar_varias(self, facturas: List[Dict[str, Any]]) -> int:
+        """
+        Elimina varias facturas del índice.
+
+        Cada eliminar() desplaza la lista ordenada; para muchas facturas se
+        filtran las listas una sola vez, en O(N + k) en lugar de O(k·N).
+
+        Args:
+            facturas: Facturas a eliminar (los mismos objetos que se agregaron)
+
+        Returns:
+            int: Cantidad de facturas que estaban en el índice
+        """
+        quitadas = set()
+        tipos = set()
+        for factura in facturas:
+            entrada = self._entradas.pop(id(factura), None)
+            if entrada is None:
+                continue
+            clave, tipo = entrada
+            del self._facturas[clave]
+            quitadas.add(clave)
+            tipos.add(tipo)
+        if not quitadas:
+            return 0
+
+        self._claves = [clave for clave in self._claves if clave not in quitadas]
+        for tipo in tipos:
+            claves_tipo = [clave for clave in self._por_tipo.get(tipo, ()) if clave not in quitadas]
+            if claves_tipo:
+                self._por_tipo[tipo] = claves_tipo
+            else:
+                self._por_tipo.pop(tipo, None)
+        return len(quitadas)
+
+    def actualizar(self, factura: Dict[str, Any]) -> None:
+        """
+        Vuelve a indexar una factura cuya fecha o tipo cambió.
+
+        Args:
+            factura: Factura modificada
+        """
+        self.eliminar(factura)
+        self.agregar(factura)
+
+    @staticmethod
+    def _quitar_clave(claves: List[Tuple[int, int]], clave: Tuple[int, int]) -> None:
+        posicion = bisect_left(claves, clave)
+        if posicion < len(claves) and claves[posicion] == clave:
+            del claves[posicion]
+
+    def rango(self, desde: date, hasta: date, tipo: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Obtiene las facturas con fecha entre desde y hasta (ambas incluidas).
+
+        Args:
+            desde: Fecha inicial
+            hasta: Fecha final
+            tipo: Tipo de gasto (opcional)
+
+        Returns:
+            List[Dict]: Facturas del rango, de la más reciente a la más antigua
+                (el mismo orden de Database.obtener_facturas)
+        """
+        if tipo is None:
+            claves = self._claves
+        else:
+            claves = self._por_tipo.get(tipo)
+            if not claves:
+                return []
+
+        inicio = bisect_left(claves, (desde.toordinal(),))
+        fin = bisect_left(claves, (hasta.toordinal() + 1,))
+        facturas = self._facturas
+        return [facturas[clave] for clave in reversed(claves[inicio:fin])]
+
+
+def partes_fecha(texto: Any) -> Optional[Tuple[int, int, int]]:
+    """
+    Obtiene (año, mes, día) de una fecha DD/MM/YYYY o YYYY-MM-DD.
+
+    Args:
+        texto: Fecha en texto
+
+    Returns:
+        Optional[Tuple[int, int, int]]: Partes de la fecha, o None si no es válida
+    """
+    ordinal = ordinal_fecha(texto)
+    if ordinal is None:
+        return None
+    fecha = date.fromordinal(ordinal)
+    return fecha.year, fecha.month, fecha.day
+
+
+class _NodoCalendario:
+    """Nodo del índice de calendario con conteo y suma en centavos, en total y por tipo"""
+    __slots__ = ('cantidad', 'centavos', 'por_tipo', 'hijos', 'facturas')
+
+    def __init__(self):
+        self.cantidad = 0
+        self.centavos = 0
+        self.por_tipo: Dict[str, List[int]] = {}
+        self.hijos: Dict[int, '_NodoCalendario'] = {}
+        self.facturas: Dict[str, Dict[int, Dict[str, Any]]] = {}
+
+    def sumar(self, tipo: str, cantidad: int, centavos: int) -> None:
+        self.cantidad += cantidad
+        self.centavos += centavos
+        acumulado = self.por_tipo.setdefault(tipo, [0, 0])
+        acumulado[0] += cantidad
+        acumulado[1] += centavos
+        if not acumulado[0]:
+            del self.por_tipo[tipo]
+
+    def totales(self, tipo: Optional[str]) -> Tuple[int, int]:
+        if tipo is None:
+            return self.cantidad, self.centavos
+        cantidad, centavos = self.por_tipo.get(tipo, (0, 0))
+        return cantidad, centavos
+
+
+class TotalesCalendario:
+    """
+    Copia de los totales del índice de calendario en un momento dado.
+
+    Ofrece totales_por_tipo() y totales_mensuales() con la misma forma que
+    exportacion.AgrupacionFacturas, así que las hojas de resumen de Excel
+    muestran las mismas cifras que los resúmenes de la interfaz. Al ser una
+    copia, se puede usar desde otro hilo mientras el índice sigue cambiando.
+    """
+
+    def __init__(self, centavos_por_tipo: Dict[str, int], centavos_por_mes: Dict[Tuple[int, int], int]):
+        self.centavos_por_tipo = centavos_por_tipo
+        self.centavos_por_mes = centavos_por_mes
+        self.centavos_total = sum(centavos_por_tipo.values())
+
+    def totales_por_tipo(self) -> List[Tuple[str, float]]:
+        """Total de cada tipo, de mayor a menor."""
+        return sorted(((tipo, centavos / 100) for tipo, centavos in self.centavos_por_tipo.items()),
+                      key=lambda x: x[1], reverse=True)
+
+    def totales_mensuales(self) -> List[Tuple[int, int, float]]:
+        """(año, mes, total) de cada mes, en orden cronológico."""
+        return [(anio, mes, self.centavos_por_mes[(anio, mes)] / 100)
+                for anio, mes in sorted(self.centavos_por_mes)]
+
+
+class IndiceCalendario:
+    """
+    Índice jerárquico año → mes → día → facturas.
+
+    Cada nodo guarda la cantidad de facturas y la suma de sus valores en
+    centavos, en total y por tipo de gasto: es un cubo de agregados por
+    (año, mes, día, tipo) con sus subtotales por mes y por año. Agregar,
+    modificar o eliminar una factura ajusta tres nodos, y los totales de
+    cualquier combinación de año, mes, día y tipo salen de los nodos sin
+    recorrer las facturas. Sumar en centavos evita que las altas y bajas
+    sucesivas acumulen error de punto flotante.
+    """
+
+    def __init__(self, facturas: Optional[List[Dict[str, Any]]] = None):
+        self._anios: Dict[int, _NodoCalendario] = {}
+        self._entradas: Dict[int, Tuple[int, int, int, str, float]] = {}
+        if facturas:
+            self.reconstruir(facturas)
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    def reconstruir(self, facturas: List[Dict[str, Any]]) -> None:
+        """
+        Reconstruye el índice completo a partir de una lista de facturas.
+
+        Args:
+            facturas: Lista de facturas
+        """
+        self._anios = {}
+        self._entradas = {}
+        for factura in facturas:
+            self.agregar(factura)
+        logger.debug(f"Índice de calendario reconstruido con {len(self._entradas)} facturas")
+
+    @staticmethod
+    def _centavos(factura: Dict[str, Any]) -> int:
+        try:
+            return round(float(factura.get('valor', 0)) * 100)
+        except (TypeError, ValueError):
+            return 0
+
+    def agregar(self, factura: Dict[str, Any]) -> None:
+        """
+        Agrega una factura al índice.
+
+        Args:
+            factura: Factura a agregar
+        """
+        partes = partes_fecha(factura.get('fecha'))
+        if partes is None:
+            return
+        anio, mes, dia = partes
+        tipo = factura.get('tipo', '')
+        centavos = self._centavos(factura)
+
+        nodo_anio = self._anios.setdefault(anio, _NodoCalendario())
+        nodo_mes = nodo_anio.hijos.setdefault(mes, _NodoCalendario())
+        nodo_dia = nodo_mes.hijos.setdefault(dia, _NodoCalendario())
+        for nodo in (nodo_anio, nodo_mes, nodo_dia):
+            nodo.sumar(tipo, 1, centavos)
+        nodo_dia.facturas.setdefault(tipo, {})[id(factura)] = factura
+        self._entradas[id(factura)] = (anio, mes, dia, tipo, centavos)
+
+    def eliminar(self, factura: Dict[str, Any]) -> bool:
+        """
+        Elimina una factura del índice usando los datos con los que se indexó.
+
+        Args:
+            factura: Factura a eliminar (el mismo objeto que se agregó)
+
+        Returns:
+            bool: True si la factura estaba en el índice
+        """
+        entrada = self._entradas.pop(id(factura), None)
+        if entrada is None:
+            return False
+        anio, mes, dia, tipo, centavos = entrada
+
+        nodo_anio = self._anios[anio]
+        nodo_mes = nodo_anio.hijos[mes]
+        nodo_dia = nodo_mes.hijos[dia]
+        for nodo in (nodo_anio, nodo_mes, nodo_dia):
+            nodo.sumar(tipo, -1, -centavos)
+
+        facturas_tipo = nodo_dia.facturas[tipo]
+        del facturas_tipo[id(factura)]
+        if not facturas_tipo:
+            del nodo_dia.facturas[tipo]
+        if not nodo_dia.cantidad:
+            del nodo_mes.hijos[dia]
+        if not nodo_mes.cantidad:
+            del nodo_anio.hijos[mes]
+        if not nodo_anio.cantidad:
+            del self._anios[anio]
+        return True
+
+    def actualizar(self, factura: Dict[str, Any]) -> None:
+        """
+        Vuelve a indexar una factura cuya fecha, tipo o valor cambió.
+
+        Args:
+            factura: Factura modificada
+        """
+        self.eliminar(factura)
+        self.agregar(factura)
+
+    def anios(self) -> List[int]:
+        """Años con facturas, del más reciente al más antiguo"""
+        return sorted(self._anios, reverse=True)
+
+    def _nodos(self, anio: Optional[int], mes: Optional[int], dia: Optional[int], hasta_dia: bool):
+        """
+        Recorre los nodos que cumplen el filtro, de la fecha más reciente a la más antigua.
+
+        Se detiene en el nivel más profundo especificado (o en el día si hasta_dia es True).
+        """
+        anios = [anio] if anio is not None else sorted(self._anios, reverse=True)
+        for a in anios:
+            nodo_anio = self._anios.get(a)
+            if nodo_anio is None:
+                continue
+            if mes is None and dia is None and not hasta_dia:
+                yield nodo_anio
+                continue
+            meses = [mes] if mes is not None else sorted(nodo_anio.hijos, reverse=True)
+            for m in meses:
+                nodo_mes = nodo_anio.hijos.get(m)
+                if nodo_mes is None:
+                    continue
+                if dia is None and not hasta_dia:
+                    yield nodo_mes
+                    continue
+                dias = [dia] if dia is not None else sorted(nodo_mes.hijos, reverse=True)
+                for d in dias:
+                    nodo_dia = nodo_mes.hijos.get(d)
+                    if nodo_dia is not None:
+                        yield nodo_dia
+
+    def totales(self, anio: Optional[int] = None, mes: Optional[int] = None,
+                dia: Optional[int] = None, tipo: Optional[str] = None) -> Tuple[int, float]:
+        """
+        Obtiene la cantidad y la suma de las facturas que cumplen el filtro.
+
+        Args:
+            anio: Año (None para todos)
+            mes: Mes 1-12 (None para todos)
+            dia: Día 1-31 (None para todos)
+            tipo: Tipo de gasto (None para todos)
+
+        Returns:
+            Tuple[int, float]: (cantidad, suma)
+        """
+        cantidad, centavos = 0, 0
+        for nodo in self._nodos_resumen(anio, mes, dia):
+            c, s = nodo.totales(tipo)
+            cantidad += c
+            centavos += s
+        return cantidad, centavos / 100
+
+    def _nodos_resumen(self, anio: Optional[int], mes: Optional[int], dia: Optional[int]):
+        """Nodos cuyos totales cubren exactamente el filtro"""
+        if anio is None and mes is None and dia is None:
+            return self._anios.values()
+        return self._nodos(anio, mes, dia, hasta_dia=False)
+
+    def totales_por_tipo(self, anio: Optional[int] = None, mes: Optional[int] = None,
+                         dia: Optional[int] = None) -> Dict[str, Tuple[int, float]]:
+        """
+        Obtiene la cantidad y la suma de cada tipo de gasto en un período.
+
+        Args:
+            anio: Año (None para todos)
+            mes: Mes 1-12 (None para todos)
+            dia: Día 1-31 (None para todos)
+
+        Returns:
+            Dict[str, Tuple[int, float]]: {tipo: (cantidad, suma)}
+        """
+        acumulado: Dict[str, List[int]] = {}
+        for nodo in self._nodos_resumen(anio, mes, dia):
+            for tipo, (cantidad, centavos) in nodo.por_tipo.items():
+                totales = acumulado.setdefault(tipo, [0, 0])
+                totales[0] += cantidad
+                totales[1] += centavos
+        return {tipo: (cantidad, centavos / 100) for tipo, (cantidad, centavos) in acumulado.items()}
+
+    def totales_mensuales(self, anio: int) -> List[float]:
+        """
+        Obtiene la suma de cada mes de un año.
+
+        Args:
+            anio: Año
+
+        Returns:
+            List[float]: Totales de enero a diciembre
+        """
+        totales = [0.0] * 12
+        nodo_anio = self._anios.get(anio)
+        if nodo_anio is not None:
+            for mes, nodo_mes in nodo_anio.hijos.items():
+                totales[mes - 1] = nodo_mes.centavos / 100
+        return totales
+
+    def instantanea_totales(self) -> TotalesCalendario:
+        """
+        Copia los totales por tipo y por mes de todo el índice.
+
+        Returns:
+            TotalesCalendario: Totales que no cambian con las ediciones posteriores
+        """
+        centavos_por_tipo: Dict[str, int] = {}
+        centavos_por_mes: Dict[Tuple[int, int], int] = {}
+        for anio, nodo_anio in self._anios.items():
+            for tipo, (_, centavos) in nodo_anio.por_tipo.items():
+                centavos_por_tipo[tipo] = centavos_por_tipo.get(tipo, 0) + centavos
+            for mes, nodo_mes in nodo_anio.hijos.items():
+                centavos_por_mes[(anio, mes)] = nodo_mes.centavos
+        return TotalesCalendario(centavos_por_tipo, centavos_por_mes)
+
+    def consultar(self, anio: Optional[int] = None, mes: Optional[int] = None,
+                  dia: Optional[int] = None, tipo: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Obtiene las facturas que cumplen el filtro.
+
+        Args:
+            anio: Año (None para todos)
+            mes: Mes 1-12 (None para todos)
+            dia: Día 1-31 (None para todos)
+            tipo: Tipo de gasto (None para todos)
+
+        Returns:
+            List[Dict]: Facturas de la más reciente a la más antigua
+        """
+        resultado = []
+        for nodo_dia in self._nodos(anio, mes, dia, hasta_dia=True):
+            if tipo is None:
+                for facturas_tipo in nodo_dia.facturas.values():
+                    resultado.extend(facturas_tipo.values())
+            else:
+                facturas_tipo = nodo_dia.facturas.get(tipo)
+                if facturas_tipo:
+                    resultado.extend(facturas_tipo.values())
+        return resultado
+
+
+class IndiceFilas:
+    """
+    Posición de cada factura dentro de la lista que muestra una tabla.
+
+    Permite que una edición actualice solo la fila afectada en cada tabla
+    sin buscarla fila por fila. Las facturas se identifican por identidad del
+    objeto, así que también sirve para facturas que aún no tienen ID.
+    """
+
+    def __init__(self, facturas: Optional[List[Dict[str, Any]]] = None):
+        self._filas: Dict[int, int] = {}
+        if facturas:
+            self.reconstruir(facturas)
+
+    def __len__(self) -> int:
+        return len(self._filas)
+
+    def __contains__(self, factura: Dict[str, Any]) -> bool:
+        return id(factura) in self._filas
+
+    def reconstruir(self, facturas: List[Dict[str, Any]]) -> None:
+        """
+        Recalcula las posiciones después de reemplazar o reordenar la lista.
+
+        Args:
+            facturas: Lista mostrada, en el orden de la tabla
+        """
+        self._filas = {id(factura): fila for fila, factura in enumerate(facturas)}
+
+    def agregar(self, factura: Dict[str, Any]) -> int:
+        """
+        Registra una factura agregada al final de la lista.
+
+        Args:
+            factura: Factura agregada
+
+        Returns:
+            int: Fila de la factura
+        """
+        fila = len(self._filas)
+        self._filas[id(factura)] = fila
+        return fila
+
+    def fila(self, factura: Dict[str, Any]) -> Optional[int]:
+        """
+        Obtiene la fila de una factura.
+
+        Args:
+            factura: Factura buscada (el mismo objeto que está en la lista)
+
+        Returns:
+            Optional[int]: Fila de la factura, o None si no está en la lista
+        """
+        return self._filas.get(id(factura))
+
+
+class IndiceIds:
+    """
+    Facturas por ID de la base de datos.
+
+    Las facturas nuevas se registran sin ID y pasan al índice cuando el
+    guardado en segundo plano les asigna uno (ver ids_asignados).
+    """
+
+    def __init__(self, facturas: Optional[List[Dict[str, Any]]] = None):
+        self._por_id: Dict[Any, Dict[str, Any]] = {}
+        self._sin_id: Dict[int, Dict[str, Any]] = {}
+        if facturas:
+            self.reconstruir(facturas)
+
+    def __len__(self) -> int:
+        return len(self._por_id) + len(self._sin_id)
+
+    def reconstruir(self, facturas: List[Dict[str, Any]]) -> None:
+        """
+        Reconstruye el índice completo a partir de una lista de facturas.
+
+        Args:
+            facturas: Lista de facturas
+        """
+        self._por_id = {}
+        self._sin_id = {}
+        for factura in facturas:
+            self.agregar(factura)
+
+    def agregar(self, factura: Dict[str, Any]) -> None:
+        """
+        Agrega una factura al índice.
+
+        Args:
+            factura: Factura a agregar
+        """
+        factura_id = factura.get('id')
+        if factura_id is None:
+            self._sin_id[id(factura)] = factura
+        else:
+            self._por_id[factura_id] = factura
+
+    def eliminar(self, factura: Dict[str, Any]) -> bool:
+        """
+        Elimina una factura del índice.
+
+        Args:
+            factura: Factura a eliminar
+
+        Returns:
+            bool: True si la factura estaba en el índice
+        """
+        if self._sin_id.pop(id(factura), None) is not None:
+            return True
+        factura_id = factura.get('id')
+        if factura_id is not None and self._por_id.get(factura_id) is factura:
+            del self._por_id[factura_id]
+            return True
+        return False
+
+    def ids_asignados(self, facturas: List[Dict[str, Any]]) -> None:
+        """
+        Mueve al índice por ID las facturas nuevas que ya se guardaron.
+
+        Las que se eliminaron mientras se guardaban no se vuelven a agregar.
+
+        Args:
+            facturas: Facturas nuevas del lote guardado
+        """
+        for factura in facturas:
+            if self._sin_id.pop(id(factura), None) is not None:
+                self.agregar(factura)
+
+    def obtener(self, factura_id: Any) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene una factura por su ID.
+
+        Args:
+            factura_id: ID de la factura
+
+        Returns:
+            Optional[Dict]: La factura, o None si no existe
+        """
+        return self._por_id.get(factura_id)
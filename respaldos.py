@@ -0,0 +1,592 @@
+"""
+Respaldos en línea de la base de datos.
+
+La copia se toma con la API de respaldo de SQLite (Database.respaldar_en),
+por pasos y sin bloquear las ediciones, en un archivo temporal junto al
+destino. Ese archivo se verifica con PRAGMA integrity_check, se comprime si
+se pidió y solo entonces reemplaza al destino, así que un respaldo cancelado
+o fallido no deja un archivo a medias.
+
+RepositorioRespaldos guarda instantáneas incrementales: la copia se parte en
+fragmentos de páginas consecutivas que se guardan comprimidos bajo su hash
+SHA-256, una sola vez aunque aparezcan en muchas instantáneas. Como SQLite
+modifica las páginas en su lugar, una instantánea nueva solo agrega los
+fragmentos que cambiaron desde las anteriores.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from database import Database, PAGINAS_RESPALDO_POR_PASO
+
+# zstd es opcional: está en la biblioteca estándar desde Python 3.14 y antes
+# en el paquete zstandard
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Extensión que se agrega al respaldo según la compresión
+EXTENSIONES_COMPRESION = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+# Bytes que se comprimen entre dos revisiones de cancelación y progreso
+TAMANO_LECTURA_COMPRESION = 1 << 20
+
+# Páginas por fragmento del repositorio: con páginas de 4 KB, fragmentos de
+# 64 KB; una edición aislada solo agrega el fragmento de la página que cambió
+PAGINAS_POR_FRAGMENTO = 16
+
+# Nivel de zlib para los fragmentos del repositorio
+NIVEL_COMPRESION_FRAGMENTOS = 6
+
+
+class RespaldoCancelado(Exception):
+    """El usuario canceló el respaldo; el archivo de destino no se modificó."""
+
+
+class RespaldoInvalido(Exception):
+    """La copia no pasó PRAGMA integrity_check."""
+
+
+def compresiones_disponibles() -> List[str]:
+    """
+    Compresiones que se pueden usar en este equipo.
+    
+    Returns:
+        List[str]: 'gzip' y, si hay soporte para zstd, 'zstd'
+    """
+    disponibles = ['gzip']
+    if zstd is not None or zstandard is not None:
+        disponibles.append('zstd')
+    return disponibles
+
+
+def _abrir_comprimido(ruta: str, compresion: str):
+    """Abre un archivo comprimido para escritura binaria."""
+    if compresion == 'gzip':
+        return gzip.open(ruta, 'wb', compresslevel=6)
+    if compresion == 'zstd':
+        if zstd is not None:
+            return zstd.open(ruta, 'wb')
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=3).stream_writer(open(ruta, 'wb'), closefd=True)
+        raise ValueError("La compresión zstd requiere Python 3.14 o el paquete zstandard")
+    raise ValueError(
+        f"Compresión desconocida: {compresion}. "
+        f"Opciones válidas: {', '.join(EXTENSIONES_COMPRESION)}"
+    )
+
+
+def verificar_respaldo(ruta: str) -> List[str]:
+    """
+    Ejecuta PRAGMA integrity_check sobre una copia sin comprimir.
+    
+    Args:
+        ruta: Archivo de la copia
+    
+    Returns:
+        List[str]: Problemas encontrados; vacía si la copia está íntegra
+    """
+    conn = sqlite3.connect(ruta)
+    try:
+        resultado = [fila[0] for fila in conn.execute('PRAGMA integrity_check')]
+    except sqlite3.DatabaseError as e:
+        # Un daño en el esquema impide incluso ejecutar la verificación
+        return [str(e)]
+    finally:
+        conn.close()
+    return [] if resultado == ['ok'] else resultado
+
+
+def _borrar(ruta: str):
+    """Borra un archivo temporal si existe."""
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+def respaldar(db: Database, ruta: str, compresion: Optional[str] = None, verificar: bool = True,
+              progreso: Optional[Callable[[int, int], None]] = None,
+              cancelado: Optional[Callable[[], bool]] = None,
+              paginas_por_paso: int = PAGINAS_RESPALDO_POR_PASO) -> Dict[str, Any]:
+    """
+    Crea un respaldo de la base de datos mientras sigue en uso.
+    
+    Args:
+        db: Base de datos a respaldar; se copia desde la conexión del hilo actual
+        ruta: Archivo de destino; se reemplaza solo si el respaldo termina
+        compresion: None, 'gzip' o 'zstd'
+        verificar: Si es True, ejecuta PRAGMA integrity_check antes de comprimir
+        progreso: Función opcional que recibe (hechas, total) en páginas; la
+            compresión cuenta como una segunda pasada sobre las páginas
+        cancelado: Función opcional que devuelve True para cancelar
+        paginas_por_paso: Páginas por paso de la API de respaldo
+    
+    Returns:
+        Dict[str, Any]: ruta, paginas, bytes del archivo, compresion, verificado y duracion_ms
+    
+    Raises:
+        RespaldoCancelado: Si se canceló; el destino queda como estaba
+        RespaldoInvalido: Si la copia no pasó la verificación
+    """
+    if compresion is not None and compresion not in EXTENSIONES_COMPRESION:
+        raise ValueError(
+            f"Compresión desconocida: {compresion}. "
+            f"Opciones válidas: {', '.join(EXTENSIONES_COMPRESION)}"
+        )
+    
+    def revisar_cancelacion():
+        if cancelado and cancelado():
+            raise RespaldoCancelado("Respaldo cancelado por el usuario")
+    
+    inicio = time.perf_counter()
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    descriptor, copia = tempfile.mkstemp(prefix=f".{os.path.basename(ruta)}.", suffix='.tmp', dir=directorio)
+    os.close(descriptor)
+    comprimido = None
+    try:
+        # 1. Copia por pasos; cancelar desde el progreso interrumpe la API de respaldo
+        pasadas = 2 if compresion else 1
+        
+        def avance_copia(hechas, total):
+            revisar_cancelacion()
+            if progreso:
+                progreso(hechas, total * pasadas)
+        
+        paginas = db.respaldar_en(copia, paginas_por_paso, avance_copia)
+        revisar_cancelacion()
+        
+        # 2. Verificación de la copia sin comprimir
+        if verificar:
+            problemas = verificar_respaldo(copia)
+            if problemas:
+                raise RespaldoInvalido(
+                    "La copia no pasó la verificación de integridad: " + "; ".join(problemas[:5])
+                )
+            revisar_cancelacion()
+        
+        # 3. Compresión por bloques, con el progreso en páginas
+        final = copia
+        if compresion:
+            descriptor, comprimido = tempfile.mkstemp(prefix=f".{os.path.basename(ruta)}.", suffix='.tmp',
+                                                      dir=directorio)
+            os.close(descriptor)
+            tamano = os.path.getsize(copia) or 1
+            leidos = 0
+            with open(copia, 'rb') as origen, _abrir_comprimido(comprimido, compresion) as salida:
+                while True:
+                    bloque = origen.read(TAMANO_LECTURA_COMPRESION)
+                    if not bloque:
+                        break
+                    salida.write(bloque)
+                    leidos += len(bloque)
+                    revisar_cancelacion()
+                    if progreso:
+                        progreso(paginas + paginas * leidos // tamano, paginas * 2)
+            final = comprimido
+        
+        revisar_cancelacion()
+        with open(final, 'rb+') as archivo:
+            os.fsync(archivo.fileno())
+        os.replace(final, ruta)
+    finally:
+        _borrar(copia)
+        if comprimido:
+            _borrar(comprimido)
+    
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    tamano = os.path.getsize(ruta)
+    logger.info(f"Respaldo creado en {ruta}: {paginas} páginas, {tamano} bytes, "
+                f"compresión {compresion or 'ninguna'}, {duracion_ms:.0f} ms")
+    return {
+        'ruta': ruta,
+        'paginas': paginas,
+        'bytes': tamano,
+        'compresion': compresion,
+        'verificado': verificar,
+        'duracion_ms': duracion_ms
+    }
+
+
+def _tamano_pagina(ruta: str) -> int:
+    """Lee el tamaño de página de la cabecera de un archivo de SQLite."""
+    with open(ruta, 'rb') as archivo:
+        cabecera = archivo.read(100)
+    tamano = int.from_bytes(cabecera[16:18], 'big')
+    # El valor 1 representa páginas de 65536 bytes
+    return 65536 if tamano == 1 else tamano
+
+
+def _escribir_atomico(ruta: str, datos: bytes):
+    """Escribe un archivo completo con un temporal y os.replace."""
+    descriptor, temporal = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=os.path.dirname(ruta))
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(datos)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        _borrar(temporal)
+        raise
+
+
+class PoliticaRetencion:
+    """
+    Qué instantáneas se conservan al aplicar la retención.
+    
+    Se conservan las `ultimas` más recientes y, además, la más reciente de
+    cada uno de los últimos `diarias` días, `semanales` semanas y `mensuales`
+    meses que tengan instantáneas.
+    """
+    __slots__ = ('ultimas', 'diarias', 'semanales', 'mensuales')
+    
+    def __init__(self, ultimas: int = 24, diarias: int = 7, semanales: int = 4, mensuales: int = 12):
+        self.ultimas = ultimas
+        self.diarias = diarias
+        self.semanales = semanales
+        self.mensuales = mensuales
+    
+    def conservadas(self, instantaneas: List[Dict[str, Any]]) -> Set[str]:
+        """
+        Selecciona las instantáneas que se conservan.
+        
+        Args:
+            instantaneas: Instantáneas con 'id' y 'fecha' en formato ISO
+        
+        Returns:
+            Set[str]: IDs de las instantáneas que se conservan
+        """
+        recientes = sorted(instantaneas, key=lambda i: i['fecha'], reverse=True)
+        conservar = {i['id'] for i in recientes[:self.ultimas]}
+        periodos = (
+            (self.diarias, lambda fecha: fecha.date()),
+            (self.semanales, lambda fecha: fecha.isocalendar()[:2]),
+            (self.mensuales, lambda fecha: (fecha.year, fecha.month)),
+        )
+        for cantidad, periodo in periodos:
+            vistos = set()
+            for instantanea in recientes:
+                if len(vistos) >= cantidad:
+                    break
+                clave = periodo(datetime.fromisoformat(instantanea['fecha']))
+                if clave not in vistos:
+                    # La primera de cada periodo es la más reciente
+                    vistos.add(clave)
+                    conservar.add(instantanea['id'])
+        return conservar
+
+
+class RepositorioRespaldos:
+    """
+    Repositorio de instantáneas incrementales y deduplicadas de la base de datos.
+    
+    Estructura del directorio:
+        objetos/ab/abcd...: Fragmentos comprimidos con zlib, nombrados por el
+            SHA-256 de su contenido sin comprimir.
+        instantaneas/<id>.json: Manifiesto con la lista ordenada de fragmentos.
+    
+    Una instantánea existe cuando su manifiesto está escrito; los fragmentos de
+    una instantánea cancelada quedan sin referencias y se borran al aplicar la
+    retención. El repositorio admite un solo escritor a la vez.
+    """
+    
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._objetos = os.path.join(ruta, 'objetos')
+        self._instantaneas = os.path.join(ruta, 'instantaneas')
+        os.makedirs(self._objetos, exist_ok=True)
+        os.makedirs(self._instantaneas, exist_ok=True)
+        self._leer_objeto = lru_cache(maxsize=64)(self._leer_objeto_sin_cache)
+    
+    def _ruta_objeto(self, clave: str) -> str:
+        return os.path.join(self._objetos, clave[:2], clave)
+    
+    def _ruta_manifiesto(self, id_instantanea: str) -> str:
+        return os.path.join(self._instantaneas, f"{id_instantanea}.json")
+    
+    def _guardar_objeto(self, datos: bytes) -> Tuple[str, int]:
+        """
+        Guarda un fragmento si no existe.
+        
+        Returns:
+            Tuple[str, int]: Clave del fragmento y bytes escritos (0 si ya estaba)
+        """
+        clave = hashlib.sha256(datos).hexdigest()
+        ruta = self._ruta_objeto(clave)
+        if os.path.exists(ruta):
+            return clave, 0
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        comprimido = zlib.compress(datos, NIVEL_COMPRESION_FRAGMENTOS)
+        _escribir_atomico(ruta, comprimido)
+        return clave, len(comprimido)
+    
+    def _leer_objeto_sin_cache(self, clave: str) -> bytes:
+        """Lee y descomprime un fragmento, comprobando su hash."""
+        with open(self._ruta_objeto(clave), 'rb') as archivo:
+            datos = zlib.decompress(archivo.read())
+        if hashlib.sha256(datos).hexdigest() != clave:
+            raise RespaldoInvalido(f"El fragmento {clave} está dañado")
+        return datos
+    
+    def _leer_manifiesto(self, id_instantanea: str) -> Dict[str, Any]:
+        ruta = self._ruta_manifiesto(id_instantanea)
+        if not os.path.exists(ruta):
+            raise ValueError(f"No existe la instantánea {id_instantanea}")
+        with open(ruta, 'r', encoding='utf-8') as archivo:
+            return json.load(archivo)
+    
+    def instantaneas(self) -> List[Dict[str, Any]]:
+        """
+        Lista las instantáneas del repositorio, de la más antigua a la más reciente.
+        
+        Returns:
+            List[Dict[str, Any]]: id, fecha, paginas, bytes, fragmentos y bytes_nuevos
+        """
+        resultado = []
+        for nombre in os.listdir(self._instantaneas):
+            if not nombre.endswith('.json'):
+                continue
+            manifiesto = self._leer_manifiesto(nombre[:-len('.json')])
+            manifiesto['fragmentos'] = len(manifiesto['fragmentos'])
+            resultado.append(manifiesto)
+        return sorted(resultado, key=lambda i: i['fecha'])
+    
+    def crear_instantanea(self, db: Database, progreso: Optional[Callable[[int, int], None]] = None,
+                          cancelado: Optional[Callable[[], bool]] = None,
+                          fecha: Optional[datetime] = None,
+                          paginas_por_paso: int = PAGINAS_RESPALDO_POR_PASO) -> Dict[str, Any]:
+        """
+        Guarda una instantánea con los fragmentos que cambiaron.
+        
+        La base se copia con la API de respaldo a un temporal, se verifica y se
+        recorre por fragmentos; solo se escriben los que no están en el repositorio.
+        
+        Args:
+            db: Base de datos a respaldar; se copia desde la conexión del hilo actual
+            progreso: Función opcional que recibe (hechas, total) en páginas; la
+                fragmentación cuenta como una segunda pasada
+            cancelado: Función opcional que devuelve True para cancelar
+            fecha: Fecha de la instantánea; por defecto, la actual
+            paginas_por_paso: Páginas por paso de la API de respaldo
+        
+        Returns:
+            Dict[str, Any]: Manifiesto sin la lista de fragmentos, con
+                fragmentos_nuevos, bytes_nuevos y duracion_ms
+        
+        Raises:
+            RespaldoCancelado: Si se canceló; no se registra la instantánea
+            RespaldoInvalido: Si la copia no pasó la verificación
+        """
+        def revisar_cancelacion():
+            if cancelado and cancelado():
+                raise RespaldoCancelado("Respaldo cancelado por el usuario")
+        
+        inicio = time.perf_counter()
+        fecha = fecha or datetime.now()
+        id_instantanea = fecha.strftime('%Y%m%d_%H%M%S_%f')
+        descriptor, copia = tempfile.mkstemp(prefix='.copia.', suffix='.tmp', dir=self.ruta)
+        os.close(descriptor)
+        try:
+            def avance_copia(hechas, total):
+                revisar_cancelacion()
+                if progreso:
+                    progreso(hechas, total * 2)
+            
+            paginas = db.respaldar_en(copia, paginas_por_paso, avance_copia)
+            problemas = verificar_respaldo(copia)
+            if problemas:
+                raise RespaldoInvalido(
+                    "La copia no pasó la verificación de integridad: " + "; ".join(problemas[:5])
+                )
+            
+            tamano_pagina = _tamano_pagina(copia)
+            tamano_fragmento = tamano_pagina * PAGINAS_POR_FRAGMENTO
+            fragmentos = []
+            nuevos = 0
+            bytes_nuevos = 0
+            with open(copia, 'rb') as archivo:
+                while True:
+                    datos = archivo.read(tamano_fragmento)
+                    if not datos:
+                        break
+                    clave, escritos = self._guardar_objeto(datos)
+                    if escritos:
+                        nuevos += 1
+                        bytes_nuevos += escritos
+                    fragmentos.append(clave)
+                    revisar_cancelacion()
+                    if progreso:
+                        progreso(paginas + len(fragmentos) * PAGINAS_POR_FRAGMENTO, paginas * 2)
+            bytes_copia = os.path.getsize(copia)
+        finally:
+            _borrar(copia)
+        
+        manifiesto = {
+            'id': id_instantanea,
+            'fecha': fecha.isoformat(),
+            'tamano_pagina': tamano_pagina,
+            'paginas': paginas,
+            'bytes': bytes_copia,
+            'bytes_nuevos': bytes_nuevos,
+            'fragmentos': fragmentos,
+        }
+        _escribir_atomico(self._ruta_manifiesto(id_instantanea),
+                          json.dumps(manifiesto, ensure_ascii=False).encode('utf-8'))
+        
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        logger.info(f"Instantánea {id_instantanea}: {len(fragmentos)} fragmentos, {nuevos} nuevos "
+                    f"({bytes_nuevos} bytes), {duracion_ms:.0f} ms")
+        manifiesto.update(fragmentos=len(fragmentos), fragmentos_nuevos=nuevos, duracion_ms=duracion_ms)
+        return manifiesto
+    
+    def restaurar(self, id_instantanea: str, destino: str,
+                  progreso: Optional[Callable[[int, int], None]] = None,
+                  cancelado: Optional[Callable[[], bool]] = None,
+                  verificar: bool = True) -> Dict[str, Any]:
+        """
+        Reconstruye el archivo de una instantánea.
+        
+        Args:
+            id_instantanea: ID de la instantánea
+            destino: Archivo de destino; se reemplaza solo si la restauración termina
+            progreso: Función opcional que recibe (fragmentos escritos, total)
+            cancelado: Función opcional que devuelve True para cancelar
+            verificar: Si es True, ejecuta PRAGMA integrity_check antes de reemplazar
+        
+        Returns:
+            Dict[str, Any]: ruta, bytes y duracion_ms
+        
+        Raises:
+            RespaldoCancelado: Si se canceló; el destino queda como estaba
+            RespaldoInvalido: Si un fragmento está dañado o la copia no es íntegra
+        """
+        inicio = time.perf_counter()
+        manifiesto = self._leer_manifiesto(id_instantanea)
+        fragmentos = manifiesto['fragmentos']
+        directorio = os.path.dirname(os.path.abspath(destino))
+        descriptor, temporal = tempfile.mkstemp(prefix=f".{os.path.basename(destino)}.", suffix='.tmp',
+                                                dir=directorio)
+        try:
+            with os.fdopen(descriptor, 'wb') as archivo:
+                for numero, clave in enumerate(fragmentos, 1):
+                    archivo.write(self._leer_objeto(clave))
+                    if cancelado and cancelado():
+                        raise RespaldoCancelado("Restauración cancelada por el usuario")
+                    if progreso:
+                        progreso(numero, len(fragmentos))
+                archivo.flush()
+                os.fsync(archivo.fileno())
+            if os.path.getsize(temporal) != manifiesto['bytes']:
+                raise RespaldoInvalido(f"La instantánea {id_instantanea} no tiene el tamaño esperado")
+            if verificar:
+                problemas = verificar_respaldo(temporal)
+                if problemas:
+                    raise RespaldoInvalido(
+                        "La copia restaurada no pasó la verificación de integridad: " + "; ".join(problemas[:5])
+                    )
+            os.replace(temporal, destino)
+        except BaseException:
+            _borrar(temporal)
+            raise
+        
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        logger.info(f"Instantánea {id_instantanea} restaurada en {destino} ({duracion_ms:.0f} ms)")
+        return {'ruta': destino, 'bytes': manifiesto['bytes'], 'duracion_ms': duracion_ms}
+    
+    def aplicar_retencion(self, politica: Optional[PoliticaRetencion] = None) -> Dict[str, int]:
+        """
+        Borra las instantáneas que la política no conserva y los fragmentos sin referencias.
+        
+        Args:
+            politica: Política de retención; por defecto, PoliticaRetencion()
+        
+        Returns:
+            Dict[str, int]: instantaneas y fragmentos borrados, y bytes liberados
+        """
+        politica = politica or PoliticaRetencion()
+        instantaneas = self.instantaneas()
+        conservar = politica.conservadas(instantaneas)
+        borradas = 0
+        for instantanea in instantaneas:
+            if instantanea['id'] not in conservar:
+                os.remove(self._ruta_manifiesto(instantanea['id']))
+                borradas += 1
+        
+        # Marcar los fragmentos referenciados y barrer el resto
+        referenciados = set()
+        for id_instantanea in conservar:
+            referenciados.update(self._leer_manifiesto(id_instantanea)['fragmentos'])
+        fragmentos_borrados = 0
+        bytes_liberados = 0
+        for clave, ruta in self._recorrer_objetos():
+            if clave not in referenciados:
+                bytes_liberados += os.path.getsize(ruta)
+                os.remove(ruta)
+                fragmentos_borrados += 1
+        self._leer_objeto.cache_clear()
+        
+        logger.info(f"Retención aplicada: {borradas} instantáneas y {fragmentos_borrados} fragmentos "
+                    f"borrados ({bytes_liberados} bytes)")
+        return {'instantaneas': borradas, 'fragmentos': fragmentos_borrados, 'bytes': bytes_liberados}
+    
+    def _recorrer_objetos(self) -> Iterable:
+        """Recorre los fragmentos guardados como pares (clave, ruta)."""
+        for prefijo in os.listdir(self._objetos):
+            carpeta = os.path.join(self._objetos, prefijo)
+            if not os.path.isdir(carpeta):
+                continue
+            for nombre in os.listdir(carpeta):
+                if nombre.startswith('.'):
+                    # Temporal de una escritura interrumpida
+                    _borrar(os.path.join(carpeta, nombre))
+                    continue
+                yield nombre, os.path.join(carpeta, nombre)
+    
+    def tamano(self) -> int:
+        """Bytes que ocupan los fragmentos del repositorio."""
+        return sum(os.path.getsize(ruta) for _, ruta in self._recorrer_objetos())
+
+
+def respaldar_incremental(db: Database, ruta_repositorio: str,
+                          politica: Optional[PoliticaRetencion] = None,
+                          progreso: Optional[Callable[[int, int], None]] = None,
+                          cancelado: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+    """
+    Guarda una instantánea en un repositorio y aplica la retención.
+    
+    Args:
+        db: Base de datos a respaldar
+        ruta_repositorio: Directorio del repositorio; se crea si no existe
+        politica: Política de retención; por defecto, PoliticaRetencion()
+        progreso, cancelado: Como en RepositorioRespaldos.crear_instantanea
+    
+    Returns:
+        Dict[str, Any]: La instantánea creada, con 'retencion' (lo borrado) y
+            'bytes_repositorio' (lo que ocupa el repositorio)
+    """
+    repositorio = RepositorioRespaldos(ruta_repositorio)
+    instantanea = repositorio.crear_instantanea(db, progreso, cancelado)
+    instantanea['retencion'] = repositorio.aplicar_retencion(politica)
+    instantanea['bytes_repositorio'] = repositorio.tamano()
+    return instantanea
@@ -0,0 +1,73 @@
+"""
+Evento de cambio de una factura para las tablas y los resúmenes mostrados.
+
+Una edición se describe con un CambioFactura que guarda la fecha, el tipo y
+el valor de la factura antes y después del cambio. Con esos datos las tablas
+redibujan solo la fila de la factura y cada resumen sabe si la edición lo
+afecta; los totales se vuelven a leer de los agregados de IndiceCalendario.
+"""
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from indices import ordinal_fecha
+
+logger = logging.getLogger(__name__)
+
+# Campos de la factura que afectan los totales de los resúmenes
+CAMPOS_RESUMEN = ('fecha', 'tipo', 'valor')
+
+
+def datos_resumen(factura: Dict[str, Any]) -> Tuple[Optional[int], str, float]:
+    """
+    Obtiene los datos de una factura que cuentan en los resúmenes.
+    
+    Args:
+        factura: Factura
+    
+    Returns:
+        Tuple: (ordinal de la fecha o None, tipo, valor)
+    """
+    try:
+        valor = float(factura.get('valor', 0))
+    except (TypeError, ValueError):
+        valor = 0.0
+    return ordinal_fecha(factura.get('fecha')), factura.get('tipo', ''), valor
+
+
+class CambioFactura:
+    """
+    Evento "factura modificada" que reciben las tablas y los resúmenes.
+    
+    Se crea después de aplicar la edición a la factura; el estado anterior se
+    reconstruye a partir del valor anterior del campo editado.
+    """
+    __slots__ = ('factura', 'campo', 'valor_anterior', 'nuevo_valor', 'antes', 'despues')
+    
+    def __init__(self, factura: Dict[str, Any], campo: str, valor_anterior: Any):
+        """
+        Args:
+            factura: Factura modificada (el mismo objeto de la lista en memoria)
+            campo: Nombre del campo modificado
+            valor_anterior: Valor del campo antes de la edición
+        """
+        self.factura = factura
+        self.campo = campo
+        self.valor_anterior = valor_anterior
+        self.nuevo_valor = factura.get(campo)
+        self.despues = datos_resumen(factura)
+        if campo in CAMPOS_RESUMEN:
+            anterior = dict(factura)
+            anterior[campo] = valor_anterior
+            self.antes = datos_resumen(anterior)
+        else:
+            self.antes = self.despues
+    
+    @property
+    def afecta_resumenes(self) -> bool:
+        """True si cambió la fecha, el tipo o el valor"""
+        return self.antes != self.despues
+    
+    @property
+    def diferencia_centavos(self) -> int:
+        """Diferencia en centavos entre el valor nuevo y el anterior"""
+        return round(self.despues[2] * 100) - round(self.antes[2] * 100)